@@ -1,12 +1,40 @@
-from fastapi import APIRouter, File, UploadFile, Form, Depends, HTTPException, status, Body
+from fastapi import APIRouter, File, UploadFile, Form, Depends, HTTPException, status, Body, Header, Response, Query
+from fastapi.responses import StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator, Tuple
+from datetime import date
+from functools import partial
+import json
 from app.core.security import verify_token, TokenError
-from app.services.file_service import handle_upload
-from app.services.document_service import analyze_and_store_document
-from app.services.document_update_service import update_document_analysis, get_document_analysis
-from app.services.audit_service import log_event, EventType
+from app.services.file_service import handle_upload, is_tabular_file
+from app.services.document_service import analyze_and_store_document, stream_analyze_and_store_document
+from app.services.batch_upload_service import expand_batch_uploads, process_batch_uploads, BatchUploadError
+from app.services.document_update_service import (
+    AnalysisVersionConflictError,
+    update_document_analysis,
+    update_document_analyses,
+    get_cached_document_analysis,
+    get_cached_document_analyses,
+)
+from app.services.analysis_cache_service import etag_matches, parse_if_match, version_etag
+from app.services.data_row_service import file_exists, list_file_rows, search_rows, MAX_PAGE_SIZE
+from app.services.document_product_service import search_products
+from app.services.invoice_search_service import search_invoices, sum_invoices_by_provider_month
+from app.services.document_search_service import search_documents, MAX_PAGE_SIZE as SEARCH_MAX_PAGE_SIZE
+from app.services.validation_service import list_file_validations, iter_file_validations_csv
+from app.services.export_service import check_export_format, export_to_storage, iter_export, ExportError, EXPORT_FORMATS
+from app.core.config import settings
+from app.utils.upload_buffer import UploadTooLargeError, upload_sha256
+from app.utils.excel_reader import ExcelReadError
+from app.services.audit_service import log_event, log_events, build_upload_audit_events, EventType
+from app.services.idempotency_service import (
+    idempotency_store,
+    request_fingerprint,
+    IdempotencyError,
+    IdempotencyKeyMismatchError,
+    InvalidIdempotencyKeyError,
+)
 
 router = APIRouter()
 security = HTTPBearer()
@@ -37,11 +65,52 @@ def require_role(token: str, required_role: str):
     return payload
 
 
+# Header que indica que la respuesta es la guardada de una petición anterior con la misma Idempotency-Key
+REPLAYED_HEADER = "Idempotent-Replayed"
+
+
+async def _upload_fingerprint(endpoint: str, files: List[UploadFile], *params) -> str:
+    # El contenido entra en la huella: reutilizar la clave con otro archivo del mismo nombre es un error 422
+    digests = [await upload_sha256(f) for f in files]
+    return request_fingerprint(endpoint, [f.filename for f in files], digests, *params)
+
+
+async def _idempotent(user_id, idempotency_key, fingerprint, factory, stream=False):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Ejecuta el procesamiento de una carga respetando Idempotency-Key (sin clave se ejecuta directamente) y traduce los errores de idempotencia a HTTP
+    Parámetros de entrada:
+        - user_id: str | None - Usuario autenticado
+        - idempotency_key: str | None - Valor del header Idempotency-Key
+        - fingerprint: Callable - Corrutina sin argumentos que calcula la huella de la petición (endpoint, archivos con su SHA-256, parámetros); solo se evalúa si hay clave
+        - factory: Callable - Corrutina sin argumentos que procesa la carga (o prepara el iterador si stream=True)
+        - stream: bool - True para respuestas en streaming
+    Retorno esperado: tuple[Any, bool] - (resultado o iterador, True si es una respuesta repetida)
+    Excepciones: HTTPException 400 si la clave no es válida, 422 si la clave se usó con otra petición, 409 si la petición original con la clave no terminó
+    """
+    if idempotency_key is None:
+        return await factory(), False
+    run = idempotency_store.run_stream if stream else idempotency_store.run
+    try:
+        return await run(user_id, idempotency_key, await fingerprint(), factory)
+    except InvalidIdempotencyKeyError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except IdempotencyKeyMismatchError as e:
+        raise HTTPException(status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+    except IdempotencyError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+
+
 @router.post("/upload")
 async def upload_file(
+    response: Response,
     file: UploadFile = File(...),
     parametro1: str | None = Form(None),
     parametro2: str | None = Form(None),
+    delta: bool = Form(False),
+    previous_file_id: int | None = Form(None),
+    sheets: str | None = Form(None),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
     creds: HTTPAuthorizationCredentials = Depends(security),
 ):
     """
@@ -51,91 +120,475 @@ async def upload_file(
         - file: UploadFile - Archivo a subir (CSV, Excel, PDF, JPG, PNG)
         - parametro1: str | None - Primer parámetro requerido para CSV/Excel (opcional para documentos)
         - parametro2: str | None - Segundo parámetro requerido para CSV/Excel (opcional para documentos)
+        - delta: bool - Solo CSV/Excel: reingesta incremental contra la versión anterior del archivo (mismo nombre y usuario, o previous_file_id); la respuesta incluye "delta" con unchanged, changed, added y removed
+        - previous_file_id: int | None - Solo CSV/Excel con delta: ID de la versión anterior
+        - sheets: str | None - Solo Excel: hojas a leer (sin valor la primera, "*" todas o nombres separados por coma)
+        - idempotency_key: str | None - Header Idempotency-Key: una repetición con la misma clave (por usuario) recibe la respuesta original con el header Idempotent-Replayed sin volver a procesar el archivo
         - creds: HTTPAuthorizationCredentials - Credenciales HTTP con token Bearer (inyectado por FastAPI)
-    Retorno esperado: dict - Para CSV/Excel: {"file_id": int, "s3_path": str, "rows_saved": int, "validations": list}. Para documentos: {"document_id": int, "analysis_id": int | None, "storage_path": str, "ai_status": str, "ai_error": str | None, "analysis": dict | None}
-    Excepciones: HTTPException 400 si faltan parametro1/parametro2 para CSV/Excel, HTTPException 401/403 si no está autenticado o no tiene rol "uploader"
+    Retorno esperado: dict - Para CSV/Excel: {"file_id": int, "s3_path": str, "rows_saved": int, "validations": list, "validation_summary": dict} donde validations son las primeras validaciones y validation_summary tiene total, by_error, by_column y truncated (detalle completo en GET /files/{file_id}/validations). Para documentos: {"document_id": int, "analysis_id": int | None, "storage_path": str, "ai_status": str, "ai_error": str | None, "analysis": dict | None}
+    Excepciones: HTTPException 400 si faltan parametro1/parametro2 para CSV/Excel, una hoja pedida no existe o la Idempotency-Key no es válida, HTTPException 401/403 si no está autenticado o no tiene rol "uploader", HTTPException 404 si previous_file_id no existe, HTTPException 409 si la petición original con la clave no terminó, HTTPException 413 si el archivo supera MAX_UPLOAD_FILE_BYTES, HTTPException 422 si la clave se usó con otra petición
     """
     payload = require_role(creds.credentials, "uploader")
     user_id = payload.get("sub")
 
-    content_type = (file.content_type or "").lower()
-    filename = (file.filename or "").lower()
-
-    # Detectar archivos tabulares (CSV y Excel)
-    is_tabular = (
-        "csv" in content_type
-        or filename.endswith(".csv")
-        or filename.endswith(".xlsx")
-        or filename.endswith(".xls")
-        or "excel" in content_type
-        or "spreadsheet" in content_type
-    )
+    is_tabular = is_tabular_file(file.content_type, file.filename)
 
     # Flujo CSV/Excel: requiere parametro1 y parametro2 como en la lógica existente
-    if is_tabular:
-        if parametro1 is None or parametro2 is None:
+    if is_tabular and (parametro1 is None or parametro2 is None):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="parametro1 and parametro2 are required for CSV/Excel uploads",
+        )
+
+    async def process():
+        try:
+            if is_tabular:
+                result = await handle_upload(
+                    file,
+                    parametro1,
+                    parametro2,
+                    uploaded_by=user_id,
+                    delta=delta,
+                    previous_file_id=previous_file_id,
+                    sheets=sheets,
+                )
+            else:
+                # Flujo documento (PDF/JPG/PNG, etc.): análisis IA + guardado
+                result = await analyze_and_store_document(
+                    file,
+                    uploaded_by=user_id,
+                )
+        except UploadTooLargeError as e:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=str(e),
+            )
+        except FileNotFoundError as e:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=str(e),
+            )
+        except ExcelReadError as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(e),
+            )
+
+        # Registrar eventos de auditoría de la carga (y del análisis IA si lo hubo)
+        log_events(build_upload_audit_events(file.filename, user_id, result, is_tabular))
+        return result
+
+    fingerprint = partial(_upload_fingerprint, "upload", [file], parametro1, parametro2, delta, previous_file_id, sheets)
+    result, replayed = await _idempotent(user_id, idempotency_key, fingerprint, process)
+    if replayed:
+        response.headers[REPLAYED_HEADER] = "true"
+    return result
+
+
+@router.post("/upload/batch")
+async def upload_files_batch(
+    files: List[UploadFile] = File(...),
+    parametro1: str | None = Form(None),
+    parametro2: str | None = Form(None),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+    creds: HTTPAuthorizationCredentials = Depends(security),
+):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Endpoint de carga por lotes. Acepta varios archivos en una sola petición multipart y/o archivos .zip, que se expanden en sus entradas. Cada archivo se procesa como en /upload (CSV/Excel con validaciones o documento con IA) con concurrencia acotada, y los resultados se envían como NDJSON a medida que cada archivo termina
+    Parámetros de entrada:
+        - files: list[UploadFile] - Archivos a subir (CSV, Excel, PDF, JPG, PNG o ZIP con cualquiera de ellos)
+        - parametro1: str | None - Primer parámetro requerido si el lote contiene CSV/Excel
+        - parametro2: str | None - Segundo parámetro requerido si el lote contiene CSV/Excel
+        - idempotency_key: str | None - Header Idempotency-Key: una repetición con la misma clave (por usuario) recibe las mismas líneas NDJSON sin volver a procesar el lote
+        - creds: HTTPAuthorizationCredentials - Credenciales HTTP con token Bearer (inyectado por FastAPI)
+    Retorno esperado: StreamingResponse (application/x-ndjson) - Una línea por archivo: {"index": int, "filename": str, "file_type": str, "status": "ok" | "error", "result": dict | None, "error": str | None}
+    Excepciones: HTTPException 400 si el lote está vacío, supera el máximo de archivos, contiene un ZIP inválido, faltan parametro1/parametro2 para CSV/Excel o la Idempotency-Key no es válida, HTTPException 401/403 si no está autenticado o no tiene rol "uploader", HTTPException 409/422 por conflictos de Idempotency-Key (ver /upload)
+    """
+    payload = require_role(creds.credentials, "uploader")
+    user_id = payload.get("sub")
+
+    async def prepare():
+        try:
+            uploads = expand_batch_uploads(files)
+        except BatchUploadError as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+        has_tabular = any(is_tabular_file(u.content_type, u.filename) for u in uploads)
+        if has_tabular and (parametro1 is None or parametro2 is None):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="parametro1 and parametro2 are required for CSV/Excel uploads",
             )
-        result = await handle_upload(
-            file,
+
+        return process_batch_uploads(
+            uploads,
             parametro1,
             parametro2,
             uploaded_by=user_id,
         )
-        
-        # Registrar evento de auditoría para carga de CSV/Excel
-        log_event(
-            event_type=EventType.DOCUMENT_UPLOAD,
-            description=f"Carga de archivo CSV/Excel: {file.filename}",
-            user_id=user_id,
-            metadata={
-                "filename": file.filename,
-                "file_id": result.get("file_id"),
-                "rows_saved": result.get("rows_saved"),
-                "validations_count": len(result.get("validations", [])),
-                "file_type": "CSV/Excel"
-            }
-        )
-        
-        return result
 
-    # Flujo documento (PDF/JPG/PNG, etc.): análisis IA + guardado
-    result = await analyze_and_store_document(
-        file,
-        uploaded_by=user_id,
-    )
-    
-    # Registrar evento de auditoría para carga de documento
-    log_event(
-        event_type=EventType.DOCUMENT_UPLOAD,
-        description=f"Carga de documento: {file.filename}",
-        user_id=user_id,
-        metadata={
-            "filename": file.filename,
-            "document_id": result.get("document_id"),
-            "ai_status": result.get("ai_status"),
-            "file_type": "Documento"
-        }
+    fingerprint = partial(_upload_fingerprint, "upload/batch", files, parametro1, parametro2)
+    lines, replayed = await _idempotent(user_id, idempotency_key, fingerprint, prepare, stream=True)
+    return StreamingResponse(
+        lines,
+        media_type="application/x-ndjson",
+        headers={REPLAYED_HEADER: "true"} if replayed else None,
     )
-    
-    # Si se analizó con IA, registrar evento adicional
-    if result.get("ai_status") == "analyzed":
-        log_event(
-            event_type=EventType.AI_ANALYSIS,
-            description=f"Análisis IA completado para documento: {file.filename}",
-            user_id=user_id,
-            metadata={
-                "filename": file.filename,
-                "document_id": result.get("document_id"),
-                "classification": result.get("analysis", {}).get("classification") if result.get("analysis") else None
-            }
+
+
+async def _sse_events(events: AsyncIterator[Tuple[str, Any]]) -> AsyncIterator[str]:
+    async for event, data in events:
+        yield f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False, default=str)}\n\n"
+
+
+@router.post("/upload/stream")
+async def upload_file_stream(
+    file: UploadFile = File(...),
+    idempotency_key: str | None = Header(None, alias="Idempotency-Key"),
+    creds: HTTPAuthorizationCredentials = Depends(security),
+):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Carga de documentos (PDF/JPG/PNG) con análisis IA en streaming. Envía Server-Sent Events a medida que el modelo genera la respuesta: primero el documento creado, luego classification, los campos de encabezado y cada producto, y al final el mismo resultado que /upload. El análisis completo se guarda igual que en /upload
+    Parámetros de entrada:
+        - file: UploadFile - Documento a analizar (PDF, JPG, PNG)
+        - idempotency_key: str | None - Header Idempotency-Key: una repetición con la misma clave (por usuario) recibe los mismos eventos sin volver a analizar el documento
+        - creds: HTTPAuthorizationCredentials - Credenciales HTTP con token Bearer (inyectado por FastAPI)
+    Retorno esperado: StreamingResponse (text/event-stream) - Eventos "document" {"document_id", "storage_path"}, "field" {"name", "value"}, "product" dict, y "done" (resultado de /upload) o "error" {"detail"}
+    Excepciones: HTTPException 400 si el archivo es CSV/Excel o la Idempotency-Key no es válida, HTTPException 401/403 si no está autenticado o no tiene rol "uploader", HTTPException 409/422 por conflictos de Idempotency-Key (ver /upload), HTTPException 413 si el archivo supera MAX_UPLOAD_FILE_BYTES
+    """
+    payload = require_role(creds.credentials, "uploader")
+    user_id = payload.get("sub")
+
+    if is_tabular_file(file.content_type, file.filename):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Streaming analysis is only available for documents (PDF/JPG/PNG)",
+        )
+
+    async def prepare():
+        try:
+            events = await stream_analyze_and_store_document(file, uploaded_by=user_id)
+        except UploadTooLargeError as e:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=str(e),
+            )
+        return _sse_events(events)
+
+    fingerprint = partial(_upload_fingerprint, "upload/stream", [file])
+    messages, replayed = await _idempotent(user_id, idempotency_key, fingerprint, prepare, stream=True)
+    headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    if replayed:
+        headers[REPLAYED_HEADER] = "true"
+    return StreamingResponse(messages, media_type="text/event-stream", headers=headers)
+
+
+def _check_price_range(min_price: Optional[float], max_price: Optional[float]) -> None:
+    if min_price is not None and max_price is not None and min_price > max_price:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_price cannot be greater than max_price",
+        )
+
+
+@router.get("/rows/search")
+def search_data_rows(
+    name: Optional[str] = Query(None, description="Prefijo del nombre"),
+    external_id: Optional[str] = Query(None, description="external_id exacto"),
+    min_price: Optional[float] = Query(None, description="Precio mínimo (inclusive)"),
+    max_price: Optional[float] = Query(None, description="Precio máximo (inclusive)"),
+    after_id: Optional[int] = Query(None, ge=0, description="Cursor: next_after_id de la página anterior"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Filas por página"),
+    creds: HTTPAuthorizationCredentials = Depends(security),
+):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Busca filas de datos en todos los archivos cargados por prefijo de nombre y/o external_id, con filtro de precio y paginación por keyset. Requiere autenticación JWT con rol "uploader"
+    Parámetros de entrada:
+        - name: str | None - Prefijo del nombre (query parameter)
+        - external_id: str | None - external_id exacto (query parameter)
+        - min_price: float | None - Precio mínimo (query parameter)
+        - max_price: float | None - Precio máximo (query parameter)
+        - after_id: int | None - Cursor de paginación (query parameter)
+        - limit: int - Filas por página (query parameter, default: 100, rango: 1-1000)
+        - creds: HTTPAuthorizationCredentials - Credenciales HTTP con token Bearer (inyectado por FastAPI)
+    Retorno esperado: dict - {"rows": list, "next_after_id": int | None} donde cada fila tiene id, file_id, external_id, name, price, uploaded_by; next_after_id es None en la última página
+    Excepciones: HTTPException 400 si no se indica name ni external_id o el rango de precio es inválido, HTTPException 401/403 si no está autenticado o no tiene el rol
+    """
+    require_role(creds.credentials, "uploader")
+    _check_price_range(min_price, max_price)
+    try:
+        return search_rows(name=name, external_id=external_id, after_id=after_id, limit=limit, min_price=min_price, max_price=max_price)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/products/search")
+def search_document_products(
+    name: str = Query(..., min_length=1, description="Prefijo del nombre del producto"),
+    min_total: Optional[float] = Query(None, description="Total mínimo de la línea (inclusive)"),
+    max_total: Optional[float] = Query(None, description="Total máximo de la línea (inclusive)"),
+    after_id: Optional[int] = Query(None, ge=0, description="Cursor: next_after_id de la página anterior"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Productos por página"),
+    creds: HTTPAuthorizationCredentials = Depends(security),
+):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Busca líneas de producto de las facturas analizadas por prefijo de nombre, con filtro de total y paginación por keyset. Requiere autenticación JWT con rol "uploader"
+    Parámetros de entrada:
+        - name: str - Prefijo del nombre (query parameter)
+        - min_total: float | None - Total mínimo (query parameter)
+        - max_total: float | None - Total máximo (query parameter)
+        - after_id: int | None - Cursor de paginación (query parameter)
+        - limit: int - Productos por página (query parameter, default: 100, rango: 1-1000)
+        - creds: HTTPAuthorizationCredentials - Credenciales HTTP con token Bearer (inyectado por FastAPI)
+    Retorno esperado: dict - {"products": list, "next_after_id": int | None} donde cada producto tiene id, analysis_id, name, quantity, unit_price y total
+    Excepciones: HTTPException 400 si el rango de total es inválido, HTTPException 401/403 si no está autenticado o no tiene el rol
+    """
+    require_role(creds.credentials, "uploader")
+    if min_total is not None and max_total is not None and min_total > max_total:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_total cannot be greater than max_total",
+        )
+    return search_products(name=name, after_id=after_id, limit=limit, min_total=min_total, max_total=max_total)
+
+
+def _check_date_range(date_from: Optional[date], date_to: Optional[date]) -> None:
+    if date_from is not None and date_to is not None and date_from > date_to:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="date_from cannot be after date_to",
+        )
+
+
+@router.get("/invoices/search")
+def search_invoice_analyses(
+    provider_name: Optional[str] = Query(None, description="Prefijo del nombre del proveedor"),
+    client_name: Optional[str] = Query(None, description="Prefijo del nombre del cliente"),
+    invoice_number: Optional[str] = Query(None, description="Número de factura exacto"),
+    date_from: Optional[date] = Query(None, description="Fecha de factura mínima (AAAA-MM-DD, inclusive)"),
+    date_to: Optional[date] = Query(None, description="Fecha de factura máxima (AAAA-MM-DD, inclusive)"),
+    min_amount: Optional[float] = Query(None, description="Monto total mínimo (inclusive)"),
+    max_amount: Optional[float] = Query(None, description="Monto total máximo (inclusive)"),
+    after_id: Optional[int] = Query(None, ge=0, description="Cursor: next_after_id de la página anterior"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Facturas por página"),
+    creds: HTTPAuthorizationCredentials = Depends(security),
+):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Busca facturas analizadas por proveedor, cliente, número de factura, rango de fechas y rango de montos, con paginación por keyset. Requiere autenticación JWT con rol "uploader"
+    Parámetros de entrada:
+        - provider_name: str | None - Prefijo del proveedor (query parameter)
+        - client_name: str | None - Prefijo del cliente (query parameter)
+        - invoice_number: str | None - Número de factura (query parameter)
+        - date_from: date | None - Fecha mínima (query parameter)
+        - date_to: date | None - Fecha máxima (query parameter)
+        - min_amount: float | None - Monto mínimo (query parameter)
+        - max_amount: float | None - Monto máximo (query parameter)
+        - after_id: int | None - Cursor de paginación (query parameter)
+        - limit: int - Facturas por página (query parameter, default: 100, rango: 1-1000)
+        - creds: HTTPAuthorizationCredentials - Credenciales HTTP con token Bearer (inyectado por FastAPI)
+    Retorno esperado: dict - {"invoices": list, "next_after_id": int | None} donde cada factura tiene id, document_id, provider_name, client_name, invoice_number, invoice_date, invoice_date_value y total_amount
+    Excepciones: HTTPException 400 si no hay ningún filtro de búsqueda o un rango es inválido, HTTPException 401/403 si no está autenticado o no tiene el rol
+    """
+    require_role(creds.credentials, "uploader")
+    _check_date_range(date_from, date_to)
+    if min_amount is not None and max_amount is not None and min_amount > max_amount:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="min_amount cannot be greater than max_amount",
+        )
+    try:
+        return search_invoices(
+            provider_name=provider_name,
+            client_name=client_name,
+            invoice_number=invoice_number,
+            date_from=date_from,
+            date_to=date_to,
+            min_amount=min_amount,
+            max_amount=max_amount,
+            after_id=after_id,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/invoices/totals")
+def get_invoice_totals(
+    provider_name: Optional[str] = Query(None, description="Prefijo del nombre del proveedor"),
+    date_from: Optional[date] = Query(None, description="Fecha de factura mínima (AAAA-MM-DD, inclusive)"),
+    date_to: Optional[date] = Query(None, description="Fecha de factura máxima (AAAA-MM-DD, inclusive)"),
+    creds: HTTPAuthorizationCredentials = Depends(security),
+):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suma total_amount de las facturas por proveedor y mes, calculado en la base de datos. Requiere autenticación JWT con rol "uploader"
+    Parámetros de entrada:
+        - provider_name: str | None - Prefijo del proveedor (query parameter)
+        - date_from: date | None - Fecha mínima (query parameter)
+        - date_to: date | None - Fecha máxima (query parameter)
+        - creds: HTTPAuthorizationCredentials - Credenciales HTTP con token Bearer (inyectado por FastAPI)
+    Retorno esperado: dict - {"totals": list} donde cada elemento tiene provider_name, month ("AAAA-MM"), invoice_count y total_amount
+    Excepciones: HTTPException 400 si el rango de fechas es inválido, HTTPException 401/403 si no está autenticado o no tiene el rol
+    """
+    require_role(creds.credentials, "uploader")
+    _check_date_range(date_from, date_to)
+    return {"totals": sum_invoices_by_provider_month(provider_name=provider_name, date_from=date_from, date_to=date_to)}
+
+
+@router.get("/documents/search")
+def search_document_text(
+    q: str = Query(..., min_length=1, max_length=500, description="Texto a buscar en la descripción y el resumen"),
+    cursor: Optional[str] = Query(None, description="Cursor: next_cursor de la página anterior"),
+    limit: int = Query(20, ge=1, le=SEARCH_MAX_PAGE_SIZE, description="Resultados por página"),
+    creds: HTTPAuthorizationCredentials = Depends(security),
+):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Búsqueda de texto completo en la descripción y el resumen de los documentos analizados, ordenada por relevancia y paginada por cursor. Requiere autenticación JWT con rol "uploader"
+    Parámetros de entrada:
+        - q: str - Texto a buscar; todas sus palabras deben aparecer, por prefijo (query parameter)
+        - cursor: str | None - Cursor de paginación (query parameter)
+        - limit: int - Resultados por página (query parameter, default: 20, rango: 1-100)
+        - creds: HTTPAuthorizationCredentials - Credenciales HTTP con token Bearer (inyectado por FastAPI)
+    Retorno esperado: dict - {"documents": list, "next_cursor": str | None} donde cada documento tiene analysis_id, document_id, classification, description, summary y score
+    Excepciones: HTTPException 400 si q no tiene palabras o el cursor es inválido, HTTPException 401/403 si no está autenticado o no tiene el rol
+    """
+    require_role(creds.credentials, "uploader")
+    try:
+        return search_documents(q, cursor=cursor, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/{file_id}/rows")
+def get_file_rows(
+    file_id: int,
+    min_price: Optional[float] = Query(None, description="Precio mínimo (inclusive)"),
+    max_price: Optional[float] = Query(None, description="Precio máximo (inclusive)"),
+    after_id: Optional[int] = Query(None, ge=0, description="Cursor: next_after_id de la página anterior"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Filas por página"),
+    creds: HTTPAuthorizationCredentials = Depends(security),
+):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Lista las filas guardadas de un archivo CSV/Excel en orden de carga, con filtro de precio y paginación por keyset (el costo de cada página no depende de su posición). Requiere autenticación JWT con rol "uploader"
+    Parámetros de entrada:
+        - file_id: int - ID del archivo (path parameter)
+        - min_price: float | None - Precio mínimo (query parameter)
+        - max_price: float | None - Precio máximo (query parameter)
+        - after_id: int | None - Cursor de paginación (query parameter)
+        - limit: int - Filas por página (query parameter, default: 100, rango: 1-1000)
+        - creds: HTTPAuthorizationCredentials - Credenciales HTTP con token Bearer (inyectado por FastAPI)
+    Retorno esperado: dict - {"file_id": int, "rows": list, "next_after_id": int | None}
+    Excepciones: HTTPException 400 si el rango de precio es inválido, HTTPException 401/403 si no está autenticado o no tiene el rol, HTTPException 404 si el archivo no existe
+    """
+    require_role(creds.credentials, "uploader")
+    _check_price_range(min_price, max_price)
+    result = list_file_rows(file_id, after_id=after_id, limit=limit, min_price=min_price, max_price=max_price)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Archivo con ID {file_id} no encontrado",
         )
-    
     return result
 
 
+@router.get("/{file_id}/validations")
+def get_file_validations(
+    file_id: int,
+    error: Optional[str] = Query(None, description="Código de error (EMPTY, TYPE, DUPLICATE)"),
+    column: Optional[str] = Query(None, description="Columna validada"),
+    after_id: Optional[int] = Query(None, ge=0, description="Cursor: next_after_id de la página anterior"),
+    limit: int = Query(100, ge=1, le=MAX_PAGE_SIZE, description="Validaciones por página"),
+    format: str = Query("json", description="json (paginado) o csv (todas las validaciones filtradas)"),
+    creds: HTTPAuthorizationCredentials = Depends(security),
+):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Consulta las validaciones de un archivo CSV/Excel con filtros por código de error y columna. En JSON pagina por keyset; en CSV transmite todas las validaciones filtradas. Requiere autenticación JWT con rol "uploader"
+    Parámetros de entrada:
+        - file_id: int - ID del archivo (path parameter)
+        - error: str | None - Código de error (query parameter)
+        - column: str | None - Columna validada (query parameter)
+        - after_id: int | None - Cursor de paginación (query parameter, solo JSON)
+        - limit: int - Validaciones por página (query parameter, default: 100, rango: 1-1000, solo JSON)
+        - format: str - "json" (default) o "csv" (query parameter)
+        - creds: HTTPAuthorizationCredentials - Credenciales HTTP con token Bearer (inyectado por FastAPI)
+    Retorno esperado: dict {"file_id": int, "validations": list, "next_after_id": int | None} donde cada validación tiene id, row, column, error, message; o StreamingResponse text/csv si format=csv
+    Excepciones: HTTPException 400 si el formato no es válido, HTTPException 401/403 si no está autenticado o no tiene el rol, HTTPException 404 si el archivo no existe
+    """
+    require_role(creds.credentials, "uploader")
+    if format not in ("json", "csv"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported format: {format}")
+
+    if format == "csv":
+        if not file_exists(file_id):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Archivo con ID {file_id} no encontrado",
+            )
+        return StreamingResponse(
+            iter_file_validations_csv(file_id, error_code=error, column=column),
+            media_type="text/csv",
+            headers={"Content-Disposition": f'attachment; filename="file_{file_id}_validations.csv"'},
+        )
+
+    result = list_file_validations(file_id, error_code=error, column=column, after_id=after_id, limit=limit)
+    if result is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Archivo con ID {file_id} no encontrado",
+        )
+    return result
+
+
+@router.get("/{file_id}/export")
+async def export_file_rows(
+    file_id: int,
+    format: str = Query("parquet", description="parquet, arrow o csv"),
+    destination: str = Query("response", description="response (descarga) o storage (se guarda en S3/local)"),
+    creds: HTTPAuthorizationCredentials = Depends(security),
+):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Exporta las filas de un archivo CSV/Excel en formato columnar. Las filas se leen del cursor por lotes y se escriben como record batches de Arrow (Parquet con compresión y estadísticas por columna, o Arrow IPC stream), o como CSV. El resultado se transmite en la respuesta o se guarda en el almacenamiento. Requiere autenticación JWT con rol "uploader"
+    Parámetros de entrada:
+        - file_id: int - ID del archivo (path parameter)
+        - format: str - "parquet" (default), "arrow" o "csv" (query parameter)
+        - destination: str - "response" (default) o "storage" (query parameter)
+        - creds: HTTPAuthorizationCredentials - Credenciales HTTP con token Bearer (inyectado por FastAPI)
+    Retorno esperado: StreamingResponse con el archivo exportado, o dict {"file_id": int, "format": str, "storage_path": str, "bytes": int} si destination=storage
+    Excepciones: HTTPException 400 si el formato o el destino no son válidos o el formato requiere pyarrow y no está instalado, HTTPException 401/403 si no está autenticado o no tiene el rol, HTTPException 404 si el archivo no existe
+    """
+    require_role(creds.credentials, "uploader")
+    if destination not in ("response", "storage"):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Unsupported destination: {destination}")
+    try:
+        check_export_format(format)
+    except ExportError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if not file_exists(file_id):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"Archivo con ID {file_id} no encontrado",
+        )
+
+    if destination == "storage":
+        return await export_to_storage(file_id, format)
+
+    media_type, extension = EXPORT_FORMATS[format]
+    return StreamingResponse(
+        iter_export(file_id, format),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="file_{file_id}.{extension}"'},
+    )
+
+
 class DocumentAnalysisUpdate(BaseModel):
     """Modelo para actualizar análisis de documento."""
     classification: Optional[str] = None
@@ -152,30 +605,155 @@ class DocumentAnalysisUpdate(BaseModel):
     sentiment: Optional[str] = None
 
 
+class DocumentAnalysisBatchItem(DocumentAnalysisUpdate):
+    """Actualización parcial de un análisis dentro de PATCH /analysis/batch."""
+    id: int
+    # Versión leída (equivale al If-Match de PUT /analysis/{analysis_id})
+    version: Optional[int] = None
+
+
+class DocumentAnalysisBatchUpdate(BaseModel):
+    """Modelo para actualizar varios análisis en una sola transacción."""
+    updates: List[DocumentAnalysisBatchItem]
+
+
+class DocumentAnalysisBatchGet(BaseModel):
+    """Modelo para obtener varios análisis por ID."""
+    ids: List[int]
+
+
+def _check_batch_size(count: int) -> None:
+    if count > settings.ANALYSIS_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"A batch can contain at most {settings.ANALYSIS_BATCH_MAX_ITEMS} analyses"
+        )
+
+
+@router.post("/analysis/batch-get")
+def batch_get_analyses(
+    request: DocumentAnalysisBatchGet = Body(...),
+    creds: HTTPAuthorizationCredentials = Depends(security),
+):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Obtiene varios análisis en una sola petición: los cacheados se toman de la caché de lectura y el resto se lee con una consulta IN. Requiere autenticación JWT y rol "uploader"
+    Parámetros de entrada:
+        - request: DocumentAnalysisBatchGet - {"ids": [int, ...]} con hasta ANALYSIS_BATCH_MAX_ITEMS IDs
+        - creds: HTTPAuthorizationCredentials - Credenciales HTTP con token Bearer (inyectado por FastAPI)
+    Retorno esperado: Response - JSON {"analyses": list, "missing": list[int]} con los análisis en el orden pedido (sin repetidos; mismo formato que GET /analysis/{analysis_id}) y los IDs inexistentes
+    Excepciones: HTTPException 400 si se piden demasiados IDs, HTTPException 401/403 si no está autenticado o no tiene rol "uploader"
+    """
+    require_role(creds.credentials, "uploader")
+    analysis_ids = list(dict.fromkeys(request.ids))
+    _check_batch_size(len(analysis_ids))
+
+    try:
+        cached = get_cached_document_analyses(analysis_ids)
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al obtener análisis: {str(e)}"
+        )
+    # Las respuestas ya están serializadas: se concatenan sin volver a pasar por json
+    bodies = b",".join(cached[analysis_id].body for analysis_id in analysis_ids if analysis_id in cached)
+    missing = [analysis_id for analysis_id in analysis_ids if analysis_id not in cached]
+    content = b'{"analyses":[' + bodies + b'],"missing":' + json.dumps(missing).encode("utf-8") + b"}"
+    return Response(content=content, media_type="application/json")
+
+
+@router.patch("/analysis/batch")
+def batch_update_analyses(
+    request: DocumentAnalysisBatchUpdate = Body(...),
+    creds: HTTPAuthorizationCredentials = Depends(security),
+):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Actualiza varios análisis en una sola transacción con UPDATE masivos (actualización parcial por análisis, como PUT /analysis/{analysis_id}) y registra un único evento de auditoría. Cada elemento lleva la version leída (control de concurrencia optimista, como If-Match en PUT): si algún análisis cambió desde esa versión o no existe no se aplica ningún cambio. Requiere autenticación JWT y rol "uploader"
+    Parámetros de entrada:
+        - request: DocumentAnalysisBatchUpdate - {"updates": [{"id": int, "version": int, ...campos}, ...]} con hasta ANALYSIS_BATCH_MAX_ITEMS análisis
+        - creds: HTTPAuthorizationCredentials - Credenciales HTTP con token Bearer (inyectado por FastAPI)
+    Retorno esperado: dict - {"analyses": list} con los análisis actualizados y sus nuevas versiones
+    Excepciones: HTTPException 400 si hay demasiados análisis, HTTPException 428 si algún elemento no tiene version, HTTPException 412 con los IDs modificados por otro usuario, HTTPException 404 si alguno no existe, HTTPException 401/403 si no está autenticado o no tiene rol "uploader", HTTPException 500 si ocurre un error al actualizar
+    """
+    payload = require_role(creds.credentials, "uploader")
+    user_id = payload.get("sub")
+    updates = [item.model_dump(exclude_unset=True) for item in request.updates]
+    _check_batch_size(len(updates))
+    unversioned = [str(item["id"]) for item in updates if item.get("version") is None]
+    if unversioned:
+        raise HTTPException(
+            status_code=status.HTTP_428_PRECONDITION_REQUIRED,
+            detail=f"version is required for analyses {', '.join(unversioned)}"
+        )
+
+    try:
+        updated = update_document_analyses(updates)
+    except AnalysisVersionConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=str(e)
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error al actualizar análisis: {str(e)}"
+        )
+
+    updated_fields: Dict[str, List[str]] = {}
+    for item in updates:
+        fields = updated_fields.setdefault(str(item["id"]), [])
+        fields.extend(field for field in item if field not in ("id", "version") and field not in fields)
+    log_event(
+        event_type=EventType.USER_INTERACTION,
+        description=f"Análisis de documentos actualizados en lote: {len(updated)}",
+        user_id=user_id,
+        metadata={
+            "analysis_ids": [analysis["id"] for analysis in updated],
+            "updated_fields": updated_fields
+        }
+    )
+    return {"analyses": updated}
+
+
 @router.get("/analysis/{analysis_id}")
 def get_analysis(
     analysis_id: int,
+    if_none_match: str | None = Header(None, alias="If-None-Match"),
     creds: HTTPAuthorizationCredentials = Depends(security),
 ):
     """
     Generado por IA - Fecha: 2024-12-19
-    Descripción: Obtiene un análisis de documento por su ID desde la base de datos. Requiere autenticación JWT y rol "uploader"
+    Descripción: Obtiene un análisis de documento por su ID, desde la caché de lectura o la base de datos. Incluye ETag (versión) y Last-Modified (updated_at del último cambio, si se conoce); con If-None-Match igual al ETag actual responde 304 sin cuerpo. Requiere autenticación JWT y rol "uploader"
     Parámetros de entrada:
         - analysis_id: int - ID del análisis a obtener (path parameter)
+        - if_none_match: str | None - Header If-None-Match con el ETag de una respuesta anterior (opcional)
         - creds: HTTPAuthorizationCredentials - Credenciales HTTP con token Bearer (inyectado por FastAPI)
-    Retorno esperado: dict - Diccionario con el análisis completo (id, document_id, classification, client_name, provider_name, invoice_number, total_amount, products, description, summary, sentiment)
+    Retorno esperado: Response - JSON con el análisis completo (id, document_id, classification, client_name, provider_name, invoice_number, total_amount, products, description, summary, sentiment), o 304 si el cliente ya tiene esta versión
     Excepciones: HTTPException 404 si el análisis no existe, HTTPException 401/403 si no está autenticado o no tiene rol "uploader"
     """
     payload = require_role(creds.credentials, "uploader")
     
     try:
-        analysis = get_document_analysis(analysis_id)
-        if not analysis:
+        cached = get_cached_document_analysis(analysis_id)
+        if cached is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Análisis con ID {analysis_id} no encontrado"
             )
-        return analysis
+        # no-cache: el navegador guarda la respuesta pero la revalida con If-None-Match en cada consulta
+        headers = {"ETag": cached.etag, "Cache-Control": "private, no-cache"}
+        if cached.last_modified:
+            # Momento del último cambio guardado (updated_at); los análisis sin ese dato solo envían ETag
+            headers["Last-Modified"] = cached.last_modified
+        if etag_matches(if_none_match, cached.etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+        return Response(content=cached.body, media_type="application/json", headers=headers)
     except HTTPException:
         raise
     except Exception as e:
@@ -187,30 +765,40 @@ def get_analysis(
 
 @router.put("/analysis/{analysis_id}")
 def update_analysis(
+    response: Response,
     analysis_id: int,
     update_data: DocumentAnalysisUpdate = Body(...),
+    if_match: str | None = Header(None, alias="If-Match"),
     creds: HTTPAuthorizationCredentials = Depends(security),
 ):
     """
     Generado por IA - Fecha: 2024-12-19
-    Descripción: Actualiza un análisis de documento existente. Solo actualiza los campos proporcionados en el body (actualización parcial). Requiere autenticación JWT y rol "uploader". Registra evento de auditoría para la actualización
+    Descripción: Actualiza un análisis de documento existente. Solo actualiza los campos proporcionados en el body (actualización parcial). Requiere el header If-Match con el ETag leído (control de concurrencia optimista: si otro usuario guardó antes, responde 412 y no se pisa su cambio). Requiere autenticación JWT y rol "uploader". Registra evento de auditoría para la actualización
     Parámetros de entrada:
+        - response: Response - Respuesta (inyectada por FastAPI) donde se agrega el ETag de la nueva versión
         - analysis_id: int - ID del análisis a actualizar (path parameter)
         - update_data: DocumentAnalysisUpdate - Objeto con los campos a actualizar (classification, client_name, provider_name, invoice_number, total_amount, products, description, summary, sentiment)
+        - if_match: str | None - Header If-Match con el ETag de GET /analysis/{analysis_id} ("*" acepta cualquier versión)
         - creds: HTTPAuthorizationCredentials - Credenciales HTTP con token Bearer (inyectado por FastAPI)
-    Retorno esperado: dict - Diccionario con el análisis actualizado incluyendo todos los campos
-    Excepciones: HTTPException 404 si el análisis no existe, HTTPException 401/403 si no está autenticado o no tiene rol "uploader", HTTPException 500 si ocurre un error al actualizar
+    Retorno esperado: dict - Diccionario con el análisis actualizado incluyendo todos los campos y la nueva version (también en el header ETag)
+    Excepciones: HTTPException 428 si falta If-Match, HTTPException 412 si el análisis cambió desde esa versión, HTTPException 404 si el análisis no existe, HTTPException 401/403 si no está autenticado o no tiene rol "uploader", HTTPException 500 si ocurre un error al actualizar
     """
     payload = require_role(creds.credentials, "uploader")
     user_id = payload.get("sub")
+    if not if_match:
+        raise HTTPException(
+            status_code=status.HTTP_428_PRECONDITION_REQUIRED,
+            detail="If-Match header with the analysis ETag is required"
+        )
     
     try:
         # Convertir el modelo Pydantic a dict y filtrar None
         update_dict = update_data.model_dump(exclude_unset=True)
         
-        # Actualizar el análisis
+        # Actualizar el análisis (compare-and-swap sobre la versión indicada en If-Match)
         updated_analysis = update_document_analysis(
             analysis_id=analysis_id,
+            expected_versions=parse_if_match(if_match),
             **update_dict
         )
         
@@ -226,8 +814,14 @@ def update_analysis(
             }
         )
         
+        response.headers["ETag"] = version_etag(updated_analysis["version"])
         return updated_analysis
         
+    except AnalysisVersionConflictError as e:
+        raise HTTPException(
+            status_code=status.HTTP_412_PRECONDITION_FAILED,
+            detail=str(e)
+        )
     except ValueError as e:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
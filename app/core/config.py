@@ -21,7 +21,106 @@ class Settings(BaseSettings):
     AWS_S3_BUCKET: str | None = None
 
     # Gemini AI Configuration
-    GEMINI_API_KEY: str | None = None 
+    GEMINI_API_KEY: str | None = None
+    # URL base alternativa de la API de Gemini (proxy o servidor falso en pruebas/benchmarks)
+    GEMINI_BASE_URL: str | None = None
+
+    # Preprocesamiento de imágenes antes de enviarlas a la IA: lado máximo en píxeles, calidad JPEG y escala de grises cuando no hay color
+    AI_IMAGE_PREPROCESSING: bool = True
+    AI_IMAGE_MAX_DIMENSION: int = 2048
+    AI_IMAGE_JPEG_QUALITY: int = 85
+    AI_IMAGE_GRAYSCALE: bool = True
+
+    # Salida JSON estructurada con esquema (si se desactiva, solo se usa la extracción tolerante del texto)
+    AI_STRUCTURED_OUTPUT: bool = True
+
+    # Modelos de IA: con análisis en dos etapas un modelo rápido clasifica y solo las facturas pasan al modelo de extracción
+    AI_TWO_STAGE_ANALYSIS: bool = False
+    AI_CLASSIFIER_MODEL: str = "gemini-2.5-flash-lite"
+    AI_EXTRACTION_MODEL: str = "gemini-2.5-pro"
+    # Precio en USD por millón de tokens (entrada, salida) para estimar el costo de cada etapa
+    AI_MODEL_PRICES_PER_MILLION_TOKENS: dict[str, tuple[float, float]] = {
+        "gemini-2.5-pro": (1.25, 10.0),
+        "gemini-2.5-flash": (0.30, 2.50),
+        "gemini-2.5-flash-lite": (0.10, 0.40),
+    }
+
+    # Gobernador de llamadas a la IA: límite de concurrencia adaptativo (AIMD), reintentos con backoff y jitter,
+    # plazo máximo por documento, timeout por petición y circuit breaker
+    AI_GOVERNOR_INITIAL_LIMIT: int = 8
+    AI_GOVERNOR_MIN_LIMIT: int = 1
+    AI_GOVERNOR_MAX_LIMIT: int = 32
+    AI_GOVERNOR_TARGET_LATENCY_SECONDS: float = 30.0
+    AI_GOVERNOR_DECREASE_FACTOR: float = 0.7
+    AI_MAX_RETRIES: int = 3
+    AI_RETRY_BASE_DELAY_SECONDS: float = 0.5
+    AI_RETRY_MAX_DELAY_SECONDS: float = 8.0
+    AI_DEADLINE_SECONDS: float = 180.0
+    AI_REQUEST_TIMEOUT_SECONDS: float = 90.0
+    AI_BREAKER_FAILURE_THRESHOLD: int = 5
+    AI_BREAKER_RESET_SECONDS: float = 30.0
+
+    # PDFs largos: páginas mínimas para dividir, páginas usadas para clasificar, páginas por fragmento y fragmentos simultáneos
+    AI_PDF_SPLIT_MIN_PAGES: int = 6
+    AI_PDF_CLASSIFY_PAGES: int = 2
+    AI_PDF_PAGES_PER_CHUNK: int = 4
+    AI_PDF_MAX_CONCURRENT_CHUNKS: int = 4
+
+    # Carga por lotes: archivos procesados en paralelo y límites del lote
+    BATCH_UPLOAD_CONCURRENCY: int = 4
+    BATCH_UPLOAD_MAX_FILES: int = 500
+    BATCH_UPLOAD_MAX_ZIP_UNCOMPRESSED_BYTES: int = 1024 * 1024 * 1024
+
+    # Idempotency-Key en las cargas: tiempo que se conserva cada respuesta y máximo de respuestas guardadas por proceso
+    IDEMPOTENCY_TTL_SECONDS: int = 24 * 3600
+    IDEMPOTENCY_MAX_ENTRIES: int = 10000
+
+    # Caché de GET /files/analysis/{analysis_id}: vigencia de cada respuesta (acota los datos viejos si otro proceso actualiza el análisis) y máximo de análisis por proceso (0 la desactiva)
+    ANALYSIS_CACHE_TTL_SECONDS: int = 30
+    ANALYSIS_CACHE_MAX_ENTRIES: int = 5000
+    # Máximo de análisis por petición en POST /files/analysis/batch-get y PATCH /files/analysis/batch
+    ANALYSIS_BATCH_MAX_ITEMS: int = 500
+    # Búsqueda de texto en description y summary: "auto" (FTS5 en SQLite, índice full-text en SQL Server), "fts5", "fulltext" o "inverted" (índice invertido propio en la tabla document_search_terms)
+    DOCUMENT_SEARCH_BACKEND: str = "auto"
+
+    # Límites de carga (0 desactiva el límite) y memoria máxima antes de pasar a disco
+    MAX_UPLOAD_REQUEST_BYTES: int = 2 * 1024 * 1024 * 1024
+    MAX_UPLOAD_FILE_BYTES: int = 500 * 1024 * 1024
+    UPLOAD_SPOOL_MAX_MEMORY_BYTES: int = 1024 * 1024
+
+    # Almacenamiento direccionado por contenido (SHA-256) y recolección de blobs sin referencias
+    STORAGE_BLOB_PREFIX: str = "blobs"
+    BLOB_GC_GRACE_SECONDS: int = 3600
+
+    # Validaciones de ejemplo incluidas en la respuesta de /upload (el resto se consulta por archivo)
+    VALIDATION_SAMPLE_SIZE: int = 20
+
+    # Alcance de la detección de nombres duplicados: "file" solo dentro del archivo; "uploader" también contra las cargas anteriores del mismo usuario (tabla name_index)
+    DUPLICATE_NAME_SCOPE: str = "file"
+
+    # Lectura de Excel por lotes: motor ("auto" usa python-calamine si está instalado y si no openpyxl en modo read_only) y filas por lote
+    EXCEL_READER_ENGINE: str = "auto"
+    EXCEL_BATCH_ROWS: int = 10000
+
+    # Lectura de CSV por lotes: motor ("auto" usa pyarrow si está instalado y si no el motor C de pandas; "python" usa el módulo csv) y filas por lote
+    CSV_PARSER_ENGINE: str = "auto"
+    CSV_BATCH_ROWS: int = 50000
+    # Bytes iniciales del CSV usados para detectar codificación (BOM, UTF-8 o cp1252), separador y comillas
+    CSV_SNIFF_BYTES: int = 64 * 1024
+
+    # Exportación de filas (Parquet/Arrow/CSV): filas por lote (row group), compresión Parquet y prefijo en el almacenamiento
+    EXPORT_BATCH_ROWS: int = 65536
+    EXPORT_PARQUET_COMPRESSION: str = "zstd"
+    STORAGE_EXPORT_PREFIX: str = "exports"
+
+    # Escritor de almacenamiento asíncrono: escrituras simultáneas y política de fsync local ("none", "file", "batch")
+    STORAGE_MAX_IN_FLIGHT_WRITES: int = 8
+    STORAGE_FSYNC_POLICY: str = "none"
+    STORAGE_FSYNC_BATCH_SIZE: int = 32
+    STORAGE_FSYNC_BATCH_INTERVAL_SECONDS: float = 1.0
+
+    # Token estático para que un recolector (Prometheus, etc.) lea GET /metrics sin JWT; sin valor solo se acepta un JWT con rol "uploader"
+    METRICS_TOKEN: str | None = None
 
     class Config:
         env_file = ".env"
@@ -0,0 +1,60 @@
+from fastapi import HTTPException, status
+from starlette.responses import JSONResponse
+
+
+class RequestSizeLimitMiddleware:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Middleware ASGI que limita el tamaño del cuerpo de las peticiones bajo un prefijo de ruta. Rechaza con 413 según Content-Length antes de leer el cuerpo y, para cuerpos sin Content-Length (chunked), corta en cuanto se supera el límite mientras se recibe
+    Parámetros de entrada:
+        - app: ASGIApp - Aplicación ASGI envuelta
+        - max_bytes: int - Tamaño máximo del cuerpo en bytes (0 desactiva el límite)
+        - path_prefix: str - Prefijo de ruta al que se aplica el límite
+    Retorno esperado: None (middleware ASGI)
+    """
+
+    def __init__(self, app, max_bytes: int, path_prefix: str = "/"):
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or not self.max_bytes
+            or not scope.get("path", "").startswith(self.path_prefix)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope.get("headers") or [])
+        content_length = headers.get(b"content-length")
+        if content_length is not None:
+            try:
+                declared = int(content_length)
+            except ValueError:
+                declared = 0
+            if declared > self.max_bytes:
+                response = JSONResponse(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    content={"detail": f"Request body exceeds {self.max_bytes} bytes"},
+                )
+                await response(scope, receive, send)
+                return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    # FastAPI re-lanza HTTPException surgidas al leer el cuerpo
+                    raise HTTPException(
+                        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                        detail=f"Request body exceeds {self.max_bytes} bytes",
+                    )
+            return message
+
+        await self.app(scope, limited_receive, send)
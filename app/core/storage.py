@@ -0,0 +1,312 @@
+"""
+Interfaz asíncrona de almacenamiento (local o S3) que no bloquea el event loop.
+"""
+import asyncio
+import os
+import shutil
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import BinaryIO, List, Optional, Tuple
+
+from app.core.aws import _get_s3_client, _use_s3
+from app.core.config import settings
+from app.utils.logger import logger
+
+_COPY_CHUNK_SIZE = 1024 * 1024
+
+
+class FsyncPolicy:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Políticas de fsync para el almacenamiento local: "none" (delegar en el sistema operativo), "file" (fsync de cada archivo y su directorio antes de confirmar la escritura) o "batch" (fsync agrupado cada N escrituras o cada cierto intervalo)
+    Parámetros de entrada: None (clase con constantes)
+    Retorno esperado: None (clase con constantes)
+    """
+    NONE = "none"
+    PER_FILE = "file"
+    BATCH = "batch"
+
+
+class AsyncStorage(ABC):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Interfaz asíncrona común para los backends de almacenamiento. Las claves son jerárquicas con "/" (ej: "blobs/ab/cd/<sha256>")
+    Parámetros de entrada: None (clase abstracta)
+    Retorno esperado: None (clase abstracta)
+    """
+
+    @abstractmethod
+    def uri(self, key: str) -> str:
+        """Retorna la URI (file:// o s3://) de una clave."""
+
+    @abstractmethod
+    async def exists(self, key: str) -> bool:
+        """Indica si la clave ya está almacenada (stat local / HEAD en S3)."""
+
+    @abstractmethod
+    async def put(self, data: bytes | memoryview | BinaryIO, key: str) -> str:
+        """Guarda el contenido bajo la clave y retorna su URI."""
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Elimina la clave si existe."""
+
+    @abstractmethod
+    async def list(self, prefix: str) -> List[Tuple[str, float]]:
+        """Lista (clave, timestamp de última modificación) bajo un prefijo."""
+
+    async def flush(self) -> None:
+        """Fuerza la durabilidad de escrituras pendientes (no-op por defecto)."""
+
+
+class LocalAsyncStorage(AsyncStorage):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Backend local respaldado por un pool de hilos. Escribe en un archivo temporal del mismo directorio y lo renombra de forma atómica, aplica la política de fsync configurada y limita las escrituras simultáneas al tamaño del pool
+    Parámetros de entrada:
+        - root: str | None - Directorio raíz (None usa ./storage del directorio de trabajo actual)
+        - max_in_flight: int - Número máximo de escrituras simultáneas (hilos del pool)
+        - fsync_policy: str - Política de fsync (FsyncPolicy.NONE, PER_FILE o BATCH)
+        - fsync_batch_size: int - Escrituras acumuladas que disparan un fsync en modo batch
+        - fsync_batch_interval: float - Segundos máximos entre fsync en modo batch
+    Retorno esperado: None (backend de almacenamiento)
+    """
+
+    def __init__(
+        self,
+        root: Optional[str] = None,
+        max_in_flight: int = 8,
+        fsync_policy: str = FsyncPolicy.NONE,
+        fsync_batch_size: int = 32,
+        fsync_batch_interval: float = 1.0,
+    ):
+        if fsync_policy not in (FsyncPolicy.NONE, FsyncPolicy.PER_FILE, FsyncPolicy.BATCH):
+            raise ValueError(f"Política de fsync inválida: {fsync_policy}")
+        self._root = root
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix="storage")
+        self._fsync_policy = fsync_policy
+        self._fsync_batch_size = fsync_batch_size
+        self._fsync_batch_interval = fsync_batch_interval
+        self._known_dirs: set = set()
+        self._pending_fsync: List[str] = []
+        self._last_fsync = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _root_dir(self) -> str:
+        return self._root or os.path.join(os.getcwd(), "storage")
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self._root_dir(), *key.split("/"))
+
+    def uri(self, key: str) -> str:
+        return f"file://{self._path(key)}"
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _ensure_dir(self, directory: str) -> None:
+        # Evita un makedirs (varias syscalls) por escritura: los directorios creados se recuerdan
+        if directory in self._known_dirs:
+            return
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            self._known_dirs.add(directory)
+
+    @staticmethod
+    def _fsync_path(path: str) -> None:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _flush_pending(self) -> None:
+        with self._lock:
+            pending, self._pending_fsync = self._pending_fsync, []
+            self._last_fsync = time.monotonic()
+        directories = set()
+        for path in pending:
+            if os.path.exists(path):
+                self._fsync_path(path)
+            directories.add(os.path.dirname(path))
+        for directory in directories:
+            self._fsync_path(directory)
+
+    def _put_sync(self, data, key: str) -> str:
+        path = self._path(key)
+        directory = os.path.dirname(path)
+        self._ensure_dir(directory)
+        tmp_path = os.path.join(directory, f".{os.path.basename(path)}.{uuid.uuid4().hex}.tmp")
+        try:
+            tmp_file = open(tmp_path, "wb")
+        except FileNotFoundError:
+            # El directorio se eliminó desde fuera después de cachearlo: se vuelve a crear
+            with self._lock:
+                self._known_dirs.discard(directory)
+            self._ensure_dir(directory)
+            tmp_file = open(tmp_path, "wb")
+        try:
+            with tmp_file as f:
+                if hasattr(data, "read"):
+                    shutil.copyfileobj(data, f, _COPY_CHUNK_SIZE)
+                else:
+                    f.write(data)
+                if self._fsync_policy == FsyncPolicy.PER_FILE:
+                    f.flush()
+                    os.fsync(f.fileno())
+            # Rename atómico: un lector nunca ve un archivo a medio escribir
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+
+        if self._fsync_policy == FsyncPolicy.PER_FILE:
+            self._fsync_path(directory)
+        elif self._fsync_policy == FsyncPolicy.BATCH:
+            with self._lock:
+                self._pending_fsync.append(path)
+                due = (
+                    len(self._pending_fsync) >= self._fsync_batch_size
+                    or time.monotonic() - self._last_fsync >= self._fsync_batch_interval
+                )
+            if due:
+                self._flush_pending()
+        return f"file://{path}"
+
+    async def exists(self, key: str) -> bool:
+        return await self._run(os.path.exists, self._path(key))
+
+    async def put(self, data, key: str) -> str:
+        return await self._run(self._put_sync, data, key)
+
+    def _delete_sync(self, key: str) -> None:
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+    async def delete(self, key: str) -> None:
+        await self._run(self._delete_sync, key)
+
+    def _list_sync(self, prefix: str) -> List[Tuple[str, float]]:
+        root = self._root_dir()
+        objects = []
+        for dirpath, _, filenames in os.walk(self._path(prefix.rstrip("/"))):
+            for name in filenames:
+                if name.endswith(".tmp"):
+                    continue
+                path = os.path.join(dirpath, name)
+                key = os.path.relpath(path, root).replace(os.sep, "/")
+                objects.append((key, os.path.getmtime(path)))
+        return objects
+
+    async def list(self, prefix: str) -> List[Tuple[str, float]]:
+        return await self._run(self._list_sync, prefix)
+
+    async def flush(self) -> None:
+        if self._fsync_policy == FsyncPolicy.BATCH and self._pending_fsync:
+            await self._run(self._flush_pending)
+
+
+class S3AsyncStorage(AsyncStorage):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Backend S3 con la misma interfaz. Las llamadas de boto3 (bloqueantes) se ejecutan en un pool de hilos acotado, que limita también las escrituras simultáneas
+    Parámetros de entrada:
+        - bucket: str - Nombre del bucket
+        - max_in_flight: int - Número máximo de operaciones simultáneas
+    Retorno esperado: None (backend de almacenamiento)
+    """
+
+    def __init__(self, bucket: str, max_in_flight: int = 8):
+        self._bucket = bucket
+        self._executor = ThreadPoolExecutor(max_workers=max(1, max_in_flight), thread_name_prefix="s3")
+
+    def uri(self, key: str) -> str:
+        return f"s3://{self._bucket}/{key}"
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def _exists_sync(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            _get_s3_client().head_object(Bucket=self._bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    async def exists(self, key: str) -> bool:
+        return await self._run(self._exists_sync, key)
+
+    def _put_sync(self, data, key: str) -> str:
+        s3 = _get_s3_client()
+        if hasattr(data, "read"):
+            # upload_fileobj hace multipart para archivos grandes sin leerlos completos
+            s3.upload_fileobj(data, self._bucket, key)
+        else:
+            s3.put_object(Bucket=self._bucket, Key=key, Body=bytes(data))
+        return self.uri(key)
+
+    async def put(self, data, key: str) -> str:
+        return await self._run(self._put_sync, data, key)
+
+    async def delete(self, key: str) -> None:
+        await self._run(lambda: _get_s3_client().delete_object(Bucket=self._bucket, Key=key))
+
+    def _list_sync(self, prefix: str) -> List[Tuple[str, float]]:
+        paginator = _get_s3_client().get_paginator("list_objects_v2")
+        objects = []
+        for page in paginator.paginate(Bucket=self._bucket, Prefix=prefix):
+            for obj in page.get("Contents", []):
+                objects.append((obj["Key"], obj["LastModified"].timestamp()))
+        return objects
+
+    async def list(self, prefix: str) -> List[Tuple[str, float]]:
+        return await self._run(self._list_sync, prefix)
+
+
+@lru_cache(maxsize=1)
+def get_storage() -> AsyncStorage:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Retorna el backend de almacenamiento configurado (S3 si hay credenciales AWS, local en otro caso). Se crea una sola vez por proceso
+    Parámetros de entrada: None
+    Retorno esperado: AsyncStorage - Backend de almacenamiento compartido
+    """
+    if _use_s3():
+        return S3AsyncStorage(settings.AWS_S3_BUCKET, max_in_flight=settings.STORAGE_MAX_IN_FLIGHT_WRITES)
+    return LocalAsyncStorage(
+        max_in_flight=settings.STORAGE_MAX_IN_FLIGHT_WRITES,
+        fsync_policy=settings.STORAGE_FSYNC_POLICY,
+        fsync_batch_size=settings.STORAGE_FSYNC_BATCH_SIZE,
+        fsync_batch_interval=settings.STORAGE_FSYNC_BATCH_INTERVAL_SECONDS,
+    )
+
+
+async def flush_periodically(storage: AsyncStorage, interval_seconds: float) -> None:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Llama a storage.flush() cada interval_seconds hasta que se cancele la tarea. Con la política "batch" acota el tiempo que una escritura espera su fsync aunque no lleguen más escrituras que lo disparen
+    Parámetros de entrada:
+        - storage: AsyncStorage - Backend de almacenamiento
+        - interval_seconds: float - Segundos entre cada flush
+    Retorno esperado: None (corre hasta ser cancelada)
+    """
+    while True:
+        await asyncio.sleep(interval_seconds)
+        try:
+            await storage.flush()
+        except Exception as e:
+            logger.error(f"Error al forzar la durabilidad del almacenamiento: {e}")
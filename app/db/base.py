@@ -6,7 +6,15 @@ from app.models import file_validation
 from app.models import data_row
 from app.models import document
 from app.models import audit_log
+from app.models import blob
+from app.models import name_index
+from app.models import document_product
+from app.models import document_search_term
+from app.db.indexes import ensure_indexes
+from app.services.document_search_service import ensure_search_index
 
 # create tables if needed
 def init_db(engine):
     Base.metadata.create_all(bind=engine)
+    ensure_indexes(engine)
+    ensure_search_index(engine)
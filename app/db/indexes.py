@@ -0,0 +1,56 @@
+"""
+Índices de consulta de las tablas de datos cargados y de los análisis de facturas.
+
+Se declaran aparte de los modelos para poder crearlos también en bases existentes
+(create_all solo crea los índices de las tablas nuevas).
+"""
+from sqlalchemy import Index
+
+from app.models.data_row import DataRow
+from app.models.document import DocumentAnalysis
+
+# Cada índice termina en id para que la paginación por keyset (id > :after ORDER BY id)
+# se resuelva con un seek; price se incluye para filtrar rangos sin leer la fila completa
+DATA_ROW_INDEXES = [
+    Index("ix_data_rows_file_id_id", DataRow.file_id, DataRow.id, mssql_include=["price"]),
+    Index("ix_data_rows_name_id", DataRow.name, DataRow.id, mssql_include=["price"]),
+    Index("ix_data_rows_external_id_id", DataRow.external_id, DataRow.id, mssql_include=["price"]),
+]
+
+# Búsqueda de facturas: igualdad o prefijo en proveedor/cliente seguido del rango de fechas
+# (invoice_date_value); total_amount se incluye para el filtro de montos y las sumas por mes
+DOCUMENT_ANALYSIS_INDEXES = [
+    Index(
+        "ix_document_analyses_provider_date_id",
+        DocumentAnalysis.provider_name, DocumentAnalysis.invoice_date_value, DocumentAnalysis.id,
+        mssql_include=["total_amount"],
+    ),
+    Index(
+        "ix_document_analyses_client_date_id",
+        DocumentAnalysis.client_name, DocumentAnalysis.invoice_date_value, DocumentAnalysis.id,
+        mssql_include=["total_amount"],
+    ),
+    Index("ix_document_analyses_invoice_number_id", DocumentAnalysis.invoice_number, DocumentAnalysis.id),
+    Index(
+        "ix_document_analyses_date_id",
+        DocumentAnalysis.invoice_date_value, DocumentAnalysis.id,
+        mssql_include=["provider_name", "total_amount"],
+    ),
+    # Búsqueda solo por monto: rango de total_amount dentro de las facturas
+    Index(
+        "ix_document_analyses_classification_amount_id",
+        DocumentAnalysis.classification, DocumentAnalysis.total_amount, DocumentAnalysis.id,
+    ),
+]
+
+
+def ensure_indexes(engine) -> None:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Crea los índices declarados que todavía no existan
+    Parámetros de entrada:
+        - engine: Engine - Motor de SQLAlchemy
+    Retorno esperado: None
+    """
+    for index in DATA_ROW_INDEXES + DOCUMENT_ANALYSIS_INDEXES:
+        index.create(bind=engine, checkfirst=True)
@@ -1,11 +1,22 @@
-from fastapi import FastAPI
+import asyncio
+import contextlib
+import hmac
+
+from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from app.api.v1 import auth, files, token, audit
+from app.api.v1.files import require_role
+from app.core.config import settings
+from app.core.request_limits import RequestSizeLimitMiddleware
+from app.core.storage import FsyncPolicy, flush_periodically, get_storage
 from app.db.base import init_db
 from app.db.base_class import engine
 from app.services.auth_service import ensure_demo_user
+from app.utils.metrics import metrics
 
 app = FastAPI(title="FastAPI Test Project")
+security = HTTPBearer()
 
 app.add_middleware(
     CORSMiddleware,
@@ -15,6 +26,13 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Rechaza cargas demasiado grandes antes de leer (y volcar a disco) el cuerpo completo
+app.add_middleware(
+    RequestSizeLimitMiddleware,
+    max_bytes=settings.MAX_UPLOAD_REQUEST_BYTES,
+    path_prefix="/api/v1/files",
+)
+
 
 @app.on_event("startup")
 def on_startup():
@@ -26,6 +44,32 @@ def on_startup():
     ensure_demo_user()
 
 
+@app.on_event("startup")
+async def start_storage_flush():
+    """
+    Con STORAGE_FSYNC_POLICY=batch, fuerza el fsync pendiente cada STORAGE_FSYNC_BATCH_INTERVAL_SECONDS
+    aunque no lleguen nuevas escrituras que lo disparen.
+    """
+    app.state.storage_flush_task = None
+    if settings.STORAGE_FSYNC_POLICY == FsyncPolicy.BATCH:
+        app.state.storage_flush_task = asyncio.create_task(
+            flush_periodically(get_storage(), settings.STORAGE_FSYNC_BATCH_INTERVAL_SECONDS)
+        )
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    """
+    Detiene el flush periódico y confirma en disco las escrituras que quedaron pendientes.
+    """
+    task = getattr(app.state, "storage_flush_task", None)
+    if task is not None:
+        task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await task
+    await get_storage().flush()
+
+
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Auth"])
 app.include_router(files.router, prefix="/api/v1/files", tags=["Files"])
 app.include_router(token.router, prefix="/api/v1/token", tags=["Token"])
@@ -35,3 +79,16 @@ app.include_router(audit.router, prefix="/api/v1/audit", tags=["Audit"])
 @app.get("/health")
 def health():
     return {"status": "ok"}
+
+
+@app.get("/metrics")
+def get_metrics(creds: HTTPAuthorizationCredentials = Depends(security)):
+    """
+    Métricas del proceso: latencia, tokens y costo estimado por etapa de IA, tiempos por página de PDF, etc.
+    Requiere el token de METRICS_TOKEN o un JWT con rol "uploader" (401/403 en otro caso).
+    """
+    token_value = settings.METRICS_TOKEN
+    # Comparación en tiempo constante para no filtrar el token por la latencia de la respuesta
+    if not (token_value and hmac.compare_digest(creds.credentials.encode("utf-8"), token_value.encode("utf-8"))):
+        require_role(creds.credentials, "uploader")
+    return metrics.snapshot()
@@ -0,0 +1,18 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime
+from app.db.base_class import Base
+
+
+class StoredBlob(Base):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Blob de contenido direccionado por SHA-256. Un mismo blob puede ser referenciado por varios archivos/documentos; ref_count lleva la cuenta para poder eliminar los que ya nadie referencia. created_at se reinicia cada vez que una carga reutiliza el blob, para que el periodo de gracia de la recolección cuente desde el último uso. Se guarda en UTC (sin zona) desde Python, el mismo reloj que usa collect_garbage para el corte, y no con la hora local del servidor de base de datos
+    """
+    __tablename__ = "stored_blobs"
+
+    sha256 = Column(String(64), primary_key=True)
+    size = Column(BigInteger, nullable=False)
+    storage_path = Column(String(500), nullable=False)
+    ref_count = Column(Integer, nullable=False, default=0, index=True)
+    created_at = Column(DateTime, default=lambda: datetime.now(timezone.utc).replace(tzinfo=None), nullable=False)
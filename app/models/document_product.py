@@ -0,0 +1,25 @@
+from sqlalchemy import Column, Float, Index, Integer, String
+from app.db.base_class import Base
+
+
+class DocumentProduct(Base):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Línea de producto de una factura analizada (reemplaza a DocumentAnalysis.products_json). position conserva el orden de las líneas dentro del análisis
+    """
+    __tablename__ = "document_products"
+
+    id = Column(Integer, primary_key=True)
+    analysis_id = Column(Integer, nullable=False)
+    position = Column(Integer, nullable=False)
+    name = Column(String(255))
+    quantity = Column(Float)
+    unit_price = Column(Float)
+    total = Column(Float)
+
+    __table_args__ = (
+        # Productos de uno o varios análisis, en orden
+        Index("ix_document_products_analysis_id_position", "analysis_id", "position"),
+        # Búsqueda por prefijo de nombre con paginación por keyset (id > :after ORDER BY id)
+        Index("ix_document_products_name_id", "name", "id", mssql_include=["total"]),
+    )
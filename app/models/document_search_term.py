@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String
+from app.db.base_class import Base
+
+
+class DocumentSearchTerm(Base):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Índice invertido de description y summary de los análisis, usado cuando la base de datos no tiene búsqueda de texto (DOCUMENT_SEARCH_BACKEND "inverted"). La clave primaria (term, analysis_id) resuelve las búsquedas por prefijo de término; weight es la frecuencia del término en el análisis, por mil términos
+    """
+    __tablename__ = "document_search_terms"
+
+    term = Column(String(100), primary_key=True)
+    analysis_id = Column(Integer, primary_key=True, index=True)
+    weight = Column(Integer, nullable=False)
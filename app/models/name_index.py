@@ -0,0 +1,17 @@
+from sqlalchemy import Column, String, Integer, DateTime
+from sqlalchemy.sql import func
+from app.db.base_class import Base
+
+
+class NameIndexEntry(Base):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Índice persistente de nombres de filas ya cargadas por cada usuario. La clave primaria (uploaded_by, name_hash) garantiza unicidad y permite consultar lotes de hashes con una búsqueda por índice; file_id indica en qué archivo se cargó el nombre
+    """
+    __tablename__ = "name_index"
+
+    uploaded_by = Column(String(50), primary_key=True)
+    # BLAKE2b de 16 bytes (hex) del nombre normalizado, ver name_index_service.name_hash
+    name_hash = Column(String(32), primary_key=True)
+    file_id = Column(Integer, nullable=False, index=True)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
@@ -1,8 +1,24 @@
-import json
+import io
+import time
+from functools import lru_cache
+from typing import Any, Callable, List, Literal, Optional, Type
 from google import genai
 from google.genai import types as genai_types
+from PIL import Image, ImageOps
+from pydantic import BaseModel, ValidationError
 from app.core.config import settings
+from app.services.ai_governor import get_governor
+from app.services.pdf_pipeline import analyze_pdf
+from app.utils.json_extract import PartialJsonParser, extract_json_object
 from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+# Un píxel se considera "con color" si su saturación (0-255) supera este umbral
+_GRAYSCALE_SATURATION_THRESHOLD = 48
+# Proporción máxima de píxeles con color para convertir a escala de grises sin perder información
+_GRAYSCALE_MAX_COLORED_RATIO = 0.005
+# Lado de la miniatura usada para estimar el color de la imagen
+_GRAYSCALE_SAMPLE_SIZE = 128
 
 
 class AIServiceError(Exception):
@@ -15,6 +31,56 @@ class AIServiceError(Exception):
     pass
 
 
+class ProductItem(BaseModel):
+    """Línea de producto de una factura."""
+    name: Optional[str] = None
+    quantity: Optional[float] = None
+    unit_price: Optional[float] = None
+    total: Optional[float] = None
+
+
+class DocumentAnalysisResult(BaseModel):
+    """Esquema de respuesta del análisis completo (mismos campos que DocumentAnalysis)."""
+    classification: Literal["FACTURA", "INFORMACION"]
+    client_name: Optional[str] = None
+    client_address: Optional[str] = None
+    provider_name: Optional[str] = None
+    provider_address: Optional[str] = None
+    invoice_number: Optional[str] = None
+    invoice_date: Optional[str] = None
+    total_amount: Optional[float] = None
+    products: List[ProductItem] = []
+    description: Optional[str] = None
+    summary: Optional[str] = None
+    sentiment: Optional[str] = None
+
+
+class ClassificationResult(BaseModel):
+    """Esquema de respuesta de la etapa de clasificación (incluye el resumen de INFORMACION)."""
+    classification: Literal["FACTURA", "INFORMACION"]
+    description: Optional[str] = None
+    summary: Optional[str] = None
+    sentiment: Optional[str] = None
+
+
+class InvoiceExtractionResult(BaseModel):
+    """Esquema de respuesta de la etapa de extracción de facturas."""
+    client_name: Optional[str] = None
+    client_address: Optional[str] = None
+    provider_name: Optional[str] = None
+    provider_address: Optional[str] = None
+    invoice_number: Optional[str] = None
+    invoice_date: Optional[str] = None
+    total_amount: Optional[float] = None
+    products: List[ProductItem] = []
+
+
+class LineItemsResult(BaseModel):
+    """Esquema de respuesta de un fragmento de páginas de una factura."""
+    products: List[ProductItem] = []
+    total_amount: Optional[float] = None
+
+
 def _normalize_analysis_response(parsed: dict) -> dict:
     """
     Generado por IA - Fecha: 2024-12-19
@@ -89,6 +155,102 @@ def _detect_file_type(content_type: str | None, filename: str) -> str:
     raise AIServiceError(f"No se reconoce el tipo de archivo: {filename}")
 
 
+def _is_effectively_grayscale(image: Image.Image) -> bool:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Indica si una imagen RGB/RGBA es en la práctica escala de grises (papel blanco y tinta negra), midiendo la saturación sobre una miniatura. Un sello o logo de color por encima del umbral la mantiene en color
+    Parámetros de entrada:
+        - image: Image.Image - Imagen ya decodificada
+    Retorno esperado: bool - True si la proporción de píxeles con color es despreciable
+    """
+    sample = image.convert("RGB")
+    sample.thumbnail((_GRAYSCALE_SAMPLE_SIZE, _GRAYSCALE_SAMPLE_SIZE))
+    histogram = sample.convert("HSV").getchannel("S").histogram()
+    colored = sum(histogram[_GRAYSCALE_SATURATION_THRESHOLD:])
+    return colored <= _GRAYSCALE_MAX_COLORED_RATIO * sum(histogram)
+
+
+def _preprocess_image(bytes_data: bytes | memoryview, content_type: str | None) -> tuple[bytes | memoryview, str | None]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Reduce el tamaño de una imagen JPG/PNG antes de enviarla a la IA: aplica la orientación EXIF, la reduce a AI_IMAGE_MAX_DIMENSION, la pasa a escala de grises si no tiene color y la recodifica sin metadatos (JPEG, o PNG si tiene transparencia). Si la imagen no se puede decodificar o recodificarla no aporta nada se envía el original
+    Parámetros de entrada:
+        - bytes_data: bytes | memoryview - Contenido original de la imagen
+        - content_type: str | None - Tipo MIME original
+    Retorno esperado: tuple - (contenido a enviar, tipo MIME del contenido)
+    """
+    if not settings.AI_IMAGE_PREPROCESSING:
+        return bytes_data, content_type
+
+    max_dimension = settings.AI_IMAGE_MAX_DIMENSION
+    try:
+        with Image.open(io.BytesIO(bytes_data)) as original:
+            if original.format not in ("JPEG", "PNG"):
+                return bytes_data, content_type
+            original_size = original.size
+            had_exif = bool(original.getexif())
+            if original.format == "JPEG":
+                # Decodificación reducida por DCT (1/2, 1/4, 1/8): evita decodificar la foto completa
+                original.draft("RGB", (max_dimension, max_dimension))
+            # La orientación se aplica a los píxeles porque el EXIF no se conserva
+            image = ImageOps.exif_transpose(original)
+
+        has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        if image.mode not in ("RGB", "RGBA", "L", "LA"):
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+        if settings.AI_IMAGE_GRAYSCALE and image.mode in ("RGB", "RGBA") and _is_effectively_grayscale(image):
+            image = image.convert("LA" if has_alpha else "L")
+
+        output = io.BytesIO()
+        if has_alpha:
+            image.save(output, format="PNG", optimize=True)
+            mime_type = "image/png"
+        else:
+            image.save(output, format="JPEG", quality=settings.AI_IMAGE_JPEG_QUALITY, optimize=True)
+            mime_type = "image/jpeg"
+        processed = output.getvalue()
+
+    except Exception as e:
+        logger.warning(f"No se pudo preprocesar la imagen, se envía el original: {e}")
+        return bytes_data, content_type
+
+    resized = image.size != original_size
+    if not resized and not had_exif and len(processed) >= len(bytes_data):
+        return bytes_data, content_type
+
+    logger.info(
+        f"Imagen preprocesada: {original_size[0]}x{original_size[1]} ({len(bytes_data)} bytes) -> "
+        f"{image.size[0]}x{image.size[1]} {image.mode} ({len(processed)} bytes)"
+    )
+    return processed, mime_type
+
+
+@lru_cache(maxsize=4)
+def _client_for(api_key: str, base_url: str | None) -> genai.Client:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Crea (una sola vez por combinación de parámetros) el cliente de Gemini
+    Parámetros de entrada:
+        - api_key: str - Clave de la API de Gemini
+        - base_url: str | None - URL base alternativa (None usa la API pública)
+    Retorno esperado: genai.Client - Cliente de Gemini
+    """
+    http_options = genai_types.HttpOptions(base_url=base_url) if base_url else None
+    return genai.Client(api_key=api_key, http_options=http_options)
+
+
+def _get_client() -> genai.Client:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Retorna el cliente de Gemini compartido para la configuración actual (reutiliza conexiones entre llamadas)
+    Parámetros de entrada: None
+    Retorno esperado: genai.Client - Cliente configurado con GEMINI_API_KEY y GEMINI_BASE_URL
+    """
+    return _client_for(settings.GEMINI_API_KEY, settings.GEMINI_BASE_URL)
+
+
 def _build_analysis_prompt() -> str:
     """
     Generado por IA - Fecha: 2024-12-19
@@ -134,12 +296,247 @@ def _build_analysis_prompt() -> str:
     )
 
 
-def analyze_document(bytes_data: bytes, filename: str, content_type: str | None = None):
+def _build_classification_prompt() -> str:
     """
     Generado por IA - Fecha: 2024-12-19
-    Descripción: Analiza un documento (PDF, JPG, PNG) usando la API de Gemini para clasificarlo y extraer información estructurada
+    Descripción: Construye el prompt de la primera etapa (modelo rápido): clasifica el documento y, si es INFORMACION, lo resume en la misma llamada
+    Parámetros de entrada: None
+    Retorno esperado: str - Prompt de clasificación
+    """
+    return (
+        "Clasifica el documento como FACTURA o INFORMACION.\n\n"
+        "Si es FACTURA, responde SOLO este JSON (sin texto adicional, sin markdown):\n"
+        '{"classification": "FACTURA"}\n\n'
+        "Si es INFORMACION, responde SOLO este JSON (sin texto adicional, sin markdown):\n"
+        "{\n"
+        '  "classification": "INFORMACION",\n'
+        '  "description": "descripción detallada del contenido del documento",\n'
+        '  "summary": "resumen breve del contenido",\n'
+        '  "sentiment": "positivo" o "negativo" o "neutral" (basado en el tono del texto)\n'
+        "}\n\n"
+        "IMPORTANTE: Responde SOLO con el JSON válido, sin markdown, sin código, sin explicaciones."
+    )
+
+
+def _build_invoice_extraction_prompt() -> str:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Construye el prompt de la segunda etapa (modelo de extracción), enfocado solo en los datos de una factura
+    Parámetros de entrada: None
+    Retorno esperado: str - Prompt de extracción de factura
+    """
+    return (
+        "El documento es una FACTURA. Extrae sus datos y responde SOLO este JSON (sin texto adicional, sin markdown):\n"
+        "{\n"
+        '  "provider_name": "nombre del proveedor o null si no existe",\n'
+        '  "provider_address": "dirección del proveedor o null si no existe",\n'
+        '  "client_name": "nombre del cliente o null si no existe",\n'
+        '  "client_address": "dirección del cliente o null si no existe",\n'
+        '  "invoice_number": "número de factura o null si no existe",\n'
+        '  "invoice_date": "fecha de factura o null si no existe",\n'
+        '  "total_amount": número decimal del total o null si no existe,\n'
+        '  "products": [\n'
+        '    {"name": "nombre del producto", "quantity": cantidad (número) o null, "unit_price": precio unitario (número) o null, "total": total del producto (número) o null}\n'
+        "  ]\n"
+        "}\n\n"
+        "IMPORTANTE: Responde SOLO con el JSON válido, sin markdown, sin código, sin explicaciones."
+    )
+
+
+def _record_usage(stage: str, model: str, elapsed: float, usage) -> None:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Registra latencia, tokens y costo estimado de una llamada al modelo, agrupados por etapa
+    Parámetros de entrada:
+        - stage: str - Etapa del análisis ("analysis", "classify", "extract", "pdf_chunk")
+        - model: str - Modelo invocado
+        - elapsed: float - Segundos de la llamada
+        - usage: GenerateContentResponseUsageMetadata | None - Uso de tokens reportado por la API
+    Retorno esperado: None
+    """
+    input_tokens = (getattr(usage, "prompt_token_count", None) or 0) if usage else 0
+    output_tokens = 0
+    if usage:
+        output_tokens = (usage.candidates_token_count or 0) + (getattr(usage, "thoughts_token_count", None) or 0)
+    input_price, output_price = settings.AI_MODEL_PRICES_PER_MILLION_TOKENS.get(model, (0.0, 0.0))
+    cost = (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+    metrics.increment(f"ai.{stage}.calls")
+    metrics.increment(f"ai.{stage}.input_tokens", input_tokens)
+    metrics.increment(f"ai.{stage}.output_tokens", output_tokens)
+    metrics.increment(f"ai.{stage}.cost_usd", cost)
+    metrics.observe(f"ai.{stage}.seconds", elapsed)
+    logger.info(f"IA etapa {stage} ({model}): {elapsed:.2f}s, {input_tokens}+{output_tokens} tokens, ${cost:.5f}")
+
+
+def _parse_response(parsed, text: str | None, schema: Type[BaseModel], stage: str) -> dict:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Obtiene el objeto validado de la respuesta. Usa el objeto que el SDK ya parseó con el esquema (salida estructurada); si no lo hay, extrae de forma tolerante el primer objeto JSON del texto y lo valida. Registra el total de respuestas, las que necesitaron el respaldo y las que no se pudieron interpretar
+    Parámetros de entrada:
+        - parsed: BaseModel | None - Objeto parseado por el SDK (None si no lo hay, ej. en streaming)
+        - text: str | None - Texto completo de la respuesta
+        - schema: Type[BaseModel] - Esquema esperado
+        - stage: str - Etapa del análisis (para las métricas)
+    Retorno esperado: dict - Respuesta validada
+    Excepciones: ValueError si la respuesta no contiene un objeto válido para el esquema
+    """
+    metrics.increment("ai.parse.responses")
+    if settings.AI_STRUCTURED_OUTPUT and isinstance(parsed, schema):
+        return parsed.model_dump()
+    if settings.AI_STRUCTURED_OUTPUT and parsed is None and text:
+        # Streaming con salida estructurada: el texto completo debería ser JSON válido para el esquema
+        try:
+            return schema.model_validate_json(text).model_dump()
+        except ValidationError:
+            pass
+
+    metrics.increment("ai.parse.fallbacks")
+    try:
+        data = extract_json_object(text or "")
+        if isinstance(data.get("classification"), str):
+            data["classification"] = data["classification"].strip().upper()
+        return schema.model_validate(data).model_dump()
+    except (ValueError, ValidationError) as e:
+        metrics.increment("ai.parse.failures")
+        metrics.increment(f"ai.{stage}.parse_failures")
+        raise ValueError(f"Respuesta de la IA no interpretable: {e}") from e
+
+
+def _generate_json(bytes_data: bytes, mime_type: str, prompt: str, schema: Type[BaseModel], model: str, stage: str, deadline: float) -> dict:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Envía un archivo y un prompt a Gemini a través del gobernador (límite adaptativo, reintentos y circuit breaker) pidiendo salida JSON estructurada con el esquema indicado, registra latencia y costo de la etapa y retorna el objeto validado
     Parámetros de entrada:
-        - bytes_data: bytes - Contenido del archivo en bytes
+        - bytes_data: bytes - Contenido del archivo
+        - mime_type: str - Tipo MIME del contenido
+        - prompt: str - Instrucciones para el modelo
+        - schema: Type[BaseModel] - Esquema de la respuesta
+        - model: str - Modelo a invocar
+        - stage: str - Etapa del análisis (para las métricas)
+        - deadline: float - Instante límite (time.monotonic()) del análisis del documento
+    Retorno esperado: dict - Respuesta validada con el esquema
+    Excepciones: Propaga errores de la API, del gobernador o ValueError si la respuesta no es interpretable
+    """
+    file_input = genai_types.Part.from_bytes(mime_type=mime_type, data=bytes_data)
+    structured = {"response_mime_type": "application/json", "response_schema": schema} if settings.AI_STRUCTURED_OUTPUT else {}
+
+    def _call(remaining: float):
+        # Cada intento tiene su propio timeout, nunca mayor al tiempo que queda del presupuesto
+        timeout_ms = int(min(remaining, settings.AI_REQUEST_TIMEOUT_SECONDS) * 1000)
+        return _get_client().models.generate_content(
+            model=model,
+            contents=[prompt, file_input],
+            config=genai_types.GenerateContentConfig(
+                http_options=genai_types.HttpOptions(timeout=max(1, timeout_ms)),
+                **structured,
+            ),
+        )
+
+    start = time.perf_counter()
+    result = get_governor().call(_call, deadline)
+    _record_usage(stage, model, time.perf_counter() - start, result.usage_metadata)
+
+    return _parse_response(result.parsed, result.text, schema, stage)
+
+
+class StreamInterruptedError(Exception):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: El streaming se cortó después de haber emitido campos; no se reintenta para no duplicar eventos
+    Parámetros de entrada: None (clase de excepción)
+    Retorno esperado: None (clase de excepción)
+    """
+    pass
+
+
+def _stream_json(
+    bytes_data: bytes,
+    mime_type: str,
+    prompt: str,
+    schema: Type[BaseModel],
+    model: str,
+    stage: str,
+    deadline: float,
+    on_event: Callable[[str, Any], None],
+) -> dict:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Igual que _generate_json pero con la API de streaming: parsea el JSON parcial a medida que llega y emite cada campo de primer nivel ("field") y cada producto ("product") en cuanto se completa
+    Parámetros de entrada:
+        - bytes_data, mime_type, prompt, schema, model, stage, deadline: ver _generate_json
+        - on_event: Callable[[str, Any], None] - Recibe ("field", {"name", "value"}) o ("product", dict)
+    Retorno esperado: dict - Respuesta completa validada con el esquema
+    Excepciones: Propaga errores de la API, del gobernador, StreamInterruptedError o ValueError si la respuesta no es interpretable
+    """
+    file_input = genai_types.Part.from_bytes(mime_type=mime_type, data=bytes_data)
+    structured = {"response_mime_type": "application/json", "response_schema": schema} if settings.AI_STRUCTURED_OUTPUT else {}
+
+    def _call(remaining: float):
+        timeout_ms = int(min(remaining, settings.AI_REQUEST_TIMEOUT_SECONDS) * 1000)
+        parser = PartialJsonParser()
+        chunks: List[str] = []
+        usage = None
+        try:
+            stream = _get_client().models.generate_content_stream(
+                model=model,
+                contents=[prompt, file_input],
+                config=genai_types.GenerateContentConfig(
+                    http_options=genai_types.HttpOptions(timeout=max(1, timeout_ms)),
+                    **structured,
+                ),
+            )
+            for chunk in stream:
+                usage = chunk.usage_metadata or usage
+                text = chunk.text or ""
+                if not text:
+                    continue
+                chunks.append(text)
+                for kind, name, value in parser.feed(text):
+                    if kind == "item" and name == "products":
+                        on_event("product", value)
+                    elif kind == "field" and name != "products":
+                        on_event("field", {"name": name, "value": value})
+        except Exception as e:
+            if chunks:
+                raise StreamInterruptedError(f"Streaming interrumpido: {e}") from e
+            raise
+        return "".join(chunks), usage
+
+    start = time.perf_counter()
+    text, usage = get_governor().call(_call, deadline)
+    _record_usage(stage, model, time.perf_counter() - start, usage)
+
+    return _parse_response(None, text, schema, stage)
+
+
+def _analyze_whole(bytes_data: bytes, mime_type: str, deadline: float) -> dict:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Analiza un archivo completo. En modo de una etapa usa el prompt completo con AI_EXTRACTION_MODEL; en modo de dos etapas (AI_TWO_STAGE_ANALYSIS) clasifica con AI_CLASSIFIER_MODEL y solo las facturas pasan al modelo de extracción
+    Parámetros de entrada:
+        - bytes_data: bytes - Contenido del archivo
+        - mime_type: str - Tipo MIME del contenido
+        - deadline: float - Instante límite (time.monotonic()) del análisis del documento
+    Retorno esperado: dict - Respuesta parseada (sin normalizar)
+    """
+    if not settings.AI_TWO_STAGE_ANALYSIS:
+        return _generate_json(bytes_data, mime_type, _build_analysis_prompt(), DocumentAnalysisResult, settings.AI_EXTRACTION_MODEL, "analysis", deadline)
+
+    classified = _generate_json(bytes_data, mime_type, _build_classification_prompt(), ClassificationResult, settings.AI_CLASSIFIER_MODEL, "classify", deadline)
+    if str(classified.get("classification", "")).upper() != "FACTURA":
+        return classified
+
+    extracted = _generate_json(bytes_data, mime_type, _build_invoice_extraction_prompt(), InvoiceExtractionResult, settings.AI_EXTRACTION_MODEL, "extract", deadline)
+    return {**extracted, "classification": "FACTURA"}
+
+
+def analyze_document(bytes_data: bytes | memoryview, filename: str, content_type: str | None = None):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Analiza un documento (PDF, JPG, PNG) usando la API de Gemini para clasificarlo y extraer información estructurada. Las imágenes se reducen antes de enviarse, los PDFs largos se analizan por fragmentos de páginas y, con AI_TWO_STAGE_ANALYSIS, un modelo rápido clasifica antes de la extracción
+    Parámetros de entrada:
+        - bytes_data: bytes | memoryview - Contenido del archivo (bytes o vista sin copia del archivo temporal)
         - filename: str - Nombre del archivo (usado para detectar tipo)
         - content_type: str | None - Tipo MIME del archivo (opcional, usado para detectar tipo)
     Retorno esperado: dict - Diccionario normalizado con la clasificación y datos extraídos (classification, client_name, provider_name, invoice_number, etc. para FACTURA o description, summary, sentiment para INFORMACION)
@@ -149,40 +546,102 @@ def analyze_document(bytes_data: bytes, filename: str, content_type: str | None
         raise AIServiceError("GEMINI_API_KEY no está configurado")
 
     try:
-        client = genai.Client(api_key=settings.GEMINI_API_KEY)
+        # Si el servicio está caído (circuit breaker abierto) se falla antes de preprocesar nada
+        get_governor().check_available()
+        deadline = time.monotonic() + settings.AI_DEADLINE_SECONDS
 
-        _detect_file_type(content_type, filename)
-        prompt = _build_analysis_prompt()
+        file_type = _detect_file_type(content_type, filename)
 
-        # Convertir bytes a formato Gemini
-        file_input = genai_types.Part.from_bytes(
-            mime_type=content_type or "application/octet-stream",
-            data=bytes_data
-        )
-
-        # 🔥 Modelo correcto para la API v1beta
-        result = client.models.generate_content(
-            model="gemini-2.5-pro", 
-            contents=[prompt, file_input]
-        )
+        if file_type == "image":
+            bytes_data, content_type = _preprocess_image(bytes_data, content_type)
 
-        text = result.text.strip()
+        if file_type == "pdf":
+            # PDFs largos: clasificación con las primeras páginas y extracción por fragmentos en paralelo
+            parsed = analyze_pdf(
+                bytes_data,
+                lambda pdf_bytes: _analyze_whole(pdf_bytes, "application/pdf", deadline),
+                lambda pdf_bytes, prompt: _generate_json(pdf_bytes, "application/pdf", prompt, LineItemsResult, settings.AI_EXTRACTION_MODEL, "pdf_chunk", deadline),
+            )
+            if parsed is not None:
+                return _normalize_analysis_response(parsed)
 
-        # Limpiar ` ```json `
-        if text.startswith("```json"):
-            text = text[7:]
-        if text.startswith("```"):
-            text = text[3:]
-        if text.endswith("```"):
-            text = text[:-3]
-        text = text.strip()
+        # El SDK requiere bytes: única copia del contenido
+        data = bytes_data if isinstance(bytes_data, bytes) else bytes(bytes_data)
+        parsed = _analyze_whole(data, content_type or "application/octet-stream", deadline)
 
-        # Parsear JSON
-        parsed = json.loads(text)
-        
         # Normalizar respuesta para asegurar que todos los campos estén presentes
         return _normalize_analysis_response(parsed)
 
     except Exception as e:
         logger.error(f"Error al analizar documento con Gemini: {e}")
         raise AIServiceError(f"Error al analizar documento con Gemini: {e}")
+
+
+def _emit_all(result: dict, on_event: Callable[[str, Any], None]) -> None:
+    for name, value in result.items():
+        if name == "products":
+            for product in value or []:
+                on_event("product", product)
+        else:
+            on_event("field", {"name": name, "value": value})
+
+
+def analyze_document_streaming(
+    bytes_data: bytes | memoryview,
+    filename: str,
+    content_type: str | None = None,
+    on_event: Callable[[str, Any], None] = lambda event, data: None,
+) -> dict:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Variante de analyze_document que usa la API de streaming y emite los campos a medida que el modelo los genera: primero classification (el esquema la pone primero; en modo de dos etapas viene del clasificador), luego los datos de encabezado y luego cada producto. Los PDFs largos que se dividen en fragmentos emiten sus campos al terminar
+    Parámetros de entrada:
+        - bytes_data: bytes | memoryview - Contenido del archivo
+        - filename: str - Nombre del archivo (usado para detectar tipo)
+        - content_type: str | None - Tipo MIME del archivo
+        - on_event: Callable[[str, Any], None] - Recibe ("field", {"name": str, "value": Any}) o ("product", dict). Se invoca desde el hilo que ejecuta el análisis
+    Retorno esperado: dict - Diccionario normalizado igual al de analyze_document
+    Excepciones: AIServiceError si GEMINI_API_KEY no está configurado o si ocurre un error al analizar el documento
+    """
+    if not settings.GEMINI_API_KEY:
+        raise AIServiceError("GEMINI_API_KEY no está configurado")
+
+    try:
+        get_governor().check_available()
+        deadline = time.monotonic() + settings.AI_DEADLINE_SECONDS
+
+        file_type = _detect_file_type(content_type, filename)
+        if file_type == "image":
+            bytes_data, content_type = _preprocess_image(bytes_data, content_type)
+
+        if file_type == "pdf":
+            parsed = analyze_pdf(
+                bytes_data,
+                lambda pdf_bytes: _analyze_whole(pdf_bytes, "application/pdf", deadline),
+                lambda pdf_bytes, prompt: _generate_json(pdf_bytes, "application/pdf", prompt, LineItemsResult, settings.AI_EXTRACTION_MODEL, "pdf_chunk", deadline),
+            )
+            if parsed is not None:
+                normalized = _normalize_analysis_response(parsed)
+                _emit_all(normalized, on_event)
+                return normalized
+
+        data = bytes_data if isinstance(bytes_data, bytes) else bytes(bytes_data)
+        mime_type = content_type or "application/octet-stream"
+
+        if not settings.AI_TWO_STAGE_ANALYSIS:
+            parsed = _stream_json(data, mime_type, _build_analysis_prompt(), DocumentAnalysisResult, settings.AI_EXTRACTION_MODEL, "analysis", deadline, on_event)
+            return _normalize_analysis_response(parsed)
+
+        classified = _generate_json(data, mime_type, _build_classification_prompt(), ClassificationResult, settings.AI_CLASSIFIER_MODEL, "classify", deadline)
+        if str(classified.get("classification", "")).upper() != "FACTURA":
+            normalized = _normalize_analysis_response(classified)
+            _emit_all(normalized, on_event)
+            return normalized
+
+        on_event("field", {"name": "classification", "value": "FACTURA"})
+        extracted = _stream_json(data, mime_type, _build_invoice_extraction_prompt(), InvoiceExtractionResult, settings.AI_EXTRACTION_MODEL, "extract", deadline, on_event)
+        return _normalize_analysis_response({**extracted, "classification": "FACTURA"})
+
+    except Exception as e:
+        logger.error(f"Error al analizar documento con Gemini (streaming): {e}")
+        raise AIServiceError(f"Error al analizar documento con Gemini: {e}")
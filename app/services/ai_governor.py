@@ -0,0 +1,377 @@
+"""
+Gobernador de llamadas al servicio de IA: límite de concurrencia adaptativo (AIMD),
+reintentos con backoff y jitter, presupuesto de tiempo por documento y circuit breaker.
+"""
+import random
+import threading
+import time
+from typing import Callable, Optional, TypeVar
+
+from app.core.config import settings
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+try:
+    import httpx
+    _has_httpx = True
+except Exception:
+    _has_httpx = False
+
+try:
+    from google.genai import errors as genai_errors
+    _has_genai = True
+except Exception:
+    _has_genai = False
+
+T = TypeVar("T")
+
+# Códigos HTTP que indican saturación o falla temporal del servicio
+_RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+
+class AIGovernorError(Exception):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Error base del gobernador: la llamada no se hizo o no terminó por protección del servicio
+    Parámetros de entrada: None (clase de excepción)
+    Retorno esperado: None (clase de excepción)
+    """
+    pass
+
+
+class CircuitOpenError(AIGovernorError):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: El circuit breaker está abierto: el servicio de IA se considera caído y se falla de inmediato
+    Parámetros de entrada: None (clase de excepción)
+    Retorno esperado: None (clase de excepción)
+    """
+    pass
+
+
+class AIOverloadedError(AIGovernorError):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: No se obtuvo un cupo de concurrencia antes de agotar el presupuesto de tiempo
+    Parámetros de entrada: None (clase de excepción)
+    Retorno esperado: None (clase de excepción)
+    """
+    pass
+
+
+class DeadlineExceededError(AIGovernorError):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Se agotó el presupuesto de tiempo del documento (incluyendo reintentos)
+    Parámetros de entrada: None (clase de excepción)
+    Retorno esperado: None (clase de excepción)
+    """
+    pass
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Indica si un error del servicio de IA es temporal (saturación, 5xx, timeouts o fallas de conexión) y vale la pena reintentar
+    Parámetros de entrada:
+        - error: Exception - Error lanzado por la llamada
+    Retorno esperado: bool - True si es reintentable
+    """
+    if _has_genai and isinstance(error, genai_errors.APIError):
+        return error.code in _RETRYABLE_STATUS
+    if _has_httpx and isinstance(error, (httpx.TimeoutException, httpx.TransportError)):
+        return True
+    return isinstance(error, (TimeoutError, ConnectionError))
+
+
+class AdaptiveLimiter:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Límite de concurrencia AIMD. Cada llamada rápida y exitosa suma 1/límite (≈ +1 por ronda completa); una llamada lenta (por encima de la latencia objetivo) o con error de saturación multiplica el límite por el factor de reducción
+    Parámetros de entrada:
+        - initial_limit: int - Límite inicial
+        - min_limit: int - Límite mínimo
+        - max_limit: int - Límite máximo
+        - target_latency: float - Latencia en segundos por encima de la cual se reduce el límite
+        - decrease_factor: float - Factor multiplicativo de reducción (0 < f < 1)
+    Retorno esperado: None (limitador)
+    """
+
+    def __init__(self, initial_limit: int, min_limit: int, max_limit: int, target_latency: float, decrease_factor: float):
+        self._min = max(1, min_limit)
+        self._max = max(self._min, max_limit)
+        self._limit = float(min(max(initial_limit, self._min), self._max))
+        self._target_latency = target_latency
+        self._decrease_factor = decrease_factor
+        self._in_flight = 0
+        self._condition = threading.Condition()
+        metrics.set_gauge("ai.governor.limit", self._limit)
+        metrics.set_gauge("ai.governor.in_flight", 0)
+
+    @property
+    def limit(self) -> int:
+        return int(self._limit)
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    def acquire(self, timeout: float) -> None:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Espera un cupo de concurrencia
+        Parámetros de entrada:
+            - timeout: float - Segundos máximos de espera
+        Retorno esperado: None
+        Excepciones: AIOverloadedError si no hay cupo antes del timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self._in_flight >= int(self._limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    metrics.increment("ai.governor.rejected")
+                    raise AIOverloadedError(f"Servicio de IA saturado: {self._in_flight} llamadas en curso (límite {int(self._limit)})")
+                self._condition.wait(remaining)
+            self._in_flight += 1
+            metrics.set_gauge("ai.governor.in_flight", self._in_flight)
+
+    def release(self, latency: float, overloaded: bool = False) -> None:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Libera el cupo y ajusta el límite según la latencia observada
+        Parámetros de entrada:
+            - latency: float - Segundos que tardó la llamada
+            - overloaded: bool - True si la llamada falló por saturación o falla temporal del servicio
+        Retorno esperado: None
+        """
+        with self._condition:
+            self._in_flight -= 1
+            if overloaded or latency > self._target_latency:
+                self._limit = max(self._min, self._limit * self._decrease_factor)
+            else:
+                self._limit = min(self._max, self._limit + 1 / self._limit)
+            metrics.set_gauge("ai.governor.in_flight", self._in_flight)
+            metrics.set_gauge("ai.governor.limit", self._limit)
+            self._condition.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Circuit breaker por fallas consecutivas. Cerrado: deja pasar todo. Abierto: rechaza durante reset_timeout. Semiabierto: deja pasar una sola llamada de prueba que decide si se cierra o se vuelve a abrir
+    Parámetros de entrada:
+        - failure_threshold: int - Fallas temporales consecutivas que abren el circuito
+        - reset_timeout: float - Segundos que permanece abierto antes de probar de nuevo
+    Retorno esperado: None (circuit breaker)
+    """
+    CLOSED = "closed"
+    HALF_OPEN = "half_open"
+    OPEN = "open"
+    _STATE_GAUGE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self._failure_threshold = max(1, failure_threshold)
+        self._reset_timeout = reset_timeout
+        self._failures = 0
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+        metrics.set_gauge("ai.breaker.state", 0)
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self._reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def _set_state(self, state: str) -> None:
+        if state != self._state:
+            logger.warning(f"Circuit breaker de IA: {self._state} -> {state}")
+        self._state = state
+        metrics.set_gauge("ai.breaker.state", self._STATE_GAUGE[state])
+
+    def check(self) -> None:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Falla de inmediato si el circuito está abierto, sin reservar la llamada de prueba
+        Parámetros de entrada: None
+        Retorno esperado: None
+        Excepciones: CircuitOpenError si el circuito está abierto
+        """
+        if self.state == self.OPEN:
+            metrics.increment("ai.breaker.rejected")
+            raise CircuitOpenError("Servicio de IA no disponible (circuit breaker abierto)")
+
+    def before_call(self) -> None:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Autoriza una llamada; en estado semiabierto solo una llamada de prueba a la vez
+        Parámetros de entrada: None
+        Retorno esperado: None
+        Excepciones: CircuitOpenError si la llamada no está permitida
+        """
+        with self._lock:
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self._reset_timeout:
+                    metrics.increment("ai.breaker.rejected")
+                    raise CircuitOpenError("Servicio de IA no disponible (circuit breaker abierto)")
+                self._set_state(self.HALF_OPEN)
+            if self._state == self.HALF_OPEN:
+                if self._probe_in_flight:
+                    metrics.increment("ai.breaker.rejected")
+                    raise CircuitOpenError("Servicio de IA en prueba de recuperación")
+                self._probe_in_flight = True
+
+    def cancel_call(self) -> None:
+        """Libera la llamada autorizada por before_call que finalmente no se hizo."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._failures = 0
+            self._probe_in_flight = False
+            self._set_state(self.CLOSED)
+
+    def record_failure(self, retryable: bool) -> None:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Registra el resultado fallido de una llamada. Solo las fallas temporales del servicio cuentan para abrir el circuito; un error no reintentable (petición inválida) demuestra que el servicio responde
+        Parámetros de entrada:
+            - retryable: bool - True si la falla fue temporal (5xx, 429, timeout, conexión)
+        Retorno esperado: None
+        """
+        with self._lock:
+            self._probe_in_flight = False
+            if not retryable:
+                self._failures = 0
+                self._set_state(self.CLOSED)
+                return
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self._failure_threshold:
+                self._opened_at = time.monotonic()
+                if self._state != self.OPEN:
+                    metrics.increment("ai.breaker.opened")
+                self._set_state(self.OPEN)
+
+
+class AIGovernor:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Ejecuta llamadas al servicio de IA a través del circuit breaker y del limitador adaptativo, reintentando las fallas temporales con backoff exponencial con jitter dentro de un plazo límite
+    Parámetros de entrada:
+        - limiter: AdaptiveLimiter - Limitador de concurrencia
+        - breaker: CircuitBreaker - Circuit breaker
+        - max_retries: int - Reintentos máximos por llamada
+        - base_delay: float - Espera base del backoff en segundos
+        - max_delay: float - Espera máxima entre reintentos en segundos
+    Retorno esperado: None (gobernador)
+    """
+
+    def __init__(self, limiter: AdaptiveLimiter, breaker: CircuitBreaker, max_retries: int, base_delay: float, max_delay: float):
+        self.limiter = limiter
+        self.breaker = breaker
+        self._max_retries = max_retries
+        self._base_delay = base_delay
+        self._max_delay = max_delay
+
+    def check_available(self) -> None:
+        self.breaker.check()
+
+    def call(self, fn: Callable[[float], T], deadline: float) -> T:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Ejecuta fn respetando el breaker, el límite de concurrencia y el plazo. fn recibe los segundos restantes para usarlos como timeout de la petición
+        Parámetros de entrada:
+            - fn: Callable[[float], T] - Llamada al servicio; recibe el tiempo restante en segundos
+            - deadline: float - Instante límite (time.monotonic()) para terminar, incluyendo reintentos
+        Retorno esperado: T - Resultado de fn
+        Excepciones: CircuitOpenError, AIOverloadedError, DeadlineExceededError o el error de fn si no es reintentable o se agotaron los reintentos
+        """
+        attempt = 0
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                metrics.increment("ai.governor.deadline_exceeded")
+                raise DeadlineExceededError("Se agotó el tiempo máximo para el análisis con IA")
+
+            self.breaker.before_call()
+            try:
+                self.limiter.acquire(timeout=remaining)
+            except AIOverloadedError:
+                # La llamada no llegó al servicio: no cuenta como falla del upstream
+                self.breaker.cancel_call()
+                raise
+
+            start = time.monotonic()
+            try:
+                result = fn(deadline - start)
+            except Exception as e:
+                latency = time.monotonic() - start
+                retryable = is_retryable(e)
+                self.limiter.release(latency, overloaded=retryable)
+                self.breaker.record_failure(retryable)
+                if not retryable or attempt >= self._max_retries:
+                    raise
+                # Full jitter: espera aleatoria entre 0 y el backoff exponencial
+                delay = random.uniform(0, min(self._max_delay, self._base_delay * (2 ** attempt)))
+                if time.monotonic() + delay >= deadline:
+                    metrics.increment("ai.governor.deadline_exceeded")
+                    raise DeadlineExceededError(f"Se agotó el tiempo máximo para el análisis con IA: {e}") from e
+                attempt += 1
+                metrics.increment("ai.governor.retries")
+                logger.warning(f"Falla temporal del servicio de IA ({e}), reintento {attempt} en {delay:.2f}s")
+                time.sleep(delay)
+                continue
+
+            self.limiter.release(time.monotonic() - start)
+            self.breaker.record_success()
+            return result
+
+
+_governor: Optional[AIGovernor] = None
+_governor_lock = threading.Lock()
+
+
+def get_governor() -> AIGovernor:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Retorna el gobernador compartido del proceso, creado con la configuración actual
+    Parámetros de entrada: None
+    Retorno esperado: AIGovernor - Gobernador de llamadas a la IA
+    """
+    global _governor
+    with _governor_lock:
+        if _governor is None:
+            _governor = AIGovernor(
+                AdaptiveLimiter(
+                    initial_limit=settings.AI_GOVERNOR_INITIAL_LIMIT,
+                    min_limit=settings.AI_GOVERNOR_MIN_LIMIT,
+                    max_limit=settings.AI_GOVERNOR_MAX_LIMIT,
+                    target_latency=settings.AI_GOVERNOR_TARGET_LATENCY_SECONDS,
+                    decrease_factor=settings.AI_GOVERNOR_DECREASE_FACTOR,
+                ),
+                CircuitBreaker(
+                    failure_threshold=settings.AI_BREAKER_FAILURE_THRESHOLD,
+                    reset_timeout=settings.AI_BREAKER_RESET_SECONDS,
+                ),
+                max_retries=settings.AI_MAX_RETRIES,
+                base_delay=settings.AI_RETRY_BASE_DELAY_SECONDS,
+                max_delay=settings.AI_RETRY_MAX_DELAY_SECONDS,
+            )
+        return _governor
+
+
+def reset_governor() -> None:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Descarta el gobernador compartido (se recrea con la configuración vigente en la siguiente llamada)
+    Parámetros de entrada: None
+    Retorno esperado: None
+    """
+    global _governor
+    with _governor_lock:
+        _governor = None
@@ -0,0 +1,214 @@
+"""
+Caché de lectura (read-through) de las respuestas de GET /files/analysis/{analysis_id}:
+guarda el JSON ya serializado de cada análisis con su ETag (columna version) y
+Last-Modified (columna updated_at), de modo que las consultas repetidas (y las validaciones If-None-Match)
+no vuelven a tocar la base de datos ni a leer sus productos.
+update_document_analysis invalida la entrada.
+"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from email.utils import format_datetime
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from app.core.config import settings
+from app.utils.metrics import metrics
+
+
+class CachedAnalysis:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Respuesta serializada de un análisis
+    Parámetros de entrada:
+        - body: bytes - JSON del análisis
+        - etag: str - ETag de la versión (ver version_etag)
+        - last_modified: str | None - updated_at del análisis (ISO 8601 en UTC), o None si no se conoce
+        - expires_at: float - Vencimiento según time.monotonic()
+    Retorno esperado: None (entrada de caché con body, etag, last_modified en formato HTTP o None, y expires_at)
+    """
+
+    def __init__(self, body: bytes, etag: str, last_modified: Optional[str], expires_at: float):
+        self.body = body
+        self.etag = etag
+        self.last_modified = _http_date(last_modified) if last_modified else None
+        self.expires_at = expires_at
+
+
+def _http_date(value: str) -> str:
+    moment = datetime.fromisoformat(value)
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return format_datetime(moment.astimezone(timezone.utc).replace(microsecond=0), usegmt=True)
+
+
+def serialize_analysis(analysis: Dict[str, Any]) -> bytes:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Serializa un análisis con el mismo formato JSON que usa FastAPI para las respuestas
+    Parámetros de entrada:
+        - analysis: dict - Análisis (ver get_document_analysis)
+    Retorno esperado: bytes - JSON UTF-8
+    """
+    return json.dumps(analysis, ensure_ascii=False, allow_nan=False, separators=(",", ":"), default=str).encode("utf-8")
+
+
+def version_etag(version: int) -> str:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: ETag fuerte de un análisis a partir de su columna version: es el mismo en todos los procesos y sirve para If-None-Match y para If-Match en las actualizaciones
+    Parámetros de entrada:
+        - version: int - Versión del análisis
+    Retorno esperado: str - ETag entre comillas, por ejemplo "3"
+    """
+    return f'"{version}"'
+
+
+def parse_if_match(if_match: str) -> Optional[List[int]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Obtiene las versiones aceptadas por el header If-Match. Usa comparación fuerte (RFC 9110): las etiquetas débiles (W/) o que no son versiones no coinciden con ninguna
+    Parámetros de entrada:
+        - if_match: str - Valor del header
+    Retorno esperado: list[int] | None - Versiones aceptadas (puede quedar vacía), o None para "*" (cualquier versión)
+    """
+    if if_match.strip() == "*":
+        return None
+    versions = []
+    for tag in (tag.strip() for tag in if_match.split(",")):
+        if len(tag) > 2 and tag[0] == tag[-1] == '"' and tag[1:-1].isascii() and tag[1:-1].isdigit():
+            versions.append(int(tag[1:-1]))
+    return versions
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Evalúa el header If-None-Match contra un ETag con comparación débil (RFC 9110): "*" o cualquiera de las etiquetas de la lista, con o sin prefijo W/
+    Parámetros de entrada:
+        - if_none_match: str | None - Valor del header
+        - etag: str - ETag actual
+    Retorno esperado: bool - True si el cliente ya tiene esta versión
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in if_none_match.split(","))
+    return any((tag[2:] if tag.startswith("W/") else tag) == etag for tag in tags)
+
+
+class AnalysisCache:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Caché LRU en memoria del proceso, segura entre hilos, de respuestas de análisis por ID. Una carga que empezó antes de invalidar la entrada no se guarda, para no volver a cachear datos viejos
+    Parámetros de entrada:
+        - ttl_seconds: float - Vigencia de cada entrada (límite de datos viejos si otro proceso actualizó el análisis)
+        - max_entries: int - Máximo de análisis guardados (se descartan los menos usados)
+    Retorno esperado: None (caché con estado)
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[int, CachedAnalysis]" = OrderedDict()
+        # Se incrementa en cada invalidación: una carga solo se guarda si no hubo invalidaciones mientras corría
+        self._generation = 0
+
+    def get_or_load(self, analysis_id: int, loader: Callable[[int], Optional[Dict[str, Any]]]) -> Optional[CachedAnalysis]:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Retorna la respuesta cacheada del análisis o la carga con loader, la serializa y la guarda
+        Parámetros de entrada:
+            - analysis_id: int - ID del análisis
+            - loader: Callable[[int], dict | None] - Lectura desde la base de datos (ver get_document_analysis)
+        Retorno esperado: CachedAnalysis | None - None si el análisis no existe (no se cachea)
+        Excepciones: Las que lance loader
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(analysis_id)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(analysis_id)
+                metrics.increment("analysis_cache.hit")
+                return entry
+            generation = self._generation
+        metrics.increment("analysis_cache.miss")
+
+        analysis = loader(analysis_id)
+        if analysis is None:
+            return None
+        return self._store({analysis_id: analysis}, generation)[analysis_id]
+
+    def get_many_or_load(
+        self,
+        analysis_ids: Iterable[int],
+        loader: Callable[[List[int]], Dict[int, Dict[str, Any]]],
+    ) -> Dict[int, CachedAnalysis]:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Variante de get_or_load para varios análisis: los que no están cacheados se cargan con una sola llamada a loader
+        Parámetros de entrada:
+            - analysis_ids: Iterable[int] - IDs de los análisis
+            - loader: Callable[[list[int]], dict[int, dict]] - Lectura de varios análisis desde la base de datos (ver get_document_analyses)
+        Retorno esperado: dict[int, CachedAnalysis] - Respuestas por ID; los análisis inexistentes no se incluyen
+        Excepciones: Las que lance loader
+        """
+        found: Dict[int, CachedAnalysis] = {}
+        missing: List[int] = []
+        now = time.monotonic()
+        with self._lock:
+            for analysis_id in dict.fromkeys(analysis_ids):
+                entry = self._entries.get(analysis_id)
+                if entry is not None and entry.expires_at > now:
+                    self._entries.move_to_end(analysis_id)
+                    found[analysis_id] = entry
+                else:
+                    missing.append(analysis_id)
+            generation = self._generation
+        metrics.increment("analysis_cache.hit", len(found))
+        if missing:
+            metrics.increment("analysis_cache.miss", len(missing))
+            found.update(self._store(loader(missing), generation))
+        return found
+
+    def _store(self, analyses: Dict[int, Dict[str, Any]], generation: int) -> Dict[int, CachedAnalysis]:
+        expires_at = time.monotonic() + self.ttl_seconds
+        entries = {
+            analysis_id: CachedAnalysis(
+                serialize_analysis(analysis), version_etag(analysis["version"]), analysis.get("updated_at"), expires_at
+            )
+            for analysis_id, analysis in analyses.items()
+        }
+        if self.max_entries <= 0:
+            return entries
+        with self._lock:
+            if self._generation == generation:
+                for analysis_id, entry in entries.items():
+                    self._entries[analysis_id] = entry
+                    self._entries.move_to_end(analysis_id)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return entries
+
+    def invalidate(self, *analysis_ids: int) -> None:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Descarta las respuestas cacheadas de los análisis modificados
+        Parámetros de entrada:
+            - analysis_ids: int - IDs de los análisis
+        Retorno esperado: None
+        """
+        with self._lock:
+            for analysis_id in analysis_ids:
+                self._entries.pop(analysis_id, None)
+            self._generation += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+analysis_cache = AnalysisCache(settings.ANALYSIS_CACHE_TTL_SECONDS, settings.ANALYSIS_CACHE_MAX_ENTRIES)
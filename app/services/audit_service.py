@@ -2,7 +2,7 @@
 Servicio de auditoría para registrar eventos del sistema.
 """
 import json
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from datetime import datetime
 
 from app.db.session import SessionLocal
@@ -24,6 +24,23 @@ class EventType:
     TOKEN_REFRESH = "Interacción del usuario"  # Refresh token también
 
 
+def _serialize_metadata(metadata: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Serializa la metadata de un evento de auditoría a JSON. Si no es serializable se guarda su representación en texto
+    Parámetros de entrada:
+        - metadata: dict | None - Diccionario con información adicional del evento
+    Retorno esperado: str | None - JSON con la metadata o None si no hay metadata
+    """
+    if not metadata:
+        return None
+    try:
+        return json.dumps(metadata, ensure_ascii=False)
+    except (TypeError, ValueError) as e:
+        logger.warning(f"Error serializando metadata para auditoría: {e}")
+        return str(metadata)
+
+
 def log_event(
     event_type: str,
     description: str,
@@ -43,13 +60,7 @@ def log_event(
     db = SessionLocal()
     try:
         # Convertir metadata a JSON string si existe
-        metadata_json = None
-        if metadata:
-            try:
-                metadata_json = json.dumps(metadata, ensure_ascii=False)
-            except (TypeError, ValueError) as e:
-                logger.warning(f"Error serializando metadata para auditoría: {e}")
-                metadata_json = str(metadata)
+        metadata_json = _serialize_metadata(metadata)
         
         audit_log = AuditLog(
             event_type=event_type,
@@ -70,6 +81,96 @@ def log_event(
         db.close()
 
 
+def log_events(events: List[Dict[str, Any]]) -> None:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Registra varios eventos de auditoría en una sola sesión y un solo commit. Pensado para cargas por lotes, donde registrar evento por evento multiplicaría las transacciones
+    Parámetros de entrada:
+        - events: list[dict] - Lista de eventos con las claves "event_type", "description", "user_id" (opcional) y "metadata" (opcional)
+    Retorno esperado: None (función que registra los eventos en la BD)
+    """
+    if not events:
+        return
+
+    db = SessionLocal()
+    try:
+        db.add_all([
+            AuditLog(
+                event_type=event["event_type"],
+                description=event["description"],
+                user_id=event.get("user_id"),
+                event_metadata=_serialize_metadata(event.get("metadata")),
+            )
+            for event in events
+        ])
+        db.commit()
+        logger.info(f"{len(events)} eventos de auditoría registrados en lote")
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error al registrar eventos de auditoría en lote: {e}")
+        # No lanzamos la excepción para no interrumpir el flujo principal
+    finally:
+        db.close()
+
+
+def build_upload_audit_events(
+    filename: Optional[str],
+    user_id: Optional[str],
+    result: Dict[str, Any],
+    is_tabular: bool,
+) -> List[Dict[str, Any]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Construye los eventos de auditoría asociados a la carga de un archivo (CSV/Excel o documento), incluyendo el evento de IA cuando el documento fue analizado
+    Parámetros de entrada:
+        - filename: str | None - Nombre original del archivo
+        - user_id: str | None - ID del usuario que subió el archivo
+        - result: dict - Resultado de handle_upload o analyze_and_store_document
+        - is_tabular: bool - True si el archivo es CSV/Excel
+    Retorno esperado: list[dict] - Eventos listos para log_event/log_events (event_type, description, user_id, metadata)
+    """
+    if is_tabular:
+        return [{
+            "event_type": EventType.DOCUMENT_UPLOAD,
+            "description": f"Carga de archivo CSV/Excel: {filename}",
+            "user_id": user_id,
+            "metadata": {
+                "filename": filename,
+                "file_id": result.get("file_id"),
+                "rows_saved": result.get("rows_saved"),
+                "validations_count": (result.get("validation_summary") or {}).get("total", len(result.get("validations", []))),
+                "file_type": "CSV/Excel"
+            }
+        }]
+
+    events = [{
+        "event_type": EventType.DOCUMENT_UPLOAD,
+        "description": f"Carga de documento: {filename}",
+        "user_id": user_id,
+        "metadata": {
+            "filename": filename,
+            "document_id": result.get("document_id"),
+            "ai_status": result.get("ai_status"),
+            "file_type": "Documento"
+        }
+    }]
+
+    # Si se analizó con IA, registrar evento adicional
+    if result.get("ai_status") == "analyzed":
+        events.append({
+            "event_type": EventType.AI_ANALYSIS,
+            "description": f"Análisis IA completado para documento: {filename}",
+            "user_id": user_id,
+            "metadata": {
+                "filename": filename,
+                "document_id": result.get("document_id"),
+                "classification": result.get("analysis", {}).get("classification") if result.get("analysis") else None
+            }
+        })
+    return events
+
+
 def get_audit_logs(
     event_type: Optional[str] = None,
     user_id: Optional[str] = None,
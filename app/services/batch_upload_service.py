@@ -0,0 +1,278 @@
+"""
+Servicio de carga por lotes: expande archivos ZIP y procesa varios archivos en paralelo.
+"""
+import asyncio
+import json
+import mimetypes
+import os
+import zipfile
+from tempfile import SpooledTemporaryFile
+from typing import Any, AsyncIterator, Dict, List, Optional, Union
+
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from app.core.config import settings
+from app.core.storage import get_storage
+from app.services.audit_service import log_events, build_upload_audit_events, EventType
+from app.services.document_service import analyze_and_store_document
+from app.services.blob_service import store_blob, store_blobs
+from app.services.file_service import handle_upload, is_tabular_file
+from app.utils.logger import logger
+from app.utils.upload_buffer import SpooledUpload
+
+# Tamaño máximo en memoria de cada entrada extraída del ZIP antes de pasar a disco
+_ZIP_ENTRY_SPOOL_BYTES = 1024 * 1024
+
+
+class BatchUploadError(Exception):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Excepción para lotes inválidos (vacíos, demasiado grandes o con ZIP corrupto)
+    Parámetros de entrada: None (clase de excepción)
+    Retorno esperado: None (clase de excepción)
+    """
+    pass
+
+
+def _is_zip_upload(upload_file: UploadFile) -> bool:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Determina si un archivo subido es un ZIP por su content_type o extensión
+    Parámetros de entrada:
+        - upload_file: UploadFile - Archivo subido
+    Retorno esperado: bool - True si es un archivo ZIP
+    """
+    content_type = (upload_file.content_type or "").lower()
+    filename = (upload_file.filename or "").lower()
+    return "zip" in content_type or filename.endswith(".zip")
+
+
+def _extract_zip_entries(upload_file: UploadFile) -> List[UploadFile]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Extrae las entradas de un ZIP como objetos UploadFile independientes. Ignora directorios y metadatos de macOS, y limita el tamaño total descomprimido para evitar ZIP bombs
+    Parámetros de entrada:
+        - upload_file: UploadFile - Archivo ZIP subido
+    Retorno esperado: list[UploadFile] - Un UploadFile por cada archivo contenido en el ZIP
+    Excepciones: BatchUploadError si el ZIP es inválido o supera el tamaño descomprimido permitido
+    """
+    try:
+        upload_file.file.seek(0)
+        archive = zipfile.ZipFile(upload_file.file)
+    except zipfile.BadZipFile:
+        raise BatchUploadError(f"Archivo ZIP inválido: {upload_file.filename}")
+
+    entries = []
+    with archive:
+        infos = [
+            info for info in archive.infolist()
+            if not info.is_dir() and not info.filename.startswith("__MACOSX/")
+        ]
+        total_size = sum(info.file_size for info in infos)
+        if total_size > settings.BATCH_UPLOAD_MAX_ZIP_UNCOMPRESSED_BYTES:
+            raise BatchUploadError(
+                f"El ZIP {upload_file.filename} supera el tamaño descomprimido permitido "
+                f"({settings.BATCH_UPLOAD_MAX_ZIP_UNCOMPRESSED_BYTES} bytes)"
+            )
+
+        for info in infos:
+            name = os.path.basename(info.filename)
+            if not name:
+                continue
+            spool = SpooledTemporaryFile(max_size=_ZIP_ENTRY_SPOOL_BYTES)
+            with archive.open(info) as member:
+                while chunk := member.read(_ZIP_ENTRY_SPOOL_BYTES):
+                    spool.write(chunk)
+            spool.seek(0)
+            content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            entries.append(UploadFile(
+                file=spool,
+                size=info.file_size,
+                filename=name,
+                headers=Headers({"content-type": content_type}),
+            ))
+    return entries
+
+
+def expand_batch_uploads(files: List[UploadFile]) -> List[UploadFile]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Normaliza los archivos de un lote: los ZIP se reemplazan por sus entradas y el resto se mantiene tal cual, respetando el orden recibido
+    Parámetros de entrada:
+        - files: list[UploadFile] - Archivos recibidos en la petición multipart
+    Retorno esperado: list[UploadFile] - Lista plana de archivos a procesar
+    Excepciones: BatchUploadError si el lote queda vacío, supera BATCH_UPLOAD_MAX_FILES o contiene un ZIP inválido
+    """
+    uploads: List[UploadFile] = []
+    for upload_file in files:
+        if _is_zip_upload(upload_file):
+            uploads.extend(_extract_zip_entries(upload_file))
+        else:
+            uploads.append(upload_file)
+
+        if len(uploads) > settings.BATCH_UPLOAD_MAX_FILES:
+            raise BatchUploadError(
+                f"El lote supera el máximo de {settings.BATCH_UPLOAD_MAX_FILES} archivos"
+            )
+
+    if not uploads:
+        raise BatchUploadError("El lote no contiene archivos")
+    return uploads
+
+
+async def _store_batch(uploads: List[UploadFile]) -> List[Union[SpooledUpload, Exception]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Recibe y guarda en S3/local todos los archivos del lote antes de procesarlos: calcula el SHA-256 de cada uno, escribe una sola vez cada contenido distinto con store_blobs (una transacción de reclamación y escrituras concurrentes) y hace un único flush del almacenamiento. Si el guardado conjunto falla, cada archivo se guarda luego por su cuenta y reporta su propio error
+    Parámetros de entrada:
+        - uploads: list[UploadFile] - Archivos ya expandidos con expand_batch_uploads
+    Retorno esperado: list - Por cada archivo, su SpooledUpload (con storage_path si se guardó) o la excepción al recibirlo (por ejemplo UploadTooLargeError)
+    """
+    prepared: List[Union[SpooledUpload, Exception]] = []
+    for upload_file in uploads:
+        try:
+            prepared.append(await SpooledUpload.from_upload_file(upload_file))
+        except Exception as e:
+            prepared.append(e)
+
+    # Un handle por contenido distinto: los archivos repetidos dentro del lote se escriben una sola vez
+    contents = {upload.sha256: upload.open() for upload in prepared if isinstance(upload, SpooledUpload)}
+    if not contents:
+        return prepared
+    try:
+        stored = await store_blobs(contents)
+        await get_storage().flush()
+    except Exception as e:
+        logger.warning(f"No se pudo guardar el lote en conjunto, se guarda archivo por archivo: {e}")
+        return prepared
+
+    for upload in prepared:
+        if isinstance(upload, SpooledUpload):
+            upload.storage_path = stored[upload.sha256][0]
+    return prepared
+
+
+async def _process_one(
+    index: int,
+    upload_file: UploadFile,
+    prepared: Union[SpooledUpload, Exception],
+    parametro1: Optional[str],
+    parametro2: Optional[str],
+    uploaded_by: Optional[str],
+    semaphore: asyncio.Semaphore,
+) -> Dict[str, Any]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Procesa un archivo del lote (tabular o documento) respetando el semáforo de concurrencia. Antes de procesarlo vuelve a reclamar su blob con store_blob: el lote puede durar más que BLOB_GC_GRACE_SECONDS y la referencia recién se registra en el servicio, así que el periodo de gracia se reinicia y, si la recolección ya borró el objeto, se vuelve a escribir. Los errores se capturan y se reportan en el resultado para no abortar el resto del lote
+    Parámetros de entrada:
+        - index: int - Posición del archivo dentro del lote
+        - upload_file: UploadFile - Archivo a procesar
+        - prepared: SpooledUpload | Exception - Contenido ya recibido y guardado por _store_batch, o el error al recibirlo
+        - parametro1: str | None - Primer parámetro para CSV/Excel
+        - parametro2: str | None - Segundo parámetro para CSV/Excel
+        - uploaded_by: str | None - ID del usuario que sube el lote
+        - semaphore: asyncio.Semaphore - Semáforo que limita los archivos en proceso simultáneo
+    Retorno esperado: dict - {"index", "filename", "file_type", "status", "result", "error"}
+    """
+    is_tabular = is_tabular_file(upload_file.content_type, upload_file.filename)
+    item: Dict[str, Any] = {
+        "index": index,
+        "filename": upload_file.filename,
+        "file_type": "CSV/Excel" if is_tabular else "Documento",
+        "status": "ok",
+        "result": None,
+        "error": None,
+    }
+    async with semaphore:
+        try:
+            if isinstance(prepared, Exception):
+                raise prepared
+            if prepared.storage_path is not None:
+                # Reclama y comprueba que siga existiendo: solo se reescribe si la recolección lo borró
+                prepared.storage_path, _ = await store_blob(prepared.open(), prepared.sha256)
+            if is_tabular:
+                item["result"] = await handle_upload(
+                    upload_file,
+                    parametro1,
+                    parametro2,
+                    uploaded_by=uploaded_by,
+                    upload=prepared,
+                )
+            else:
+                item["result"] = await analyze_and_store_document(
+                    upload_file,
+                    uploaded_by=uploaded_by,
+                    upload=prepared,
+                )
+        except Exception as e:
+            logger.error(f"Error procesando {upload_file.filename} en carga por lotes: {e}")
+            item["status"] = "error"
+            item["error"] = str(e)
+        finally:
+            if isinstance(prepared, SpooledUpload):
+                prepared.close()
+            await upload_file.close()
+    return item
+
+
+async def process_batch_uploads(
+    uploads: List[UploadFile],
+    parametro1: Optional[str],
+    parametro2: Optional[str],
+    uploaded_by: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Guarda primero todos los archivos del lote en S3/local de una vez (_store_batch), los procesa con concurrencia acotada (BATCH_UPLOAD_CONCURRENCY) y emite una línea NDJSON por archivo en cuanto termina. Los eventos de auditoría se acumulan y se registran en una sola transacción al final del lote
+    Parámetros de entrada:
+        - uploads: list[UploadFile] - Archivos ya expandidos con expand_batch_uploads
+        - parametro1: str | None - Primer parámetro para CSV/Excel
+        - parametro2: str | None - Segundo parámetro para CSV/Excel
+        - uploaded_by: str | None - ID del usuario que sube el lote
+    Retorno esperado: AsyncIterator[str] - Líneas NDJSON con el resultado de cada archivo, en orden de finalización
+    """
+    prepared = await _store_batch(uploads)
+    semaphore = asyncio.Semaphore(max(1, settings.BATCH_UPLOAD_CONCURRENCY))
+    tasks = [
+        asyncio.create_task(_process_one(index, upload_file, prepared[index], parametro1, parametro2, uploaded_by, semaphore))
+        for index, upload_file in enumerate(uploads)
+    ]
+
+    audit_events: List[Dict[str, Any]] = []
+    succeeded = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            item = await next_done
+            if item["status"] == "ok":
+                succeeded += 1
+                audit_events.extend(build_upload_audit_events(
+                    item["filename"],
+                    uploaded_by,
+                    item["result"],
+                    item["file_type"] == "CSV/Excel",
+                ))
+            yield json.dumps(item, ensure_ascii=False, default=str) + "\n"
+    finally:
+        # Si el cliente corta la conexión, no dejamos tareas huérfanas
+        for task in tasks:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        # Las tareas canceladas antes de empezar no llegan a su finally: cerramos aquí sus temporales
+        for upload_file, upload in zip(uploads, prepared):
+            if isinstance(upload, SpooledUpload):
+                upload.close()
+            await upload_file.close()
+
+        audit_events.append({
+            "event_type": EventType.DOCUMENT_UPLOAD,
+            "description": f"Carga por lotes: {succeeded}/{len(uploads)} archivos procesados",
+            "user_id": uploaded_by,
+            "metadata": {
+                "files_total": len(uploads),
+                "files_succeeded": succeeded,
+                "files_failed": len(uploads) - succeeded,
+            },
+        })
+        await asyncio.to_thread(log_events, audit_events)
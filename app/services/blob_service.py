@@ -0,0 +1,188 @@
+"""
+Servicio de almacenamiento direccionado por contenido (SHA-256) con deduplicación y conteo de referencias.
+"""
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+from typing import BinaryIO, Dict, Iterable, Tuple
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.core.storage import get_storage
+from app.db.session import SessionLocal
+from app.models.blob import StoredBlob
+from app.utils.logger import logger
+
+# Máximo de hashes por cláusula IN al reclamar blobs (SQL Server admite hasta 2100 parámetros)
+_CLAIM_CHUNK_SIZE = 1000
+
+
+def blob_key(sha256: str) -> str:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Construye la clave de almacenamiento de un blob a partir de su hash, repartida en dos niveles de subdirectorios/prefijos (ab/cd/<sha256>)
+    Parámetros de entrada:
+        - sha256: str - Hash SHA-256 (hex) del contenido
+    Retorno esperado: str - Clave del blob (ej: "blobs/ab/cd/abcd...")
+    """
+    return f"{settings.STORAGE_BLOB_PREFIX}/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def _claim_blobs(sha256s: Iterable[str]) -> None:
+    # Reinicia el periodo de gracia de los registros (si existen) en una transacción corta. Si collect_garbage
+    # está borrando alguno de esos blobs, el UPDATE espera su bloqueo de fila y el objeto ya no está al consultarlo después
+    sha256s = list(sha256s)
+    # Mismo reloj (UTC) que el corte de collect_garbage: GETDATE() de SQL Server usa la hora local del servidor
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    db = SessionLocal()
+    try:
+        for start in range(0, len(sha256s), _CLAIM_CHUNK_SIZE):
+            db.query(StoredBlob).filter(StoredBlob.sha256.in_(sha256s[start:start + _CLAIM_CHUNK_SIZE])).update(
+                {StoredBlob.created_at: now}, synchronize_session=False
+            )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+
+
+async def store_blobs(contents: Dict[str, BinaryIO]) -> Dict[str, Tuple[str, bool]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Guarda varios contenidos en S3/local bajo su clave SHA-256 a través del almacenamiento asíncrono (sin bloquear el event loop). Antes de comprobar si los blobs ya existen (HEAD en S3, stat en local) reclama sus registros en una sola transacción: reinicia el periodo de gracia de collect_garbage, que así no los borra mientras la carga termina de tomar su referencia, y espera a que termine un borrado en curso. Las comprobaciones y las escrituras de los blobs que faltan se lanzan juntas, acotadas por el pool del almacenamiento; los que ya existen no se vuelven a escribir
+    Parámetros de entrada:
+        - contents: dict - {sha256: handle} con un handle por contenido distinto, posicionado al inicio
+    Retorno esperado: dict - {sha256: (storage_path: str, created: bool)} donde created es False si el blob ya existía
+    """
+    storage = get_storage()
+    # Fuera del event loop: puede esperar el bloqueo de collect_garbage, que necesita el loop para terminar
+    await asyncio.to_thread(_claim_blobs, contents)
+    sha256s = list(contents)
+    existing = await asyncio.gather(*(storage.exists(blob_key(sha256)) for sha256 in sha256s))
+
+    results: Dict[str, Tuple[str, bool]] = {}
+    missing = []
+    for sha256, exists in zip(sha256s, existing):
+        if exists:
+            logger.info(f"Blob {sha256} ya almacenado, se omite la escritura")
+            results[sha256] = (storage.uri(blob_key(sha256)), False)
+        else:
+            missing.append(sha256)
+    paths = await asyncio.gather(*(storage.put(contents[sha256], blob_key(sha256)) for sha256 in missing))
+    results.update((sha256, (path, True)) for sha256, path in zip(missing, paths))
+    return results
+
+
+async def store_blob(fileobj: BinaryIO, sha256: str) -> Tuple[str, bool]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Guarda un único contenido bajo su clave SHA-256 (ver store_blobs). Si el blob existe no se vuelve a escribir
+    Parámetros de entrada:
+        - fileobj: BinaryIO - Handle con el contenido posicionado al inicio
+        - sha256: str - Hash SHA-256 (hex) del contenido
+    Retorno esperado: tuple - (storage_path: str, created: bool) donde created es False si el blob ya existía
+    """
+    return (await store_blobs({sha256: fileobj}))[sha256]
+
+
+def add_blob_reference(db: Session, sha256: str, size: int, storage_path: str) -> None:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Registra una referencia a un blob dentro de la transacción del llamador: crea el registro con ref_count=1 o incrementa el contador de forma atómica si ya existe. No hace commit
+    Parámetros de entrada:
+        - db: Session - Sesión de base de datos del llamador
+        - sha256: str - Hash SHA-256 (hex) del blob
+        - size: int - Tamaño del contenido en bytes
+        - storage_path: str - Ruta de almacenamiento del blob
+    Retorno esperado: None
+    """
+    updated = (
+        db.query(StoredBlob)
+        .filter(StoredBlob.sha256 == sha256)
+        .update({StoredBlob.ref_count: StoredBlob.ref_count + 1}, synchronize_session=False)
+    )
+    if updated:
+        return
+
+    try:
+        # Savepoint: si otra transacción insertó el mismo blob en paralelo, caemos al UPDATE
+        with db.begin_nested():
+            db.add(StoredBlob(sha256=sha256, size=size, storage_path=storage_path, ref_count=1))
+    except IntegrityError:
+        db.query(StoredBlob).filter(StoredBlob.sha256 == sha256).update(
+            {StoredBlob.ref_count: StoredBlob.ref_count + 1}, synchronize_session=False
+        )
+
+
+def release_blob_reference(db: Session, sha256: str) -> None:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Libera una referencia a un blob dentro de la transacción del llamador. El contenido no se borra aquí: lo elimina collect_garbage cuando el contador llega a 0. No hace commit
+    Parámetros de entrada:
+        - db: Session - Sesión de base de datos del llamador
+        - sha256: str - Hash SHA-256 (hex) del blob
+    Retorno esperado: None
+    """
+    db.query(StoredBlob).filter(
+        StoredBlob.sha256 == sha256,
+        StoredBlob.ref_count > 0,
+    ).update({StoredBlob.ref_count: StoredBlob.ref_count - 1}, synchronize_session=False)
+
+
+async def collect_garbage(grace_seconds: int | None = None) -> Dict[str, int]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Elimina los blobs que nadie referencia: los registrados con ref_count=0 y los huérfanos presentes en el almacenamiento sin registro (escrituras cuya transacción falló). Solo considera blobs más antiguos que el periodo de gracia (contado desde el último reuso en store_blob) para no competir con cargas en curso, y borra cada objeto mientras mantiene bloqueada su fila
+    Parámetros de entrada:
+        - grace_seconds: int | None - Antigüedad mínima en segundos (None usa BLOB_GC_GRACE_SECONDS)
+    Retorno esperado: dict - {"blobs_deleted": int, "orphans_deleted": int}
+    """
+    if grace_seconds is None:
+        grace_seconds = settings.BLOB_GC_GRACE_SECONDS
+    cutoff = time.time() - grace_seconds
+    cutoff_dt = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(seconds=grace_seconds)
+
+    storage = get_storage()
+    blobs_deleted = 0
+    orphans_deleted = 0
+    db = SessionLocal()
+    try:
+        unreferenced = db.query(StoredBlob.sha256).filter(
+            StoredBlob.ref_count <= 0,
+            StoredBlob.created_at <= cutoff_dt,
+        ).all()
+        for blob in unreferenced:
+            # Borrado condicional: si alguien tomó una referencia o reclamó el blob (store_blob) mientras tanto, no se elimina
+            deleted = db.query(StoredBlob).filter(
+                StoredBlob.sha256 == blob.sha256,
+                StoredBlob.ref_count <= 0,
+                StoredBlob.created_at <= cutoff_dt,
+            ).delete(synchronize_session=False)
+            if deleted:
+                # El objeto se borra antes del commit, con la fila aún bloqueada: una carga concurrente espera
+                # en store_blob y ya no lo encuentra, así que lo vuelve a escribir en lugar de omitirlo
+                await storage.delete(blob_key(blob.sha256))
+                blobs_deleted += 1
+            db.commit()
+
+        for key, last_modified in await storage.list(f"{settings.STORAGE_BLOB_PREFIX}/"):
+            if last_modified > cutoff:
+                continue
+            sha256 = key.rsplit("/", 1)[-1]
+            if db.query(StoredBlob.sha256).filter(StoredBlob.sha256 == sha256).first() is None:
+                await storage.delete(key)
+                orphans_deleted += 1
+
+        logger.info(f"GC de blobs: {blobs_deleted} sin referencias y {orphans_deleted} huérfanos eliminados")
+        return {"blobs_deleted": blobs_deleted, "orphans_deleted": orphans_deleted}
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error en la recolección de blobs: {e}")
+        raise
+    finally:
+        db.close()
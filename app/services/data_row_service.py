@@ -0,0 +1,137 @@
+"""
+Consulta de las filas (DataRow) guardadas por las cargas CSV/Excel: filas de un archivo
+y búsqueda entre archivos, con paginación por keyset y filtro de precio en el servidor.
+"""
+from typing import Any, Dict, List, Optional
+
+from app.db.session import SessionLocal
+from app.models.data_row import DataRow
+from app.models.file_model import File
+
+# Tamaño de página máximo aceptado por los endpoints
+MAX_PAGE_SIZE = 1000
+
+
+def _row_to_dict(row: DataRow) -> Dict[str, Any]:
+    return {
+        "id": row.id,
+        "file_id": row.file_id,
+        "external_id": row.external_id,
+        "name": row.name,
+        "price": row.price,
+        "uploaded_by": row.uploaded_by,
+    }
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_").replace("[", "\\[")
+
+
+def _page(query, after_id: Optional[int], limit: int, min_price: Optional[float], max_price: Optional[float]) -> Dict[str, Any]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Aplica el filtro de precio y la paginación por keyset (id > after_id ORDER BY id) a una consulta de DataRow. Se lee una fila de más para saber si hay otra página
+    Parámetros de entrada:
+        - query: Query - Consulta base ya filtrada
+        - after_id: int | None - Último id de la página anterior (None para la primera)
+        - limit: int - Filas por página
+        - min_price: float | None - Precio mínimo (inclusive)
+        - max_price: float | None - Precio máximo (inclusive)
+    Retorno esperado: dict - {"rows": list, "next_after_id": int | None}
+    """
+    # Las filas eliminadas por una carga delta no se exponen
+    query = query.filter(DataRow.deleted_at.is_(None))
+    if min_price is not None:
+        query = query.filter(DataRow.price >= min_price)
+    if max_price is not None:
+        query = query.filter(DataRow.price <= max_price)
+    if after_id is not None:
+        query = query.filter(DataRow.id > after_id)
+
+    rows: List[DataRow] = query.order_by(DataRow.id).limit(limit + 1).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "rows": [_row_to_dict(row) for row in rows],
+        "next_after_id": rows[-1].id if has_more else None,
+    }
+
+
+def file_exists(file_id: int) -> bool:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Indica si existe el archivo (File) con el ID dado
+    Parámetros de entrada:
+        - file_id: int - ID del archivo
+    Retorno esperado: bool - True si existe
+    """
+    db = SessionLocal()
+    try:
+        return db.query(File.id).filter(File.id == file_id).first() is not None
+    finally:
+        db.close()
+
+
+def list_file_rows(
+    file_id: int,
+    after_id: Optional[int] = None,
+    limit: int = 100,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Retorna una página de las filas guardadas de un archivo, en orden de inserción
+    Parámetros de entrada:
+        - file_id: int - ID del archivo (File)
+        - after_id: int | None - Cursor: next_after_id de la página anterior
+        - limit: int - Filas por página (máximo MAX_PAGE_SIZE)
+        - min_price: float | None - Precio mínimo (inclusive)
+        - max_price: float | None - Precio máximo (inclusive)
+    Retorno esperado: dict | None - {"file_id": int, "rows": list, "next_after_id": int | None} o None si el archivo no existe
+    """
+    db = SessionLocal()
+    try:
+        if db.query(File.id).filter(File.id == file_id).first() is None:
+            return None
+        page = _page(db.query(DataRow).filter(DataRow.file_id == file_id), after_id, min(limit, MAX_PAGE_SIZE), min_price, max_price)
+        return {"file_id": file_id, **page}
+    finally:
+        db.close()
+
+
+def search_rows(
+    name: Optional[str] = None,
+    external_id: Optional[str] = None,
+    after_id: Optional[int] = None,
+    limit: int = 100,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Busca filas en todos los archivos por prefijo de nombre y/o external_id exacto (ambos resueltos con índice)
+    Parámetros de entrada:
+        - name: str | None - Prefijo del nombre
+        - external_id: str | None - external_id exacto
+        - after_id: int | None - Cursor: next_after_id de la página anterior
+        - limit: int - Filas por página (máximo MAX_PAGE_SIZE)
+        - min_price: float | None - Precio mínimo (inclusive)
+        - max_price: float | None - Precio máximo (inclusive)
+    Retorno esperado: dict - {"rows": list, "next_after_id": int | None}
+    Excepciones: ValueError si no se indica name ni external_id
+    """
+    if not name and not external_id:
+        raise ValueError("name or external_id is required")
+
+    db = SessionLocal()
+    try:
+        query = db.query(DataRow)
+        if external_id:
+            query = query.filter(DataRow.external_id == external_id)
+        if name:
+            # Prefijo (LIKE 'x%'): usa el índice por nombre, a diferencia de '%x%'
+            query = query.filter(DataRow.name.like(_escape_like(name) + "%", escape="\\"))
+        return _page(query, after_id, min(limit, MAX_PAGE_SIZE), min_price, max_price)
+    finally:
+        db.close()
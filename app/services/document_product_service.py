@@ -0,0 +1,246 @@
+"""
+Líneas de producto de las facturas analizadas (tabla document_products): escritura
+masiva al guardar un análisis, actualización por diferencias, lectura por lotes de
+análisis, búsqueda por nombre y migración de los products_json existentes.
+"""
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, insert, select, update
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.models.document import DocumentAnalysis
+from app.models.document_product import DocumentProduct
+from app.services.data_row_service import _escape_like
+from app.utils.logger import logger
+
+# IDs por sentencia IN: SQL Server admite hasta 2100 parámetros por consulta
+_IN_CHUNK = 2000
+
+# Tamaño de página máximo de la búsqueda
+MAX_PAGE_SIZE = 1000
+
+PRODUCT_FIELDS = ("name", "quantity", "unit_price", "total")
+
+
+def _to_float(value: Any) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def normalize_products(products: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Lleva las líneas de producto a las columnas de la tabla: name como texto y quantity, unit_price y total como números (None si no son numéricos). Otras claves no se guardan
+    Parámetros de entrada:
+        - products: list[dict] | None - Productos del análisis (IA o actualización del usuario)
+    Retorno esperado: list[dict] - Productos con name, quantity, unit_price y total
+    """
+    normalized = []
+    for product in products or []:
+        if not isinstance(product, dict):
+            continue
+        name = product.get("name")
+        normalized.append({
+            "name": str(name)[:255] if name is not None else None,
+            "quantity": _to_float(product.get("quantity")),
+            "unit_price": _to_float(product.get("unit_price")),
+            "total": _to_float(product.get("total")),
+        })
+    return normalized
+
+
+def _product_to_dict(product) -> Dict[str, Any]:
+    return {field: getattr(product, field) for field in PRODUCT_FIELDS}
+
+
+def _chunks(values: List[int]) -> Iterable[List[int]]:
+    for start in range(0, len(values), _IN_CHUNK):
+        yield values[start:start + _IN_CHUNK]
+
+
+def _load_rows(db: Session, analysis_ids: List[int]) -> Dict[int, list]:
+    rows: Dict[int, list] = {}
+    for chunk in _chunks(analysis_ids):
+        statement = (
+            select(DocumentProduct.id, DocumentProduct.analysis_id, *(getattr(DocumentProduct, f) for f in PRODUCT_FIELDS))
+            .where(DocumentProduct.analysis_id.in_(chunk))
+            .order_by(DocumentProduct.analysis_id, DocumentProduct.position)
+        )
+        for row in db.execute(statement).all():
+            rows.setdefault(row.analysis_id, []).append(row)
+    return rows
+
+
+def load_products(db: Session, analysis_ids: Iterable[int]) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Lee los productos de varios análisis con una consulta IN por bloque de IDs
+    Parámetros de entrada:
+        - db: Session - Sesión de base de datos
+        - analysis_ids: Iterable[int] - IDs de los análisis
+    Retorno esperado: dict[int, list[dict]] - Productos en orden por análisis; los análisis sin productos no se incluyen
+    """
+    rows = _load_rows(db, list(dict.fromkeys(analysis_ids)))
+    return {analysis_id: [_product_to_dict(row) for row in products] for analysis_id, products in rows.items()}
+
+
+def insert_products(db: Session, analysis_id: int, products: Optional[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Inserta los productos de un análisis nuevo con un INSERT de varias filas. No hace commit
+    Parámetros de entrada:
+        - db: Session - Sesión de base de datos del llamador
+        - analysis_id: int - ID del análisis
+        - products: list[dict] | None - Productos del análisis
+    Retorno esperado: list[dict] - Productos normalizados guardados
+    """
+    normalized = normalize_products(products)
+    if normalized:
+        db.execute(insert(DocumentProduct), [
+            {"analysis_id": analysis_id, "position": position, **product}
+            for position, product in enumerate(normalized)
+        ])
+    return normalized
+
+
+def sync_products(db: Session, products_by_analysis: Dict[int, Optional[List[Dict[str, Any]]]]) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Reemplaza los productos de uno o varios análisis escribiendo solo las diferencias: las líneas se comparan por posición con una lectura IN; las que cambiaron se actualizan por clave primaria, las nuevas se insertan y las sobrantes se eliminan, todo con sentencias masivas. No hace commit
+    Parámetros de entrada:
+        - db: Session - Sesión de base de datos del llamador
+        - products_by_analysis: dict[int, list[dict] | None] - Nueva lista de productos por ID de análisis
+    Retorno esperado: dict[int, list[dict]] - Productos normalizados por análisis
+    """
+    normalized = {analysis_id: normalize_products(products) for analysis_id, products in products_by_analysis.items()}
+    existing = _load_rows(db, list(normalized))
+
+    inserts: List[Dict[str, Any]] = []
+    updates: List[Dict[str, Any]] = []
+    deletes: List[int] = []
+    for analysis_id, products in normalized.items():
+        current = existing.get(analysis_id, [])
+        for position, product in enumerate(products):
+            if position >= len(current):
+                inserts.append({"analysis_id": analysis_id, "position": position, **product})
+            elif _product_to_dict(current[position]) != product:
+                updates.append({"id": current[position].id, **product})
+        deletes.extend(row.id for row in current[len(products):])
+
+    if updates:
+        # UPDATE masivo por clave primaria del ORM
+        db.execute(update(DocumentProduct), updates)
+    if inserts:
+        db.execute(insert(DocumentProduct), inserts)
+    for chunk in _chunks(deletes):
+        db.execute(delete(DocumentProduct).where(DocumentProduct.id.in_(chunk)))
+    return normalized
+
+
+def parse_products_json(products_json: Optional[str]) -> List[Dict[str, Any]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Lee el formato anterior (products_json); un JSON inválido o que no es una lista se toma como sin productos
+    Parámetros de entrada:
+        - products_json: str | None - Productos serializados
+    Retorno esperado: list[dict] - Productos
+    """
+    if not products_json:
+        return []
+    try:
+        products = json.loads(products_json)
+    except (json.JSONDecodeError, TypeError):
+        return []
+    return products if isinstance(products, list) else []
+
+
+def search_products(
+    name: str,
+    after_id: Optional[int] = None,
+    limit: int = 100,
+    min_total: Optional[float] = None,
+    max_total: Optional[float] = None,
+) -> Dict[str, Any]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Busca líneas de producto de todas las facturas por prefijo de nombre (resuelto con el índice por nombre), con filtro de total y paginación por keyset
+    Parámetros de entrada:
+        - name: str - Prefijo del nombre del producto
+        - after_id: int | None - Cursor: next_after_id de la página anterior
+        - limit: int - Productos por página (máximo MAX_PAGE_SIZE)
+        - min_total: float | None - Total mínimo de la línea (inclusive)
+        - max_total: float | None - Total máximo de la línea (inclusive)
+    Retorno esperado: dict - {"products": list, "next_after_id": int | None} donde cada producto tiene id, analysis_id, name, quantity, unit_price y total
+    Excepciones: ValueError si name está vacío
+    """
+    if not name:
+        raise ValueError("name is required")
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    db = SessionLocal()
+    try:
+        # Prefijo (LIKE 'x%'): usa el índice por nombre, a diferencia de '%x%'
+        statement = select(DocumentProduct).where(DocumentProduct.name.like(_escape_like(name) + "%", escape="\\"))
+        if min_total is not None:
+            statement = statement.where(DocumentProduct.total >= min_total)
+        if max_total is not None:
+            statement = statement.where(DocumentProduct.total <= max_total)
+        if after_id is not None:
+            statement = statement.where(DocumentProduct.id > after_id)
+        products = db.execute(statement.order_by(DocumentProduct.id).limit(limit + 1)).scalars().all()
+        has_more = len(products) > limit
+        products = products[:limit]
+        return {
+            "products": [{"id": p.id, "analysis_id": p.analysis_id, **_product_to_dict(p)} for p in products],
+            "next_after_id": products[-1].id if has_more else None,
+        }
+    finally:
+        db.close()
+
+
+def backfill_document_products(batch_size: int = 500) -> int:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Migra los products_json existentes a document_products por lotes de análisis (keyset por id, un commit por lote). Los análisis que ya tienen productos se omiten, así que se puede volver a ejecutar; products_json no se borra
+    Parámetros de entrada:
+        - batch_size: int - Análisis por lote
+    Retorno esperado: int - Análisis migrados
+    """
+    migrated = 0
+    after_id = 0
+    db = SessionLocal()
+    try:
+        while True:
+            batch = db.execute(
+                select(DocumentAnalysis.id, DocumentAnalysis.products_json)
+                .where(DocumentAnalysis.id > after_id, DocumentAnalysis.products_json.is_not(None))
+                .order_by(DocumentAnalysis.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                break
+            after_id = batch[-1].id
+            already = set(_load_rows(db, [row.id for row in batch]))
+            rows = []
+            for analysis_id, products_json in batch:
+                if analysis_id in already:
+                    continue
+                products = normalize_products(parse_products_json(products_json))
+                rows.extend({"analysis_id": analysis_id, "position": position, **p} for position, p in enumerate(products))
+                migrated += 1 if products else 0
+            if rows:
+                db.execute(insert(DocumentProduct), rows)
+            db.commit()
+            logger.info(f"Migración de productos: hasta el análisis {after_id}, {migrated} análisis migrados")
+        return migrated
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
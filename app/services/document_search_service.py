@@ -0,0 +1,328 @@
+"""
+Búsqueda de texto en description y summary de los análisis de documentos, con ranking y
+paginación por cursor. Según la base de datos (DOCUMENT_SEARCH_BACKEND) se resuelve con:
+- "fts5": tabla virtual FTS5 de SQLite (document_analyses_fts), ranking BM25.
+- "fulltext": índice full-text de SQL Server sobre document_analyses (CONTAINSTABLE, RANK).
+- "inverted": índice invertido propio en document_search_terms, para bases sin búsqueda de texto.
+Los índices "fts5" e "inverted" los mantiene index_analyses en la transacción de cada
+alta o actualización; el de SQL Server se actualiza solo (CHANGE_TRACKING AUTO).
+"""
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from sqlalchemy import Float, Integer, delete, func, insert, literal, select, text, union_all
+from sqlalchemy.orm import Session
+
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.document import DocumentAnalysis
+from app.models.document_search_term import DocumentSearchTerm
+from app.services.data_row_service import _escape_like
+from app.utils.logger import logger
+
+SEARCH_BACKENDS = ("fts5", "fulltext", "inverted")
+
+# Tamaño de página máximo de la búsqueda
+MAX_PAGE_SIZE = 100
+
+# Términos por búsqueda (el resto se ignora) y largo máximo de un término
+MAX_QUERY_TERMS = 10
+MAX_TERM_LENGTH = 100
+
+# IDs por sentencia IN: SQL Server admite hasta 2100 parámetros por consulta
+_IN_CHUNK = 2000
+
+FTS_TABLE = "document_analyses_fts"
+FULLTEXT_CATALOG = "document_search"
+
+_WORD_RE = re.compile(r"\w+")
+
+
+class SearchCursorError(ValueError):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: El cursor de paginación de la búsqueda no tiene el formato de next_cursor
+    Parámetros de entrada: None (clase de excepción)
+    Retorno esperado: None (clase de excepción)
+    """
+    pass
+
+
+def search_backend(bind) -> str:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Resuelve el backend de búsqueda de texto para una conexión: el de DOCUMENT_SEARCH_BACKEND o, con "auto", FTS5 en SQLite, full-text en SQL Server y el índice invertido en el resto
+    Parámetros de entrada:
+        - bind: Engine | Connection - Conexión de la sesión (db.get_bind())
+    Retorno esperado: str - "fts5", "fulltext" o "inverted"
+    Excepciones: ValueError si DOCUMENT_SEARCH_BACKEND no es un backend conocido
+    """
+    configured = settings.DOCUMENT_SEARCH_BACKEND
+    if configured != "auto":
+        if configured not in SEARCH_BACKENDS:
+            raise ValueError(f"DOCUMENT_SEARCH_BACKEND inválido: {configured}")
+        return configured
+    dialect = bind.dialect.name
+    if dialect == "sqlite":
+        return "fts5"
+    if dialect == "mssql":
+        return "fulltext"
+    return "inverted"
+
+
+def tokenize(value: Optional[str]) -> List[str]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Separa un texto en términos en minúsculas y sin tildes, igual que el tokenizador unicode61 de FTS5 con remove_diacritics
+    Parámetros de entrada:
+        - value: str | None - Texto a separar
+    Retorno esperado: list[str] - Términos en orden (con repeticiones), recortados a MAX_TERM_LENGTH
+    """
+    if not value:
+        return []
+    decomposed = unicodedata.normalize("NFKD", value.lower())
+    plain = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return [term[:MAX_TERM_LENGTH] for term in _WORD_RE.findall(plain)]
+
+
+def _term_weights(description: Optional[str], summary: Optional[str]) -> Dict[str, int]:
+    # Frecuencia por mil términos: en textos largos cada aparición pesa menos (mínimo 1)
+    terms = tokenize(description) + tokenize(summary)
+    counts = Counter(terms)
+    return {term: max(1, count * 1000 // len(terms)) for term, count in counts.items()}
+
+
+def index_analyses(db: Session, analyses: Iterable[Tuple[int, Optional[str], Optional[str]]]) -> None:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Actualiza el índice de búsqueda de los análisis dados (borra sus entradas e inserta las nuevas con sentencias masivas). Con el índice full-text de SQL Server no hace nada. No hace commit
+    Parámetros de entrada:
+        - db: Session - Sesión de base de datos del llamador
+        - analyses: Iterable[tuple] - (analysis_id, description, summary) de cada análisis nuevo o modificado
+    Retorno esperado: None
+    """
+    backend = search_backend(db.get_bind())
+    if backend == "fulltext":
+        return
+    analyses = list(analyses)
+    ids = [analysis_id for analysis_id, _, _ in analyses]
+
+    if backend == "fts5":
+        for start in range(0, len(ids), _IN_CHUNK):
+            chunk = ids[start:start + _IN_CHUNK]
+            db.execute(text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(str(int(i)) for i in chunk)})"))
+        rows = [
+            {"id": analysis_id, "description": description, "summary": summary}
+            for analysis_id, description, summary in analyses
+            if description or summary
+        ]
+        if rows:
+            db.execute(text(f"INSERT INTO {FTS_TABLE} (rowid, description, summary) VALUES (:id, :description, :summary)"), rows)
+        return
+
+    for start in range(0, len(ids), _IN_CHUNK):
+        db.execute(delete(DocumentSearchTerm).where(DocumentSearchTerm.analysis_id.in_(ids[start:start + _IN_CHUNK])))
+    rows = [
+        {"term": term, "analysis_id": analysis_id, "weight": weight}
+        for analysis_id, description, summary in analyses
+        for term, weight in _term_weights(description, summary).items()
+    ]
+    if rows:
+        db.execute(insert(DocumentSearchTerm), rows)
+
+
+def ensure_search_index(engine) -> None:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Crea el índice de búsqueda si no existe: la tabla FTS5 en SQLite o el catálogo y el índice full-text en SQL Server. La tabla del índice invertido la crea create_all
+    Parámetros de entrada:
+        - engine: Engine - Motor de SQLAlchemy
+    Retorno esperado: None
+    """
+    backend = search_backend(engine)
+    if backend == "fts5":
+        with engine.begin() as conn:
+            conn.execute(text(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} "
+                "USING fts5(description, summary, tokenize='unicode61 remove_diacritics 2')"
+            ))
+    elif backend == "fulltext":
+        table = DocumentAnalysis.__tablename__
+        # CREATE FULLTEXT INDEX no se puede ejecutar dentro de una transacción
+        with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+            if not conn.execute(text("SELECT FULLTEXTSERVICEPROPERTY('IsFullTextInstalled')")).scalar():
+                logger.warning("SQL Server no tiene Full-Text Search instalado: use DOCUMENT_SEARCH_BACKEND=inverted")
+                return
+            if conn.execute(text("SELECT 1 FROM sys.fulltext_indexes WHERE object_id = OBJECT_ID(:table)"), {"table": table}).first():
+                return
+            conn.execute(text(
+                f"IF NOT EXISTS (SELECT 1 FROM sys.fulltext_catalogs WHERE name = '{FULLTEXT_CATALOG}') "
+                f"CREATE FULLTEXT CATALOG {FULLTEXT_CATALOG}"
+            ))
+            key_index = conn.execute(
+                text("SELECT name FROM sys.indexes WHERE object_id = OBJECT_ID(:table) AND is_primary_key = 1"),
+                {"table": table},
+            ).scalar()
+            conn.execute(text(
+                f"CREATE FULLTEXT INDEX ON {table} (description, summary) KEY INDEX [{key_index}] "
+                f"ON {FULLTEXT_CATALOG} WITH CHANGE_TRACKING AUTO"
+            ))
+
+
+def _term_prefix(term: str, dialect: str):
+    # En SQLite LIKE no distingue mayúsculas y no usa el índice de term (BINARY): se usa el rango
+    # equivalente [term, term + U+10FFFF), que recorre solo los términos con ese prefijo
+    if dialect == "sqlite":
+        return (DocumentSearchTerm.term >= term) & (DocumentSearchTerm.term < term + "\U0010ffff")
+    return DocumentSearchTerm.term.like(_escape_like(term) + "%", escape="\\")
+
+
+def _ranked_matches(backend: str, terms: List[str], dialect: str):
+    # Subconsulta (id, score) con las coincidencias de todos los términos (por prefijo); mayor score = más relevante
+    if backend == "fts5":
+        return text(
+            f"SELECT rowid AS id, -bm25({FTS_TABLE}) AS score FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match"
+        ).bindparams(match=" ".join(f'"{term}"*' for term in terms)).columns(id=Integer, score=Float).subquery("ranked")
+    if backend == "fulltext":
+        return text(
+            f"SELECT ft.[KEY] AS id, ft.[RANK] AS score "
+            f"FROM CONTAINSTABLE({DocumentAnalysis.__tablename__}, (description, summary), :match) AS ft"
+        ).bindparams(match=" AND ".join(f'"{term}*"' for term in terms)).columns(id=Integer, score=Integer).subquery("ranked")
+
+    matches = union_all(*(
+        select(DocumentSearchTerm.analysis_id, literal(position).label("position"), DocumentSearchTerm.weight)
+        .where(_term_prefix(term, dialect))
+        for position, term in enumerate(terms)
+    )).subquery("matches")
+    return (
+        select(matches.c.analysis_id.label("id"), func.sum(matches.c.weight).label("score"))
+        .group_by(matches.c.analysis_id)
+        .having(func.count(matches.c.position.distinct()) == len(terms))
+        .subquery("ranked")
+    )
+
+
+def _parse_cursor(cursor: str) -> Tuple[float, int]:
+    try:
+        score, analysis_id = cursor.rsplit(":", 1)
+        return float(score), int(analysis_id)
+    except ValueError:
+        raise SearchCursorError(f"Cursor inválido: {cursor}")
+
+
+def rank_documents(db: Session, q: str, cursor: Optional[str] = None, limit: int = 20, backend: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Ejecuta la búsqueda en el índice y retorna una página de IDs de análisis ordenada por relevancia, sin leer los análisis
+    Parámetros de entrada:
+        - db: Session - Sesión de base de datos
+        - q: str - Texto a buscar; todos sus términos deben aparecer (por prefijo) en description o summary
+        - cursor: str | None - next_cursor de la página anterior
+        - limit: int - Resultados por página (máximo MAX_PAGE_SIZE)
+        - backend: str | None - Backend a usar (por defecto el de search_backend)
+    Retorno esperado: dict - {"matches": list[(analysis_id, score)], "next_cursor": str | None}
+    Excepciones: ValueError si q no tiene términos, SearchCursorError si el cursor es inválido
+    """
+    terms = list(dict.fromkeys(tokenize(q)))[:MAX_QUERY_TERMS]
+    if not terms:
+        raise ValueError("q must contain at least one word")
+    limit = min(limit, MAX_PAGE_SIZE)
+    bind = db.get_bind()
+    ranked = _ranked_matches(backend or search_backend(bind), terms, bind.dialect.name)
+
+    statement = select(ranked.c.id, ranked.c.score)
+    if cursor:
+        # Keyset sobre (score DESC, id): la página siguiente empieza después del último resultado
+        score, after_id = _parse_cursor(cursor)
+        statement = statement.where((ranked.c.score < score) | ((ranked.c.score == score) & (ranked.c.id > after_id)))
+    rows = db.execute(statement.order_by(ranked.c.score.desc(), ranked.c.id).limit(limit + 1)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {
+        "matches": [(row.id, row.score) for row in rows],
+        "next_cursor": f"{rows[-1].score!r}:{rows[-1].id}" if has_more else None,
+    }
+
+
+def search_documents(q: str, cursor: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Busca análisis por el texto de description y summary, ordenados por relevancia y paginados por cursor. Los análisis de la página se leen con una consulta IN
+    Parámetros de entrada:
+        - q: str - Texto a buscar
+        - cursor: str | None - next_cursor de la página anterior
+        - limit: int - Resultados por página (máximo MAX_PAGE_SIZE)
+    Retorno esperado: dict - {"documents": list, "next_cursor": str | None} donde cada documento tiene analysis_id, document_id, classification, description, summary y score
+    Excepciones: ValueError si q no tiene términos, SearchCursorError si el cursor es inválido
+    """
+    db = SessionLocal()
+    try:
+        page = rank_documents(db, q, cursor=cursor, limit=limit)
+        ids = [analysis_id for analysis_id, _ in page["matches"]]
+        analyses = {
+            row.id: row
+            for row in db.execute(
+                select(
+                    DocumentAnalysis.id,
+                    DocumentAnalysis.document_id,
+                    DocumentAnalysis.classification,
+                    DocumentAnalysis.description,
+                    DocumentAnalysis.summary,
+                ).where(DocumentAnalysis.id.in_(ids))
+            ).all()
+        } if ids else {}
+        return {
+            "documents": [
+                {
+                    "analysis_id": analysis_id,
+                    "document_id": analyses[analysis_id].document_id,
+                    "classification": analyses[analysis_id].classification,
+                    "description": analyses[analysis_id].description,
+                    "summary": analyses[analysis_id].summary,
+                    "score": score,
+                }
+                for analysis_id, score in page["matches"]
+                if analysis_id in analyses
+            ],
+            "next_cursor": page["next_cursor"],
+        }
+    finally:
+        db.close()
+
+
+def rebuild_search_index(batch_size: int = 1000) -> int:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Reconstruye el índice de búsqueda de todos los análisis existentes por lotes (keyset por id, un commit por lote). Con el índice full-text de SQL Server no hace nada: lo puebla SQL Server
+    Parámetros de entrada:
+        - batch_size: int - Análisis por lote
+    Retorno esperado: int - Análisis indexados
+    """
+    indexed = 0
+    after_id = 0
+    db = SessionLocal()
+    try:
+        if search_backend(db.get_bind()) == "fulltext":
+            return 0
+        while True:
+            batch = db.execute(
+                select(DocumentAnalysis.id, DocumentAnalysis.description, DocumentAnalysis.summary)
+                .where(DocumentAnalysis.id > after_id)
+                .order_by(DocumentAnalysis.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                break
+            after_id = batch[-1].id
+            index_analyses(db, [tuple(row) for row in batch])
+            db.commit()
+            indexed += len(batch)
+            logger.info(f"Índice de búsqueda: hasta el análisis {after_id}, {indexed} análisis indexados")
+        return indexed
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
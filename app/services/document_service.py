@@ -1,17 +1,105 @@
-import json
-from typing import Any, Dict, Optional
+import asyncio
+from datetime import datetime, timezone
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple
 
 from fastapi import UploadFile
 
-from app.core.aws import upload_bytes_to_s3
 from app.db.session import SessionLocal
 from app.models.document import Document, DocumentAnalysis
-from app.services.ai_client import analyze_document, AIServiceError
+from app.services.ai_client import analyze_document, analyze_document_streaming, AIServiceError
+from app.services.audit_service import log_events, build_upload_audit_events
+from app.services.blob_service import store_blob, add_blob_reference
+from app.services.document_product_service import insert_products
+from app.services.document_search_service import index_analyses
+from app.utils.date_parser import parse_invoice_date
+from app.utils.logger import logger
+from app.utils.upload_buffer import SpooledUpload
+
+# Referencias fuertes a los análisis en streaming en curso: siguen hasta guardar el resultado aunque el cliente se desconecte
+_streaming_tasks: Set[asyncio.Task] = set()
+
+
+async def _create_document(db, upload: SpooledUpload, upload_file: UploadFile, uploaded_by: Optional[str]) -> Document:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Guarda el archivo en S3/local (direccionado por SHA-256), salvo que ya esté guardado (upload.storage_path), y crea el registro base del documento con ai_status "pending"
+    Parámetros de entrada:
+        - db: Session - Sesión de base de datos
+        - upload: SpooledUpload - Contenido del archivo ya recibido
+        - upload_file: UploadFile - Archivo original (nombre y tipo MIME)
+        - uploaded_by: str | None - ID del usuario que subió el archivo
+    Retorno esperado: Document - Documento creado y confirmado
+    """
+    # Si el blob ya existe no se reescribe
+    storage_path = upload.storage_path or (await store_blob(upload.open(), upload.sha256))[0]
+
+    doc = Document(
+        filename=upload_file.filename,
+        storage_path=storage_path,
+        content_type=upload_file.content_type,
+        uploaded_by=uploaded_by,
+        ai_status="pending",
+    )
+    db.add(doc)
+    add_blob_reference(db, upload.sha256, upload.size, storage_path)
+    db.commit()
+    db.refresh(doc)
+    return doc
+
+
+def _persist_analysis(db, doc: Document, analysis_payload: Dict[str, Any] | None) -> Optional[int]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Guarda el análisis estructurado del documento (si lo hay) con sus productos en document_products (un INSERT de varias filas) y su texto en el índice de búsqueda, y confirma la transacción junto con el ai_status del documento
+    Parámetros de entrada:
+        - db: Session - Sesión de base de datos
+        - doc: Document - Documento analizado
+        - analysis_payload: dict | None - Resultado normalizado de la IA
+    Retorno esperado: int | None - ID del análisis creado o None si no hubo análisis
+    """
+    analysis_id = None
+    if analysis_payload:
+        analysis = DocumentAnalysis(
+            document_id=doc.id,
+            classification=analysis_payload.get("classification"),
+            client_name=analysis_payload.get("client_name"),
+            client_address=analysis_payload.get("client_address"),
+            provider_name=analysis_payload.get("provider_name"),
+            provider_address=analysis_payload.get("provider_address"),
+            invoice_number=analysis_payload.get("invoice_number"),
+            invoice_date=analysis_payload.get("invoice_date"),
+            invoice_date_value=parse_invoice_date(analysis_payload.get("invoice_date")),
+            total_amount=analysis_payload.get("total_amount"),
+            description=analysis_payload.get("description"),
+            summary=analysis_payload.get("summary"),
+            sentiment=analysis_payload.get("sentiment"),
+            updated_at=datetime.now(timezone.utc).replace(tzinfo=None),
+        )
+        db.add(analysis)
+        db.flush()  # Para obtener el ID sin hacer commit
+        analysis_id = analysis.id
+        insert_products(db, analysis_id, analysis_payload.get("products"))
+        index_analyses(db, [(analysis_id, analysis.description, analysis.summary)])
+
+    db.commit()
+    return analysis_id
+
+
+def _document_result(doc: Document, analysis_id: Optional[int], analysis_payload: Dict[str, Any] | None) -> Dict[str, Any]:
+    return {
+        "document_id": doc.id,
+        "analysis_id": analysis_id,  # ID del análisis para poder modificarlo después
+        "storage_path": doc.storage_path,
+        "ai_status": doc.ai_status,
+        "ai_error": doc.ai_error,
+        "analysis": analysis_payload,
+    }
 
 
 async def analyze_and_store_document(
     upload_file: UploadFile,
     uploaded_by: Optional[str] = None,
+    upload: Optional[SpooledUpload] = None,
 ) -> Dict[str, Any]:
     """
     Generado por IA - Fecha: 2024-12-19
@@ -19,34 +107,25 @@ async def analyze_and_store_document(
     Parámetros de entrada:
         - upload_file: UploadFile - Archivo a analizar (PDF, JPG, PNG)
         - uploaded_by: str | None - ID del usuario que subió el archivo (opcional)
+        - upload: SpooledUpload | None - Contenido ya recibido (carga por lotes); si trae storage_path no se vuelve a guardar. Se cierra al terminar
     Retorno esperado: dict - {"document_id": int, "analysis_id": int | None, "storage_path": str, "ai_status": str, "ai_error": str | None, "analysis": dict | None} donde ai_status puede ser "analyzed" o "ai_failed", y analysis contiene los datos extraídos si el análisis fue exitoso
     """
-    contents = await upload_file.read()
-
-    # 1) Guardar archivo en S3 o local (fallback ya manejado en upload_bytes_to_s3)
-    key = f"documents/{upload_file.filename}"
-    storage_path = upload_bytes_to_s3(contents, key)
+    # El contenido queda en un archivo temporal; storage e IA lo leen sin copias intermedias
+    if upload is None:
+        upload = await SpooledUpload.from_upload_file(upload_file)
 
     db = SessionLocal()
     try:
-        # 2) Crear registro base del documento
-        doc = Document(
-            filename=upload_file.filename,
-            storage_path=storage_path,
-            content_type=upload_file.content_type,
-            uploaded_by=uploaded_by,
-            ai_status="pending",
-        )
-        db.add(doc)
-        db.commit()
-        db.refresh(doc)
+        # 1) y 2) Guardar archivo y crear registro base del documento
+        doc = await _create_document(db, upload, upload_file, uploaded_by)
 
         analysis_payload: Dict[str, Any] | None = None
 
-        # 3) Intentar análisis con IA
+        # 3) Intentar análisis con IA (llamada bloqueante: se ejecuta fuera del event loop)
         try:
-            analysis_payload = analyze_document(
-                contents,
+            analysis_payload = await asyncio.to_thread(
+                analyze_document,
+                upload.getbuffer(),
                 filename=upload_file.filename,
                 content_type=upload_file.content_type,
             )
@@ -58,43 +137,95 @@ async def analyze_and_store_document(
             analysis_payload = None
 
         # 4) Guardar análisis estructurado si lo hay
-        analysis_id = None
-        if analysis_payload:
-            products = analysis_payload.get("products") or []
-            products_json = json.dumps(products, ensure_ascii=False)
-
-            analysis = DocumentAnalysis(
-                document_id=doc.id,
-                classification=analysis_payload.get("classification"),
-                client_name=analysis_payload.get("client_name"),
-                client_address=analysis_payload.get("client_address"),
-                provider_name=analysis_payload.get("provider_name"),
-                provider_address=analysis_payload.get("provider_address"),
-                invoice_number=analysis_payload.get("invoice_number"),
-                invoice_date=analysis_payload.get("invoice_date"),
-                total_amount=analysis_payload.get("total_amount"),
-                products_json=products_json,
-                description=analysis_payload.get("description"),
-                summary=analysis_payload.get("summary"),
-                sentiment=analysis_payload.get("sentiment"),
-            )
-            db.add(analysis)
-            db.flush()  # Para obtener el ID sin hacer commit
-            analysis_id = analysis.id
-
-        db.commit()
-
-        return {
-            "document_id": doc.id,
-            "analysis_id": analysis_id,  # ID del análisis para poder modificarlo después
-            "storage_path": doc.storage_path,
-            "ai_status": doc.ai_status,
-            "ai_error": doc.ai_error,
-            "analysis": analysis_payload,
-        }
+        analysis_id = _persist_analysis(db, doc, analysis_payload)
+
+        return _document_result(doc, analysis_id, analysis_payload)
     finally:
         db.close()
+        upload.close()
 
 
+async def _run_streaming_analysis(
+    upload: SpooledUpload,
+    upload_file: UploadFile,
+    uploaded_by: Optional[str],
+    queue: "asyncio.Queue[Tuple[str, Any]]",
+) -> None:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Ejecuta el flujo de analyze_and_store_document usando el análisis en streaming y publica en la cola cada evento ("document", "field", "product") y al final "done" con el resultado completo o "error"
+    Parámetros de entrada:
+        - upload: SpooledUpload - Contenido del archivo (se cierra al terminar)
+        - upload_file: UploadFile - Archivo original (nombre y tipo MIME)
+        - uploaded_by: str | None - ID del usuario que subió el archivo
+        - queue: asyncio.Queue - Cola de eventos hacia el cliente
+    Retorno esperado: None
+    """
+    loop = asyncio.get_running_loop()
 
+    def on_event(event: str, data: Any) -> None:
+        # Se invoca desde el hilo del análisis
+        loop.call_soon_threadsafe(queue.put_nowait, (event, data))
 
+    db = SessionLocal()
+    try:
+        doc = await _create_document(db, upload, upload_file, uploaded_by)
+        queue.put_nowait(("document", {"document_id": doc.id, "storage_path": doc.storage_path}))
+
+        try:
+            analysis_payload = await asyncio.to_thread(
+                analyze_document_streaming,
+                upload.getbuffer(),
+                upload_file.filename,
+                upload_file.content_type,
+                on_event,
+            )
+            doc.ai_status = "analyzed"
+        except AIServiceError as e:
+            doc.ai_status = "ai_failed"
+            doc.ai_error = str(e)
+            analysis_payload = None
+
+        analysis_id = _persist_analysis(db, doc, analysis_payload)
+        result = _document_result(doc, analysis_id, analysis_payload)
+        # Los eventos de IA se encolaron con call_soon_threadsafe antes de que terminara el hilo: "done" queda al final
+        queue.put_nowait(("done", result))
+        await asyncio.to_thread(log_events, build_upload_audit_events(upload_file.filename, uploaded_by, result, False))
+    except Exception as e:
+        logger.exception("Error en el análisis en streaming de %s", upload_file.filename)
+        queue.put_nowait(("error", {"detail": str(e)}))
+    finally:
+        db.close()
+        upload.close()
+
+
+async def stream_analyze_and_store_document(
+    upload_file: UploadFile,
+    uploaded_by: Optional[str] = None,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Variante en streaming de analyze_and_store_document. Recibe el archivo (los errores de tamaño se lanzan aquí, antes de empezar a emitir) y lanza el análisis en segundo plano; el iterador retornado entrega los eventos en cuanto están disponibles: "document" (documento creado), "field" (classification primero, luego encabezado), "product" (cada producto), y finalmente "done" con el mismo resultado que analyze_and_store_document o "error". El resultado completo se guarda en DocumentAnalysis aunque el cliente se desconecte
+    Parámetros de entrada:
+        - upload_file: UploadFile - Archivo a analizar (PDF, JPG, PNG)
+        - uploaded_by: str | None - ID del usuario que subió el archivo (opcional)
+    Retorno esperado: AsyncIterator[tuple[str, Any]] - Pares (evento, datos)
+    Excepciones: UploadTooLargeError si el archivo supera MAX_UPLOAD_FILE_BYTES
+    """
+    # Copia propia del contenido: FastAPI cierra el UploadFile al terminar la petición, pero la tarea
+    # en segundo plano sigue guardando el documento y el análisis aunque el cliente se desconecte
+    upload = await SpooledUpload.from_upload_file(upload_file, copy=True)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    task = asyncio.create_task(_run_streaming_analysis(upload, upload_file, uploaded_by, queue))
+    _streaming_tasks.add(task)
+    task.add_done_callback(_streaming_tasks.discard)
+
+    async def _events() -> AsyncIterator[Tuple[str, Any]]:
+        while True:
+            event, data = await queue.get()
+            yield event, data
+            if event in ("done", "error"):
+                return
+
+    return _events()
@@ -1,13 +1,98 @@
 """
 Servicio para actualizar análisis de documentos.
 """
-import json
-from typing import Optional, Dict, Any, List
+from datetime import datetime, timezone
+from typing import Optional, Dict, Any, Iterable, List
+
+from sqlalchemy import bindparam, select, update
 
 from app.db.session import SessionLocal
 from app.models.document import DocumentAnalysis
+from app.services.analysis_cache_service import CachedAnalysis, analysis_cache
+from app.services.document_product_service import load_products, parse_products_json, sync_products
+from app.services.document_search_service import index_analyses
+from app.utils.date_parser import parse_invoice_date
 from app.utils.logger import logger
 
+class AnalysisVersionConflictError(Exception):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: El análisis fue modificado después de la versión que el cliente leyó (If-Match no coincide)
+    Parámetros de entrada: None (clase de excepción)
+    Retorno esperado: None (clase de excepción)
+    """
+    pass
+
+
+# IDs por sentencia IN: SQL Server admite hasta 2100 parámetros por consulta
+_IN_CHUNK = 2000
+
+# Campos que se pueden actualizar (products se guarda en la tabla document_products)
+UPDATABLE_FIELDS = (
+    "classification", "client_name", "client_address", "provider_name", "provider_address",
+    "invoice_number", "invoice_date", "total_amount", "products", "description", "summary", "sentiment",
+)
+
+# Campos del índice de búsqueda de texto (document_search_service)
+SEARCH_FIELDS = ("description", "summary")
+
+
+def _analysis_to_dict(analysis: DocumentAnalysis, products: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Convierte un análisis al diccionario de respuesta con sus productos de document_products. Los análisis aún no migrados (sin filas de productos) usan products_json
+    Parámetros de entrada:
+        - analysis: DocumentAnalysis | Row - Análisis cargado o fila de la tabla
+        - products: list[dict] | None - Productos del análisis leídos de document_products
+    Retorno esperado: dict - id, document_id, classification, client_name, client_address, provider_name, provider_address, invoice_number, invoice_date, total_amount, products, description, summary, sentiment, version, updated_at (ISO 8601 en UTC o None si el análisis no se escribió desde que existe la columna)
+    """
+    products_list = products
+    if not products_list and analysis.products_json:
+        products_list = parse_products_json(analysis.products_json)
+
+    return {
+        "id": analysis.id,
+        "document_id": analysis.document_id,
+        "classification": analysis.classification,
+        "client_name": analysis.client_name,
+        "client_address": analysis.client_address,
+        "provider_name": analysis.provider_name,
+        "provider_address": analysis.provider_address,
+        "invoice_number": analysis.invoice_number,
+        "invoice_date": analysis.invoice_date,
+        "total_amount": analysis.total_amount,
+        "products": products_list,
+        "description": analysis.description,
+        "summary": analysis.summary,
+        "sentiment": analysis.sentiment,
+        "version": analysis.version,
+        "updated_at": analysis.updated_at.isoformat() if analysis.updated_at else None,
+    }
+
+
+def _update_values(fields: Dict[str, Any]) -> Dict[str, Any]:
+    # Columnas a actualizar: los campos en None no se modifican. products no es una columna (lo escribe
+    # sync_products); al cambiarlo se limpia products_json para que no quede una copia vieja.
+    # invoice_date se normaliza además en invoice_date_value para las búsquedas por rango de fechas
+    values = {}
+    for field in UPDATABLE_FIELDS:
+        value = fields.get(field)
+        if value is None:
+            continue
+        if field == "products":
+            values["products_json"] = None
+        elif field == "invoice_date":
+            values["invoice_date"] = value
+            values["invoice_date_value"] = parse_invoice_date(value)
+        else:
+            values[field] = value
+    return values
+
+
+def _utcnow() -> datetime:
+    # updated_at se guarda en UTC sin zona (igual en todos los motores): es el Last-Modified de GET /analysis/{id}
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
 
 def update_document_analysis(
     analysis_id: int,
@@ -23,10 +108,11 @@ def update_document_analysis(
     description: Optional[str] = None,
     summary: Optional[str] = None,
     sentiment: Optional[str] = None,
+    expected_versions: Optional[List[int]] = None,
 ) -> Dict[str, Any]:
     """
     Generado por IA - Fecha: 2024-12-19
-    Descripción: Actualiza un análisis de documento existente en la base de datos. Solo actualiza los campos proporcionados (actualización parcial)
+    Descripción: Actualiza un análisis de documento existente en la base de datos. Solo actualiza los campos proporcionados (actualización parcial). La actualización es una sola sentencia compare-and-swap sobre la columna version, que se incrementa en cada cambio junto con updated_at
     Parámetros de entrada:
         - analysis_id: int - ID del análisis a actualizar
         - classification: str | None - Clasificación del documento ("FACTURA" o "INFORMACION", opcional)
@@ -37,78 +123,69 @@ def update_document_analysis(
         - invoice_number: str | None - Número de factura (opcional)
         - invoice_date: str | None - Fecha de factura (opcional)
         - total_amount: float | None - Monto total de la factura (opcional)
-        - products: list[dict] | None - Lista de productos con name, quantity, unit_price, total (opcional)
+        - products: list[dict] | None - Lista de productos con name, quantity, unit_price, total (opcional). Reemplaza los productos del análisis; en document_products solo se escriben las líneas que cambiaron
         - description: str | None - Descripción del contenido para documentos informativos (opcional)
         - summary: str | None - Resumen del contenido (opcional)
         - sentiment: str | None - Sentimiento ("positivo", "negativo", "neutral") (opcional)
-    Retorno esperado: dict - Diccionario con el análisis actualizado incluyendo todos los campos (id, document_id, classification, client_name, etc., con products parseado desde JSON)
-    Excepciones: ValueError si el análisis no existe
+        - expected_versions: list[int] | None - Versiones aceptadas (If-Match); None actualiza cualquier versión
+    Retorno esperado: dict - Diccionario con el análisis actualizado incluyendo todos los campos (id, document_id, classification, client_name, etc., con sus products, y la nueva version)
+    Excepciones: ValueError si el análisis no existe, AnalysisVersionConflictError si la versión actual no es una de expected_versions
     """
+    values = _update_values({
+        "classification": classification,
+        "client_name": client_name,
+        "client_address": client_address,
+        "provider_name": provider_name,
+        "provider_address": provider_address,
+        "invoice_number": invoice_number,
+        "invoice_date": invoice_date,
+        "total_amount": total_amount,
+        "products": products,
+        "description": description,
+        "summary": summary,
+        "sentiment": sentiment,
+    })
+    table = DocumentAnalysis.__table__
+
     db = SessionLocal()
     try:
-        # Buscar el análisis
-        analysis = db.query(DocumentAnalysis).filter(DocumentAnalysis.id == analysis_id).first()
-        
-        if not analysis:
-            raise ValueError(f"Análisis con ID {analysis_id} no encontrado")
-        
-        # Actualizar campos si se proporcionan
-        if classification is not None:
-            analysis.classification = classification
-        
-        if client_name is not None:
-            analysis.client_name = client_name
-        if client_address is not None:
-            analysis.client_address = client_address
-        if provider_name is not None:
-            analysis.provider_name = provider_name
-        if provider_address is not None:
-            analysis.provider_address = provider_address
-        if invoice_number is not None:
-            analysis.invoice_number = invoice_number
-        if invoice_date is not None:
-            analysis.invoice_date = invoice_date
-        if total_amount is not None:
-            analysis.total_amount = total_amount
-        
+        # Compare-and-swap: una sola sentencia UPDATE ... WHERE id AND version, que incrementa la versión
+        statement = (
+            update(table)
+            .where(table.c.id == analysis_id)
+            .values(**values, version=table.c.version + 1, updated_at=_utcnow())
+        )
+        if expected_versions is not None:
+            statement = statement.where(table.c.version.in_(expected_versions))
+        # RETURNING (OUTPUT en SQL Server) entrega la fila actualizada sin un SELECT adicional
+        returning = db.get_bind().dialect.update_returning
+        if returning:
+            statement = statement.returning(*table.c)
+        result = db.execute(statement)
+        row = result.first() if returning else None
+        updated = row is not None if returning else result.rowcount > 0
+
+        if not updated:
+            current_version = db.execute(select(table.c.version).where(table.c.id == analysis_id)).scalar()
+            if current_version is None:
+                raise ValueError(f"Análisis con ID {analysis_id} no encontrado")
+            raise AnalysisVersionConflictError(
+                f"Análisis con ID {analysis_id} fue modificado por otro usuario (versión actual {current_version})"
+            )
+        if row is None:
+            row = db.execute(select(table).where(table.c.id == analysis_id)).first()
+        # Índice de búsqueda y productos en la misma transacción que el UPDATE: si no cambiaron no se leen de nuevo
+        if any(field in values for field in SEARCH_FIELDS):
+            index_analyses(db, [(row.id, row.description, row.summary)])
         if products is not None:
-            products_json = json.dumps(products, ensure_ascii=False)
-            analysis.products_json = products_json
-        
-        if description is not None:
-            analysis.description = description
-        if summary is not None:
-            analysis.summary = summary
-        if sentiment is not None:
-            analysis.sentiment = sentiment
-        
+            current_products = sync_products(db, {analysis_id: products})[analysis_id]
+        else:
+            current_products = load_products(db, [analysis_id]).get(analysis_id)
+
         db.commit()
-        db.refresh(analysis)
-        
-        # Parsear products_json si existe
-        products_list = None
-        if analysis.products_json:
-            try:
-                products_list = json.loads(analysis.products_json)
-            except (json.JSONDecodeError, TypeError):
-                products_list = []
-        
-        return {
-            "id": analysis.id,
-            "document_id": analysis.document_id,
-            "classification": analysis.classification,
-            "client_name": analysis.client_name,
-            "client_address": analysis.client_address,
-            "provider_name": analysis.provider_name,
-            "provider_address": analysis.provider_address,
-            "invoice_number": analysis.invoice_number,
-            "invoice_date": analysis.invoice_date,
-            "total_amount": analysis.total_amount,
-            "products": products_list,
-            "description": analysis.description,
-            "summary": analysis.summary,
-            "sentiment": analysis.sentiment,
-        }
+        # Las lecturas siguientes vuelven a cargar el análisis desde la base de datos
+        analysis_cache.invalidate(analysis_id)
+        return _analysis_to_dict(row, current_products)
         
     except Exception as e:
         db.rollback()
@@ -124,7 +201,7 @@ def get_document_analysis(analysis_id: int) -> Optional[Dict[str, Any]]:
     Descripción: Obtiene un análisis de documento por su ID desde la base de datos
     Parámetros de entrada:
         - analysis_id: int - ID del análisis a obtener
-    Retorno esperado: dict | None - Diccionario con el análisis completo (id, document_id, classification, client_name, provider_name, invoice_number, total_amount, products, description, summary, sentiment) o None si no existe. El campo products se parsea desde JSON
+    Retorno esperado: dict | None - Diccionario con el análisis completo (id, document_id, classification, client_name, provider_name, invoice_number, total_amount, products, description, summary, sentiment) o None si no existe. El campo products se lee de document_products
     """
     db = SessionLocal()
     try:
@@ -133,30 +210,7 @@ def get_document_analysis(analysis_id: int) -> Optional[Dict[str, Any]]:
         if not analysis:
             return None
         
-        # Parsear products_json si existe
-        products_list = None
-        if analysis.products_json:
-            try:
-                products_list = json.loads(analysis.products_json)
-            except (json.JSONDecodeError, TypeError):
-                products_list = []
-        
-        return {
-            "id": analysis.id,
-            "document_id": analysis.document_id,
-            "classification": analysis.classification,
-            "client_name": analysis.client_name,
-            "client_address": analysis.client_address,
-            "provider_name": analysis.provider_name,
-            "provider_address": analysis.provider_address,
-            "invoice_number": analysis.invoice_number,
-            "invoice_date": analysis.invoice_date,
-            "total_amount": analysis.total_amount,
-            "products": products_list,
-            "description": analysis.description,
-            "summary": analysis.summary,
-            "sentiment": analysis.sentiment,
-        }
+        return _analysis_to_dict(analysis, load_products(db, [analysis_id]).get(analysis_id))
         
     except Exception as e:
         logger.error(f"Error al obtener análisis de documento: {e}")
@@ -164,3 +218,155 @@ def get_document_analysis(analysis_id: int) -> Optional[Dict[str, Any]]:
     finally:
         db.close()
 
+
+def get_cached_document_analysis(analysis_id: int) -> Optional[CachedAnalysis]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Variante de get_document_analysis para GET /files/analysis/{analysis_id}: retorna la respuesta ya serializada desde la caché de lectura y solo consulta la base de datos si no está cacheada (la invalida update_document_analysis)
+    Parámetros de entrada:
+        - analysis_id: int - ID del análisis a obtener
+    Retorno esperado: CachedAnalysis | None - Respuesta con body (JSON), etag y last_modified, o None si el análisis no existe
+    """
+    return analysis_cache.get_or_load(analysis_id, get_document_analysis)
+
+
+def _load_analyses(db, analysis_ids: List[int]) -> Dict[int, Dict[str, Any]]:
+    analyses = []
+    for start in range(0, len(analysis_ids), _IN_CHUNK):
+        chunk = analysis_ids[start:start + _IN_CHUNK]
+        analyses.extend(db.execute(select(DocumentAnalysis).where(DocumentAnalysis.id.in_(chunk))).scalars())
+    # Productos de todos los análisis con una consulta IN por bloque
+    products = load_products(db, [analysis.id for analysis in analyses])
+    return {analysis.id: _analysis_to_dict(analysis, products.get(analysis.id)) for analysis in analyses}
+
+
+def get_document_analyses(analysis_ids: Iterable[int]) -> Dict[int, Dict[str, Any]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Obtiene varios análisis y sus productos con una sola sesión y una consulta IN por bloque de IDs
+    Parámetros de entrada:
+        - analysis_ids: Iterable[int] - IDs de los análisis
+    Retorno esperado: dict[int, dict] - Análisis por ID (mismo formato que get_document_analysis); los inexistentes no se incluyen
+    """
+    db = SessionLocal()
+    try:
+        return _load_analyses(db, list(dict.fromkeys(analysis_ids)))
+    except Exception as e:
+        logger.error(f"Error al obtener análisis de documentos: {e}")
+        raise
+    finally:
+        db.close()
+
+
+def get_cached_document_analyses(analysis_ids: Iterable[int]) -> Dict[int, CachedAnalysis]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Variante de get_document_analyses para POST /files/analysis/batch-get: los análisis cacheados no se consultan y el resto se carga en una sola lectura
+    Parámetros de entrada:
+        - analysis_ids: Iterable[int] - IDs de los análisis
+    Retorno esperado: dict[int, CachedAnalysis] - Respuestas serializadas por ID; los inexistentes no se incluyen
+    """
+    return analysis_cache.get_many_or_load(analysis_ids, get_document_analyses)
+
+
+def update_document_analyses(updates: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Aplica varias actualizaciones parciales en una sola transacción: verifica que todos los análisis existan (y sus versiones) con una consulta IN, ejecuta UPDATE masivos por clave primaria y versión (un executemany compare-and-swap por combinación de campos, incrementando version), sincroniza los productos de todos los análisis por diferencias, actualiza el índice de búsqueda de los que cambiaron description o summary y relee los análisis con otra consulta IN. Como en update_document_analysis, los campos en None no se modifican. Si algún análisis no está en la versión esperada no se aplica ningún cambio
+    Parámetros de entrada:
+        - updates: list[dict] - Actualizaciones con "id", opcionalmente "version" (versión leída; sin ella se acepta cualquier versión) y los campos a modificar (ver UPDATABLE_FIELDS). Si un ID se repite, sus campos se combinan y gana el último valor
+    Retorno esperado: list[dict] - Análisis actualizados, en el orden de sus IDs en updates
+    Excepciones: ValueError si algún análisis no existe, AnalysisVersionConflictError con los IDs cuya versión actual no es la esperada (en ambos casos no se aplica ningún cambio)
+    """
+    merged: Dict[int, Dict[str, Any]] = {}
+    products: Dict[int, List[Dict[str, Any]]] = {}
+    expected: Dict[int, Optional[int]] = {}
+    for item in updates:
+        merged.setdefault(item["id"], {}).update(_update_values(item))
+        if item.get("products") is not None:
+            products[item["id"]] = item["products"]
+        if item.get("version") is not None:
+            # Un ID repetido con versiones distintas nunca puede coincidir con ambas
+            previous = expected.setdefault(item["id"], item["version"])
+            if previous != item["version"]:
+                expected[item["id"]] = -1
+    analysis_ids = list(merged)
+    table = DocumentAnalysis.__table__
+
+    db = SessionLocal()
+    try:
+        current: Dict[int, int] = {}
+        for start in range(0, len(analysis_ids), _IN_CHUNK):
+            chunk = analysis_ids[start:start + _IN_CHUNK]
+            current.update(db.execute(select(table.c.id, table.c.version).where(table.c.id.in_(chunk))).all())
+        missing = [analysis_id for analysis_id in analysis_ids if analysis_id not in current]
+        if missing:
+            raise ValueError(f"Análisis con ID {', '.join(map(str, missing))} no encontrado")
+        _check_versions(expected, current)
+
+        # Un UPDATE con executemany por combinación de columnas; cada análisis modificado incrementa su versión.
+        # La condición sobre version repite el compare-and-swap de update_document_analysis fila a fila: si otro
+        # usuario guardó entre la lectura anterior y el UPDATE, esa fila no coincide y el lote se revierte
+        groups: Dict[tuple, List[Dict[str, Any]]] = {}
+        for analysis_id, values in merged.items():
+            if values:
+                row = {"b_id": analysis_id, **values}
+                if analysis_id in expected:
+                    row["b_version"] = expected[analysis_id]
+                groups.setdefault((tuple(sorted(values)), analysis_id in expected), []).append(row)
+        # Sin rowcount por executemany (pyodbc) las filas se ejecutan una a una para poder contar las coincidencias
+        sane_rowcount = db.get_bind().dialect.supports_sane_multi_rowcount
+        updated_at = _utcnow()
+        matched_all = True
+        for (columns, versioned), rows in groups.items():
+            statement = (
+                update(table)
+                .where(table.c.id == bindparam("b_id"))
+                .values({
+                    **{column: bindparam(column) for column in columns},
+                    "version": table.c.version + 1,
+                    "updated_at": updated_at,
+                })
+            )
+            if versioned:
+                statement = statement.where(table.c.version == bindparam("b_version"))
+            if sane_rowcount:
+                matched_all &= db.execute(statement, rows).rowcount == len(rows)
+            else:
+                matched_all &= all(db.execute(statement, row).rowcount == 1 for row in rows)
+        if not matched_all:
+            # Se revierte todo el lote y se informan los análisis que cambiaron desde la lectura
+            db.rollback()
+            current = {}
+            for start in range(0, len(analysis_ids), _IN_CHUNK):
+                chunk = analysis_ids[start:start + _IN_CHUNK]
+                current.update(db.execute(select(table.c.id, table.c.version).where(table.c.id.in_(chunk))).all())
+            _check_versions(expected, current)
+            raise AnalysisVersionConflictError("Análisis modificados por otro usuario durante la actualización")
+        if products:
+            sync_products(db, products)
+        searchable = [analysis_id for analysis_id, values in merged.items() if any(field in values for field in SEARCH_FIELDS)]
+        for start in range(0, len(searchable), _IN_CHUNK):
+            index_analyses(db, db.execute(
+                select(table.c.id, table.c.description, table.c.summary).where(table.c.id.in_(searchable[start:start + _IN_CHUNK]))
+            ).all())
+        db.commit()
+        analysis_cache.invalidate(*analysis_ids)
+
+        analyses = _load_analyses(db, analysis_ids)
+        return [analyses[analysis_id] for analysis_id in analysis_ids]
+
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error al actualizar análisis de documentos: {e}")
+        raise
+    finally:
+        db.close()
+
+
+def _check_versions(expected: Dict[int, Optional[int]], current: Dict[int, Optional[int]]) -> None:
+    conflicts = [analysis_id for analysis_id, version in expected.items() if current.get(analysis_id) != version]
+    if conflicts:
+        raise AnalysisVersionConflictError(
+            f"Análisis con ID {', '.join(map(str, conflicts))} fueron modificados por otro usuario"
+        )
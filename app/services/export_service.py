@@ -0,0 +1,215 @@
+"""
+Exportación columnar de las filas cargadas (DataRow) a Parquet, Arrow IPC o CSV.
+
+Las filas se leen del cursor de la base de datos por lotes como tuplas (sin crear objetos
+del ORM por fila), se convierten a record batches de Arrow y se escriben de forma
+incremental a la respuesta HTTP o al almacenamiento.
+"""
+import asyncio
+import csv
+import io
+import time
+from tempfile import SpooledTemporaryFile
+from typing import Any, Dict, Iterator, List, Tuple
+
+from sqlalchemy import select
+
+from app.core.config import settings
+from app.core.storage import get_storage
+from app.db.session import SessionLocal
+from app.models.data_row import DataRow
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc as pa_ipc
+    import pyarrow.parquet as pq
+    _has_pyarrow = True
+except Exception:
+    _has_pyarrow = False
+
+# Columnas exportadas, en orden
+EXPORT_COLUMNS = ["id", "external_id", "name", "price", "uploaded_by"]
+
+# Formato -> (tipo MIME, extensión)
+EXPORT_FORMATS = {
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+    "arrow": ("application/vnd.apache.arrow.stream", "arrows"),
+    "csv": ("text/csv", "csv"),
+}
+
+
+class ExportError(Exception):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Formato de exportación desconocido o no disponible en este entorno
+    Parámetros de entrada: None (clase de excepción)
+    Retorno esperado: None (clase de excepción)
+    """
+    pass
+
+
+def check_export_format(export_format: str) -> None:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Valida el formato antes de empezar a transmitir la respuesta
+    Parámetros de entrada:
+        - export_format: str - "parquet", "arrow" o "csv"
+    Retorno esperado: None
+    Excepciones: ExportError si el formato no existe o requiere pyarrow y no está instalado
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ExportError(f"Unsupported export format: {export_format}")
+    if export_format != "csv" and not _has_pyarrow:
+        raise ExportError(f"pyarrow is required to export {export_format}")
+
+
+def _arrow_schema():
+    return pa.schema([
+        ("id", pa.int64()),
+        ("external_id", pa.string()),
+        ("name", pa.string()),
+        ("price", pa.float64()),
+        ("uploaded_by", pa.string()),
+    ])
+
+
+def _iter_row_batches(file_id: int, batch_rows: int) -> Iterator[List[Tuple[Any, ...]]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Lee las filas de un archivo desde el cursor de la base de datos en lotes de tuplas, en orden de id
+    Parámetros de entrada:
+        - file_id: int - ID del archivo
+        - batch_rows: int - Filas por lote
+    Retorno esperado: Iterator[list[tuple]] - Lotes de (id, external_id, name, price, uploaded_by)
+    """
+    db = SessionLocal()
+    try:
+        statement = (
+            select(DataRow.id, DataRow.external_id, DataRow.name, DataRow.price, DataRow.uploaded_by)
+            .where(DataRow.file_id == file_id, DataRow.deleted_at.is_(None))
+            .order_by(DataRow.id)
+            .execution_options(stream_results=True, yield_per=batch_rows)
+        )
+        for partition in db.execute(statement).partitions(batch_rows):
+            yield [tuple(row) for row in partition]
+    finally:
+        db.close()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Salida de solo escritura que acumula los bytes escritos hasta que se retiran con drain()."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+        self._position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        chunk = bytes(data)
+        self._chunks.append(chunk)
+        self._position += len(chunk)
+        return len(chunk)
+
+    def tell(self) -> int:
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def _record_batch(rows: List[Tuple[Any, ...]], schema):
+    # Transpone el lote de tuplas a columnas y construye cada arreglo de Arrow de una vez
+    columns = list(zip(*rows))
+    return pa.RecordBatch.from_arrays(
+        [pa.array(column, type=field.type) for column, field in zip(columns, schema)],
+        schema=schema,
+    )
+
+
+def iter_export(file_id: int, export_format: str, batch_rows: int | None = None) -> Iterator[bytes]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Genera el contenido exportado por fragmentos a medida que se leen los lotes. En Parquet cada lote es un row group comprimido con estadísticas por columna (min/max/nulos); en Arrow cada lote es un record batch del formato IPC de streaming
+    Parámetros de entrada:
+        - file_id: int - ID del archivo
+        - export_format: str - "parquet", "arrow" o "csv"
+        - batch_rows: int | None - Filas por lote (None usa EXPORT_BATCH_ROWS)
+    Retorno esperado: Iterator[bytes] - Fragmentos del archivo exportado
+    Excepciones: ExportError si el formato no es válido o no está disponible
+    """
+    check_export_format(export_format)
+    batch_rows = batch_rows or settings.EXPORT_BATCH_ROWS
+    batches = _iter_row_batches(file_id, batch_rows)
+
+    if export_format == "csv":
+        text = io.StringIO()
+        writer = csv.writer(text)
+        writer.writerow(EXPORT_COLUMNS)
+        for rows in batches:
+            writer.writerows(rows)
+            yield text.getvalue().encode("utf-8")
+            text.seek(0)
+            text.truncate()
+        if text.tell():
+            yield text.getvalue().encode("utf-8")
+        return
+
+    sink = _ChunkSink()
+    schema = _arrow_schema()
+    if export_format == "parquet":
+        writer = pq.ParquetWriter(
+            sink,
+            schema,
+            compression=settings.EXPORT_PARQUET_COMPRESSION,
+            write_statistics=True,
+        )
+        write = lambda batch: writer.write_batch(batch, row_group_size=batch_rows)
+    else:
+        writer = pa_ipc.new_stream(sink, schema)
+        write = writer.write_batch
+
+    try:
+        for rows in batches:
+            write(_record_batch(rows, schema))
+            chunk = sink.drain()
+            if chunk:
+                yield chunk
+    finally:
+        # Cierra el archivo: footer de Parquet / marca de fin del stream Arrow
+        writer.close()
+    yield sink.drain()
+
+
+def _export_to_spool(file_id: int, export_format: str) -> Tuple[SpooledTemporaryFile, int]:
+    spool = SpooledTemporaryFile(max_size=settings.UPLOAD_SPOOL_MAX_MEMORY_BYTES)
+    size = 0
+    for chunk in iter_export(file_id, export_format):
+        spool.write(chunk)
+        size += len(chunk)
+    spool.seek(0)
+    return spool, size
+
+
+async def export_to_storage(file_id: int, export_format: str) -> Dict[str, Any]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Exporta las filas de un archivo y guarda el resultado en el almacenamiento (S3/local) bajo STORAGE_EXPORT_PREFIX. La lectura y escritura del archivo se hacen fuera del event loop
+    Parámetros de entrada:
+        - file_id: int - ID del archivo
+        - export_format: str - "parquet", "arrow" o "csv"
+    Retorno esperado: dict - {"file_id": int, "format": str, "storage_path": str, "bytes": int}
+    Excepciones: ExportError si el formato no es válido o no está disponible
+    """
+    check_export_format(export_format)
+    spool, size = await asyncio.to_thread(_export_to_spool, file_id, export_format)
+    try:
+        extension = EXPORT_FORMATS[export_format][1]
+        key = f"{settings.STORAGE_EXPORT_PREFIX}/{file_id}/{int(time.time())}.{extension}"
+        storage_path = await get_storage().put(spool, key)
+    finally:
+        spool.close()
+    return {"file_id": file_id, "format": export_format, "storage_path": storage_path, "bytes": size}
@@ -1,11 +1,17 @@
-import csv
-from io import StringIO, BytesIO
+import asyncio
+from functools import partial
+import numpy as np
 import pandas as pd
-from app.core.aws import upload_bytes_to_s3
 from app.db.session import SessionLocal
 from app.models.file_model import File
-from app.models.file_validation import FileValidation
-from app.models.data_row import DataRow
+from app.core.config import settings
+from app.services.blob_service import store_blob, add_blob_reference
+from app.services.delta_ingest_service import DeltaSync, find_previous_file, insert_rows, replace_file_version
+from app.services.name_index_service import name_hash, probe_names, register_names, sync_file_names
+from app.services.validation_service import ValidationSummary, save_validations
+from app.utils.csv_reader import iter_csv_batches
+from app.utils.excel_reader import ALL_SHEETS, iter_excel_batches
+from app.utils.upload_buffer import SpooledUpload
 
 def _is_empty_value(value):
     """
@@ -65,114 +71,350 @@ def _validate_row_basic(row, row_num):
     
     return errors, name_normalized
 
-async def handle_upload(upload_file, parametro1: str, parametro2: str, uploaded_by: str = None):
+def is_tabular_file(content_type: str | None, filename: str | None) -> bool:
     """
     Generado por IA - Fecha: 2024-12-19
-    Descripción: Procesa y valida un archivo CSV o Excel, guardándolo en S3/local y almacenando los datos validados en la base de datos
+    Descripción: Determina si un archivo es tabular (CSV o Excel) a partir de su content_type y extensión
     Parámetros de entrada:
-        - upload_file: UploadFile - Archivo CSV o Excel a procesar
-        - parametro1: str - Primer parámetro requerido (nombre de columna 1)
-        - parametro2: str - Segundo parámetro requerido (nombre de columna 2)
-        - uploaded_by: str | None - ID del usuario que subió el archivo (opcional)
-    Retorno esperado: dict - {"file_id": int, "s3_path": str, "rows_saved": int, "validations": list} con el ID del archivo guardado, ruta de almacenamiento, número de filas guardadas y lista de validaciones/errores encontrados
+        - content_type: str | None - Tipo MIME del archivo
+        - filename: str | None - Nombre del archivo
+    Retorno esperado: bool - True si el archivo es CSV/Excel, False si es un documento
+    """
+    content_type = (content_type or "").lower()
+    filename = (filename or "").lower()
+    return (
+        "csv" in content_type
+        or filename.endswith(".csv")
+        or filename.endswith(".xlsx")
+        or filename.endswith(".xls")
+        or "excel" in content_type
+        or "spreadsheet" in content_type
+    )
+
+def _iter_row_batches(upload, is_excel: bool, sheets: str = None):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Lee el archivo subido por lotes de filas con las columnas normalizadas (sin espacios extremos, minúsculas y "_" en lugar de espacios). Excel se recorre en modo streaming con app.utils.excel_reader y CSV con app.utils.csv_reader (codificación y separador detectados con los primeros KB)
+    Parámetros de entrada:
+        - upload: SpooledUpload - Contenido del archivo
+        - is_excel: bool - True para Excel, False para CSV
+        - sheets: str | None - Solo Excel: selección de hojas (None la primera, "*" todas o nombres separados por coma)
+    Retorno esperado: Iterator[tuple[str | None, list[dict] | DataFrame]] - (hoja o None para CSV, lote de filas; DataFrame con id, name y price como texto para los motores CSV columnares)
+    Excepciones: ExcelReadError si una hoja pedida no existe
     """
-    contents = await upload_file.read()
-    # store original file (S3 or local)
-    key = f"uploads/{upload_file.filename}"
-    storage_path = upload_bytes_to_s3(contents, key)
-    
-    # Detectar tipo de archivo y procesar
-    filename_lower = (upload_file.filename or "").lower()
-    is_excel = filename_lower.endswith((".xlsx", ".xls"))
-    
-    # Leer datos según el tipo de archivo
     if is_excel:
-        # Procesar Excel con pandas
-        df = pd.read_excel(BytesIO(contents), engine='openpyxl')
-        # Normalizar nombres de columnas: eliminar espacios y convertir a minúsculas
-        df.columns = df.columns.str.strip().str.lower().str.replace(' ', '_')
-        # Convertir DataFrame a lista de diccionarios (similar a CSV DictReader)
-        # Convertir NaN a None para compatibilidad
-        rows = df.replace({pd.NA: None, pd.NaT: None}).to_dict('records')
-    else:
-        # Procesar CSV
-        text = contents.decode('utf-8-sig')
-        reader = csv.DictReader(StringIO(text))
-        # Normalizar nombres de columnas del CSV también
-        rows = []
-        for row in reader:
-            normalized_row = {k.strip().lower().replace(' ', '_'): v for k, v in row.items()}
-            rows.append(normalized_row)
-    
-    # Primera pasada: validar todas las filas (sin duplicados)
+        yield from iter_excel_batches(upload.open(), sheets)
+        return
+    for batch in iter_csv_batches(upload.open()):
+        yield None, batch
+
+def _validate_rows(rows, first_row: int, seen_names: set, uploaded_by: str = None):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Valida un lote de filas como diccionarios: validaciones básicas y luego duplicados solo entre filas válidas
+    Parámetros de entrada:
+        - rows: list[dict] - Filas con las columnas normalizadas
+        - first_row: int - Número de fila de la primera fila del lote
+        - seen_names: set - Nombres ya aceptados en el archivo (se actualiza)
+        - uploaded_by: str | None - ID del usuario que subió el archivo
+    Retorno esperado: tuple - (rows_to_insert: list[dict], row_numbers: list[int], validations: list[dict]) donde row_numbers es el número de fila de cada fila a insertar
+    """
     validations = []
-    valid_rows_data = []  # Almacena (row_num, row, name_normalized) de filas que pasan validación básica
-    
-    row_num = 0
-    for row in rows:
-        row_num += 1
-        # Validar la fila (validaciones básicas)
+    rows_to_insert = []
+    row_numbers = []
+    for row_num, row in enumerate(rows, start=first_row):
         errs, name_normalized = _validate_row_basic(row, row_num)
-        
-        # Agregar todos los errores encontrados
+        if not errs and name_normalized in seen_names:
+            errs = [{'row': row_num, 'column': 'name', 'error': 'DUPLICATE', 'message': f'duplicate name: {name_normalized}'}]
         if errs:
             validations.extend(errs)
+            continue
+        seen_names.add(name_normalized)
+
+        # Obtener external_id (opcional, puede ser None)
+        external_id = row.get('id')
+        if _is_empty_value(external_id):
+            external_id = None
         else:
-            # Si pasa validación básica, guardar para segunda pasada (validar duplicados)
-            valid_rows_data.append((row_num, row, name_normalized))
-    
-    # Segunda pasada: validar duplicados solo entre filas válidas
-    seen_names = set()
+            external_id = str(external_id).strip() if external_id else None
+
+        # Agregar la fila ya validada (price ya validado como numérico)
+        rows_to_insert.append({
+            'external_id': external_id,
+            'name': name_normalized,
+            'price': float(row.get('price')),
+            'uploaded_by': uploaded_by
+        })
+        row_numbers.append(row_num)
+    return rows_to_insert, row_numbers, validations
+
+def _validate_frame(frame, first_row: int, seen_names: set, uploaded_by: str = None):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Variante vectorizada de _validate_rows para lotes de los motores CSV columnares. Los campos vacíos y el precio se validan por columna; solo las filas con error y la detección de duplicados se recorren en Python. Produce las mismas validaciones y filas que _validate_rows
+    Parámetros de entrada:
+        - frame: DataFrame - Lote con las columnas id, name y price como texto
+        - first_row: int - Número de fila de la primera fila del lote
+        - seen_names: set - Nombres ya aceptados en el archivo (se actualiza)
+        - uploaded_by: str | None - ID del usuario que subió el archivo
+    Retorno esperado: tuple - (rows_to_insert: list[dict], row_numbers: list[int], validations: list[dict])
+    """
+    names = frame['name'].str.strip().to_numpy(dtype=object)
+    ids = frame['id'].str.strip().to_numpy(dtype=object)
+    price_raw = frame['price'].to_numpy(dtype=object)
+    name_empty = names == ''
+    price_empty = frame['price'].str.strip().to_numpy(dtype=object) == ''
+
+    # Conversión en C con float() de Python por elemento (mismas reglas que la validación fila a fila).
+    # Si el lote tiene precios no numéricos, to_numeric los ubica y solo esos se revisan uno a uno
+    prices = np.full(len(frame), np.nan)
+    price_type = np.zeros(len(frame), dtype=bool)
+    filled = ~price_empty
+    try:
+        prices[filled] = price_raw[filled].astype(np.float64)
+    except (ValueError, TypeError):
+        suspect = filled & pd.to_numeric(frame['price'], errors='coerce').isna().to_numpy()
+        numeric = filled & ~suspect
+        try:
+            prices[numeric] = price_raw[numeric].astype(np.float64)
+        except (ValueError, TypeError):
+            suspect = filled
+        for i in np.flatnonzero(suspect):
+            try:
+                prices[i] = float(price_raw[i])
+            except (ValueError, TypeError):
+                price_type[i] = True
+
+    validations = []
+    invalid = name_empty | price_empty | price_type
+    for i in np.flatnonzero(invalid):
+        row_num = first_row + int(i)
+        if name_empty[i]:
+            validations.append({'row': row_num, 'column': 'name', 'error': 'EMPTY', 'message': 'name is required and cannot be empty'})
+        if price_empty[i]:
+            validations.append({'row': row_num, 'column': 'price', 'error': 'EMPTY', 'message': 'price is required and cannot be empty'})
+        elif price_type[i]:
+            validations.append({'row': row_num, 'column': 'price', 'error': 'TYPE', 'message': 'price must be numeric'})
+
     rows_to_insert = []
-    
-    for row_num, row, name_normalized in valid_rows_data:
-        # Verificar duplicados
-        if name_normalized in seen_names:
-            validations.append({'row': row_num, 'column': 'name', 'error': 'DUPLICATE', 'message': f'duplicate name: {name_normalized}'})
+    row_numbers = []
+    valid = ~invalid
+    for i, name, external_id, price in zip(np.flatnonzero(valid), names[valid], ids[valid], prices[valid]):
+        if name in seen_names:
+            validations.append({'row': first_row + int(i), 'column': 'name', 'error': 'DUPLICATE', 'message': f'duplicate name: {name}'})
+            continue
+        seen_names.add(name)
+        rows_to_insert.append({
+            'external_id': external_id or None,
+            'name': name,
+            'price': float(price),
+            'uploaded_by': uploaded_by
+        })
+        row_numbers.append(first_row + int(i))
+    # Mismo orden que fila a fila (sort estable: name antes que price en una misma fila)
+    validations.sort(key=lambda v: v['row'])
+    return rows_to_insert, row_numbers, validations
+
+def _reject_known_names(rows, row_numbers, known_names):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Descarta las filas de un lote cuyo nombre ya fue cargado en otro archivo, con una sola consulta por lote al índice de nombres
+    Parámetros de entrada:
+        - rows: list[dict] - Filas válidas del lote
+        - row_numbers: list[int] - Número de fila de cada una
+        - known_names: Callable[[list[str]], dict[str, int]] - Consulta de hashes ya registrados (ver name_index_service.probe_names)
+    Retorno esperado: tuple - (rows_to_insert: list[dict], validations: list[dict]) con un DUPLICATE por cada fila descartada
+    """
+    hashes = [name_hash(row['name']) for row in rows]
+    known = known_names(hashes)
+    if not known:
+        return rows, []
+    kept = []
+    validations = []
+    for row, row_num, hashed in zip(rows, row_numbers, hashes):
+        file_id = known.get(hashed)
+        if file_id is None:
+            kept.append(row)
         else:
-            seen_names.add(name_normalized)
-            
-            # Preparar la fila para insertar (ya validada completamente)
-            # Convertir price a float
-            price_raw = row.get('price')
-            price_val = float(price_raw)  # Ya validado que es numérico
-            
-            # Obtener external_id (opcional, puede ser None)
-            external_id = row.get('id')
-            if _is_empty_value(external_id):
-                external_id = None
-            else:
-                external_id = str(external_id).strip() if external_id else None
-            
-            # Agregar a la lista de filas válidas para insertar
-            rows_to_insert.append({
-                'external_id': external_id,
-                'name': name_normalized,
-                'price': price_val,
-                'uploaded_by': uploaded_by
-            })
-    # save metadata and rows
+            validations.append({'row': row_num, 'column': 'name', 'error': 'DUPLICATE', 'message': f"duplicate name: {row['name']} (already uploaded in file {file_id})"})
+    return kept, validations
+
+def _iter_validated_batches(batches, uploaded_by: str = None, annotate_sheet: bool = False, known_names=None):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Valida las filas a medida que llegan los lotes (campos requeridos, precio numérico y nombres duplicados entre filas válidas de todo el archivo) y entrega cada lote validado sin acumularlos. Los lotes DataFrame se validan de forma vectorizada
+    Parámetros de entrada:
+        - batches: Iterable[tuple[str | None, list[dict] | DataFrame]] - Lotes de filas (ver _iter_row_batches)
+        - uploaded_by: str | None - ID del usuario que subió el archivo
+        - annotate_sheet: bool - Si es True cada validación incluye "sheet" (lectura de varias hojas; los números de fila son por hoja)
+        - known_names: Callable | None - Si se indica, también se rechazan los nombres ya cargados en archivos anteriores (una consulta por lote, ver _reject_known_names)
+    Retorno esperado: Iterator[tuple] - (rows_to_insert: list[dict], validations: list[dict]) por lote
+    """
+    seen_names = set()
+    current_sheet = None
+    next_row = 1
+
+    for sheet, rows in batches:
+        if sheet != current_sheet:
+            # Los números de fila se reinician en cada hoja
+            current_sheet = sheet
+            next_row = 1
+        validate = _validate_frame if isinstance(rows, pd.DataFrame) else _validate_rows
+        batch_rows, row_numbers, batch_validations = validate(rows, next_row, seen_names, uploaded_by)
+        next_row += len(rows)
+        if known_names is not None and batch_rows:
+            batch_rows, duplicates = _reject_known_names(batch_rows, row_numbers, known_names)
+            if duplicates:
+                batch_validations.extend(duplicates)
+                batch_validations.sort(key=lambda v: v['row'])
+        if annotate_sheet:
+            for v in batch_validations:
+                v['sheet'] = sheet
+        yield batch_rows, batch_validations
+
+def _validate_batches(batches, uploaded_by: str = None, annotate_sheet: bool = False, known_names=None):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Valida todos los lotes y junta el resultado (ver _iter_validated_batches)
+    Parámetros de entrada:
+        - batches: Iterable[tuple[str | None, list[dict] | DataFrame]] - Lotes de filas (ver _iter_row_batches)
+        - uploaded_by: str | None - ID del usuario que subió el archivo
+        - annotate_sheet: bool - Si es True cada validación incluye "sheet"
+        - known_names: Callable | None - Consulta de nombres ya cargados en archivos anteriores
+    Retorno esperado: tuple - (rows_to_insert: list[dict], validations: list[dict])
+    """
+    rows_to_insert = []
+    validations = []
+    for batch_rows, batch_validations in _iter_validated_batches(batches, uploaded_by, annotate_sheet, known_names):
+        rows_to_insert.extend(batch_rows)
+        validations.extend(batch_validations)
+    return rows_to_insert, validations
+
+def _ingest_rows(upload, filename: str, is_excel: bool, sheets: str, uploaded_by: str, storage_path: str, previous_id: int = None, index_names: bool = False, delta: bool = False):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Lee, valida y guarda el archivo lote a lote en una sola transacción: cada lote validado se inserta (o se sincroniza con la versión anterior en modo delta) y sus validaciones se guardan antes de leer el siguiente, así que en memoria solo queda un lote de filas. Ejecuta en un hilo de trabajo con su propia sesión
+    Parámetros de entrada:
+        - upload: SpooledUpload - Contenido del archivo
+        - filename: str | None - Nombre del archivo
+        - is_excel: bool - True para Excel, False para CSV
+        - sheets: str | None - Solo Excel: selección de hojas
+        - uploaded_by: str | None - ID del usuario que subió el archivo
+        - storage_path: str - Ruta del blob ya guardado
+        - previous_id: int | None - Versión anterior (carga delta) que la nueva reemplaza
+        - index_names: bool - True para rechazar y registrar nombres en el índice por usuario (DUPLICATE_NAME_SCOPE="uploader")
+        - delta: bool - True si se pidió carga delta (el resultado incluye "delta")
+    Retorno esperado: dict - Resultado de handle_upload
+    Excepciones: FileNotFoundError si previous_id ya no existe, ExcelReadError si una hoja pedida no existe. Ante cualquier error no se guarda nada
+    """
+    annotate_sheet = bool(is_excel and sheets and (sheets.strip() == ALL_SHEETS or ',' in sheets))
     db = SessionLocal()
     try:
-        file_rec = File(filename=upload_file.filename, storage_path=storage_path, uploaded_by=uploaded_by)
-        db.add(file_rec)
-        db.commit()
-        db.refresh(file_rec)
-        # insert rows
-        for r in rows_to_insert:
-            dr = DataRow(**r)
-            db.add(dr)
-        db.commit()
-        # save validations
-        for v in validations:
-            fv = FileValidation(file_id=file_rec.id, row_number=v['row'], column_name=v['column'], error_code=v['error'], message=v.get('message'))
-            db.add(fv)
+        previous_file = db.get(File, previous_id) if previous_id is not None else None
+        if previous_id is not None and previous_file is None:
+            raise FileNotFoundError(f"File {previous_id} not found")
+
+        if previous_file is not None:
+            # Delta: la nueva versión reemplaza a la anterior y solo se escriben las filas que cambiaron
+            file_rec = previous_file
+            add_blob_reference(db, upload.sha256, upload.size, storage_path)
+            replace_file_version(db, file_rec, storage_path)
+            delta_sync = DeltaSync(db, file_rec.id)
+        else:
+            file_rec = File(filename=filename, storage_path=storage_path, uploaded_by=uploaded_by)
+            db.add(file_rec)
+            add_blob_reference(db, upload.sha256, upload.size, storage_path)
+            db.flush()
+            delta_sync = None
+
+        # Misma sesión para consultar el índice de nombres: una sesión aparte esperaría los bloqueos de esta transacción
+        known_names = partial(probe_names, db, uploaded_by, exclude_file_id=previous_id) if index_names else None
+        summary = ValidationSummary(settings.VALIDATION_SAMPLE_SIZE)
+        rows_added = 0
+        current_hashes = []
+        for batch_rows, batch_validations in _iter_validated_batches(_iter_row_batches(upload, is_excel, sheets), uploaded_by, annotate_sheet, known_names):
+            if delta_sync is not None:
+                delta_sync.apply(batch_rows)
+                if index_names:
+                    current_hashes.extend(name_hash(row['name']) for row in batch_rows)
+            else:
+                # INSERT por lotes, con el hash de cada fila para futuras cargas delta
+                insert_rows(db, file_rec.id, batch_rows)
+                rows_added += len(batch_rows)
+                if index_names:
+                    register_names(db, uploaded_by, file_rec.id, [name_hash(row['name']) for row in batch_rows])
+            # el detalle completo se consulta en GET /files/{file_id}/validations
+            save_validations(db, file_rec.id, batch_validations)
+            summary.add(batch_validations)
+
+        if delta_sync is not None:
+            delta_counts = delta_sync.finish()
+            rows_saved = delta_counts['changed'] + delta_counts['added']
+            if index_names:
+                sync_file_names(db, uploaded_by, file_rec.id, current_hashes)
+        else:
+            delta_counts = {'unchanged': 0, 'changed': 0, 'added': rows_added, 'removed': 0} if delta else None
+            rows_saved = rows_added
         db.commit()
+
+        result = summary.result()
         return {
             'file_id': file_rec.id,
             's3_path': storage_path,
-            'rows_saved': len(rows_to_insert),
-            'validations': validations
+            'rows_saved': rows_saved,
+            'validations': result['samples'],
+            'validation_summary': {k: v for k, v in result.items() if k != 'samples'},
+            **({'delta': delta_counts} if delta else {})
         }
+    except Exception:
+        db.rollback()
+        raise
     finally:
         db.close()
+
+async def handle_upload(upload_file, parametro1: str, parametro2: str, uploaded_by: str = None, delta: bool = False, previous_file_id: int = None, sheets: str = None, upload: SpooledUpload = None):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Procesa y valida un archivo CSV o Excel, guardándolo en S3/local y almacenando los datos validados en la base de datos. El archivo se lee, valida y guarda lote a lote en una sola transacción fuera del event loop (ver _ingest_rows); Excel se lee en modo streaming y puede incluir varias hojas
+    Parámetros de entrada:
+        - upload_file: UploadFile - Archivo CSV o Excel a procesar
+        - parametro1: str - Primer parámetro requerido (nombre de columna 1)
+        - parametro2: str - Segundo parámetro requerido (nombre de columna 2)
+        - uploaded_by: str | None - ID del usuario que subió el archivo (opcional)
+        - delta: bool - Si es True y existe una versión anterior del archivo (mismo nombre y usuario, o previous_file_id), solo se escriben las filas que cambiaron respecto de ella
+        - previous_file_id: int | None - ID explícito de la versión anterior en modo delta
+        - sheets: str | None - Solo Excel: hojas a leer (None la primera, "*" todas o nombres separados por coma). Con varias hojas las validaciones incluyen "sheet"
+        - upload: SpooledUpload | None - Contenido ya recibido (carga por lotes); si trae storage_path no se vuelve a guardar. Se cierra al terminar
+    Con DUPLICATE_NAME_SCOPE="uploader" también se rechazan como DUPLICATE los nombres que el usuario ya cargó en otros archivos (tabla name_index)
+    Retorno esperado: dict - {"file_id": int, "s3_path": str, "rows_saved": int, "validations": list, "validation_summary": dict} con el ID del archivo guardado, ruta de almacenamiento, número de filas escritas, las primeras VALIDATION_SAMPLE_SIZE validaciones y el resumen {"total", "by_error", "by_column", "truncated"}. En modo delta incluye además "delta": {"unchanged", "changed", "added", "removed"} y file_id es el del archivo lógico
+    Excepciones: FileNotFoundError si previous_file_id no existe, ExcelReadError si una hoja pedida no existe
+    """
+    # Delta: la versión anterior se resuelve antes de leer, para no contar sus nombres como duplicados
+    previous_id = None
+    if delta:
+        db = SessionLocal()
+        try:
+            previous_file = find_previous_file(db, upload_file.filename, uploaded_by, previous_file_id)
+            previous_id = previous_file.id if previous_file is not None else None
+        finally:
+            db.close()
+        if previous_file_id is not None and previous_id is None:
+            raise FileNotFoundError(f"File {previous_file_id} not found")
+
+    index_names = settings.DUPLICATE_NAME_SCOPE == "uploader" and uploaded_by is not None
+
+    # El contenido queda en un archivo temporal: storage y parsers leen del mismo handle sin copiarlo
+    if upload is None:
+        upload = await SpooledUpload.from_upload_file(upload_file)
+    try:
+        # store original file (S3 or local), content-addressed: identical re-uploads are not rewritten
+        storage_path = upload.storage_path or (await store_blob(upload.open(), upload.sha256))[0]
+
+        # Leer, validar y guardar por lotes (trabajo de CPU y base de datos fuera del event loop)
+        filename_lower = (upload_file.filename or "").lower()
+        is_excel = filename_lower.endswith((".xlsx", ".xls"))
+        return await asyncio.to_thread(
+            _ingest_rows, upload, upload_file.filename, is_excel, sheets, uploaded_by, storage_path, previous_id, index_names, delta,
+        )
+    finally:
+        upload.close()
@@ -0,0 +1,273 @@
+"""
+Idempotencia de las cargas mediante el header Idempotency-Key: la primera petición
+con una clave se ejecuta y su respuesta se guarda (por usuario y clave) durante un TTL;
+los duplicados concurrentes esperan ese resultado y los posteriores reciben la
+respuesta guardada sin volver a tocar almacenamiento, base de datos ni IA.
+"""
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Awaitable, Callable, List, Optional, Set, Tuple
+
+from app.core.config import settings
+from app.utils.metrics import metrics
+
+# Longitud máxima aceptada para la clave (mismo límite que usan las APIs públicas habituales)
+MAX_KEY_LENGTH = 255
+
+# Referencias fuertes a las respuestas en streaming en curso: siguen hasta completar la clave aunque el cliente se desconecte
+_drain_tasks: Set[asyncio.Task] = set()
+
+
+class IdempotencyError(Exception):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Error base de idempotencia
+    Parámetros de entrada: None (clase de excepción)
+    Retorno esperado: None (clase de excepción)
+    """
+    pass
+
+
+class InvalidIdempotencyKeyError(IdempotencyError):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: La clave está vacía o supera MAX_KEY_LENGTH
+    Parámetros de entrada: None (clase de excepción)
+    Retorno esperado: None (clase de excepción)
+    """
+    pass
+
+
+class IdempotencyKeyMismatchError(IdempotencyError):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: La clave ya se usó con una petición distinta (otro endpoint, archivos o parámetros)
+    Parámetros de entrada: None (clase de excepción)
+    Retorno esperado: None (clase de excepción)
+    """
+    pass
+
+
+def request_fingerprint(*parts: Any) -> str:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Huella de los datos que identifican una petición (endpoint, nombres y SHA-256 de los archivos, parámetros) para detectar una clave reutilizada con otra petición
+    Parámetros de entrada:
+        - parts: Any - Valores serializables a JSON
+    Retorno esperado: str - SHA-256 hex de los valores
+    """
+    return hashlib.sha256(json.dumps(parts, ensure_ascii=False, default=str).encode("utf-8")).hexdigest()
+
+
+class _Entry:
+    def __init__(self, fingerprint: str, future: "asyncio.Future"):
+        self.fingerprint = fingerprint
+        self.future = future
+        self.expires_at: Optional[float] = None
+
+
+class IdempotencyStore:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Almacén en memoria de respuestas por (usuario, clave). Mientras la primera petición está en curso la entrada guarda un Future que los duplicados esperan; al terminar guarda el resultado hasta que vence el TTL. Si la primera petición falla la entrada se descarta para permitir el reintento
+    Parámetros de entrada:
+        - ttl_seconds: float - Tiempo que se conserva una respuesta terminada
+        - max_entries: int - Máximo de respuestas guardadas (se descartan primero las más antiguas)
+    Retorno esperado: None (almacén con estado; usar desde el event loop)
+    """
+
+    def __init__(self, ttl_seconds: float, max_entries: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Tuple[str, str], _Entry]" = OrderedDict()
+
+    def _purge(self, now: float) -> None:
+        expired = [key for key, entry in self._entries.items() if entry.expires_at is not None and entry.expires_at <= now]
+        for key in expired:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            oldest = next((key for key, entry in self._entries.items() if entry.expires_at is not None), None)
+            if oldest is None:
+                break
+            del self._entries[oldest]
+
+    def begin(self, user_id: Optional[str], key: str, fingerprint: str) -> Tuple[bool, "asyncio.Future"]:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Reserva la clave para la petición actual o retorna la entrada existente
+        Parámetros de entrada:
+            - user_id: str | None - Usuario dueño de la clave
+            - key: str - Valor del header Idempotency-Key
+            - fingerprint: str - Huella de la petición (ver request_fingerprint)
+        Retorno esperado: tuple[bool, Future] - (True si esta petición debe ejecutarse, Future con el resultado)
+        Excepciones: InvalidIdempotencyKeyError si la clave no es válida, IdempotencyKeyMismatchError si la clave se usó con otra petición
+        """
+        if not key or len(key) > MAX_KEY_LENGTH:
+            raise InvalidIdempotencyKeyError(f"Idempotency-Key must have between 1 and {MAX_KEY_LENGTH} characters")
+
+        self._purge(time.monotonic())
+        scope = (str(user_id), key)
+        entry = self._entries.get(scope)
+        if entry is not None:
+            if entry.fingerprint != fingerprint:
+                raise IdempotencyKeyMismatchError("Idempotency-Key was already used with a different request")
+            metrics.increment("idempotency.replayed" if entry.future.done() else "idempotency.waited")
+            return False, entry.future
+
+        entry = _Entry(fingerprint, asyncio.get_running_loop().create_future())
+        self._entries[scope] = entry
+        metrics.increment("idempotency.started")
+        return True, entry.future
+
+    def complete(self, user_id: Optional[str], key: str, value: Any) -> None:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Guarda el resultado de la petición dueña de la clave y despierta a los duplicados en espera
+        Parámetros de entrada:
+            - user_id: str | None - Usuario dueño de la clave
+            - key: str - Clave reservada con begin()
+            - value: Any - Respuesta a reutilizar
+        Retorno esperado: None
+        """
+        entry = self._entries.get((str(user_id), key))
+        if entry is None or entry.future.done():
+            return
+        entry.future.set_result(value)
+        entry.expires_at = time.monotonic() + self.ttl_seconds
+        self._entries.move_to_end((str(user_id), key))
+
+    def fail(self, user_id: Optional[str], key: str, error: BaseException) -> None:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Libera la clave tras una falla: los duplicados en espera reciben el mismo error y la próxima petición con la clave se ejecuta de nuevo
+        Parámetros de entrada:
+            - user_id: str | None - Usuario dueño de la clave
+            - key: str - Clave reservada con begin()
+            - error: BaseException - Error de la petición dueña
+        Retorno esperado: None
+        """
+        entry = self._entries.pop((str(user_id), key), None)
+        if entry is None or entry.future.done():
+            return
+        if not isinstance(error, Exception):
+            # Cancelación o desconexión: los duplicados no deben verse cancelados
+            error = IdempotencyError("The original request did not finish")
+        entry.future.set_exception(error)
+        # Evita el aviso "exception was never retrieved" cuando no hay duplicados esperando
+        entry.future.exception()
+
+    async def run(
+        self,
+        user_id: Optional[str],
+        key: str,
+        fingerprint: str,
+        factory: Callable[[], Awaitable[Any]],
+    ) -> Tuple[Any, bool]:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Ejecuta factory una sola vez por (usuario, clave) y reutiliza su resultado
+        Parámetros de entrada:
+            - user_id: str | None - Usuario dueño de la clave
+            - key: str - Valor del header Idempotency-Key
+            - fingerprint: str - Huella de la petición
+            - factory: Callable[[], Awaitable[Any]] - Procesamiento real de la petición
+        Retorno esperado: tuple[Any, bool] - (resultado, True si es una respuesta repetida)
+        Excepciones: Las de begin() y las que lance factory
+        """
+        owner, future = self.begin(user_id, key, fingerprint)
+        if not owner:
+            return await _wait(future), True
+        try:
+            value = await factory()
+        except BaseException as e:
+            self.fail(user_id, key, e)
+            raise
+        self.complete(user_id, key, value)
+        return value, False
+
+    async def run_stream(
+        self,
+        user_id: Optional[str],
+        key: str,
+        fingerprint: str,
+        factory: Callable[[], Awaitable[AsyncIterator[str]]],
+    ) -> Tuple[AsyncIterator[str], bool]:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Variante de run para respuestas en streaming (NDJSON/SSE): la primera petición se transmite en vivo mientras se guardan sus fragmentos, y los duplicados reciben los mismos fragmentos cuando el original termina. El stream lo consume una tarea propia del almacén, no el cliente: si el cliente original se desconecta el procesamiento sigue hasta el final y completa la clave, de modo que el reintento espera o repite ese resultado en lugar de procesar de nuevo
+        Parámetros de entrada:
+            - user_id: str | None - Usuario dueño de la clave
+            - key: str - Valor del header Idempotency-Key
+            - fingerprint: str - Huella de la petición
+            - factory: Callable[[], Awaitable[AsyncIterator[str]]] - Prepara la respuesta (puede lanzar errores de validación) y retorna el iterador de fragmentos
+        Retorno esperado: tuple[AsyncIterator[str], bool] - (fragmentos, True si es una respuesta repetida)
+        Excepciones: Las de begin() y las que lance factory
+        """
+        owner, future = self.begin(user_id, key, fingerprint)
+        if not owner:
+            chunks: List[str] = await _wait(future)
+            return _replay(chunks), True
+        try:
+            stream = await factory()
+        except BaseException as e:
+            self.fail(user_id, key, e)
+            raise
+        live: asyncio.Queue = asyncio.Queue()
+        task = asyncio.create_task(self._drain(user_id, key, stream, live))
+        _drain_tasks.add(task)
+        task.add_done_callback(_drain_tasks.discard)
+        return _follow(live), False
+
+    async def _drain(self, user_id: Optional[str], key: str, stream: AsyncIterator[str], live: "asyncio.Queue") -> None:
+        chunks: List[str] = []
+        try:
+            async for chunk in stream:
+                chunks.append(chunk)
+                live.put_nowait(chunk)
+        except BaseException as e:
+            # La falla del propio procesamiento (no la desconexión del cliente) sí libera la clave
+            self.fail(user_id, key, e)
+            live.put_nowait(_StreamEnd(e))
+            if not isinstance(e, Exception):
+                raise
+            return
+        self.complete(user_id, key, chunks)
+        live.put_nowait(_StreamEnd())
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+async def _wait(future: "asyncio.Future") -> Any:
+    # shield: si el duplicado se cancela (cliente desconectado) no se cancela el resultado compartido
+    return future.result() if future.done() else await asyncio.shield(future)
+
+
+async def _replay(chunks: List[str]) -> AsyncIterator[str]:
+    for chunk in chunks:
+        yield chunk
+
+
+class _StreamEnd:
+    def __init__(self, error: Optional[BaseException] = None):
+        self.error = error
+
+
+async def _follow(live: "asyncio.Queue") -> AsyncIterator[str]:
+    # Entrega en vivo lo que consume _drain; cortar este iterador no detiene el procesamiento
+    while True:
+        item = await live.get()
+        if isinstance(item, _StreamEnd):
+            if isinstance(item.error, Exception):
+                raise item.error
+            return
+        yield item
+
+
+idempotency_store = IdempotencyStore(
+    ttl_seconds=settings.IDEMPOTENCY_TTL_SECONDS,
+    max_entries=settings.IDEMPOTENCY_MAX_ENTRIES,
+)
@@ -0,0 +1,215 @@
+"""
+Búsqueda y totales de facturas sobre DocumentAnalysis, resueltos en la base de datos
+con los índices de app/db/indexes.py (DOCUMENT_ANALYSIS_INDEXES).
+"""
+from datetime import date
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import bindparam, extract, func, select, update
+
+from app.db.session import SessionLocal
+from app.models.document import DocumentAnalysis
+from app.services.data_row_service import _escape_like
+from app.utils.date_parser import parse_invoice_date
+from app.utils.logger import logger
+
+# Tamaño de página máximo de la búsqueda
+MAX_PAGE_SIZE = 1000
+
+INVOICE_CLASSIFICATION = "FACTURA"
+
+_INVOICE_COLUMNS = (
+    DocumentAnalysis.id,
+    DocumentAnalysis.document_id,
+    DocumentAnalysis.provider_name,
+    DocumentAnalysis.client_name,
+    DocumentAnalysis.invoice_number,
+    DocumentAnalysis.invoice_date,
+    DocumentAnalysis.invoice_date_value,
+    DocumentAnalysis.total_amount,
+)
+
+
+def _invoice_to_dict(row) -> Dict[str, Any]:
+    return {
+        "id": row.id,
+        "document_id": row.document_id,
+        "provider_name": row.provider_name,
+        "client_name": row.client_name,
+        "invoice_number": row.invoice_number,
+        "invoice_date": row.invoice_date,
+        "invoice_date_value": row.invoice_date_value.isoformat() if row.invoice_date_value else None,
+        "total_amount": row.total_amount,
+    }
+
+
+def _filter_invoices(
+    statement,
+    provider_name: Optional[str] = None,
+    client_name: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+):
+    statement = statement.where(DocumentAnalysis.classification == INVOICE_CLASSIFICATION)
+    # Prefijo (LIKE 'x%'): usa los índices por proveedor y cliente, a diferencia de '%x%'
+    if provider_name:
+        statement = statement.where(DocumentAnalysis.provider_name.like(_escape_like(provider_name) + "%", escape="\\"))
+    if client_name:
+        statement = statement.where(DocumentAnalysis.client_name.like(_escape_like(client_name) + "%", escape="\\"))
+    if date_from is not None:
+        statement = statement.where(DocumentAnalysis.invoice_date_value >= date_from)
+    if date_to is not None:
+        statement = statement.where(DocumentAnalysis.invoice_date_value <= date_to)
+    return statement
+
+
+def search_invoices(
+    provider_name: Optional[str] = None,
+    client_name: Optional[str] = None,
+    invoice_number: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+    min_amount: Optional[float] = None,
+    max_amount: Optional[float] = None,
+    after_id: Optional[int] = None,
+    limit: int = 100,
+) -> Dict[str, Any]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Busca facturas analizadas por prefijo de proveedor y/o cliente, número de factura exacto y rango de fechas (sobre invoice_date_value), con filtro de monto y paginación por keyset
+    Parámetros de entrada:
+        - provider_name: str | None - Prefijo del nombre del proveedor
+        - client_name: str | None - Prefijo del nombre del cliente
+        - invoice_number: str | None - Número de factura exacto
+        - date_from: date | None - Fecha de factura mínima (inclusive)
+        - date_to: date | None - Fecha de factura máxima (inclusive)
+        - min_amount: float | None - Monto total mínimo (inclusive)
+        - max_amount: float | None - Monto total máximo (inclusive)
+        - after_id: int | None - Cursor: next_after_id de la página anterior
+        - limit: int - Facturas por página (máximo MAX_PAGE_SIZE)
+    Retorno esperado: dict - {"invoices": list, "next_after_id": int | None} donde cada factura tiene id, document_id, provider_name, client_name, invoice_number, invoice_date, invoice_date_value (ISO) y total_amount
+    Excepciones: ValueError si no se indica ningún filtro (proveedor, cliente, número de factura, fecha o monto)
+    """
+    # Cada filtro tiene un índice que lo resuelve (DOCUMENT_ANALYSIS_INDEXES); sin ninguno se recorrerían todas las facturas
+    if not (provider_name or client_name or invoice_number or date_from or date_to
+            or min_amount is not None or max_amount is not None):
+        raise ValueError("provider_name, client_name, invoice_number, a date range or an amount range is required")
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    db = SessionLocal()
+    try:
+        statement = _filter_invoices(select(*_INVOICE_COLUMNS), provider_name, client_name, date_from, date_to)
+        if invoice_number:
+            statement = statement.where(DocumentAnalysis.invoice_number == invoice_number)
+        if min_amount is not None:
+            statement = statement.where(DocumentAnalysis.total_amount >= min_amount)
+        if max_amount is not None:
+            statement = statement.where(DocumentAnalysis.total_amount <= max_amount)
+        if after_id is not None:
+            statement = statement.where(DocumentAnalysis.id > after_id)
+
+        rows = db.execute(statement.order_by(DocumentAnalysis.id).limit(limit + 1)).all()
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "invoices": [_invoice_to_dict(row) for row in rows],
+            "next_after_id": rows[-1].id if has_more else None,
+        }
+    finally:
+        db.close()
+
+
+def sum_invoices_by_provider_month(
+    provider_name: Optional[str] = None,
+    date_from: Optional[date] = None,
+    date_to: Optional[date] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suma total_amount de las facturas por proveedor y mes con un GROUP BY en la base de datos. Las facturas sin fecha normalizada no se incluyen
+    Parámetros de entrada:
+        - provider_name: str | None - Prefijo del nombre del proveedor
+        - date_from: date | None - Fecha de factura mínima (inclusive)
+        - date_to: date | None - Fecha de factura máxima (inclusive)
+    Retorno esperado: list[dict] - {"provider_name", "month" ("AAAA-MM"), "invoice_count", "total_amount"} ordenados por proveedor y mes
+    """
+    year = extract("year", DocumentAnalysis.invoice_date_value)
+    month = extract("month", DocumentAnalysis.invoice_date_value)
+
+    db = SessionLocal()
+    try:
+        statement = _filter_invoices(
+            select(
+                DocumentAnalysis.provider_name,
+                year.label("year"),
+                month.label("month"),
+                func.count().label("invoice_count"),
+                func.sum(DocumentAnalysis.total_amount).label("total_amount"),
+            ),
+            provider_name,
+            None,
+            date_from,
+            date_to,
+        ).where(DocumentAnalysis.invoice_date_value.is_not(None))
+        statement = statement.group_by(DocumentAnalysis.provider_name, year, month).order_by(DocumentAnalysis.provider_name, year, month)
+        return [
+            {
+                "provider_name": row.provider_name,
+                "month": f"{int(row.year):04d}-{int(row.month):02d}",
+                "invoice_count": row.invoice_count,
+                "total_amount": row.total_amount or 0.0,
+            }
+            for row in db.execute(statement).all()
+        ]
+    finally:
+        db.close()
+
+
+def backfill_invoice_dates(batch_size: int = 1000) -> int:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Completa invoice_date_value de los análisis existentes a partir del texto de invoice_date, por lotes (keyset por id, un UPDATE masivo y un commit por lote). Se puede volver a ejecutar: solo lee análisis sin fecha normalizada
+    Parámetros de entrada:
+        - batch_size: int - Análisis por lote
+    Retorno esperado: int - Análisis con fecha normalizada; las fechas que no se reconocen quedan en NULL
+    """
+    table = DocumentAnalysis.__table__
+    statement = (
+        update(table)
+        .where(table.c.id == bindparam("b_id"))
+        .values({"invoice_date_value": bindparam("b_date")})
+    )
+    normalized = 0
+    after_id = 0
+    db = SessionLocal()
+    try:
+        while True:
+            batch = db.execute(
+                select(DocumentAnalysis.id, DocumentAnalysis.invoice_date)
+                .where(
+                    DocumentAnalysis.id > after_id,
+                    DocumentAnalysis.invoice_date.is_not(None),
+                    DocumentAnalysis.invoice_date_value.is_(None),
+                )
+                .order_by(DocumentAnalysis.id)
+                .limit(batch_size)
+            ).all()
+            if not batch:
+                break
+            after_id = batch[-1].id
+            rows = [
+                {"b_id": analysis_id, "b_date": value}
+                for analysis_id, value in ((row.id, parse_invoice_date(row.invoice_date)) for row in batch)
+                if value is not None
+            ]
+            if rows:
+                db.execute(statement, rows)
+            db.commit()
+            normalized += len(rows)
+            logger.info(f"Normalización de fechas de factura: hasta el análisis {after_id}, {normalized} fechas normalizadas")
+        return normalized
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
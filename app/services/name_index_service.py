@@ -0,0 +1,152 @@
+"""
+Índice persistente de nombres por usuario (tabla name_index) para detectar nombres
+duplicados entre cargas. Los nombres se guardan como hash del nombre normalizado y se
+consultan por lotes con una sola sentencia IN por bloque de hashes.
+"""
+import hashlib
+from typing import Dict, Iterable, List, Optional
+
+from sqlalchemy import delete, insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.db.session import SessionLocal
+from app.models.data_row import DataRow
+from app.models.name_index import NameIndexEntry
+
+# Hashes por sentencia: SQL Server admite hasta 2100 parámetros por consulta
+_PROBE_CHUNK = 2000
+
+
+def name_hash(name: str) -> str:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Hash BLAKE2b de 16 bytes del nombre normalizado por la validación (sin espacios extremos), el mismo criterio con el que se detectan duplicados dentro de un archivo
+    Parámetros de entrada:
+        - name: str - Nombre normalizado de la fila
+    Retorno esperado: str - Hash hex de 32 caracteres
+    """
+    return hashlib.blake2b(name.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _chunks(values: List[str]) -> Iterable[List[str]]:
+    for start in range(0, len(values), _PROBE_CHUNK):
+        yield values[start:start + _PROBE_CHUNK]
+
+
+def probe_names(db: Session, uploaded_by: Optional[str], hashes: Iterable[str], exclude_file_id: Optional[int] = None) -> Dict[str, int]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Busca cuáles de los hashes ya están registrados para el usuario, con una consulta IN por bloque de _PROBE_CHUNK hashes (búsqueda por la clave primaria)
+    Parámetros de entrada:
+        - db: Session - Sesión de base de datos
+        - uploaded_by: str | None - Usuario
+        - hashes: Iterable[str] - Hashes de nombres (ver name_hash)
+        - exclude_file_id: int | None - Archivo cuyos nombres no cuentan (versión anterior en una carga delta)
+    Retorno esperado: dict[str, int] - Hash -> file_id de los nombres ya registrados
+    """
+    known: Dict[str, int] = {}
+    for chunk in _chunks(list(dict.fromkeys(hashes))):
+        statement = select(NameIndexEntry.name_hash, NameIndexEntry.file_id).where(
+            NameIndexEntry.uploaded_by == uploaded_by,
+            NameIndexEntry.name_hash.in_(chunk),
+        )
+        if exclude_file_id is not None:
+            statement = statement.where(NameIndexEntry.file_id != exclude_file_id)
+        known.update(db.execute(statement).all())
+    return known
+
+
+def find_known_names(uploaded_by: Optional[str], hashes: Iterable[str], exclude_file_id: Optional[int] = None) -> Dict[str, int]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Variante de probe_names con su propia sesión, para usar desde la validación por lotes (hilo de trabajo)
+    Parámetros de entrada:
+        - uploaded_by: str | None - Usuario
+        - hashes: Iterable[str] - Hashes de nombres
+        - exclude_file_id: int | None - Archivo cuyos nombres no cuentan
+    Retorno esperado: dict[str, int] - Hash -> file_id de los nombres ya registrados
+    """
+    db = SessionLocal()
+    try:
+        return probe_names(db, uploaded_by, hashes, exclude_file_id)
+    finally:
+        db.close()
+
+
+def register_names(db: Session, uploaded_by: Optional[str], file_id: int, hashes: Iterable[str]) -> None:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Registra los nombres de un archivo en el índice con INSERT de varias filas por bloque. No hace commit
+    Parámetros de entrada:
+        - db: Session - Sesión de base de datos del llamador
+        - uploaded_by: str | None - Usuario
+        - file_id: int - Archivo que carga los nombres
+        - hashes: Iterable[str] - Hashes de nombres
+    Retorno esperado: None
+    """
+    for chunk in _chunks(list(dict.fromkeys(hashes))):
+        try:
+            # Savepoint: si otra carga del mismo usuario registró alguno de estos nombres en paralelo, se insertan solo los que faltan
+            with db.begin_nested():
+                db.execute(insert(NameIndexEntry), [{"uploaded_by": uploaded_by, "name_hash": h, "file_id": file_id} for h in chunk])
+        except IntegrityError:
+            known = probe_names(db, uploaded_by, chunk)
+            missing = [h for h in chunk if h not in known]
+            if missing:
+                db.execute(insert(NameIndexEntry), [{"uploaded_by": uploaded_by, "name_hash": h, "file_id": file_id} for h in missing])
+
+
+def sync_file_names(db: Session, uploaded_by: Optional[str], file_id: int, hashes: Iterable[str]) -> None:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Deja en el índice exactamente los nombres de la versión actual de un archivo (carga delta): borra los que ya no están y registra los nuevos. No hace commit
+    Parámetros de entrada:
+        - db: Session - Sesión de base de datos del llamador
+        - uploaded_by: str | None - Usuario
+        - file_id: int - Archivo lógico
+        - hashes: Iterable[str] - Hashes de los nombres de la versión actual
+    Retorno esperado: None
+    """
+    current = set(hashes)
+    previous = set(db.execute(
+        select(NameIndexEntry.name_hash).where(NameIndexEntry.uploaded_by == uploaded_by, NameIndexEntry.file_id == file_id)
+    ).scalars())
+    for chunk in _chunks(sorted(previous - current)):
+        db.execute(delete(NameIndexEntry).where(
+            NameIndexEntry.uploaded_by == uploaded_by,
+            NameIndexEntry.name_hash.in_(chunk),
+        ))
+    register_names(db, uploaded_by, file_id, [h for h in current if h not in previous])
+
+
+def rebuild_name_index(db: Session) -> int:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Reconstruye el índice a partir de las filas activas guardadas (al activar DUPLICATE_NAME_SCOPE="uploader" sobre datos existentes). Cada nombre queda asociado al primer archivo que lo cargó. Hace commit
+    Parámetros de entrada:
+        - db: Session - Sesión de base de datos
+    Retorno esperado: int - Nombres registrados
+    """
+    db.execute(delete(NameIndexEntry))
+    statement = (
+        select(DataRow.uploaded_by, DataRow.file_id, DataRow.name)
+        .where(DataRow.deleted_at.is_(None))
+        .order_by(DataRow.id)
+        .execution_options(stream_results=True, yield_per=_PROBE_CHUNK)
+    )
+    seen = set()
+    batch = []
+    for uploaded_by, file_id, name in db.execute(statement):
+        key = (uploaded_by, name_hash(name))
+        if key in seen:
+            continue
+        seen.add(key)
+        batch.append({"uploaded_by": uploaded_by, "name_hash": key[1], "file_id": file_id})
+        if len(batch) >= _PROBE_CHUNK:
+            db.execute(insert(NameIndexEntry), batch)
+            batch = []
+    if batch:
+        db.execute(insert(NameIndexEntry), batch)
+    db.commit()
+    return len(seen)
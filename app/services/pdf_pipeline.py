@@ -0,0 +1,180 @@
+"""
+Pipeline de análisis de PDFs de varias páginas: clasificación con las primeras páginas y
+extracción concurrente de las páginas con líneas de productos.
+"""
+import io
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, List, Optional
+
+from app.core.config import settings
+from app.utils.logger import logger
+from app.utils.metrics import metrics
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    _has_pypdf = True
+except Exception:
+    _has_pypdf = False
+
+# Importes con dos decimales (1.234,56 / 1234.56)
+_AMOUNT_RE = re.compile(r"\d[\d.,]*[.,]\d{2}\b")
+_LINE_ITEM_KEYWORDS = ("cantidad", "cant.", "precio", "importe", "subtotal", "unidad", "qty", "quantity", "unit price", "amount")
+
+# Limita las llamadas simultáneas a la IA por fragmentos de PDF en todo el proceso
+_chunk_semaphore = threading.BoundedSemaphore(max(1, settings.AI_PDF_MAX_CONCURRENT_CHUNKS))
+
+ModelCall = Callable[[bytes, str], dict]
+HeadAnalysis = Callable[[bytes], dict]
+
+
+def _build_line_items_prompt() -> str:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Construye el prompt para extraer solo las líneas de productos de un fragmento de páginas de una factura
+    Parámetros de entrada: None
+    Retorno esperado: str - Prompt con el formato JSON esperado
+    """
+    return (
+        "Estas páginas son parte de una FACTURA más larga. Extrae SOLO las líneas de productos que aparecen en ellas.\n"
+        "Responde SOLO este JSON (sin texto adicional, sin markdown):\n"
+        "{\n"
+        '  "products": [\n'
+        '    {"name": "nombre del producto", "quantity": cantidad (número) o null, "unit_price": precio unitario (número) o null, "total": total del producto (número) o null}\n'
+        "  ],\n"
+        '  "total_amount": total general de la factura (número) si aparece en estas páginas o null\n'
+        "}\n\n"
+        "IMPORTANTE: Responde SOLO con el JSON válido, sin markdown, sin código, sin explicaciones."
+    )
+
+
+def _page_text(page) -> str:
+    try:
+        return page.extract_text() or ""
+    except Exception:
+        return ""
+
+
+def _is_line_item_page(text: str) -> bool:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Heurística para decidir si una página contiene líneas de productos. Las páginas sin texto extraíble (escaneadas) no se pueden descartar y se consideran candidatas
+    Parámetros de entrada:
+        - text: str - Texto extraído de la página
+    Retorno esperado: bool - True si la página debe enviarse a la extracción de productos
+    """
+    if not text.strip():
+        return True
+    amounts = len(_AMOUNT_RE.findall(text))
+    if amounts >= 2:
+        return True
+    lower = text.lower()
+    return amounts >= 1 and any(keyword in lower for keyword in _LINE_ITEM_KEYWORDS)
+
+
+def _split_pages(reader, pages: List[int]) -> bytes:
+    writer = PdfWriter()
+    for index in pages:
+        writer.add_page(reader.pages[index])
+    output = io.BytesIO()
+    writer.write(output)
+    return output.getvalue()
+
+
+def _timed_call(analyze: HeadAnalysis, pdf_bytes: bytes, pages: List[int]) -> dict:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Analiza un fragmento de páginas respetando el semáforo global y registra el tiempo del fragmento y por página
+    Parámetros de entrada:
+        - analyze: Callable[[bytes], dict] - Función que envía el PDF del fragmento al modelo y retorna el JSON parseado
+        - pdf_bytes: bytes - PDF con las páginas del fragmento
+        - pages: List[int] - Índices (base 0) de las páginas del fragmento
+    Retorno esperado: dict - Respuesta parseada del modelo
+    """
+    with _chunk_semaphore:
+        start = time.perf_counter()
+        result = analyze(pdf_bytes)
+        elapsed = time.perf_counter() - start
+
+    metrics.observe("ai.pdf.chunk_seconds", elapsed)
+    for _ in pages:
+        metrics.observe("ai.pdf.page_seconds", elapsed / len(pages))
+    logger.info(f"PDF páginas {pages[0] + 1}-{pages[-1] + 1} analizadas en {elapsed:.2f}s ({elapsed / len(pages):.2f}s/página)")
+    return result
+
+
+def merge_invoice_results(header: dict, chunk_results: List[dict]) -> dict:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Une el resultado de las primeras páginas (encabezado de la factura) con los productos de los fragmentos, en orden de página. El total es el último total general encontrado en los fragmentos; si no hay ninguno se conserva el del encabezado o, en su defecto, la suma de los totales de línea
+    Parámetros de entrada:
+        - header: dict - Respuesta del modelo para las primeras páginas
+        - chunk_results: List[dict] - Respuestas de los fragmentos en orden de página
+    Retorno esperado: dict - Resultado combinado con "products" y "total_amount"
+    """
+    merged = dict(header)
+    products = list(header.get("products") or [])
+    total = None
+    for result in chunk_results:
+        products.extend(result.get("products") or [])
+        if result.get("total_amount") is not None:
+            total = result["total_amount"]
+
+    merged["products"] = products
+    if total is not None:
+        merged["total_amount"] = total
+    elif merged.get("total_amount") is None:
+        line_totals = [product.get("total") for product in products]
+        if line_totals and all(isinstance(value, (int, float)) for value in line_totals):
+            merged["total_amount"] = round(sum(line_totals), 2)
+    return merged
+
+
+def analyze_pdf(bytes_data: bytes | memoryview, analyze_head: HeadAnalysis, call_model: ModelCall) -> Optional[dict]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Analiza un PDF largo por partes. Cuenta las páginas, clasifica el documento con las primeras AI_PDF_CLASSIFY_PAGES y, si es FACTURA, envía en paralelo (máximo AI_PDF_MAX_CONCURRENT_CHUNKS llamadas) los fragmentos de páginas con líneas de productos y combina los resultados. Si no es FACTURA retorna None para que el documento se analice completo
+    Parámetros de entrada:
+        - bytes_data: bytes | memoryview - Contenido del PDF
+        - analyze_head: Callable[[bytes], dict] - Función que clasifica y extrae un PDF corto (se aplica a las primeras páginas)
+        - call_model: Callable[[bytes, str], dict] - Función que envía (PDF, prompt) al modelo de extracción y retorna el JSON parseado
+    Retorno esperado: dict | None - Respuesta combinada (sin normalizar) o None si el PDF debe analizarse en una sola llamada (pocas páginas, no es FACTURA, pypdf no disponible o PDF no legible)
+    """
+    if not _has_pypdf:
+        return None
+    try:
+        reader = PdfReader(io.BytesIO(bytes_data))
+        page_count = len(reader.pages)
+    except Exception as e:
+        logger.warning(f"No se pudo leer el PDF para dividirlo, se analiza completo: {e}")
+        return None
+
+    metrics.observe("ai.pdf.pages", page_count)
+    if page_count < settings.AI_PDF_SPLIT_MIN_PAGES:
+        return None
+
+    head_pages = list(range(min(settings.AI_PDF_CLASSIFY_PAGES, page_count)))
+    header = _timed_call(analyze_head, _split_pages(reader, head_pages), head_pages)
+    if str(header.get("classification", "")).upper() != "FACTURA":
+        # Descripción y resumen deben cubrir todo el documento: se analiza completo en una sola llamada
+        return None
+
+    item_pages = [index for index in range(len(head_pages), page_count) if _is_line_item_page(_page_text(reader.pages[index]))]
+    chunk_size = max(1, settings.AI_PDF_PAGES_PER_CHUNK)
+    chunks = [item_pages[i:i + chunk_size] for i in range(0, len(item_pages), chunk_size)]
+    logger.info(f"PDF de {page_count} páginas: {len(item_pages)} con productos en {len(chunks)} fragmentos")
+    if not chunks:
+        return header
+
+    # Los fragmentos se generan en este hilo: PdfReader no es seguro entre hilos
+    chunk_pdfs = [_split_pages(reader, pages) for pages in chunks]
+    prompt = _build_line_items_prompt()
+    with ThreadPoolExecutor(max_workers=min(len(chunks), max(1, settings.AI_PDF_MAX_CONCURRENT_CHUNKS))) as executor:
+        results = list(executor.map(
+            lambda args: _timed_call(lambda pdf_bytes: call_model(pdf_bytes, prompt), args[0], args[1]),
+            zip(chunk_pdfs, chunks),
+        ))
+
+    return merge_invoice_results(header, results)
@@ -1,3 +1,193 @@
+"""
+Resumen y consulta de las validaciones de archivos CSV/Excel (FileValidation).
+"""
+import csv
+import io
+from collections import Counter
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import insert, select
+
+from app.db.session import SessionLocal
+from app.models.file_model import File
+from app.models.file_validation import FileValidation
+
+# Validaciones por INSERT al guardarlas y por lote al exportarlas
+_BATCH_SIZE = 5000
+
+# Columnas de la exportación CSV, en orden
+VALIDATION_EXPORT_COLUMNS = ["id", "row", "column", "error", "message"]
+
+
 # placeholder for more advanced validation logic or IA-based validation
 def validate_with_rules(row):
     return []
+
+
+class ValidationSummary:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Resumen de las validaciones de una carga acumulado lote a lote, sin conservar la lista completa: conteos por código de error y por columna más las primeras muestras
+    Parámetros de entrada:
+        - sample_size: int - Número de validaciones de muestra a conservar
+    Retorno esperado: None (clase acumuladora)
+    """
+
+    def __init__(self, sample_size: int):
+        self.sample_size = sample_size
+        self.total = 0
+        self.by_error: Counter = Counter()
+        self.by_column: Counter = Counter()
+        self.samples: List[Dict[str, Any]] = []
+
+    def add(self, validations: List[Dict[str, Any]]) -> None:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Suma las validaciones de un lote al resumen
+        Parámetros de entrada:
+            - validations: list[dict] - Validaciones del lote con row, column, error, message
+        Retorno esperado: None
+        """
+        self.total += len(validations)
+        self.by_error.update(v["error"] for v in validations)
+        self.by_column.update(v["column"] for v in validations)
+        self.samples.extend(validations[:max(0, self.sample_size - len(self.samples))])
+
+    def result(self) -> Dict[str, Any]:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Retorna el resumen acumulado
+        Parámetros de entrada: None
+        Retorno esperado: dict - {"total": int, "by_error": dict, "by_column": dict, "samples": list, "truncated": bool}
+        """
+        return {
+            "total": self.total,
+            "by_error": dict(self.by_error),
+            "by_column": dict(self.by_column),
+            "samples": list(self.samples),
+            "truncated": self.total > self.sample_size,
+        }
+
+
+def summarize_validations(validations: List[Dict[str, Any]], sample_size: int) -> Dict[str, Any]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Resume las validaciones de una carga en conteos por código de error y por columna, más las primeras muestras
+    Parámetros de entrada:
+        - validations: list[dict] - Validaciones con row, column, error, message
+        - sample_size: int - Número de validaciones de muestra a incluir
+    Retorno esperado: dict - {"total": int, "by_error": dict, "by_column": dict, "samples": list, "truncated": bool}
+    """
+    summary = ValidationSummary(sample_size)
+    summary.add(validations)
+    return summary.result()
+
+
+def save_validations(db, file_id: int, validations: List[Dict[str, Any]]) -> None:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Guarda las validaciones de un archivo con INSERT de varias filas por lote (sin crear un objeto del ORM por validación). No hace commit
+    Parámetros de entrada:
+        - db: Session - Sesión de base de datos del llamador
+        - file_id: int - ID del archivo
+        - validations: list[dict] - Validaciones con row, column, error, message y opcionalmente sheet
+    Retorno esperado: None
+    """
+    for start in range(0, len(validations), _BATCH_SIZE):
+        db.execute(insert(FileValidation), [
+            {
+                "file_id": file_id,
+                "row_number": v["row"],
+                "column_name": v["column"],
+                "error_code": v["error"],
+                # En cargas de varias hojas la hoja se conserva en el mensaje (row_number es por hoja)
+                "message": f"[{v['sheet']}] {v.get('message')}" if v.get("sheet") else v.get("message"),
+            }
+            for v in validations[start:start + _BATCH_SIZE]
+        ])
+
+
+def _filtered(statement, file_id: int, error_code: Optional[str], column: Optional[str]):
+    statement = statement.where(FileValidation.file_id == file_id)
+    if error_code:
+        statement = statement.where(FileValidation.error_code == error_code)
+    if column:
+        statement = statement.where(FileValidation.column_name == column)
+    return statement
+
+
+def _validation_to_dict(validation) -> Dict[str, Any]:
+    return {
+        "id": validation.id,
+        "row": validation.row_number,
+        "column": validation.column_name,
+        "error": validation.error_code,
+        "message": validation.message,
+    }
+
+
+def list_file_validations(
+    file_id: int,
+    error_code: Optional[str] = None,
+    column: Optional[str] = None,
+    after_id: Optional[int] = None,
+    limit: int = 100,
+) -> Optional[Dict[str, Any]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Retorna una página de las validaciones de un archivo, con paginación por keyset (id > after_id ORDER BY id) y filtros por código de error y columna
+    Parámetros de entrada:
+        - file_id: int - ID del archivo
+        - error_code: str | None - Código de error (ej: "EMPTY", "DUPLICATE")
+        - column: str | None - Columna validada
+        - after_id: int | None - Cursor: next_after_id de la página anterior
+        - limit: int - Validaciones por página
+    Retorno esperado: dict | None - {"file_id": int, "validations": list, "next_after_id": int | None} o None si el archivo no existe
+    """
+    db = SessionLocal()
+    try:
+        if db.query(File.id).filter(File.id == file_id).first() is None:
+            return None
+        statement = _filtered(select(FileValidation), file_id, error_code, column)
+        if after_id is not None:
+            statement = statement.where(FileValidation.id > after_id)
+        validations = db.execute(statement.order_by(FileValidation.id).limit(limit + 1)).scalars().all()
+        has_more = len(validations) > limit
+        validations = validations[:limit]
+        return {
+            "file_id": file_id,
+            "validations": [_validation_to_dict(v) for v in validations],
+            "next_after_id": validations[-1].id if has_more else None,
+        }
+    finally:
+        db.close()
+
+
+def iter_file_validations_csv(file_id: int, error_code: Optional[str] = None, column: Optional[str] = None) -> Iterator[bytes]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Exporta como CSV todas las validaciones (filtradas) de un archivo, leyendo del cursor por lotes
+    Parámetros de entrada:
+        - file_id: int - ID del archivo
+        - error_code: str | None - Código de error
+        - column: str | None - Columna validada
+    Retorno esperado: Iterator[bytes] - Fragmentos del CSV (encabezado incluido)
+    """
+    text = io.StringIO()
+    writer = csv.writer(text)
+    writer.writerow(VALIDATION_EXPORT_COLUMNS)
+    db = SessionLocal()
+    try:
+        statement = _filtered(
+            select(FileValidation.id, FileValidation.row_number, FileValidation.column_name, FileValidation.error_code, FileValidation.message),
+            file_id, error_code, column,
+        ).order_by(FileValidation.id).execution_options(stream_results=True, yield_per=_BATCH_SIZE)
+        for partition in db.execute(statement).partitions(_BATCH_SIZE):
+            writer.writerows(partition)
+            yield text.getvalue().encode("utf-8")
+            text.seek(0)
+            text.truncate()
+    finally:
+        db.close()
+    if text.tell():
+        yield text.getvalue().encode("utf-8")
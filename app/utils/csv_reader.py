@@ -1,2 +1,307 @@
-# helper utilities for CSV streaming if needed
-pass
+"""
+Lectura de CSV por lotes con tres motores:
+
+- "pyarrow": lector multihilo de Arrow (si pyarrow está instalado)
+- "pandas": motor C de pandas con chunksize
+- "python": módulo csv de la biblioteca estándar (filas como diccionarios)
+
+La codificación y el separador se detectan con los primeros KB del archivo (sniff_csv)
+y el contenido se decodifica en una sola pasada. El encabezado se normaliza una sola vez.
+Los motores columnares solo leen las columnas que usa la validación (id, name, price),
+siempre como texto para conservar el valor original en los mensajes de error, y entregan
+DataFrames de pandas.
+"""
+import codecs
+import csv
+from io import TextIOWrapper
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Union
+
+import pandas as pd
+
+from app.core.config import settings
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    _has_pyarrow = True
+except Exception:
+    _has_pyarrow = False
+
+# Columnas que leen los motores columnares
+CSV_COLUMNS = ("id", "name", "price")
+
+# Motores de lectura disponibles
+CSV_ENGINES = ("auto", "pyarrow", "pandas", "python")
+
+# Bytes por bloque que lee pyarrow (cada bloque se entrega como uno o más lotes)
+_PYARROW_BLOCK_SIZE = 16 * 1024 * 1024
+
+# Separadores que se consideran al detectar el formato
+_SNIFF_DELIMITERS = ",;\t|"
+
+# Bytes que no son UTF-8 válido se decodifican como cp1252 (los 5 bytes sin definir en cp1252 como latin-1)
+_FALLBACK_CHARS = [
+    bytes([b]).decode("cp1252") if b not in (0x81, 0x8D, 0x8F, 0x90, 0x9D) else chr(b)
+    for b in range(256)
+]
+
+
+def _decode_fallback(error: UnicodeDecodeError):
+    chunk = error.object[error.start:error.end]
+    return "".join(_FALLBACK_CHARS[b] for b in chunk), error.end
+
+
+# Manejador de errores de decodificación registrado en codecs (también lo usa pandas)
+DECODE_ERRORS = "csv_cp1252_fallback"
+codecs.register_error(DECODE_ERRORS, _decode_fallback)
+
+
+class CsvFormat:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Formato detectado de un CSV
+    Parámetros de entrada:
+        - encoding: str - "utf-8-sig", "utf-8", "utf-16" o "cp1252"
+        - delimiter: str - Separador de campos
+        - quotechar: str - Carácter de comillas
+    Retorno esperado: None (clase contenedora)
+    """
+
+    def __init__(self, encoding: str = "utf-8-sig", delimiter: str = ",", quotechar: str = '"'):
+        self.encoding = encoding
+        self.delimiter = delimiter
+        self.quotechar = quotechar
+
+    def __repr__(self) -> str:
+        return f"CsvFormat(encoding={self.encoding!r}, delimiter={self.delimiter!r}, quotechar={self.quotechar!r})"
+
+    def text_stream(self, file: BinaryIO) -> TextIOWrapper:
+        # Decodificación incremental; los bytes inválidos no interrumpen la lectura
+        return TextIOWrapper(file, encoding=self.encoding, errors=DECODE_ERRORS, newline="")
+
+    def reader(self, text_stream) -> Iterator[List[str]]:
+        return csv.reader(text_stream, delimiter=self.delimiter, quotechar=self.quotechar)
+
+
+def _detect_encoding(sample: bytes, complete: bool) -> str:
+    if sample.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return "utf-16"
+    try:
+        # Decodificador incremental: una secuencia cortada al final de la muestra no es un error
+        codecs.getincrementaldecoder("utf-8")().decode(sample, final=complete)
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "cp1252"
+
+
+def sniff_csv(file: BinaryIO, sample_bytes: Optional[int] = None) -> CsvFormat:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Detecta codificación (BOM, UTF-8 válido o cp1252), separador y comillas a partir de los primeros bytes del archivo. Solo se toman separador y comillas de csv.Sniffer: el resto del dialecto se deja en los valores estándar porque Sniffer desactiva las comillas dobles escapadas ("") cuando la muestra no las contiene
+    Parámetros de entrada:
+        - file: BinaryIO - CSV posicionado al inicio (posicionable; vuelve al inicio al terminar)
+        - sample_bytes: int | None - Bytes a examinar (None usa CSV_SNIFF_BYTES)
+    Retorno esperado: CsvFormat - Formato detectado (separador "," si no se puede detectar)
+    """
+    sample_bytes = sample_bytes or settings.CSV_SNIFF_BYTES
+    sample = file.read(sample_bytes)
+    file.seek(0)
+    complete = len(sample) < sample_bytes
+    csv_format = CsvFormat(encoding=_detect_encoding(sample, complete))
+
+    text = codecs.getincrementaldecoder(csv_format.encoding)(errors=DECODE_ERRORS).decode(sample, final=complete)
+    if not complete and "\n" in text:
+        # Solo líneas completas
+        text = text[:text.rindex("\n") + 1]
+    try:
+        dialect = csv.Sniffer().sniff(text, delimiters=_SNIFF_DELIMITERS)
+    except csv.Error:
+        return csv_format
+    csv_format.delimiter = dialect.delimiter
+    if dialect.quotechar in ('"', "'"):
+        csv_format.quotechar = dialect.quotechar
+    return csv_format
+
+
+def normalize_header(value: Optional[str]) -> str:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Normaliza un nombre de columna: sin espacios extremos, minúsculas y "_" en lugar de espacios
+    Parámetros de entrada:
+        - value: str | None - Nombre de columna original
+    Retorno esperado: str - Nombre normalizado ("" si no tiene nombre)
+    """
+    return (value or "").strip().lower().replace(" ", "_")
+
+
+def _resolve_engine(engine: Optional[str]) -> str:
+    engine = engine or settings.CSV_PARSER_ENGINE
+    if engine not in CSV_ENGINES:
+        raise ValueError(f"Unknown CSV parser engine: {engine}")
+    if engine == "auto":
+        return "pyarrow" if _has_pyarrow else "pandas"
+    if engine == "pyarrow" and not _has_pyarrow:
+        return "pandas"
+    return engine
+
+
+def _read_header(file: BinaryIO, csv_format: CsvFormat) -> Optional[List[str]]:
+    # Solo la primera fila lógica (respeta comillas); el archivo vuelve al inicio
+    text_stream = csv_format.text_stream(file)
+    try:
+        header = next(csv_format.reader(text_stream), None)
+    finally:
+        text_stream.detach()
+    file.seek(0)
+    return header
+
+
+def _column_positions(header: List[str]) -> Dict[str, int]:
+    # Si dos columnas se normalizan igual gana la última, como en csv.DictReader
+    positions = {}
+    for index, name in enumerate(header):
+        name = normalize_header(name)
+        if name in CSV_COLUMNS:
+            positions[name] = index
+    return positions
+
+
+def _complete(frame: pd.DataFrame) -> pd.DataFrame:
+    # Columnas ausentes como texto vacío y filas cortas (valores nulos) como ""
+    for name in CSV_COLUMNS:
+        if name not in frame.columns:
+            frame[name] = ""
+    return frame[list(CSV_COLUMNS)].fillna("")
+
+
+def _iter_pandas(file: BinaryIO, header: List[str], positions: Dict[str, int], csv_format: CsvFormat, batch_rows: int) -> Iterator[pd.DataFrame]:
+    names = [f"c{index}" for index in range(len(header))]
+    rename = {f"c{index}": name for name, index in positions.items()}
+    reader = pd.read_csv(
+        file,
+        engine="c",
+        encoding=csv_format.encoding,
+        encoding_errors=DECODE_ERRORS,
+        sep=csv_format.delimiter,
+        quotechar=csv_format.quotechar,
+        header=None,
+        skiprows=1,
+        names=names,
+        usecols=list(rename),
+        dtype={column: str for column in rename},
+        keep_default_na=False,
+        na_filter=False,
+        chunksize=batch_rows,
+    )
+    with reader:
+        for chunk in reader:
+            yield _complete(chunk.rename(columns=rename))
+
+
+def _iter_pyarrow(file: BinaryIO, header: List[str], positions: Dict[str, int], csv_format: CsvFormat, batch_rows: int) -> Iterator[pd.DataFrame]:
+    names = [f"c{index}" for index in range(len(header))]
+    rename = {f"c{index}": name for name, index in positions.items()}
+    reader = pa_csv.open_csv(
+        file,
+        read_options=pa_csv.ReadOptions(
+            column_names=names,
+            skip_rows=1,
+            block_size=_PYARROW_BLOCK_SIZE,
+            # pyarrow lee UTF-8 de forma nativa y transcodifica el resto con el codec de Python
+            encoding=csv_format.encoding.replace("-sig", ""),
+        ),
+        parse_options=pa_csv.ParseOptions(
+            delimiter=csv_format.delimiter,
+            quote_char=csv_format.quotechar,
+            newlines_in_values=True,
+        ),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=list(rename),
+            column_types={column: pa.string() for column in rename},
+            strings_can_be_null=False,
+            quoted_strings_can_be_null=False,
+        ),
+    )
+    for record_batch in reader:
+        for start in range(0, record_batch.num_rows, batch_rows):
+            chunk = record_batch.slice(start, batch_rows).to_pandas()
+            yield _complete(chunk.rename(columns=rename))
+
+
+def _iter_python(file: BinaryIO, csv_format: CsvFormat, batch_rows: int) -> Iterator[List[Dict[str, Any]]]:
+    # Decodificación incremental (sin decodificar todo el archivo a un str)
+    text_stream = csv_format.text_stream(file)
+    try:
+        reader = csv_format.reader(text_stream)
+        header = [normalize_header(name) for name in next(reader, [])]
+        batch: List[Dict[str, Any]] = []
+        for values in reader:
+            if not values:
+                # Línea en blanco (csv.DictReader también las omite)
+                continue
+            batch.append(dict(zip(header, values)))
+            if len(batch) >= batch_rows:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+    finally:
+        # Separar el wrapper para que no cierre el archivo subyacente
+        text_stream.detach()
+
+
+def iter_csv_batches(
+    file: BinaryIO,
+    csv_format: Optional[CsvFormat] = None,
+    batch_rows: Optional[int] = None,
+    engine: Optional[str] = None,
+) -> Iterator[Union[pd.DataFrame, List[Dict[str, Any]]]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Lee un CSV por lotes. Con "pyarrow" o "pandas" cada lote es un DataFrame con las columnas id, name y price como texto (vacío si falta); con "python" cada lote es una lista de diccionarios con todas las columnas normalizadas
+    Parámetros de entrada:
+        - file: BinaryIO - CSV posicionado al inicio (posicionable)
+        - csv_format: CsvFormat | None - Formato del archivo (None lo detecta con sniff_csv)
+        - batch_rows: int | None - Filas por lote (None usa CSV_BATCH_ROWS)
+        - engine: str | None - "auto", "pyarrow", "pandas" o "python" (None usa CSV_PARSER_ENGINE; "auto" y "pyarrow" usan pandas si pyarrow no está instalado)
+    Retorno esperado: Iterator[DataFrame | list[dict]] - Lotes de filas en orden. Si un motor columnar encuentra filas con una cantidad de campos distinta al encabezado, el resto del archivo se entrega como lotes del motor "python"
+    Excepciones: ValueError si el motor no existe
+    """
+    batch_rows = batch_rows or settings.CSV_BATCH_ROWS
+    engine = _resolve_engine(engine)
+    csv_format = csv_format or sniff_csv(file)
+    if engine == "python":
+        yield from _iter_python(file, csv_format, batch_rows)
+        return
+
+    header = _read_header(file, csv_format)
+    if not header:
+        return
+    positions = _column_positions(header)
+    if not positions:
+        # Sin ninguna columna conocida: solo importa cuántas filas hay (todas fallan la validación)
+        yield from (
+            _complete(pd.DataFrame(index=range(len(batch))))
+            for batch in _iter_python(file, csv_format, batch_rows)
+        )
+        return
+    reader = _iter_pyarrow if engine == "pyarrow" else _iter_pandas
+    consumed = 0
+    try:
+        for frame in reader(file, header, positions, csv_format, batch_rows):
+            if len(frame):
+                consumed += len(frame)
+                yield frame
+    except ValueError:
+        # Filas con más (o, en pyarrow, menos) campos que el encabezado o, en pyarrow, bytes que
+        # no son UTF-8 válido: se continúa con el módulo csv desde la primera fila no entregada
+        file.seek(0)
+        skipped = 0
+        for batch in _iter_python(file, csv_format, batch_rows):
+            if skipped + len(batch) <= consumed:
+                skipped += len(batch)
+                continue
+            yield batch[consumed - skipped:]
+            skipped = consumed
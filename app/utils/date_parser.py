@@ -0,0 +1,65 @@
+"""
+Normalización de las fechas de factura que entrega la IA (texto libre) a fechas reales,
+para guardarlas en DocumentAnalysis.invoice_date_value y filtrar rangos con índice.
+"""
+import re
+from datetime import date
+from typing import Optional
+
+# Meses en español e inglés (nombre completo o abreviado a 3 letras)
+_MONTHS = {
+    "enero": 1, "febrero": 2, "marzo": 3, "abril": 4, "mayo": 5, "junio": 6, "julio": 7,
+    "agosto": 8, "septiembre": 9, "setiembre": 9, "octubre": 10, "noviembre": 11, "diciembre": 12,
+    "january": 1, "february": 2, "march": 3, "april": 4, "may": 5, "june": 6, "july": 7,
+    "august": 8, "september": 9, "october": 10, "november": 11, "december": 12,
+    "ene": 1, "feb": 2, "mar": 3, "abr": 4, "jun": 6, "jul": 7, "ago": 8, "sep": 9, "set": 9,
+    "oct": 10, "nov": 11, "dic": 12, "jan": 1, "apr": 4, "aug": 8, "dec": 12,
+}
+
+_ACCENTS = str.maketrans("áéíóú", "aeiou")
+
+# 2024-01-31, 2024/01/31 o 2024.01.31 (opcionalmente con hora: 2024-01-31T10:00:00)
+_YEAR_FIRST_RE = re.compile(r"^(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})(?:[t\s].*)?$")
+# 31/01/2024, 31-01-2024, 31.01.2024 o 31/01/24 (día primero, como en las facturas en español)
+_DAY_FIRST_RE = re.compile(r"^(\d{1,2})[-/.](\d{1,2})[-/.](\d{2}|\d{4})$")
+# 31 de enero de 2024, 31 enero 2024, 31-ene-2024, January 31, 2024
+_DAY_MONTH_NAME_RE = re.compile(r"^(\d{1,2})(?:\s+de\s+|[\s\-/.]+)([a-záéíóú]+)\.?(?:\s+del?\s+|[\s\-/.,]+)(\d{4})$")
+_MONTH_NAME_DAY_RE = re.compile(r"^([a-z]+)\.?\s+(\d{1,2}),?\s+(\d{4})$")
+
+
+def _build_date(year: int, month: int, day: int) -> Optional[date]:
+    if year < 100:
+        year += 2000
+    try:
+        return date(year, month, day)
+    except ValueError:
+        return None
+
+
+def parse_invoice_date(value: Optional[str]) -> Optional[date]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Convierte la fecha de factura en texto libre a una fecha. Acepta formato ISO (año primero), día/mes/año con "/", "-" o "." y fechas con el nombre del mes en español o inglés. Las fechas numéricas con el día primero se leen como DD/MM/AAAA
+    Parámetros de entrada:
+        - value: str | None - Fecha de factura tal como la extrajo la IA
+    Retorno esperado: date | None - Fecha normalizada o None si el texto está vacío, no se reconoce o no es una fecha válida
+    """
+    if not value or not isinstance(value, str):
+        return None
+    text = " ".join(value.strip().lower().split())
+
+    match = _YEAR_FIRST_RE.match(text)
+    if match:
+        return _build_date(int(match.group(1)), int(match.group(2)), int(match.group(3)))
+    match = _DAY_FIRST_RE.match(text)
+    if match:
+        return _build_date(int(match.group(3)), int(match.group(2)), int(match.group(1)))
+    match = _DAY_MONTH_NAME_RE.match(text)
+    if match:
+        month = _MONTHS.get(match.group(2).translate(_ACCENTS))
+        return _build_date(int(match.group(3)), month, int(match.group(1))) if month else None
+    match = _MONTH_NAME_DAY_RE.match(text)
+    if match:
+        month = _MONTHS.get(match.group(1))
+        return _build_date(int(match.group(3)), month, int(match.group(2))) if month else None
+    return None
@@ -0,0 +1,153 @@
+"""
+Lectura de planillas Excel por lotes de filas sin construir el libro completo en memoria.
+
+Usa python-calamine cuando está instalado (lector nativo, también para .xls) y, si no,
+openpyxl en modo read_only, que recorre las hojas del XML de forma incremental.
+"""
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from app.core.config import settings
+
+try:
+    from python_calamine import CalamineWorkbook
+    _has_calamine = True
+except Exception:
+    _has_calamine = False
+
+try:
+    from openpyxl import load_workbook
+    _has_openpyxl = True
+except Exception:
+    _has_openpyxl = False
+
+# Valor de selección que incluye todas las hojas
+ALL_SHEETS = "*"
+
+
+class ExcelReadError(Exception):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Hoja inexistente o motor de lectura de Excel no disponible
+    Parámetros de entrada: None (clase de excepción)
+    Retorno esperado: None (clase de excepción)
+    """
+    pass
+
+
+def select_sheets(available: List[str], selection: Optional[str]) -> List[str]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Resuelve qué hojas leer a partir de la selección del usuario
+    Parámetros de entrada:
+        - available: list[str] - Hojas del libro, en orden
+        - selection: str | None - None o vacío para la primera hoja, "*" para todas, o nombres separados por coma
+    Retorno esperado: list[str] - Hojas a leer, en el orden pedido
+    Excepciones: ExcelReadError si se pide una hoja que no existe
+    """
+    if not selection or not selection.strip():
+        return available[:1]
+    if selection.strip() == ALL_SHEETS:
+        return list(available)
+    names = [name.strip() for name in selection.split(",") if name.strip()]
+    missing = [name for name in names if name not in available]
+    if missing:
+        raise ExcelReadError(f"Sheet not found: {', '.join(missing)} (available: {', '.join(available)})")
+    return names
+
+
+def _normalize_header(value: Any) -> Optional[str]:
+    # Mismo criterio que para CSV: sin espacios extremos, minúsculas y "_" en lugar de espacios
+    if value is None:
+        return None
+    header = str(value).strip().lower().replace(" ", "_")
+    return header or None
+
+
+def _batches(rows: Iterable[Tuple[Any, ...]], batch_rows: int) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Convierte las filas de una hoja (la primera es el encabezado) en lotes de diccionarios. Las filas sin ningún valor se omiten y las columnas sin encabezado se descartan
+    Parámetros de entrada:
+        - rows: Iterable[tuple] - Valores de cada fila de la hoja; None o "" para celdas vacías
+        - batch_rows: int - Filas por lote
+    Retorno esperado: Iterator[list[dict]] - Lotes de filas con las columnas normalizadas
+    """
+    iterator = iter(rows)
+    header = next(iterator, None)
+    if header is None:
+        return
+    columns = [(index, name) for index, name in enumerate(map(_normalize_header, header)) if name]
+
+    batch: List[Dict[str, Any]] = []
+    for values in iterator:
+        record = {}
+        empty = True
+        for index, name in columns:
+            value = values[index] if index < len(values) else None
+            if value == "":
+                value = None
+            if value is not None:
+                empty = False
+            record[name] = value
+        if empty:
+            continue
+        batch.append(record)
+        if len(batch) >= batch_rows:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _calamine_rows(sheet) -> Iterator[Tuple[Any, ...]]:
+    for values in sheet.iter_rows():
+        # calamine entrega los números enteros de Excel como float; se devuelven como int igual que pandas
+        yield tuple(int(v) if isinstance(v, float) and v.is_integer() else v for v in values)
+
+
+def _resolve_engine(engine: Optional[str]) -> str:
+    engine = engine or settings.EXCEL_READER_ENGINE
+    if engine == "auto":
+        engine = "calamine" if _has_calamine else "openpyxl"
+    if engine == "calamine" and not _has_calamine:
+        raise ExcelReadError("python-calamine is not installed")
+    if engine == "openpyxl" and not _has_openpyxl:
+        raise ExcelReadError("openpyxl is not installed")
+    if engine not in ("calamine", "openpyxl"):
+        raise ExcelReadError(f"Unknown Excel reader engine: {engine}")
+    return engine
+
+
+def iter_excel_batches(
+    file: BinaryIO,
+    sheets: Optional[str] = None,
+    batch_rows: Optional[int] = None,
+    engine: Optional[str] = None,
+) -> Iterator[Tuple[str, List[Dict[str, Any]]]]:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Recorre las hojas seleccionadas de un libro Excel y entrega sus filas por lotes, sin cargar el libro completo. La primera fila de cada hoja es el encabezado
+    Parámetros de entrada:
+        - file: BinaryIO - Libro Excel (posicionable)
+        - sheets: str | None - Selección de hojas (ver select_sheets)
+        - batch_rows: int | None - Filas por lote (None usa EXCEL_BATCH_ROWS)
+        - engine: str | None - "auto", "calamine" u "openpyxl" (None usa EXCEL_READER_ENGINE)
+    Retorno esperado: Iterator[tuple[str, list[dict]]] - (hoja, lote de filas); cada lote pertenece a una sola hoja
+    Excepciones: ExcelReadError si una hoja no existe o el motor no está disponible
+    """
+    batch_rows = batch_rows or settings.EXCEL_BATCH_ROWS
+    if _resolve_engine(engine) == "calamine":
+        workbook = CalamineWorkbook.from_filelike(file)
+        for name in select_sheets(list(workbook.sheet_names), sheets):
+            for batch in _batches(_calamine_rows(workbook.get_sheet_by_name(name)), batch_rows):
+                yield name, batch
+        return
+
+    # read_only: las filas se leen del XML a medida que se recorren; data_only: valores calculados de las fórmulas
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        for name in select_sheets(workbook.sheetnames, sheets):
+            for batch in _batches(workbook[name].iter_rows(values_only=True), batch_rows):
+                yield name, batch
+    finally:
+        workbook.close()
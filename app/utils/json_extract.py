@@ -0,0 +1,191 @@
+"""
+Extracción tolerante e incremental de JSON en respuestas de modelos (texto libre, markdown o streaming).
+"""
+import json
+import re
+from typing import List
+
+# Comas finales antes de } o ] (JSON inválido que algunos modelos generan)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+
+
+class JsonStreamExtractor:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Extractor incremental de objetos JSON. Recibe el texto por fragmentos, ignora lo que esté fuera de las llaves (prosa, ```json) y retorna cada objeto de primer nivel en cuanto se cierra, respetando strings y escapes
+    Parámetros de entrada: None
+    Retorno esperado: None (extractor con estado)
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+
+    @property
+    def partial(self) -> str:
+        """Texto del objeto que se está leyendo (vacío si no hay ninguno abierto)."""
+        return "".join(self._buffer)
+
+    def feed(self, chunk: str) -> List[dict]:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Procesa un fragmento de texto
+        Parámetros de entrada:
+            - chunk: str - Siguiente fragmento de la respuesta
+        Retorno esperado: List[dict] - Objetos completados en este fragmento (los que no son JSON válido ni reparable se descartan)
+        """
+        completed = []
+        for char in chunk:
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._buffer = [char]
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+                if self._depth == 0:
+                    parsed = _loads_lenient("".join(self._buffer))
+                    self._buffer = []
+                    if isinstance(parsed, dict):
+                        completed.append(parsed)
+        return completed
+
+
+def _loads_lenient(text: str):
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(_TRAILING_COMMA_RE.sub(r"\1", text))
+    except json.JSONDecodeError:
+        return None
+
+
+def extract_json_object(text: str) -> dict:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Retorna el primer objeto JSON válido contenido en un texto (tolera prosa antes o después, bloques markdown y comas finales)
+    Parámetros de entrada:
+        - text: str - Texto completo de la respuesta
+    Retorno esperado: dict - Primer objeto JSON encontrado
+    Excepciones: ValueError si el texto no contiene ningún objeto JSON válido
+    """
+    objects = JsonStreamExtractor().feed(text)
+    if not objects:
+        raise ValueError("La respuesta no contiene un objeto JSON válido")
+    return objects[0]
+
+
+class PartialJsonParser:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Parser incremental de un objeto JSON que llega por fragmentos. Emite cada campo de primer nivel en cuanto su valor se completa y, para los campos que son listas, cada elemento en cuanto se cierra (antes de que termine la lista)
+    Parámetros de entrada: None
+    Retorno esperado: None (parser con estado; `result` contiene el objeto completo al terminar)
+    """
+
+    def __init__(self):
+        self._text: List[str] = []
+        self._depth = 0
+        self._in_string = False
+        self._escaped = False
+        self._reading_key = False
+        self._key_start = 0
+        self._key = None
+        self._value_start = None
+        self._array_key = None
+        self._item_start = 0
+        self.result = None
+
+    def _slice(self, start: int, end: int) -> str:
+        return "".join(self._text[start:end]).strip()
+
+    def _emit_field(self, end: int, events: list) -> None:
+        if self._key is not None and self._value_start is not None:
+            raw = self._slice(self._value_start, end)
+            value = _loads_lenient(raw) if raw else None
+            events.append(("field", self._key, value))
+        self._key = None
+        self._value_start = None
+
+    def _emit_item(self, end: int, events: list) -> None:
+        raw = self._slice(self._item_start, end)
+        if raw:
+            events.append(("item", self._array_key, _loads_lenient(raw)))
+
+    def feed(self, chunk: str) -> List[tuple]:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Procesa un fragmento de texto
+        Parámetros de entrada:
+            - chunk: str - Siguiente fragmento de la respuesta
+        Retorno esperado: List[tuple] - Eventos ("field", nombre, valor) e ("item", nombre_lista, elemento) completados en este fragmento
+        """
+        events: List[tuple] = []
+        for char in chunk:
+            if self.result is not None:
+                break
+            if self._depth == 0:
+                if char == "{":
+                    self._depth = 1
+                    self._text = [char]
+                continue
+
+            position = len(self._text)
+            self._text.append(char)
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if self._reading_key:
+                        self._key = json.loads(self._slice(self._key_start, position + 1))
+                        self._reading_key = False
+                continue
+
+            if char == '"':
+                self._in_string = True
+                if self._depth == 1 and self._key is None:
+                    self._reading_key = True
+                    self._key_start = position
+            elif char == ":" and self._depth == 1 and self._key is not None and self._value_start is None:
+                self._value_start = position + 1
+            elif char in "{[":
+                self._depth += 1
+                if char == "[" and self._depth == 2 and self._array_key is None:
+                    self._array_key = self._key
+                    self._item_start = position + 1
+            elif char in "}]":
+                if char == "]" and self._depth == 2 and self._array_key is not None:
+                    self._emit_item(position, events)
+                    self._array_key = None
+                self._depth -= 1
+                if self._depth == 0:
+                    self._emit_field(position, events)
+                    self.result = _loads_lenient("".join(self._text))
+            elif char == ",":
+                if self._depth == 2 and self._array_key is not None:
+                    self._emit_item(position, events)
+                    self._item_start = position + 1
+                elif self._depth == 1:
+                    self._emit_field(position, events)
+        return events
@@ -0,0 +1,84 @@
+"""
+Registro de métricas en memoria del proceso (contadores, gauges y tiempos).
+"""
+import threading
+from collections import deque
+from typing import Deque, Dict
+
+_MAX_SAMPLES = 1024
+
+
+def _percentile(sorted_values: list, fraction: float) -> float:
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class MetricsRegistry:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Registro de métricas seguro entre hilos. Los tiempos guardan count/sum/min/max acumulados y una ventana de las últimas muestras para calcular percentiles
+    Parámetros de entrada:
+        - max_samples: int - Muestras recientes conservadas por métrica de tiempo
+    Retorno esperado: None (registro de métricas)
+    """
+
+    def __init__(self, max_samples: int = _MAX_SAMPLES):
+        self._max_samples = max_samples
+        self._lock = threading.Lock()
+        self._counters: Dict[str, float] = {}
+        self._gauges: Dict[str, float] = {}
+        self._timings: Dict[str, dict] = {}
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def increment(self, name: str, value: float = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self._lock:
+            self._gauges[name] = value
+
+    def add_gauge(self, name: str, delta: float) -> None:
+        with self._lock:
+            self._gauges[name] = self._gauges.get(name, 0) + delta
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            timing = self._timings.get(name)
+            if timing is None:
+                timing = self._timings[name] = {"count": 0, "sum": 0.0, "min": value, "max": value}
+                self._samples[name] = deque(maxlen=self._max_samples)
+            timing["count"] += 1
+            timing["sum"] += value
+            timing["min"] = min(timing["min"], value)
+            timing["max"] = max(timing["max"], value)
+            self._samples[name].append(value)
+
+    def snapshot(self) -> dict:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Retorna una copia de todas las métricas, con promedio y percentiles p50/p95 para los tiempos
+        Parámetros de entrada: None
+        Retorno esperado: dict - {"counters": {...}, "gauges": {...}, "timings": {nombre: {count, sum, min, max, avg, p50, p95}}}
+        """
+        with self._lock:
+            timings = {}
+            for name, timing in self._timings.items():
+                samples = sorted(self._samples[name])
+                timings[name] = {
+                    **timing,
+                    "avg": timing["sum"] / timing["count"],
+                    "p50": _percentile(samples, 0.5),
+                    "p95": _percentile(samples, 0.95),
+                }
+            return {"counters": dict(self._counters), "gauges": dict(self._gauges), "timings": timings}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._timings.clear()
+            self._samples.clear()
+
+
+metrics = MetricsRegistry()
@@ -0,0 +1,217 @@
+"""
+Manejo de archivos subidos sin copiar su contenido completo en memoria.
+
+El contenido se mantiene en un SpooledTemporaryFile (memoria hasta cierto tamaño,
+luego disco) y se expone como handle de archivo o memoryview para almacenamiento,
+parsers y hashing.
+"""
+import hashlib
+import io
+import mmap
+import shutil
+from tempfile import SpooledTemporaryFile
+from typing import BinaryIO, Optional
+
+from app.core.config import settings
+
+# Tamaño de bloque para recorrer el archivo (hash y tamaño) sin cargarlo entero
+_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Excepción para archivos que superan el tamaño máximo permitido por archivo
+    Parámetros de entrada: None (clase de excepción)
+    Retorno esperado: None (clase de excepción)
+    """
+    pass
+
+
+async def upload_sha256(upload_file) -> str:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Calcula el SHA-256 del contenido de un UploadFile recorriéndolo por bloques y lo deja posicionado al inicio para el procesamiento posterior
+    Parámetros de entrada:
+        - upload_file: UploadFile - Archivo subido
+    Retorno esperado: str - SHA-256 hex del contenido
+    """
+    source = getattr(upload_file, "file", None)
+    if isinstance(source, io.IOBase) and source.seekable():
+        source.seek(0)
+        digest, _ = SpooledUpload._digest(source, None, upload_file.filename)
+        source.seek(0)
+        return digest
+    data = await upload_file.read()
+    await upload_file.seek(0)
+    return hashlib.sha256(data).hexdigest()
+
+
+class SpooledUpload:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Contenido de un archivo subido respaldado por un archivo temporal (en memoria o en disco). Calcula tamaño y SHA-256 en una sola pasada y entrega handles o memoryview sin duplicar el contenido
+    Parámetros de entrada:
+        - file: BinaryIO - Archivo con el contenido (posicionable)
+        - size: int - Tamaño del contenido en bytes
+        - sha256: str - Hash SHA-256 (hex) del contenido
+        - filename: str | None - Nombre original del archivo
+        - content_type: str | None - Tipo MIME del archivo
+        - owns_file: bool - True si el archivo temporal fue creado aquí y debe cerrarse en close()
+    El atributo storage_path (None por defecto) guarda la ruta del blob cuando el contenido ya se almacenó, por ejemplo en la carga por lotes
+    Retorno esperado: None (clase contenedora)
+    """
+
+    def __init__(
+        self,
+        file: BinaryIO,
+        size: int,
+        sha256: str,
+        filename: Optional[str] = None,
+        content_type: Optional[str] = None,
+        owns_file: bool = False,
+    ):
+        self._file = file
+        self._owns_file = owns_file
+        self._mmap: Optional[mmap.mmap] = None
+        self._views: list = []
+        self.size = size
+        self.sha256 = sha256
+        self.filename = filename
+        self.content_type = content_type
+        self.storage_path: Optional[str] = None
+
+    @classmethod
+    async def from_upload_file(cls, upload_file, max_bytes: Optional[int] = None, copy: bool = False) -> "SpooledUpload":
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Construye un SpooledUpload a partir de un UploadFile. Si el UploadFile ya está respaldado por un archivo temporal (caso de Starlette) se reutiliza sin copiarlo; en otro caso, o con copy=True, el contenido se vuelca a un SpooledTemporaryFile propio. El límite de tamaño se valida con el tamaño declarado antes de leer y mientras se recorre el contenido
+        Parámetros de entrada:
+            - upload_file: UploadFile - Archivo subido
+            - max_bytes: int | None - Tamaño máximo permitido (None usa MAX_UPLOAD_FILE_BYTES; 0 desactiva el límite)
+            - copy: bool - True para copiar siempre el contenido a un temporal propio, que sigue abierto aunque FastAPI cierre el UploadFile al terminar la petición (procesamiento en segundo plano)
+        Retorno esperado: SpooledUpload - Contenido listo para consumir
+        Excepciones: UploadTooLargeError si el archivo supera el tamaño máximo
+        """
+        if max_bytes is None:
+            max_bytes = settings.MAX_UPLOAD_FILE_BYTES
+
+        declared_size = getattr(upload_file, "size", None)
+        if max_bytes and isinstance(declared_size, int) and declared_size > max_bytes:
+            raise UploadTooLargeError(
+                f"El archivo {upload_file.filename} supera el tamaño máximo de {max_bytes} bytes"
+            )
+
+        source = getattr(upload_file, "file", None)
+        if isinstance(source, io.IOBase) and source.seekable() and not copy:
+            # El archivo ya está en un temporal: solo lo recorremos para hash y tamaño
+            spool = source
+            owns_file = False
+        elif isinstance(source, io.IOBase) and source.seekable():
+            # Copia por bloques a un temporal propio (memoria hasta el límite, luego disco)
+            spool = SpooledTemporaryFile(max_size=settings.UPLOAD_SPOOL_MAX_MEMORY_BYTES)
+            source.seek(0)
+            shutil.copyfileobj(source, spool, _CHUNK_SIZE)
+            owns_file = True
+        else:
+            # Objetos sin archivo subyacente: volcamos el contenido a un temporal propio
+            spool = SpooledTemporaryFile(max_size=settings.UPLOAD_SPOOL_MAX_MEMORY_BYTES)
+            data = await upload_file.read()
+            spool.write(data)
+            del data
+            owns_file = True
+
+        spool.seek(0)
+        try:
+            digest, size = cls._digest(spool, max_bytes, upload_file.filename)
+        except UploadTooLargeError:
+            if owns_file:
+                spool.close()
+            raise
+        spool.seek(0)
+        return cls(
+            spool,
+            size=size,
+            sha256=digest,
+            filename=upload_file.filename,
+            content_type=upload_file.content_type,
+            owns_file=owns_file,
+        )
+
+    @staticmethod
+    def _digest(file: BinaryIO, max_bytes: Optional[int], filename: Optional[str]):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Recorre el archivo por bloques calculando SHA-256 y tamaño, cortando en cuanto se supera el límite
+        Parámetros de entrada:
+            - file: BinaryIO - Archivo posicionado al inicio
+            - max_bytes: int | None - Tamaño máximo permitido (0/None sin límite)
+            - filename: str | None - Nombre del archivo para el mensaje de error
+        Retorno esperado: tuple - (sha256_hex: str, size: int)
+        Excepciones: UploadTooLargeError si el archivo supera el tamaño máximo
+        """
+        hasher = hashlib.sha256()
+        size = 0
+        while chunk := file.read(_CHUNK_SIZE):
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                raise UploadTooLargeError(
+                    f"El archivo {filename} supera el tamaño máximo de {max_bytes} bytes"
+                )
+            hasher.update(chunk)
+        return hasher.hexdigest(), size
+
+    def open(self) -> BinaryIO:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Retorna el handle del contenido posicionado al inicio. Es el mismo handle para todos los consumidores, por lo que deben usarse de forma secuencial y no cerrarlo
+        Parámetros de entrada: None
+        Retorno esperado: BinaryIO - Handle de lectura posicionado en 0
+        """
+        self._file.seek(0)
+        return self._file
+
+    def getbuffer(self) -> memoryview:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Retorna una vista de solo lectura del contenido sin copiarlo: el buffer interno si sigue en memoria o un mmap del archivo temporal si ya pasó a disco
+        Parámetros de entrada: None
+        Retorno esperado: memoryview - Vista del contenido completo
+        """
+        if self.size == 0:
+            return memoryview(b"")
+
+        inner = getattr(self._file, "_file", self._file)
+        if isinstance(inner, io.BytesIO):
+            base = inner.getbuffer()
+        else:
+            if self._mmap is None:
+                self._file.flush()
+                self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+            base = memoryview(self._mmap)
+
+        view = base.toreadonly()
+        self._views.extend((view, base))
+        return view
+
+    def close(self) -> None:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Libera las memoryview entregadas y el mmap (si se creó), para que el archivo temporal pueda cerrarse. El archivo temporal solo se cierra si fue creado por esta clase; si no, lo cierra el dueño del UploadFile
+        Parámetros de entrada: None
+        Retorno esperado: None
+        """
+        for view in self._views:
+            view.release()
+        self._views.clear()
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+        if self._owns_file:
+            self._file.close()
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
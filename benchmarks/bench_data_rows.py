@@ -0,0 +1,120 @@
+"""
+Benchmark de la consulta de filas (DataRow): paginación por keyset frente a OFFSET,
+búsqueda por prefijo de nombre y por external_id, y filtro de precio.
+
+Carga N filas sintéticas repartidas en archivos, crea los índices de app/db/indexes.py
+y mide la latencia de páginas al principio y al final de un archivo grande.
+
+Uso (desde la raíz del repositorio, con el .env del proyecto):
+    python -m benchmarks.bench_data_rows --rows 1000000
+    # 100M filas contra una base SQL Server dedicada (la carga tarda; --skip-load reutiliza los datos)
+    python -m benchmarks.bench_data_rows --rows 100000000 --database-url "mssql+pyodbc://..." --batch-size 50000
+"""
+import argparse
+import random
+import statistics
+import time
+
+from sqlalchemy import create_engine, func, insert, select, text
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.db.indexes import ensure_indexes
+from app.models.data_row import DataRow
+from app.models.file_model import File
+from app.services import data_row_service
+
+_WORDS = ["Tornillo", "Tuerca", "Arandela", "Clavo", "Perno", "Taco", "Bisagra", "Cable"]
+
+
+def _load(engine, rows: int, files: int, batch_size: int) -> None:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Inserta archivos y filas sintéticas por lotes. El archivo 1 recibe la mitad de las filas para medir páginas profundas
+    Parámetros de entrada:
+        - engine: Engine - Motor de SQLAlchemy
+        - rows: int - Total de filas
+        - files: int - Número de archivos
+        - batch_size: int - Filas por INSERT
+    Retorno esperado: None
+    """
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        conn.execute(insert(File), [{"filename": f"f{i}.csv", "storage_path": f"blobs/{i}", "uploaded_by": "bench"} for i in range(1, files + 1)])
+        file_ids = [row[0] for row in conn.execute(select(File.id).order_by(File.id))]
+
+    start = time.perf_counter()
+    for offset in range(0, rows, batch_size):
+        batch = []
+        for i in range(offset, min(offset + batch_size, rows)):
+            batch.append({
+                "file_id": file_ids[0] if i % 2 == 0 else rng.choice(file_ids),
+                "external_id": f"EXT-{i}",
+                "name": f"{rng.choice(_WORDS)} {i}",
+                "price": round(rng.uniform(0, 1000), 2),
+                "uploaded_by": "bench",
+            })
+        with engine.begin() as conn:
+            conn.execute(insert(DataRow), batch)
+    print(f"carga: {rows} filas en {time.perf_counter() - start:.1f} s")
+
+
+def _timed(fn, runs: int) -> str:
+    times = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        fn()
+        times.append((time.perf_counter() - start) * 1000)
+    return f"p50 {statistics.median(times):8.2f} ms   max {max(times):8.2f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--files", type=int, default=100)
+    parser.add_argument("--batch-size", type=int, default=20_000)
+    parser.add_argument("--page-size", type=int, default=100)
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--database-url", default="sqlite:///benchmarks/data_rows.db")
+    parser.add_argument("--skip-load", action="store_true", help="Reutiliza las filas ya cargadas")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    if not args.skip_load:
+        Base.metadata.create_all(bind=engine)
+        with engine.connect() as conn:
+            if conn.execute(select(func.count()).select_from(DataRow)).scalar():
+                raise SystemExit("data_rows ya tiene filas: use una base dedicada vacía o --skip-load")
+        _load(engine, args.rows, args.files, args.batch_size)
+    ensure_indexes(engine)
+
+    data_row_service.SessionLocal = sessionmaker(bind=engine)
+    with engine.connect() as conn:
+        file_rows = conn.execute(select(func.count()).select_from(DataRow).where(DataRow.file_id == 1)).scalar()
+        last_ids = conn.execute(
+            select(DataRow.id).where(DataRow.file_id == 1).order_by(DataRow.id.desc()).limit(args.page_size + 1)
+        ).scalars().all()
+    deep_after_id = last_ids[-1]
+    deep_offset = max(file_rows - args.page_size, 0)
+    print(f"archivo 1: {file_rows} filas; página profunda en offset {deep_offset}")
+
+    def offset_page(offset: int):
+        with engine.connect() as conn:
+            conn.execute(
+                text("SELECT id, external_id, name, price FROM data_rows WHERE file_id = 1 ORDER BY id LIMIT :limit OFFSET :offset")
+                if engine.dialect.name != "mssql" else
+                text("SELECT id, external_id, name, price FROM data_rows WHERE file_id = 1 ORDER BY id OFFSET :offset ROWS FETCH NEXT :limit ROWS ONLY"),
+                {"limit": args.page_size, "offset": offset},
+            ).all()
+
+    print("keyset primera página   ", _timed(lambda: data_row_service.list_file_rows(1, limit=args.page_size), args.runs))
+    print("keyset última página    ", _timed(lambda: data_row_service.list_file_rows(1, after_id=deep_after_id, limit=args.page_size), args.runs))
+    print("OFFSET primera página   ", _timed(lambda: offset_page(0), args.runs))
+    print("OFFSET última página    ", _timed(lambda: offset_page(deep_offset), max(3, args.runs // 5)))
+    print("keyset + precio 10..20  ", _timed(lambda: data_row_service.list_file_rows(1, limit=args.page_size, min_price=10, max_price=20), args.runs))
+    print("external_id exacto      ", _timed(lambda: data_row_service.search_rows(external_id=f"EXT-{args.rows // 2}"), args.runs))
+    print("prefijo de nombre       ", _timed(lambda: data_row_service.search_rows(name="Tuerca 12", limit=args.page_size), args.runs))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark de la reingesta de una planilla actualizada: carga completa (todas las filas
+se vuelven a insertar) frente a carga delta (solo se escriben las filas que cambiaron).
+
+Carga una versión inicial de N filas y luego una versión con --change-ratio de filas
+modificadas (la mitad con otro precio, un cuarto quitadas y un cuarto nuevas).
+
+Uso (desde la raíz del repositorio, con el .env del proyecto):
+    python -m benchmarks.bench_delta_ingest --rows 1000000 --change-ratio 0.01
+    python -m benchmarks.bench_delta_ingest --rows 1000000 --database-url "mssql+pyodbc://..."
+"""
+import argparse
+import random
+import time
+
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base import Base
+from app.db.indexes import ensure_indexes
+from app.models.data_row import DataRow
+from app.models.file_model import File
+from app.services.delta_ingest_service import apply_delta, insert_rows
+
+
+def _versions(rows: int, change_ratio: float):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Genera la versión inicial y la actualizada de la planilla
+    Parámetros de entrada:
+        - rows: int - Filas de la versión inicial
+        - change_ratio: float - Fracción de filas que cambian en la nueva versión
+    Retorno esperado: tuple[list[dict], list[dict]] - (versión inicial, versión actualizada)
+    """
+    rng = random.Random(42)
+    original = [
+        {"external_id": f"EXT-{i}", "name": f"Producto {i}", "price": round(rng.uniform(0, 1000), 2), "uploaded_by": "bench"}
+        for i in range(rows)
+    ]
+    changed = max(int(rows * change_ratio), 4)
+    picked = rng.sample(range(rows), changed)
+    updated_ids = set(picked[: changed // 2])
+    removed_ids = set(picked[changed // 2: changed // 2 + changed // 4])
+
+    updated = [
+        {**row, "price": row["price"] + 1} if i in updated_ids else row
+        for i, row in enumerate(original)
+        if i not in removed_ids
+    ]
+    updated += [
+        {"external_id": f"NEW-{i}", "name": f"Nuevo {i}", "price": 1.0, "uploaded_by": "bench"}
+        for i in range(changed - len(updated_ids) - len(removed_ids))
+    ]
+    return original, updated
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--change-ratio", type=float, default=0.01)
+    parser.add_argument("--database-url", default="sqlite:///benchmarks/delta_ingest.db")
+    args = parser.parse_args()
+
+    engine = create_engine(args.database_url)
+    Base.metadata.create_all(bind=engine)
+    ensure_indexes(engine)
+    with engine.connect() as conn:
+        if conn.execute(select(func.count()).select_from(DataRow)).scalar():
+            raise SystemExit("data_rows ya tiene filas: use una base dedicada vacía")
+
+    original, updated = _versions(args.rows, args.change_ratio)
+    db = sessionmaker(bind=engine)()
+    try:
+        full_file, delta_file = File(filename="full.csv", storage_path="full", uploaded_by="bench"), File(filename="delta.csv", storage_path="delta", uploaded_by="bench")
+        db.add_all([full_file, delta_file])
+        db.commit()
+
+        start = time.perf_counter()
+        insert_rows(db, delta_file.id, original)
+        db.commit()
+        print(f"versión inicial: {len(original)} filas en {time.perf_counter() - start:.2f} s")
+
+        # Carga completa: la nueva versión se inserta entera en un archivo nuevo
+        start = time.perf_counter()
+        insert_rows(db, full_file.id, updated)
+        db.commit()
+        print(f"carga completa : {len(updated)} filas escritas en {time.perf_counter() - start:.2f} s")
+
+        # Carga delta: solo se escriben las filas distintas
+        start = time.perf_counter()
+        counts = apply_delta(db, delta_file.id, updated)
+        db.commit()
+        written = counts["changed"] + counts["added"] + counts["removed"]
+        print(f"carga delta    : {written} filas escritas en {time.perf_counter() - start:.2f} s  {counts}")
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark de la búsqueda de texto en description y summary (app/services/document_search_service.py):
+latencia de una página de resultados con FTS5 y con el índice invertido propio, frente a
+un recorrido de la tabla con LIKE '%término%' (que debe leer todas las coincidencias para
+poder ordenarlas).
+
+Usa una base SQLite en un archivo temporal con textos generados a partir de un vocabulario
+con distribución de Zipf (pocas palabras muy frecuentes y muchas raras). El índice full-text
+de SQL Server se mide aparte, contra una base con el índice creado.
+
+Uso (desde la raíz del repositorio, con el .env del proyecto):
+    python -m benchmarks.bench_document_search --documents 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert, or_, select
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import settings
+from app.db.base_class import Base
+from app.models.document import Document, DocumentAnalysis
+from app.models.document_search_term import DocumentSearchTerm
+from app.services.document_search_service import ensure_search_index, index_analyses, rank_documents
+
+_BATCH_ROWS = 20000
+_VOCABULARY = 50000
+
+
+def _vocabulary(rng: random.Random):
+    # Palabras de 4 a 10 letras al azar: como en un texto real, pocas comparten prefijo
+    letters = "abcdefghijklmnopqrstuvwxyz"
+    return ["".join(rng.choice(letters) for _ in range(rng.randint(4, 10))) for _ in range(_VOCABULARY)]
+
+
+def _words(rng: random.Random, vocabulary, count: int):
+    # Zipf aproximado: la posición de la palabra sigue una distribución de Pareto
+    return " ".join(vocabulary[min(int(rng.paretovariate(1.1)), _VOCABULARY) - 1] for _ in range(count))
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return statistics.median(samples) * 1000, samples[int(len(samples) * 0.95) - 1] * 1000
+
+
+def _like_scan(db, q: str):
+    # Todas las coincidencias: para ordenar por relevancia no alcanza con las primeras
+    pattern = f"%{q}%"
+    return db.execute(
+        select(DocumentAnalysis.id)
+        .where(or_(DocumentAnalysis.description.like(pattern), DocumentAnalysis.summary.like(pattern)))
+    ).all()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--documents", type=int, default=1_000_000, help="Análisis con descripción y resumen")
+    parser.add_argument("--queries", type=int, default=200, help="Búsquedas medidas por variante")
+    parser.add_argument("--like-queries", type=int, default=20, help="Búsquedas medidas con LIKE (recorren la tabla)")
+    parser.add_argument("--limit", type=int, default=20, help="Resultados por página")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+    vocabulary = _vocabulary(rng)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine, tables=[Document.__table__, DocumentAnalysis.__table__, DocumentSearchTerm.__table__])
+        db = sessionmaker(bind=engine)()
+        db.execute(insert(Document), [{"id": 1, "filename": "bench.pdf", "storage_path": "bench"}])
+
+        start = time.perf_counter()
+        for first in range(1, args.documents + 1, _BATCH_ROWS):
+            db.execute(insert(DocumentAnalysis), [
+                {"id": i, "document_id": 1, "classification": "INFORMACION", "description": _words(rng, vocabulary, 30), "summary": _words(rng, vocabulary, 12)}
+                for i in range(first, min(first + _BATCH_ROWS, args.documents + 1))
+            ])
+        db.commit()
+        print(f"datos: {args.documents} análisis en {time.perf_counter() - start:.1f} s")
+
+        for backend in ("fts5", "inverted"):
+            settings.DOCUMENT_SEARCH_BACKEND = backend
+            ensure_search_index(engine)
+            start = time.perf_counter()
+            after_id = 0
+            while True:
+                batch = db.execute(
+                    select(DocumentAnalysis.id, DocumentAnalysis.description, DocumentAnalysis.summary)
+                    .where(DocumentAnalysis.id > after_id)
+                    .order_by(DocumentAnalysis.id)
+                    .limit(_BATCH_ROWS)
+                ).all()
+                if not batch:
+                    break
+                after_id = batch[-1].id
+                index_analyses(db, [tuple(row) for row in batch])
+                db.commit()
+            print(f"índice {backend}: {time.perf_counter() - start:.1f} s")
+
+        # Mezcla de búsquedas: una palabra frecuente, una rara y dos palabras
+        queries = []
+        for _ in range(args.queries):
+            kind = rng.random()
+            if kind < 0.4:
+                queries.append(vocabulary[rng.randint(0, 19)])
+            elif kind < 0.8:
+                queries.append(vocabulary[rng.randint(100, _VOCABULARY - 1)])
+            else:
+                queries.append(f"{vocabulary[rng.randint(0, 19)]} {vocabulary[rng.randint(20, 499)]}")
+
+        for backend in ("fts5", "inverted"):
+            samples = []
+            for q in queries:
+                start = time.perf_counter()
+                rank_documents(db, q, limit=args.limit, backend=backend)
+                samples.append(time.perf_counter() - start)
+            p50, p95 = _percentiles(samples)
+            print(f"{backend:9s}: {len(queries)} búsquedas  p50 {p50:8.2f} ms  p95 {p95:8.2f} ms")
+
+        samples = []
+        for q in queries[:args.like_queries]:
+            start = time.perf_counter()
+            _like_scan(db, q.split()[0])
+            samples.append(time.perf_counter() - start)
+        p50, p95 = _percentiles(samples)
+        print(f"LIKE     : {len(samples)} búsquedas  p50 {p50:8.2f} ms  p95 {p95:8.2f} ms  (sin ranking)")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
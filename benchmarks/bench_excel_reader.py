@@ -0,0 +1,126 @@
+"""
+Benchmark de la lectura de Excel: pandas.read_excel (libro completo en memoria y
+DataFrame convertido a registros, como se leía antes) frente a la lectura por lotes de
+app/utils/excel_reader.py con openpyxl en modo read_only y con python-calamine. La
+variante "upload" mide la carga completa con handle_upload (lectura, validación e INSERT
+lote a lote en una base SQLite temporal), sin escribir el blob.
+
+Cada variante corre en un proceso nuevo para que la memoria de una no afecte a la otra.
+Se reporta tiempo, filas por segundo y el aumento del RSS máximo durante la lectura
+(medido después de importar los módulos de cada variante).
+
+Uso (desde la raíz del repositorio):
+    python -m benchmarks.bench_excel_reader --rows 1000000
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+def _write_workbook(path: str, rows: int) -> None:
+    from openpyxl import Workbook
+
+    # write_only: el libro de prueba se genera sin mantenerlo en memoria
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Precios")
+    sheet.append(["id", "name", "price", "category"])
+    for i in range(rows):
+        sheet.append([f"EXT-{i}", f"Producto {i}", (i % 1000) + 0.5, f"Categoría {i % 20}"])
+    workbook.save(path)
+
+
+def _read_pandas(path: str) -> int:
+    import pandas as pd
+
+    df = pd.read_excel(path, engine="openpyxl")
+    df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
+    return len(df.replace({pd.NA: None, pd.NaT: None}).to_dict("records"))
+
+
+def _read_batches(path: str, engine: str) -> int:
+    from app.utils.excel_reader import iter_excel_batches
+
+    count = 0
+    with open(path, "rb") as file:
+        for _, rows in iter_excel_batches(file, engine=engine):
+            count += len(rows)
+    return count
+
+
+def _handle_upload(path: str) -> int:
+    import asyncio
+
+    from fastapi import UploadFile
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+
+    from app.db.base import Base
+    from app.services import file_service
+
+    async def skip_store(fileobj, sha256):
+        return "file://bench.xlsx", True
+
+    engine = create_engine(f"sqlite:///{os.path.join(os.path.dirname(path), 'upload.db')}")
+    Base.metadata.create_all(bind=engine)
+    file_service.SessionLocal = sessionmaker(bind=engine)
+    file_service.store_blob = skip_store
+    with open(path, "rb") as file:
+        result = asyncio.run(file_service.handle_upload(UploadFile(file=file, filename="bench.xlsx"), "id", "name", uploaded_by="1"))
+    return result["rows_saved"]
+
+
+def _max_rss() -> int:
+    # ru_maxrss está en KiB en Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _measure(name: str, path: str):
+    # Importar antes de medir para que la carga de módulos no cuente como memoria de lectura
+    import openpyxl  # noqa: F401
+    import pandas  # noqa: F401
+    import app.utils.excel_reader  # noqa: F401
+    import app.services.file_service  # noqa: F401
+
+    baseline = _max_rss()
+    start = time.perf_counter()
+    if name == "pandas":
+        rows = _read_pandas(path)
+    elif name == "upload":
+        rows = _handle_upload(path)
+    else:
+        rows = _read_batches(path, name)
+    elapsed = time.perf_counter() - start
+    return rows, elapsed, _max_rss() - baseline
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--readers", default="pandas,openpyxl,calamine,upload")
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "bench.xlsx")
+        start = time.perf_counter()
+        _write_workbook(path, args.rows)
+        print(f"libro: {args.rows} filas, {os.path.getsize(path) / 2**20:.1f} MiB en {time.perf_counter() - start:.1f} s")
+
+        for name in args.readers.split(","):
+            if name == "calamine":
+                try:
+                    import python_calamine  # noqa: F401
+                except ImportError:
+                    print(f"{name:9s} no instalado")
+                    continue
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+                rows, elapsed, rss_growth = pool.submit(_measure, name, path).result()
+            print(f"{name:9s} {rows} filas en {elapsed:6.2f} s  {rows / elapsed:9.0f} filas/s  memoria pico +{rss_growth / 2**20:7.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark de la detección de duplicados entre cargas (app/services/name_index_service.py):
+consulta por lotes con IN (una sentencia por bloque de 2000 hashes) frente a una consulta
+por fila, sobre un índice name_index precargado.
+
+Usa una base SQLite en un archivo temporal (la relación entre ambas variantes es la que
+interesa; en SQL Server la diferencia crece con la latencia de red por consulta).
+
+Uso (desde la raíz del repositorio, con el .env del proyecto):
+    python -m benchmarks.bench_name_index --indexed 1000000 --rows 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+
+from app.db.base_class import Base
+from app.models.name_index import NameIndexEntry
+from app.services.name_index_service import name_hash, probe_names, register_names
+
+_BATCH_ROWS = 50000
+
+
+def _per_row(db, hashes) -> int:
+    # Variante anterior a evitar: una consulta por fila
+    found = 0
+    for hashed in hashes:
+        found += db.execute(
+            select(NameIndexEntry.file_id).where(NameIndexEntry.uploaded_by == "1", NameIndexEntry.name_hash == hashed)
+        ).first() is not None
+    return found
+
+
+def _batched(db, hashes) -> int:
+    found = 0
+    for start in range(0, len(hashes), _BATCH_ROWS):
+        found += len(probe_names(db, "1", hashes[start:start + _BATCH_ROWS]))
+    return found
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--indexed", type=int, default=1_000_000, help="Nombres ya registrados para el usuario")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Filas del archivo nuevo (la mitad ya registradas)")
+    parser.add_argument("--per-row-sample", type=int, default=20_000, help="Filas medidas con la consulta por fila")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = create_engine(f"sqlite:///{os.path.join(tmp, 'bench.db')}")
+        Base.metadata.create_all(bind=engine, tables=[NameIndexEntry.__table__])
+        db = sessionmaker(bind=engine)()
+
+        start = time.perf_counter()
+        register_names(db, "1", 1, (name_hash(f"Producto {i}") for i in range(args.indexed)))
+        db.commit()
+        print(f"índice: {args.indexed} nombres en {time.perf_counter() - start:.1f} s")
+
+        offset = args.indexed - args.rows // 2
+        start = time.perf_counter()
+        hashes = [name_hash(f"Producto {i}") for i in range(offset, offset + args.rows)]
+        print(f"hash:     {args.rows} nombres en {time.perf_counter() - start:6.2f} s")
+
+        start = time.perf_counter()
+        found = _batched(db, hashes)
+        elapsed = time.perf_counter() - start
+        print(f"lotes IN: {args.rows} filas en {elapsed:6.2f} s  {args.rows / elapsed:10.0f} filas/s  ({found} ya cargadas)")
+
+        sample = hashes[:args.per_row_sample]
+        start = time.perf_counter()
+        found = _per_row(db, sample)
+        elapsed = time.perf_counter() - start
+        print(f"por fila: {len(sample)} filas en {elapsed:6.2f} s  {len(sample) / elapsed:10.0f} filas/s  ({found} ya cargadas)")
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
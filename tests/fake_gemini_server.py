@@ -0,0 +1,152 @@
+"""
+Servidor HTTP local que imita la API de Gemini (generateContent / streamGenerateContent).
+Usado por pruebas y benchmarks para no depender del servicio real.
+Generado por IA - Fecha: 2024-12-19
+"""
+import base64
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+_PATH_RE = re.compile(r"/models/(?P<model>[^/:]+):(?P<method>generateContent|streamGenerateContent)")
+
+
+class FakeGeminiServer:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Servidor que responde como Gemini con el texto que retorna `responder`. Puede simular latencia base y ancho de banda de subida para medir el efecto del tamaño del payload
+    Parámetros de entrada:
+        - responder: Callable[[str, dict], str] - Recibe (modelo, cuerpo JSON de la petición) y retorna el texto de la respuesta
+        - base_latency: float - Segundos fijos de "inferencia" por petición
+        - upload_bytes_per_second: float | None - Ancho de banda simulado para el cuerpo recibido (None sin límite)
+        - stream_chunk_size: int - Caracteres por evento en streamGenerateContent
+        - status_code: int - Código HTTP a retornar (para simular errores del servicio)
+    Retorno esperado: None (usar como context manager; `base_url` apunta al servidor)
+    """
+
+    def __init__(
+        self,
+        responder: Callable[[str, Dict[str, Any]], str],
+        base_latency: float = 0.0,
+        upload_bytes_per_second: Optional[float] = None,
+        stream_chunk_size: int = 40,
+        status_code: int = 200,
+    ):
+        self.responder = responder
+        self.base_latency = base_latency
+        self.upload_bytes_per_second = upload_bytes_per_second
+        self.stream_chunk_size = stream_chunk_size
+        self.status_code = status_code
+        self.requests: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._make_handler())
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def inline_parts(self, index: int = 0) -> List[Tuple[str, bytes]]:
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Retorna los archivos adjuntos (inline data) de una petición recibida, aceptando claves camelCase o snake_case
+        Parámetros de entrada:
+            - index: int - Posición de la petición en `requests`
+        Retorno esperado: list - [(mime_type, contenido)]
+        """
+        parts = []
+        for content in self.requests[index]["json"].get("contents", []):
+            for part in content.get("parts", []):
+                inline = part.get("inlineData") or part.get("inline_data")
+                if inline:
+                    mime_type = inline.get("mimeType") or inline.get("mime_type")
+                    data = inline["data"]
+                    # El SDK puede enviar base64 URL-safe sin relleno
+                    parts.append((mime_type, base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))))
+        return parts
+
+    def __enter__(self) -> "FakeGeminiServer":
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def _make_handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def do_POST(self):
+                match = _PATH_RE.search(self.path)
+                length = int(self.headers.get("content-length") or 0)
+                body = self.rfile.read(length)
+                if not match:
+                    self.send_error(404)
+                    return
+
+                model, method = match.group("model"), match.group("method")
+                request_json = json.loads(body or b"{}")
+                with server._lock:
+                    server.requests.append({"model": model, "method": method, "bytes": length, "json": request_json})
+
+                delay = server.base_latency
+                if server.upload_bytes_per_second:
+                    delay += length / server.upload_bytes_per_second
+                if delay:
+                    time.sleep(delay)
+
+                if server.status_code != 200:
+                    payload = json.dumps({"error": {"code": server.status_code, "message": "fake error", "status": "UNAVAILABLE"}}).encode()
+                    self.send_response(server.status_code)
+                    self.send_header("content-type", "application/json")
+                    self.send_header("content-length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+
+                text = server.responder(model, request_json)
+                usage = {
+                    "promptTokenCount": max(1, length // 4),
+                    "candidatesTokenCount": max(1, len(text) // 4),
+                    "totalTokenCount": max(1, length // 4) + max(1, len(text) // 4),
+                }
+
+                if method == "generateContent":
+                    payload = json.dumps(_response(model, text, usage)).encode()
+                    self.send_response(200)
+                    self.send_header("content-type", "application/json")
+                    self.send_header("content-length", str(len(payload)))
+                    self.end_headers()
+                    self.wfile.write(payload)
+                    return
+
+                self.send_response(200)
+                self.send_header("content-type", "text/event-stream")
+                self.end_headers()
+                size = server.stream_chunk_size
+                chunks = [text[i:i + size] for i in range(0, len(text), size)] or [""]
+                for index, chunk in enumerate(chunks):
+                    is_last = index == len(chunks) - 1
+                    event = _response(model, chunk, usage if is_last else None, finished=is_last)
+                    self.wfile.write(f"data: {json.dumps(event)}\r\n\r\n".encode())
+                    self.wfile.flush()
+
+        return Handler
+
+
+def _response(model: str, text: str, usage: Optional[Dict[str, int]], finished: bool = True) -> Dict[str, Any]:
+    candidate: Dict[str, Any] = {"content": {"role": "model", "parts": [{"text": text}]}, "index": 0}
+    if finished:
+        candidate["finishReason"] = "STOP"
+    response: Dict[str, Any] = {"candidates": [candidate], "modelVersion": model}
+    if usage:
+        response["usageMetadata"] = usage
+    return response
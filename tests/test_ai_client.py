@@ -0,0 +1,352 @@
+"""
+Pruebas unitarias para el cliente de IA (preprocesamiento, etapas y salida estructurada).
+Generado por IA - Fecha: 2024-12-19
+"""
+import io
+import json
+import pytest
+from unittest.mock import patch
+from PIL import Image, ImageDraw
+from app.services.ai_client import _preprocess_image, analyze_document, analyze_document_streaming, AIServiceError
+from app.utils.metrics import metrics
+from tests.fake_gemini_server import FakeGeminiServer
+
+
+def _invoice_photo(size=(4000, 3000), color_block=False, exif_orientation=None) -> bytes:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Genera un JPEG que simula la foto de una factura (texto negro sobre papel blanco)
+    Parámetros de entrada:
+        - size: tuple - Dimensiones en píxeles
+        - color_block: bool - Agrega un logo rojo que ocupa parte de la imagen
+        - exif_orientation: int | None - Valor de la etiqueta EXIF de orientación
+    Retorno esperado: bytes - Contenido JPEG
+    """
+    image = Image.new("RGB", size, "white")
+    draw = ImageDraw.Draw(image)
+    for y in range(50, size[1] - 50, 60):
+        draw.text((50, y), "Producto 123  x2  45.00  " * 8, fill="black")
+    if color_block:
+        draw.rectangle((0, 0, size[0] // 3, size[1] // 3), fill=(220, 20, 20))
+    exif = Image.Exif()
+    if exif_orientation:
+        exif[0x0112] = exif_orientation
+    output = io.BytesIO()
+    image.save(output, format="JPEG", quality=95, exif=exif)
+    return output.getvalue()
+
+
+class TestPreprocessImage:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para _preprocess_image
+    """
+
+    def test_downsamples_strips_exif_and_grayscales(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que una foto grande en blanco y negro se reduzca al lado máximo, se rote según el EXIF, pierda los metadatos y pase a escala de grises
+        Parámetros de entrada:
+            - JPEG 4000x3000 con orientación EXIF 6 (rotada 90°)
+        Retorno esperado: JPEG 1536x2048 en modo "L", sin EXIF y más pequeño que el original
+        """
+        raw = _invoice_photo(exif_orientation=6)
+
+        with patch('app.services.ai_client.settings.AI_IMAGE_MAX_DIMENSION', 2048):
+            processed, mime_type = _preprocess_image(raw, "image/jpeg")
+
+        assert mime_type == "image/jpeg"
+        assert len(processed) < len(raw)
+        result = Image.open(io.BytesIO(processed))
+        assert result.size == (1536, 2048)
+        assert result.mode == "L"
+        assert len(result.getexif()) == 0
+
+    def test_keeps_color_when_present(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que una imagen con un logo de color no se convierta a escala de grises
+        Parámetros de entrada:
+            - JPEG con un bloque rojo en una esquina
+        Retorno esperado: JPEG en modo "RGB"
+        """
+        raw = _invoice_photo(size=(3000, 2000), color_block=True)
+
+        processed, _ = _preprocess_image(raw, "image/jpeg")
+
+        assert Image.open(io.BytesIO(processed)).mode == "RGB"
+
+    def test_png_with_transparency_stays_png(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que un PNG con transparencia se recodifique como PNG conservando el canal alfa
+        Parámetros de entrada:
+            - PNG RGBA de 3000x3000
+        Retorno esperado: image/png con canal alfa y lado máximo respetado
+        """
+        image = Image.new("RGBA", (3000, 3000), (0, 0, 0, 0))
+        ImageDraw.Draw(image).rectangle((100, 100, 2000, 2000), fill=(0, 0, 0, 255))
+        output = io.BytesIO()
+        image.save(output, format="PNG")
+
+        with patch('app.services.ai_client.settings.AI_IMAGE_MAX_DIMENSION', 1000):
+            processed, mime_type = _preprocess_image(output.getvalue(), "image/png")
+
+        assert mime_type == "image/png"
+        result = Image.open(io.BytesIO(processed))
+        assert result.size == (1000, 1000)
+        assert result.mode in ("RGBA", "LA")
+
+    def test_returns_original_when_not_decodable_or_disabled(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que se envíe el contenido original si no es una imagen válida o si el preprocesamiento está desactivado
+        Parámetros de entrada:
+            - Bytes que no son una imagen y una foto válida con AI_IMAGE_PREPROCESSING=False
+        Retorno esperado: El mismo contenido y tipo MIME recibidos
+        """
+        assert _preprocess_image(b"no es una imagen", "image/png") == (b"no es una imagen", "image/png")
+
+        raw = _invoice_photo(size=(3000, 2000))
+        with patch('app.services.ai_client.settings.AI_IMAGE_PREPROCESSING', False):
+            assert _preprocess_image(raw, "image/jpeg") == (raw, "image/jpeg")
+
+
+class TestAnalyzeDocumentWithFakeServer:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Pruebas de analyze_document contra el servidor falso de Gemini
+    """
+
+    def test_sends_preprocessed_image(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la imagen enviada a la API sea la preprocesada y que la respuesta se normalice
+        Parámetros de entrada:
+            - Foto JPEG de 4000x3000 y un servidor que responde INFORMACION
+        Retorno esperado: Clasificación INFORMACION y un payload JPEG de a lo sumo 2048 px
+        """
+        raw = _invoice_photo()
+        answer = json.dumps({"classification": "INFORMACION", "summary": "Factura fotografiada", "sentiment": "neutral"})
+
+        with FakeGeminiServer(lambda model, body: answer) as server:
+            with patch('app.services.ai_client.settings.GEMINI_API_KEY', "test-key"), \
+                 patch('app.services.ai_client.settings.GEMINI_BASE_URL', server.base_url):
+                result = analyze_document(raw, filename="factura.jpg", content_type="image/jpeg")
+
+        assert result["classification"] == "INFORMACION"
+        assert result["summary"] == "Factura fotografiada"
+        [(mime_type, sent)] = server.inline_parts(0)
+        assert mime_type == "image/jpeg"
+        assert len(sent) < len(raw)
+        assert max(Image.open(io.BytesIO(sent)).size) <= 2048
+
+
+def _small_png() -> bytes:
+    output = io.BytesIO()
+    Image.new("L", (20, 20), 255).save(output, format="PNG")
+    return output.getvalue()
+
+
+class TestTwoStageAnalysis:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Pruebas del análisis en dos etapas (clasificador rápido + modelo de extracción) contra el servidor falso de Gemini
+    """
+
+    def _analyze(self, responder, two_stage=True):
+        with FakeGeminiServer(responder) as server:
+            with patch('app.services.ai_client.settings.GEMINI_API_KEY', "test-key"), \
+                 patch('app.services.ai_client.settings.GEMINI_BASE_URL', server.base_url), \
+                 patch('app.services.ai_client.settings.AI_TWO_STAGE_ANALYSIS', two_stage), \
+                 patch('app.services.ai_client.settings.AI_CLASSIFIER_MODEL', "modelo-rapido"), \
+                 patch('app.services.ai_client.settings.AI_EXTRACTION_MODEL', "modelo-pesado"), \
+                 patch.dict('app.services.ai_client.settings.AI_MODEL_PRICES_PER_MILLION_TOKENS', {"modelo-rapido": (1.0, 1.0), "modelo-pesado": (10.0, 10.0)}):
+                metrics.reset()
+                result = analyze_document(_small_png(), filename="doc.png", content_type="image/png")
+        return result, [request["model"] for request in server.requests], metrics.snapshot()
+
+    def test_informacion_only_uses_classifier(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que un documento INFORMACION se resuelva solo con el modelo rápido y que se registren latencia y costo de la etapa
+        Parámetros de entrada:
+            - Servidor que responde INFORMACION con resumen
+        Retorno esperado: Una petición a "modelo-rapido", resumen en el resultado y métricas de la etapa classify
+        """
+        answer = json.dumps({"classification": "INFORMACION", "summary": "Circular interna", "sentiment": "neutral"})
+
+        result, models, snapshot = self._analyze(lambda model, body: answer)
+
+        assert models == ["modelo-rapido"]
+        assert result["classification"] == "INFORMACION"
+        assert result["summary"] == "Circular interna"
+        assert snapshot["counters"]["ai.classify.calls"] == 1
+        assert snapshot["counters"]["ai.classify.cost_usd"] > 0
+        assert snapshot["timings"]["ai.classify.seconds"]["count"] == 1
+        assert "ai.extract.calls" not in snapshot["counters"]
+
+    def test_factura_goes_to_extraction_model(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que una FACTURA se clasifique con el modelo rápido y se extraiga con el modelo pesado usando el prompt de extracción
+        Parámetros de entrada:
+            - Servidor que clasifica como FACTURA y extrae número y total
+        Retorno esperado: Peticiones a "modelo-rapido" y luego "modelo-pesado", datos de factura en el resultado y costo de extracción mayor que el de clasificación
+        """
+        def responder(model, body):
+            if model == "modelo-rapido":
+                return json.dumps({"classification": "FACTURA"})
+            return json.dumps({"invoice_number": "F-77", "total_amount": 120.5, "products": [{"name": "Tornillo", "quantity": 10, "unit_price": 12.05, "total": 120.5}]})
+
+        result, models, snapshot = self._analyze(responder)
+
+        assert models == ["modelo-rapido", "modelo-pesado"]
+        assert result["classification"] == "FACTURA"
+        assert result["invoice_number"] == "F-77"
+        assert result["products"][0]["name"] == "Tornillo"
+        assert snapshot["counters"]["ai.extract.cost_usd"] > snapshot["counters"]["ai.classify.cost_usd"]
+
+    def test_single_stage_uses_extraction_model(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que sin el modo de dos etapas se haga una sola llamada con el modelo de extracción y el prompt completo
+        Parámetros de entrada:
+            - AI_TWO_STAGE_ANALYSIS=False
+        Retorno esperado: Una petición a "modelo-pesado" registrada en la etapa analysis
+        """
+        answer = json.dumps({"classification": "INFORMACION", "summary": "Nota"})
+
+        result, models, snapshot = self._analyze(lambda model, body: answer, two_stage=False)
+
+        assert models == ["modelo-pesado"]
+        assert result["summary"] == "Nota"
+        assert snapshot["counters"]["ai.analysis.calls"] == 1
+
+
+class TestStructuredOutput:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Pruebas de la salida estructurada y del respaldo tolerante contra el servidor falso de Gemini
+    """
+
+    def _analyze(self, responder):
+        with FakeGeminiServer(responder) as server:
+            with patch('app.services.ai_client.settings.GEMINI_API_KEY', "test-key"), \
+                 patch('app.services.ai_client.settings.GEMINI_BASE_URL', server.base_url):
+                metrics.reset()
+                result = analyze_document(_small_png(), filename="doc.png", content_type="image/png")
+        return result, server
+
+    def test_requests_json_schema(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que se pida salida JSON con el esquema del análisis y que la respuesta se use sin el respaldo
+        Parámetros de entrada:
+            - Servidor que responde JSON válido
+        Retorno esperado: responseMimeType application/json, esquema con el enum de clasificación y ningún fallback registrado
+        """
+        answer = json.dumps({"classification": "FACTURA", "invoice_number": "A-1", "products": [{"name": "x", "quantity": 2}]})
+
+        result, server = self._analyze(lambda model, body: answer)
+
+        config = server.requests[0]["json"]["generationConfig"]
+        assert config["responseMimeType"] == "application/json"
+        assert "FACTURA" in json.dumps(config)
+        assert result["products"] == [{"name": "x", "quantity": 2.0, "unit_price": None, "total": None}]
+        counters = metrics.snapshot()["counters"]
+        assert counters["ai.parse.responses"] == 1
+        assert "ai.parse.fallbacks" not in counters
+
+    def test_fallback_extracts_json_from_prose(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que si el modelo agrega texto alrededor del JSON la llamada no se pierda
+        Parámetros de entrada:
+            - Servidor que responde prosa + bloque markdown con el JSON
+        Retorno esperado: Resultado normalizado y un fallback registrado
+        """
+        answer = 'Este es el resultado:\n```json\n{"classification": "informacion", "summary": "Aviso"}\n```'
+
+        result, _ = self._analyze(lambda model, body: answer)
+
+        assert result["classification"] == "INFORMACION"
+        assert result["summary"] == "Aviso"
+        assert metrics.snapshot()["counters"]["ai.parse.fallbacks"] == 1
+
+    def test_unparseable_response_counts_failure(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que una respuesta sin JSON válido termine en AIServiceError y se cuente como falla de parseo
+        Parámetros de entrada:
+            - Servidor que responde solo texto
+        Retorno esperado: AIServiceError y ai.parse.failures = 1
+        """
+        with pytest.raises(AIServiceError):
+            self._analyze(lambda model, body: "No puedo analizar este documento")
+
+        assert metrics.snapshot()["counters"]["ai.parse.failures"] == 1
+
+
+class TestStreamingAnalysis:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Pruebas de analyze_document_streaming contra el endpoint streamGenerateContent del servidor falso
+    """
+
+    def test_emits_fields_before_the_response_ends(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que se use la API de streaming, que classification llegue primero y cada producto como evento propio, y que el resultado final esté normalizado
+        Parámetros de entrada:
+            - Respuesta de factura enviada en fragmentos de 7 caracteres
+        Retorno esperado: Eventos field/product en orden y resultado igual al de analyze_document
+        """
+        answer = json.dumps({
+            "classification": "factura",
+            "invoice_number": "F-7",
+            "products": [{"name": "a", "quantity": 1, "unit_price": 2, "total": 2}, {"name": "b", "quantity": 1, "unit_price": 3, "total": 3}],
+            "total_amount": 5,
+        })
+        events = []
+        with FakeGeminiServer(lambda model, body: answer, stream_chunk_size=7) as server:
+            with patch('app.services.ai_client.settings.GEMINI_API_KEY', "test-key"), \
+                 patch('app.services.ai_client.settings.GEMINI_BASE_URL', server.base_url):
+                result = analyze_document_streaming(_small_png(), "doc.png", "image/png", lambda event, data: events.append((event, data)))
+
+        assert server.requests[0]["method"] == "streamGenerateContent"
+        assert events[0] == ("field", {"name": "classification", "value": "factura"})
+        assert [data["name"] for event, data in events if event == "product"] == ["a", "b"]
+        assert ("field", {"name": "total_amount", "value": 5}) in events
+        assert result["classification"] == "FACTURA"
+        assert result["total_amount"] == 5
+        assert len(result["products"]) == 2
+
+    def test_two_stage_emits_classification_from_classifier(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que en modo de dos etapas la clasificación se emita tras la llamada al clasificador y solo la extracción use streaming
+        Parámetros de entrada:
+            - Clasificador que responde FACTURA y extracción con un producto
+        Retorno esperado: classification como primer evento, luego los campos de extracción
+        """
+        def responder(model, body):
+            if model == "modelo-rapido":
+                return json.dumps({"classification": "FACTURA"})
+            return json.dumps({"invoice_number": "F-8", "products": [{"name": "p"}], "total_amount": 1})
+
+        events = []
+        with FakeGeminiServer(responder) as server:
+            with patch('app.services.ai_client.settings.GEMINI_API_KEY', "test-key"), \
+                 patch('app.services.ai_client.settings.GEMINI_BASE_URL', server.base_url), \
+                 patch('app.services.ai_client.settings.AI_TWO_STAGE_ANALYSIS', True), \
+                 patch('app.services.ai_client.settings.AI_CLASSIFIER_MODEL', "modelo-rapido"), \
+                 patch('app.services.ai_client.settings.AI_EXTRACTION_MODEL', "modelo-pesado"):
+                result = analyze_document_streaming(_small_png(), "doc.png", "image/png", lambda event, data: events.append((event, data)))
+
+        assert [(r["model"], r["method"]) for r in server.requests] == [("modelo-rapido", "generateContent"), ("modelo-pesado", "streamGenerateContent")]
+        assert events[0] == ("field", {"name": "classification", "value": "FACTURA"})
+        assert events[1] == ("field", {"name": "invoice_number", "value": "F-8"})
+        assert result["classification"] == "FACTURA"
+        assert result["invoice_number"] == "F-8"
+
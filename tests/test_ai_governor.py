@@ -0,0 +1,220 @@
+"""
+Pruebas unitarias para el gobernador de llamadas a la IA.
+Generado por IA - Fecha: 2024-12-19
+"""
+import json
+import time
+import pytest
+from unittest.mock import patch
+from google.genai import errors as genai_errors
+from app.services.ai_client import analyze_document, AIServiceError
+from app.services.ai_governor import (
+    AdaptiveLimiter,
+    AIGovernor,
+    AIOverloadedError,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceededError,
+    reset_governor,
+)
+from app.utils.metrics import metrics
+from tests.fake_gemini_server import FakeGeminiServer
+
+
+def _server_error() -> Exception:
+    return genai_errors.ServerError(503, {"error": {"code": 503, "message": "overloaded", "status": "UNAVAILABLE"}})
+
+
+def _governor(max_retries=2, failure_threshold=5, reset_timeout=30.0) -> AIGovernor:
+    return AIGovernor(
+        AdaptiveLimiter(initial_limit=4, min_limit=1, max_limit=8, target_latency=1.0, decrease_factor=0.5),
+        CircuitBreaker(failure_threshold=failure_threshold, reset_timeout=reset_timeout),
+        max_retries=max_retries,
+        base_delay=0.0,
+        max_delay=0.0,
+    )
+
+
+@pytest.fixture(autouse=True)
+def fresh_governor():
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Descarta el gobernador compartido antes y después de cada prueba para no arrastrar el estado del breaker
+    """
+    reset_governor()
+    metrics.reset()
+    yield
+    reset_governor()
+
+
+class TestAdaptiveLimiter:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para el límite de concurrencia AIMD
+    """
+
+    def test_additive_increase_and_multiplicative_decrease(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que las llamadas rápidas suban el límite de a poco y que una llamada lenta lo reduzca a la mitad
+        Parámetros de entrada:
+            - Límite inicial 4, 8 llamadas rápidas y una lenta
+        Retorno esperado: Límite 5 tras las rápidas y 2 tras la lenta
+        """
+        limiter = AdaptiveLimiter(initial_limit=4, min_limit=1, max_limit=8, target_latency=1.0, decrease_factor=0.5)
+        for _ in range(8):
+            limiter.acquire(timeout=1)
+            limiter.release(latency=0.1)
+        assert limiter.limit == 5
+
+        limiter.acquire(timeout=1)
+        limiter.release(latency=5.0)
+        assert limiter.limit == 2
+        assert metrics.snapshot()["gauges"]["ai.governor.in_flight"] == 0
+
+    def test_rejects_when_no_slot_before_timeout(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que sin cupos disponibles se rechace la llamada al vencer la espera
+        Parámetros de entrada:
+            - Límite 1 ocupado y una segunda llamada con timeout de 50 ms
+        Retorno esperado: AIOverloadedError y el contador de rechazos en 1
+        """
+        limiter = AdaptiveLimiter(initial_limit=1, min_limit=1, max_limit=1, target_latency=1.0, decrease_factor=0.5)
+        limiter.acquire(timeout=1)
+
+        with pytest.raises(AIOverloadedError):
+            limiter.acquire(timeout=0.05)
+        assert metrics.snapshot()["counters"]["ai.governor.rejected"] == 1
+
+
+class TestCircuitBreaker:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para el circuit breaker
+    """
+
+    def test_opens_after_threshold_and_recovers_with_probe(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que el circuito se abra tras N fallas temporales, rechace llamadas, pase a semiabierto al vencer la espera y se cierre con una prueba exitosa
+        Parámetros de entrada:
+            - Umbral 2 y reset de 50 ms
+        Retorno esperado: Estados open -> half_open -> closed; una sola llamada de prueba a la vez
+        """
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+        breaker.record_failure(retryable=True)
+        breaker.record_failure(retryable=True)
+        assert breaker.state == CircuitBreaker.OPEN
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+
+        time.sleep(0.06)
+        assert breaker.state == CircuitBreaker.HALF_OPEN
+        breaker.before_call()
+        with pytest.raises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_success()
+        assert breaker.state == CircuitBreaker.CLOSED
+        assert metrics.snapshot()["gauges"]["ai.breaker.state"] == 0
+
+    def test_non_retryable_errors_do_not_open(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que los errores no reintentables (petición inválida) no cuenten para abrir el circuito
+        Parámetros de entrada:
+            - Umbral 2 y tres fallas no reintentables
+        Retorno esperado: Circuito cerrado
+        """
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30)
+        for _ in range(3):
+            breaker.record_failure(retryable=False)
+        assert breaker.state == CircuitBreaker.CLOSED
+
+
+class TestAIGovernor:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para AIGovernor.call
+    """
+
+    def test_retries_retryable_errors(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que un 503 se reintente y la llamada termine con éxito
+        Parámetros de entrada:
+            - Función que falla con 503 dos veces y luego responde
+        Retorno esperado: "ok" tras 3 intentos y 2 reintentos registrados
+        """
+        attempts = []
+
+        def fn(remaining):
+            attempts.append(remaining)
+            if len(attempts) < 3:
+                raise _server_error()
+            return "ok"
+
+        assert _governor().call(fn, deadline=time.monotonic() + 10) == "ok"
+        assert len(attempts) == 3
+        assert metrics.snapshot()["counters"]["ai.governor.retries"] == 2
+
+    def test_non_retryable_error_is_raised_immediately(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que un error no reintentable no se reintente
+        Parámetros de entrada:
+            - Función que lanza ValueError
+        Retorno esperado: ValueError tras un solo intento
+        """
+        attempts = []
+
+        def fn(remaining):
+            attempts.append(remaining)
+            raise ValueError("respuesta inválida")
+
+        with pytest.raises(ValueError):
+            _governor().call(fn, deadline=time.monotonic() + 10)
+        assert len(attempts) == 1
+
+    def test_deadline_budget(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que no se inicien llamadas con el presupuesto agotado
+        Parámetros de entrada:
+            - Plazo ya vencido
+        Retorno esperado: DeadlineExceededError sin invocar la función
+        """
+        with pytest.raises(DeadlineExceededError):
+            _governor().call(lambda remaining: pytest.fail("no debe llamarse"), deadline=time.monotonic() - 1)
+
+
+class TestGovernorWithFakeServer:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Pruebas de analyze_document con el servidor falso de Gemini devolviendo errores
+    """
+
+    def test_breaker_fails_fast_while_upstream_is_down(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que con el servicio respondiendo 503 se reintente, se abra el circuito y el siguiente documento falle de inmediato sin llegar al servidor
+        Parámetros de entrada:
+            - Servidor con status 503, 1 reintento y umbral del breaker 2
+        Retorno esperado: AIServiceError en ambos documentos; 2 peticiones al servidor y breaker abierto
+        """
+        image = b"\x89PNG no decodificable"
+        with FakeGeminiServer(lambda model, body: json.dumps({}), status_code=503) as server, \
+             patch('app.services.ai_client.settings.GEMINI_API_KEY', "test-key"), \
+             patch('app.services.ai_client.settings.GEMINI_BASE_URL', server.base_url), \
+             patch('app.services.ai_governor.settings.AI_MAX_RETRIES', 1), \
+             patch('app.services.ai_governor.settings.AI_RETRY_BASE_DELAY_SECONDS', 0.0), \
+             patch('app.services.ai_governor.settings.AI_BREAKER_FAILURE_THRESHOLD', 2):
+            with pytest.raises(AIServiceError):
+                analyze_document(image, filename="a.png", content_type="image/png")
+            with pytest.raises(AIServiceError, match="circuit breaker"):
+                analyze_document(image, filename="b.png", content_type="image/png")
+
+        assert len(server.requests) == 2
+        snapshot = metrics.snapshot()
+        assert snapshot["gauges"]["ai.breaker.state"] == 2
+        assert snapshot["counters"]["ai.breaker.rejected"] == 1
@@ -0,0 +1,141 @@
+"""
+Pruebas unitarias para la caché de lectura de análisis de documentos.
+Generado por IA - Fecha: 2024-12-19
+"""
+from app.services.analysis_cache_service import AnalysisCache, etag_matches, parse_if_match, serialize_analysis
+
+
+class _Loader:
+    def __init__(self):
+        self.calls = 0
+        self.data = {
+            1: {"id": 1, "client_name": "Cliente Ñandú", "products": [{"name": "A"}], "version": 1, "updated_at": "2024-12-19T10:30:15.250000"},
+            2: {"id": 2, "version": 1},
+            3: {"id": 3, "version": 4},
+        }
+
+    def __call__(self, analysis_id):
+        self.calls += 1
+        return self.data.get(analysis_id)
+
+
+class TestAnalysisCache:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para AnalysisCache, etag_matches y parse_if_match
+    """
+
+    def test_read_through(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la segunda lectura no llame al loader y que un análisis inexistente no se cachee
+        Parámetros de entrada:
+            - Lecturas del análisis 1 (dos veces) y del 9 (dos veces)
+        Retorno esperado: Una sola carga del 1 con JSON UTF-8 sin escapar y Last-Modified igual a su updated_at; sin Last-Modified para el 2 (sin updated_at); None y dos cargas para el 9
+        """
+        cache = AnalysisCache(ttl_seconds=60, max_entries=10)
+        loader = _Loader()
+
+        first = cache.get_or_load(1, loader)
+        second = cache.get_or_load(1, loader)
+
+        assert first is second
+        assert loader.calls == 1
+        assert first.body == serialize_analysis(loader.data[1])
+        assert "Ñandú" in first.body.decode("utf-8")
+        assert first.etag == '"1"'
+        assert first.last_modified == "Thu, 19 Dec 2024 10:30:15 GMT"
+        assert cache.get_or_load(2, loader).last_modified is None
+        assert cache.get_or_load(9, loader) is None
+        assert cache.get_or_load(9, loader) is None
+        assert loader.calls == 4
+
+    def test_invalidate_and_ttl(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que invalidar o vencer la entrada fuerce una nueva carga y que el ETag siga a la versión
+        Parámetros de entrada:
+            - Análisis 1 modificado (versión 2) e invalidado; caché con TTL 0
+        Retorno esperado: ETag "2" tras el cambio; mismo ETag al recargar sin cambios
+        """
+        cache = AnalysisCache(ttl_seconds=60, max_entries=10)
+        loader = _Loader()
+        before = cache.get_or_load(1, loader)
+
+        loader.data[1] = {**loader.data[1], "client_name": "Otro", "version": 2}
+        cache.invalidate(1)
+        after = cache.get_or_load(1, loader)
+
+        assert loader.calls == 2
+        assert (before.etag, after.etag) == ('"1"', '"2"')
+
+        expired = AnalysisCache(ttl_seconds=0, max_entries=10)
+        assert expired.get_or_load(1, loader).etag == expired.get_or_load(1, loader).etag
+        assert loader.calls == 4
+
+    def test_load_during_invalidation_not_stored(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que una carga que corría mientras se actualizaba el análisis no quede en la caché con datos viejos
+        Parámetros de entrada:
+            - Loader que invalida el análisis mientras lee
+        Retorno esperado: La lectura siguiente vuelve a cargar
+        """
+        cache = AnalysisCache(ttl_seconds=60, max_entries=10)
+        loader = _Loader()
+
+        def racing_loader(analysis_id):
+            cache.invalidate(analysis_id)
+            return loader(analysis_id)
+
+        cache.get_or_load(1, racing_loader)
+        cache.get_or_load(1, loader)
+
+        assert loader.calls == 2
+
+    def test_lru_eviction(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que al superar max_entries se descarte el análisis menos usado
+        Parámetros de entrada:
+            - Caché de 2 entradas; lecturas 1, 2, 1, 3 y luego 1 y 2
+        Retorno esperado: Solo el 2 se vuelve a cargar
+        """
+        cache = AnalysisCache(ttl_seconds=60, max_entries=2)
+        loader = _Loader()
+        for analysis_id in (1, 2, 1, 3):
+            cache.get_or_load(analysis_id, loader)
+        calls = loader.calls
+
+        cache.get_or_load(1, loader)
+        cache.get_or_load(2, loader)
+
+        assert loader.calls == calls + 1
+
+    def test_etag_matches(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica la comparación de If-None-Match (lista, prefijo W/ y "*")
+        Parámetros de entrada:
+            - Headers None, '"b"', '"a", W/"x"', 'W/"x"', "*"
+        Retorno esperado: False, False, True, True, True
+        """
+        assert not etag_matches(None, '"x"')
+        assert not etag_matches('"b"', '"x"')
+        assert etag_matches('"a", W/"x"', '"x"')
+        assert etag_matches('W/"x"', '"x"')
+        assert etag_matches("*", '"x"')
+
+    def test_parse_if_match(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica la lectura de versiones desde If-Match (comparación fuerte)
+        Parámetros de entrada:
+            - Headers '"3"', '"3", "5"', 'W/"3"', '"abc"', "*"
+        Retorno esperado: [3], [3, 5], [], [], None
+        """
+        assert parse_if_match('"3"') == [3]
+        assert parse_if_match('"3", "5"') == [3, 5]
+        assert parse_if_match('W/"3"') == []
+        assert parse_if_match('"abc"') == []
+        assert parse_if_match("*") is None
@@ -3,6 +3,9 @@ Pruebas unitarias para los endpoints de la API.
 Generado por IA - Fecha: 2024-12-19
 """
 import pytest
+import uuid
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
 from fastapi.testclient import TestClient
 from unittest.mock import patch, MagicMock, AsyncMock
 from app.main import app
@@ -236,6 +239,613 @@ class TestFilesEndpoints:
         )
         
         assert response.status_code in [401, 403]
+    
+    def test_upload_too_large_rejected(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que el endpoint de upload rechace cargas que superan MAX_UPLOAD_FILE_BYTES
+        Parámetros de entrada:
+            - POST /api/v1/files/upload con un CSV de más de 16 bytes y MAX_UPLOAD_FILE_BYTES=16
+            - Header: Authorization: Bearer <token>
+        Retorno esperado: 413 Request Entity Too Large
+        """
+        token = self.get_auth_token()
+        csv_content = 'id,name,price\n1,Producto A,10.5\n'
+        
+        with patch('app.utils.upload_buffer.settings.MAX_UPLOAD_FILE_BYTES', 16):
+            response = client.post(
+                '/api/v1/files/upload',
+                headers={'Authorization': f'Bearer {token}'},
+                data={'parametro1': 'col1', 'parametro2': 'col2'},
+                files={'file': ('test.csv', csv_content, 'text/csv')}
+            )
+        
+        assert response.status_code == 413
+    
+    def test_upload_batch_csv_ndjson(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que el endpoint de carga por lotes procese varios CSV y retorne una línea NDJSON por archivo
+        Parámetros de entrada:
+            - POST /api/v1/files/upload/batch
+            - Header: Authorization: Bearer <token>
+            - Form data: files (2 CSV), parametro1, parametro2
+        Retorno esperado: 200 OK con content-type application/x-ndjson y 2 líneas con status "ok"
+        """
+        import json
+        token = self.get_auth_token()
+        
+        response = client.post(
+            '/api/v1/files/upload/batch',
+            headers={'Authorization': f'Bearer {token}'},
+            data={'parametro1': 'col1', 'parametro2': 'col2'},
+            files=[
+                ('files', ('lote_a.csv', 'id,name,price\n1,Producto A,10.5\n', 'text/csv')),
+                ('files', ('lote_b.csv', 'id,name,price\n1,Producto B,20.0\n', 'text/csv')),
+            ]
+        )
+        
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith('application/x-ndjson')
+        items = [json.loads(line) for line in response.text.splitlines() if line]
+        assert sorted(item['filename'] for item in items) == ['lote_a.csv', 'lote_b.csv']
+        assert all(item['status'] == 'ok' for item in items)
+
+
+    def test_upload_idempotency_key_replays_response(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que repetir una carga con la misma Idempotency-Key retorne la respuesta original sin volver a procesar el archivo ni registrar auditoría
+        Parámetros de entrada:
+            - Dos POST /api/v1/files/upload con el mismo CSV y la misma Idempotency-Key
+        Retorno esperado: Mismo file_id, header Idempotent-Replayed en la segunda respuesta y handle_upload invocado una sola vez; 422 si la clave se reutiliza con otro contenido bajo el mismo nombre
+        """
+        from app.services.idempotency_service import idempotency_store
+        token = self.get_auth_token()
+        csv_content = 'id,name,price\n1,Producto A,10.5\n'
+        idempotency_store.clear()
+
+        def post(content=csv_content):
+            return client.post(
+                '/api/v1/files/upload',
+                headers={'Authorization': f'Bearer {token}', 'Idempotency-Key': 'carga-001'},
+                data={'parametro1': 'col1', 'parametro2': 'col2'},
+                files={'file': ('test.csv', content, 'text/csv')}
+            )
+
+        with patch('app.api.v1.files.handle_upload', new_callable=AsyncMock, return_value={"file_id": 42, "s3_path": "s3://x", "rows_saved": 1, "validations": []}) as mock_upload, \
+             patch('app.api.v1.files.log_events') as mock_log_events:
+            first = post()
+            second = post()
+            other = post('id,name,price\n2,Producto B,20.0\n')
+
+        assert first.status_code == 200 and second.status_code == 200
+        assert second.json() == first.json()
+        assert second.headers.get('Idempotent-Replayed') == 'true'
+        assert 'Idempotent-Replayed' not in first.headers
+        assert other.status_code == 422
+        mock_upload.assert_called_once()
+        mock_log_events.assert_called_once()
+
+
+    def test_get_file_rows_keyset(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que las filas de un CSV cargado se puedan leer por páginas y filtrar por precio
+        Parámetros de entrada:
+            - POST /api/v1/files/upload con 3 filas y GET /api/v1/files/{file_id}/rows con limit=2 y después con min_price
+        Retorno esperado: Primera página de 2 filas con next_after_id, segunda de 1 sin cursor, y 404 para un archivo inexistente
+        """
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        csv_content = 'id,name,price\n1,Producto A,10.5\n2,Producto B,20.0\n3,Producto C,30.0\n'
+        upload = client.post(
+            '/api/v1/files/upload',
+            headers=headers,
+            data={'parametro1': 'col1', 'parametro2': 'col2'},
+            files={'file': ('filas.csv', csv_content, 'text/csv')}
+        )
+        file_id = upload.json()['file_id']
+
+        first = client.get(f'/api/v1/files/{file_id}/rows', headers=headers, params={'limit': 2}).json()
+        second = client.get(f'/api/v1/files/{file_id}/rows', headers=headers, params={'limit': 2, 'after_id': first['next_after_id']}).json()
+        filtered = client.get(f'/api/v1/files/{file_id}/rows', headers=headers, params={'min_price': 15}).json()
+
+        assert [row['name'] for row in first['rows'] + second['rows']] == ['Producto A', 'Producto B', 'Producto C']
+        assert second['next_after_id'] is None
+        assert [row['price'] for row in filtered['rows']] == [20.0, 30.0]
+        assert client.get('/api/v1/files/999999/rows', headers=headers).status_code == 404
+
+
+    def test_export_file_rows_csv(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que las filas de un CSV cargado se exporten como descarga CSV y que un formato desconocido se rechace
+        Parámetros de entrada:
+            - POST /api/v1/files/upload con 2 filas y GET /api/v1/files/{file_id}/export?format=csv|xlsx
+        Retorno esperado: 200 con text/csv y 3 líneas (encabezado + 2 filas); 400 para xlsx
+        """
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        upload = client.post(
+            '/api/v1/files/upload',
+            headers=headers,
+            data={'parametro1': 'col1', 'parametro2': 'col2'},
+            files={'file': ('exportar.csv', 'id,name,price\n1,Producto A,10.5\n2,Producto B,20.0\n', 'text/csv')}
+        )
+        file_id = upload.json()['file_id']
+
+        response = client.get(f'/api/v1/files/{file_id}/export', headers=headers, params={'format': 'csv'})
+
+        assert response.status_code == 200
+        assert response.headers['content-type'].startswith('text/csv')
+        assert response.text.splitlines()[0] == 'id,external_id,name,price,uploaded_by'
+        assert len(response.text.splitlines()) == 3
+        assert client.get(f'/api/v1/files/{file_id}/export', headers=headers, params={'format': 'xlsx'}).status_code == 400
+
+
+    def test_file_rows_require_uploader_role(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que las filas, validaciones y exportaciones de un archivo no sean accesibles con el rol viewer, como el resto de los endpoints de archivos
+        Parámetros de entrada:
+            - Archivo cargado por uploader; GET de /rows/search, /{file_id}/rows, /{file_id}/validations y /{file_id}/export con token de viewer
+        Retorno esperado: 403 en todos los casos
+        """
+        headers = {'Authorization': f'Bearer {self.get_auth_token()}'}
+        upload = client.post(
+            '/api/v1/files/upload',
+            headers=headers,
+            data={'parametro1': 'col1', 'parametro2': 'col2'},
+            files={'file': ('privado.csv', 'id,name,price\n1,Producto A,10.5\n', 'text/csv')}
+        )
+        file_id = upload.json()['file_id']
+        ensure_demo_user()
+        viewer = client.post('/api/v1/auth/login', json={'username': 'viewer', 'password': 'demo1234'}).json()['access_token']
+        viewer_headers = {'Authorization': f'Bearer {viewer}'}
+
+        for path in ('/api/v1/files/rows/search?name=Producto', f'/api/v1/files/{file_id}/rows', f'/api/v1/files/{file_id}/validations', f'/api/v1/files/{file_id}/export?format=csv'):
+            assert client.get(path, headers=viewer_headers).status_code == 403
+
+
+    def test_upload_returns_validation_summary(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la carga retorne el resumen de validaciones con muestras acotadas y que el detalle se consulte por archivo
+        Parámetros de entrada:
+            - CSV con 3 filas inválidas, VALIDATION_SAMPLE_SIZE=2 y GET /api/v1/files/{file_id}/validations?error=TYPE
+        Retorno esperado: 2 muestras, total 3 con truncated, y las 2 validaciones TYPE en el endpoint
+        """
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        csv_content = 'id,name,price\n1,A,abc\n2,,10\n3,C,x\n'
+        with patch('app.services.file_service.settings.VALIDATION_SAMPLE_SIZE', 2):
+            upload = client.post(
+                '/api/v1/files/upload',
+                headers=headers,
+                data={'parametro1': 'col1', 'parametro2': 'col2'},
+                files={'file': ('invalido.csv', csv_content, 'text/csv')}
+            )
+        data = upload.json()
+
+        assert len(data['validations']) == 2
+        assert data['validation_summary']['total'] == 3
+        assert data['validation_summary']['by_error'] == {'TYPE': 2, 'EMPTY': 1}
+        assert data['validation_summary']['truncated'] is True
+
+        page = client.get(f"/api/v1/files/{data['file_id']}/validations", headers=headers, params={'error': 'TYPE'}).json()
+        assert [v['row'] for v in page['validations']] == [1, 3]
+        assert page['next_after_id'] is None
+
+
+    def test_upload_delta_reingests_only_changes(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que volver a subir una planilla con delta=true reutilice el archivo anterior y solo aplique los cambios
+        Parámetros de entrada:
+            - POST /api/v1/files/upload con 3 filas y luego con delta=true (una fila cambiada, una quitada, una nueva); previous_file_id inexistente
+        Retorno esperado: Mismo file_id, delta {"unchanged": 1, "changed": 1, "added": 1, "removed": 1}, 3 filas activas; 404 para el ID inexistente
+        """
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        filename = 'delta_precios.csv'
+        first = client.post(
+            '/api/v1/files/upload',
+            headers=headers,
+            data={'parametro1': 'col1', 'parametro2': 'col2', 'delta': 'true'},
+            files={'file': (filename, 'id,name,price\nD1,A,1\nD2,B,2\nD3,C,3\n', 'text/csv')}
+        ).json()
+        second = client.post(
+            '/api/v1/files/upload',
+            headers=headers,
+            data={'parametro1': 'col1', 'parametro2': 'col2', 'delta': 'true', 'previous_file_id': str(first['file_id'])},
+            files={'file': (filename, 'id,name,price\nD1,A,1\nD2,B,20\nD4,D,4\n', 'text/csv')}
+        )
+
+        assert second.status_code == 200
+        data = second.json()
+        assert data['file_id'] == first['file_id']
+        assert data['delta'] == {'unchanged': 1, 'changed': 1, 'added': 1, 'removed': 1}
+        assert data['rows_saved'] == 2
+        rows = client.get(f"/api/v1/files/{data['file_id']}/rows", headers=headers).json()['rows']
+        assert sorted((row['external_id'], row['price']) for row in rows) == [('D1', 1.0), ('D2', 20.0), ('D4', 4.0)]
+
+        missing = client.post(
+            '/api/v1/files/upload',
+            headers=headers,
+            data={'parametro1': 'col1', 'parametro2': 'col2', 'delta': 'true', 'previous_file_id': '999999'},
+            files={'file': (filename, 'id,name,price\nD1,A,1\n', 'text/csv')}
+        )
+        assert missing.status_code == 404
+
+
+    def test_upload_duplicate_names_across_uploads(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que con DUPLICATE_NAME_SCOPE="uploader" se rechacen los nombres ya cargados por el usuario en otro archivo, salvo los de la versión anterior en una carga delta
+        Parámetros de entrada:
+            - Archivo con "Dup X" y "Dup Y"; otro archivo con "Dup Y" y "Dup Z"; reingesta delta del primero
+        Retorno esperado: "Dup Y" como DUPLICATE en la fila 1 del segundo archivo; la reingesta delta sin validaciones
+        """
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        form = {'parametro1': 'col1', 'parametro2': 'col2'}
+        # Nombres y archivos únicos: el índice de nombres persiste entre ejecuciones sobre la misma base
+        suffix = uuid.uuid4().hex[:8]
+        with patch('app.services.file_service.settings.DUPLICATE_NAME_SCOPE', 'uploader'):
+            first = client.post(
+                '/api/v1/files/upload', headers=headers, data={**form, 'delta': 'true'},
+                files={'file': (f'dup_a_{suffix}.csv', f'name,price\nDup X {suffix},1\nDup Y {suffix},2\n', 'text/csv')}
+            ).json()
+            second = client.post(
+                '/api/v1/files/upload', headers=headers, data=form,
+                files={'file': (f'dup_b_{suffix}.csv', f'name,price\nDup Y {suffix},3\nDup Z {suffix},4\n', 'text/csv')}
+            ).json()
+            again = client.post(
+                '/api/v1/files/upload', headers=headers, data={**form, 'delta': 'true'},
+                files={'file': (f'dup_a_{suffix}.csv', f'name,price\nDup X {suffix},1\nDup Y {suffix},5\n', 'text/csv')}
+            ).json()
+
+        assert second['rows_saved'] == 1
+        assert [(v['row'], v['error']) for v in second['validations']] == [(1, 'DUPLICATE')]
+        assert f"already uploaded in file {first['file_id']}" in second['validations'][0]['message']
+        assert again['file_id'] == first['file_id']
+        assert again['validations'] == []
+
+
+    def test_upload_excel_selected_sheets(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que una carga Excel lea las hojas pedidas en sheets y rechace una hoja inexistente
+        Parámetros de entrada:
+            - Libro con hojas "Enero" (2 filas, una sin precio) y "Febrero" (1 fila); sheets="*" y sheets="Marzo"
+        Retorno esperado: 2 filas guardadas y la validación con su hoja; 400 para "Marzo"
+        """
+        import io
+        from openpyxl import Workbook
+        workbook = Workbook()
+        workbook.active.title = 'Enero'
+        workbook.active.append(['id', 'name', 'price'])
+        workbook.active.append(['X1', 'Hoja A', 1])
+        workbook.active.append(['X2', 'Hoja B', None])
+        workbook.create_sheet('Febrero').append(['id', 'name', 'price'])
+        workbook['Febrero'].append(['X3', 'Hoja C', 3])
+        buffer = io.BytesIO()
+        workbook.save(buffer)
+        content = buffer.getvalue()
+        xlsx_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+
+        response = client.post(
+            '/api/v1/files/upload',
+            headers=headers,
+            data={'parametro1': 'col1', 'parametro2': 'col2', 'sheets': '*'},
+            files={'file': ('hojas.xlsx', content, xlsx_type)}
+        )
+        assert response.status_code == 200
+        data = response.json()
+        assert data['rows_saved'] == 2
+        assert data['validations'] == [{'row': 2, 'column': 'price', 'error': 'EMPTY', 'message': 'price is required and cannot be empty', 'sheet': 'Enero'}]
+
+        missing = client.post(
+            '/api/v1/files/upload',
+            headers=headers,
+            data={'parametro1': 'col1', 'parametro2': 'col2', 'sheets': 'Marzo'},
+            files={'file': ('hojas.xlsx', content, xlsx_type)}
+        )
+        assert missing.status_code == 400
+
+
+    def test_upload_latin1_semicolon_csv(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que un CSV Latin-1 separado por ";" (exportación del ERP) se cargue en el primer intento
+        Parámetros de entrada:
+            - POST /api/v1/files/upload con un CSV cp1252 de 2 filas separado por ";"
+        Retorno esperado: 200 con rows_saved 2 y los nombres con acentos intactos
+        """
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        content = 'id;name;price\nL1;Café;10\nL2;Piñón;2.5\n'.encode('cp1252')
+        response = client.post(
+            '/api/v1/files/upload',
+            headers=headers,
+            data={'parametro1': 'col1', 'parametro2': 'col2'},
+            files={'file': ('erp.csv', content, 'text/csv')}
+        )
+
+        assert response.status_code == 200
+        data = response.json()
+        assert data['rows_saved'] == 2
+        rows = client.get(f"/api/v1/files/{data['file_id']}/rows", headers=headers).json()['rows']
+        assert [row['name'] for row in rows] == ['Café', 'Piñón']
+
+
+    def test_get_analysis_etag(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que GET /analysis/{id} envíe ETag, responda 304 sin consultar la base de datos cuando el cliente ya tiene la versión y entregue un ETag nuevo y el Last-Modified del cambio después de PUT
+        Parámetros de entrada:
+            - Análisis creado en la base de datos sin updated_at; GET, GET con If-None-Match, PUT client_name y GET con el ETag anterior
+        Retorno esperado: 200 con ETag y sin Last-Modified; 304 sin cuerpo ni lectura; 200 con el nuevo client_name, otro ETag y Last-Modified igual al updated_at guardado
+        """
+        from app.db.session import SessionLocal
+        from app.models.document import Document, DocumentAnalysis
+
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        db = SessionLocal()
+        document = Document(filename='factura.pdf', storage_path='file://factura.pdf', content_type='application/pdf', uploaded_by='1')
+        db.add(document)
+        db.flush()
+        analysis = DocumentAnalysis(document_id=document.id, classification='FACTURA', client_name='Cliente', products_json='[{"name": "A"}]')
+        db.add(analysis)
+        db.commit()
+        analysis_id = analysis.id
+        db.close()
+
+        first = client.get(f'/api/v1/files/analysis/{analysis_id}', headers=headers)
+        assert first.status_code == 200
+        assert first.json()['products'] == [{'name': 'A'}]
+        etag = first.headers['etag']
+        assert 'last-modified' not in first.headers
+
+        with patch('app.services.document_update_service.SessionLocal') as mock_session_class:
+            cached = client.get(f'/api/v1/files/analysis/{analysis_id}', headers={**headers, 'If-None-Match': etag})
+        assert cached.status_code == 304
+        assert cached.content == b''
+        assert cached.headers['etag'] == etag
+        mock_session_class.assert_not_called()
+
+        saved = client.put(f'/api/v1/files/analysis/{analysis_id}', headers={**headers, 'If-Match': etag}, json={'client_name': 'Otro'})
+        assert saved.status_code == 200
+        updated = client.get(f'/api/v1/files/analysis/{analysis_id}', headers={**headers, 'If-None-Match': etag})
+        assert updated.status_code == 200
+        assert updated.json()['client_name'] == 'Otro'
+        assert updated.headers['etag'] == saved.headers['etag'] != etag
+        updated_at = datetime.fromisoformat(saved.json()['updated_at']).replace(tzinfo=timezone.utc)
+        assert parsedate_to_datetime(updated.headers['last-modified']) == updated_at.replace(microsecond=0)
+
+
+    def test_update_analysis_if_match(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica el control de concurrencia optimista de PUT /analysis/{id}: If-Match obligatorio y 412 cuando otro usuario guardó antes
+        Parámetros de entrada:
+            - Análisis creado; PUT sin If-Match; dos PUT con el mismo ETag inicial; PUT a un ID inexistente
+        Retorno esperado: 428; 200 con ETag nuevo y 412 sin pisar el primer cambio; 404
+        """
+        from app.db.session import SessionLocal
+        from app.models.document import Document, DocumentAnalysis
+
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        db = SessionLocal()
+        document = Document(filename='cas.pdf', storage_path='file://cas.pdf', content_type='application/pdf', uploaded_by='1')
+        db.add(document)
+        db.flush()
+        analysis = DocumentAnalysis(document_id=document.id, classification='FACTURA', client_name='Cliente')
+        db.add(analysis)
+        db.commit()
+        analysis_id = analysis.id
+        db.close()
+        url = f'/api/v1/files/analysis/{analysis_id}'
+        etag = client.get(url, headers=headers).headers['etag']
+
+        assert client.put(url, headers=headers, json={'client_name': 'Sin versión'}).status_code == 428
+        first = client.put(url, headers={**headers, 'If-Match': etag}, json={'client_name': 'Revisor A'})
+        second = client.put(url, headers={**headers, 'If-Match': etag}, json={'client_name': 'Revisor B'})
+
+        assert first.status_code == 200
+        assert first.json()['version'] == 2
+        assert first.headers['etag'] == '"2"'
+        assert second.status_code == 412
+        assert client.get(url, headers=headers).json()['client_name'] == 'Revisor A'
+        missing = client.put('/api/v1/files/analysis/999999', headers={**headers, 'If-Match': '*'}, json={'client_name': 'X'})
+        assert missing.status_code == 404
+
+
+    def test_batch_get_and_update_analyses(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica la lectura y la actualización de varios análisis por petición, con un solo evento de auditoría
+        Parámetros de entrada:
+            - Dos análisis creados; POST /analysis/batch-get con un ID repetido y uno inexistente; PATCH /analysis/batch con sus versiones; PATCH repetido con las versiones viejas; PATCH sin version; PATCH con un ID inexistente; demasiados IDs
+        Retorno esperado: Análisis en el orden pedido y missing; ambos actualizados a la versión 2 y un log_event; 412 con ambos IDs; 428; 404; 400
+        """
+        from app.db.session import SessionLocal
+        from app.models.document import Document, DocumentAnalysis
+
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        db = SessionLocal()
+        document = Document(filename='lote.pdf', storage_path='file://lote.pdf', content_type='application/pdf', uploaded_by='1')
+        db.add(document)
+        db.flush()
+        analyses = [DocumentAnalysis(document_id=document.id, classification='FACTURA', client_name=name) for name in ('Uno', 'Dos')]
+        db.add_all(analyses)
+        db.commit()
+        first_id, second_id = analyses[0].id, analyses[1].id
+        db.close()
+
+        fetched = client.post('/api/v1/files/analysis/batch-get', headers=headers, json={'ids': [second_id, first_id, second_id, 999999]})
+        assert fetched.status_code == 200
+        assert [a['client_name'] for a in fetched.json()['analyses']] == ['Dos', 'Uno']
+        assert fetched.json()['missing'] == [999999]
+
+        with patch('app.api.v1.files.log_event') as mock_log_event:
+            updated = client.patch('/api/v1/files/analysis/batch', headers=headers, json={'updates': [
+                {'id': first_id, 'version': 1, 'client_name': 'Uno editado'},
+                {'id': second_id, 'version': 1, 'sentiment': 'positivo'},
+            ]})
+        assert updated.status_code == 200
+        assert [(a['client_name'], a['sentiment'], a['version']) for a in updated.json()['analyses']] == [('Uno editado', None, 2), ('Dos', 'positivo', 2)]
+        mock_log_event.assert_called_once()
+        assert mock_log_event.call_args.kwargs['metadata']['updated_fields'] == {str(first_id): ['client_name'], str(second_id): ['sentiment']}
+
+        refetched = client.post('/api/v1/files/analysis/batch-get', headers=headers, json={'ids': [first_id]}).json()
+        assert refetched['analyses'][0]['client_name'] == 'Uno editado'
+
+        stale = client.patch('/api/v1/files/analysis/batch', headers=headers, json={'updates': [
+            {'id': first_id, 'version': 1, 'client_name': 'Pisado'},
+            {'id': second_id, 'version': 1, 'client_name': 'Pisado'},
+        ]})
+        assert stale.status_code == 412
+        assert f'{first_id}, {second_id}' in stale.json()['detail']
+        unversioned = client.patch('/api/v1/files/analysis/batch', headers=headers, json={'updates': [{'id': first_id, 'client_name': 'X'}]})
+        assert unversioned.status_code == 428
+        missing = client.patch('/api/v1/files/analysis/batch', headers=headers, json={'updates': [{'id': 999999, 'version': 1, 'client_name': 'X'}]})
+        assert missing.status_code == 404
+        with patch('app.api.v1.files.settings.ANALYSIS_BATCH_MAX_ITEMS', 1):
+            too_many = client.post('/api/v1/files/analysis/batch-get', headers=headers, json={'ids': [1, 2]})
+        assert too_many.status_code == 400
+
+
+    def test_search_products_after_update(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que los productos guardados con PUT /analysis/{id} se puedan buscar por prefijo de nombre con paginación por keyset
+        Parámetros de entrada:
+            - Análisis creado; PUT con tres productos; búsquedas por un prefijo único (limit 1 y con min_total) y rango de total inválido
+        Retorno esperado: Dos páginas de un producto; un solo producto con total >= 50; 400 con min_total > max_total
+        """
+        from app.db.session import SessionLocal
+        from app.models.document import Document, DocumentAnalysis
+
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        db = SessionLocal()
+        document = Document(filename='productos.pdf', storage_path='file://productos.pdf', content_type='application/pdf', uploaded_by='1')
+        db.add(document)
+        db.flush()
+        analysis = DocumentAnalysis(document_id=document.id, classification='FACTURA', client_name='Cliente')
+        db.add(analysis)
+        db.commit()
+        analysis_id = analysis.id
+        db.close()
+
+        # Prefijo único: los productos de ejecuciones anteriores sobre la misma base no deben aparecer
+        prefix = f'Tornillo-{uuid.uuid4().hex[:8]}'
+        products = [
+            {'name': f'{prefix} M4', 'quantity': 10, 'unit_price': 2.0, 'total': 20.0},
+            {'name': 'Tuerca', 'quantity': 5, 'unit_price': 1.0, 'total': 5.0},
+            {'name': f'{prefix} M8', 'quantity': 20, 'unit_price': 3.0, 'total': 60.0},
+        ]
+        saved = client.put(f'/api/v1/files/analysis/{analysis_id}', headers={**headers, 'If-Match': '*'}, json={'products': products})
+        assert saved.status_code == 200
+        assert [p['name'] for p in saved.json()['products']] == [f'{prefix} M4', 'Tuerca', f'{prefix} M8']
+
+        first = client.get('/api/v1/files/products/search', params={'name': prefix, 'limit': 1}, headers=headers).json()
+        assert [p['name'] for p in first['products']] == [f'{prefix} M4']
+        assert first['products'][0]['analysis_id'] == analysis_id
+        second = client.get('/api/v1/files/products/search', params={'name': prefix, 'limit': 1, 'after_id': first['next_after_id']}, headers=headers).json()
+        assert [p['name'] for p in second['products']] == [f'{prefix} M8']
+
+        expensive = client.get('/api/v1/files/products/search', params={'name': prefix, 'min_total': 50}, headers=headers).json()
+        assert [p['total'] for p in expensive['products']] == [60.0]
+        invalid = client.get('/api/v1/files/products/search?name=T&min_total=10&max_total=1', headers=headers)
+        assert invalid.status_code == 400
+
+
+    def test_search_invoices_and_totals(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica la búsqueda de facturas por proveedor y rango de fechas y los totales por proveedor y mes sobre las fechas normalizadas al actualizar
+        Parámetros de entrada:
+            - Dos facturas de un proveedor con fecha en texto corregida por PUT; búsquedas y totales de enero de 2024; búsqueda sin filtros
+        Retorno esperado: Una factura en el rango; total 2024-01 de 120; 400 sin filtros y con rango de fechas invertido
+        """
+        from app.db.session import SessionLocal
+        from app.models.document import Document, DocumentAnalysis
+
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        # Proveedor único: las facturas de ejecuciones anteriores sobre la misma base no deben contarse
+        provider = f'Proveedor {uuid.uuid4().hex[:8]}'
+        db = SessionLocal()
+        document = Document(filename='facturas.pdf', storage_path='file://facturas.pdf', content_type='application/pdf', uploaded_by='1')
+        db.add(document)
+        db.flush()
+        analyses = [
+            DocumentAnalysis(document_id=document.id, classification='FACTURA', provider_name=provider, total_amount=amount)
+            for amount in (120.0, 80.0)
+        ]
+        db.add_all(analyses)
+        db.commit()
+        ids = [analysis.id for analysis in analyses]
+        db.close()
+
+        for analysis_id, invoice_date in zip(ids, ('15/01/2024', '2024-02-01')):
+            saved = client.put(f'/api/v1/files/analysis/{analysis_id}', headers={**headers, 'If-Match': '*'}, json={'invoice_date': invoice_date})
+            assert saved.status_code == 200
+
+        found = client.get('/api/v1/files/invoices/search', params={'provider_name': provider, 'date_from': '2024-01-01', 'date_to': '2024-01-31'}, headers=headers)
+        assert found.status_code == 200
+        assert [i['id'] for i in found.json()['invoices']] == [ids[0]]
+
+        totals = client.get('/api/v1/files/invoices/totals', params={'provider_name': provider}, headers=headers).json()['totals']
+        assert [(t['month'], t['total_amount']) for t in totals] == [('2024-01', 120.0), ('2024-02', 80.0)]
+        assert client.get('/api/v1/files/invoices/search', headers=headers).status_code == 400
+        assert client.get('/api/v1/files/invoices/totals?date_from=2024-02-01&date_to=2024-01-01', headers=headers).status_code == 400
+
+
+    def test_search_documents_text(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que GET /documents/search encuentre un documento por el texto de su resumen después de actualizarlo
+        Parámetros de entrada:
+            - Análisis informativo con summary actualizado por PUT; búsqueda de dos palabras del resumen; q sin palabras y cursor inválido
+        Retorno esperado: El análisis con su resumen; 400 en los dos casos inválidos
+        """
+        from app.db.session import SessionLocal
+        from app.models.document import Document, DocumentAnalysis
+
+        token = self.get_auth_token()
+        headers = {'Authorization': f'Bearer {token}'}
+        # Palabra única en el resumen: los análisis de ejecuciones anteriores sobre la misma base no deben aparecer
+        marker = f'lote{uuid.uuid4().hex[:8]}'
+        summary = f'Auditoría de hidrocarburos en Patagonia {marker}'
+        db = SessionLocal()
+        document = Document(filename='informe.pdf', storage_path='file://informe.pdf', content_type='application/pdf', uploaded_by='1')
+        db.add(document)
+        db.flush()
+        analysis = DocumentAnalysis(document_id=document.id, classification='INFORMACION', description='Informe')
+        db.add(analysis)
+        db.commit()
+        analysis_id = analysis.id
+        db.close()
+
+        saved = client.put(f'/api/v1/files/analysis/{analysis_id}', headers={**headers, 'If-Match': '*'}, json={'summary': summary})
+        assert saved.status_code == 200
+
+        response = client.get('/api/v1/files/documents/search', params={'q': f'hidrocarburo patagonia {marker}'}, headers=headers)
+        assert response.status_code == 200
+        documents = response.json()['documents']
+        assert [d['analysis_id'] for d in documents] == [analysis_id]
+        assert documents[0]['summary'] == summary
+        assert client.get('/api/v1/files/documents/search?q=%3F%3F', headers=headers).status_code == 400
+        assert client.get('/api/v1/files/documents/search?q=informe&cursor=x', headers=headers).status_code == 400
 
 
 class TestAuditEndpoints:
@@ -331,3 +941,27 @@ class TestAuditEndpoints:
         assert isinstance(data['event_types'], list)
         assert len(data['event_types']) > 0
 
+
+class TestMetricsEndpoint:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para el endpoint de métricas
+    """
+
+    def test_metrics_requires_credentials(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que GET /metrics no sea público: acepta un JWT con rol "uploader" o el token de METRICS_TOKEN
+        Parámetros de entrada:
+            - GET /metrics sin credenciales, con un token inválido, con JWT de uploader y con METRICS_TOKEN
+        Retorno esperado: 401/403 sin credenciales, 401 con token inválido, 200 con JWT y con METRICS_TOKEN
+        """
+        login = client.post('/api/v1/auth/login', json={'username': 'uploader', 'password': 'demo1234'})
+        token = login.json()['access_token']
+
+        assert client.get('/metrics').status_code in (401, 403)
+        assert client.get('/metrics', headers={'Authorization': 'Bearer no-es-un-token'}).status_code == 401
+        assert 'counters' in client.get('/metrics', headers={'Authorization': f'Bearer {token}'}).json()
+        with patch('app.main.settings.METRICS_TOKEN', 'secreto-scraper'):
+            scraped = client.get('/metrics', headers={'Authorization': 'Bearer secreto-scraper'})
+        assert scraped.status_code == 200
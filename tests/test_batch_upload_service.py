@@ -0,0 +1,210 @@
+"""
+Pruebas unitarias para el servicio de carga por lotes.
+Generado por IA - Fecha: 2024-12-19
+"""
+import io
+import json
+import zipfile
+import pytest
+from unittest.mock import patch, AsyncMock
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+from app.services.batch_upload_service import (
+    expand_batch_uploads,
+    process_batch_uploads,
+    BatchUploadError,
+)
+from app.utils.upload_buffer import SpooledUpload
+
+
+def _fake_blob_store():
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Helper con dobles de store_blobs (guardado del lote) y store_blob (reclamación antes de procesar cada archivo) que no tocan la base ni el almacenamiento
+    Retorno esperado: tuple - (store_blobs: AsyncMock, store_blob: AsyncMock)
+    """
+    stored = AsyncMock(side_effect=lambda contents: {sha: (f"file://blobs/{sha}", True) for sha in contents})
+    claimed = AsyncMock(side_effect=lambda handle, sha: (f"file://blobs/{sha}", False))
+    return stored, claimed
+
+
+def _make_upload(filename, content, content_type):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Helper para construir un UploadFile en memoria
+    Parámetros de entrada:
+        - filename: str - Nombre del archivo
+        - content: bytes - Contenido del archivo
+        - content_type: str - Tipo MIME
+    Retorno esperado: UploadFile
+    """
+    return UploadFile(
+        file=io.BytesIO(content),
+        filename=filename,
+        headers=Headers({"content-type": content_type}),
+    )
+
+
+class TestBatchUploadService:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para la expansión y el procesamiento de lotes
+    """
+
+    def test_expand_batch_uploads_extracts_zip_entries(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que un ZIP se reemplace por sus entradas, ignorando directorios y metadatos de macOS
+        Parámetros de entrada:
+            - files: [ZIP con a.csv, docs/b.pdf y __MACOSX/._a.csv, factura.png suelto]
+        Retorno esperado: Lista con a.csv, b.pdf y factura.png con content_type inferido
+        """
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w") as archive:
+            archive.writestr("a.csv", "id,name,price\n1,A,1\n")
+            archive.writestr("docs/", "")
+            archive.writestr("docs/b.pdf", b"%PDF-1.4")
+            archive.writestr("__MACOSX/._a.csv", b"meta")
+
+        uploads = expand_batch_uploads([
+            _make_upload("lote.zip", buffer.getvalue(), "application/zip"),
+            _make_upload("factura.png", b"png", "image/png"),
+        ])
+
+        assert [u.filename for u in uploads] == ["a.csv", "b.pdf", "factura.png"]
+        assert uploads[1].content_type == "application/pdf"
+        assert uploads[0].file.read() == b"id,name,price\n1,A,1\n"
+
+    def test_expand_batch_uploads_invalid_zip(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que un ZIP corrupto produzca BatchUploadError
+        Parámetros de entrada:
+            - files: [archivo .zip con contenido inválido]
+        Retorno esperado: BatchUploadError
+        """
+        with pytest.raises(BatchUploadError):
+            expand_batch_uploads([_make_upload("roto.zip", b"no es zip", "application/zip")])
+
+    def test_expand_batch_uploads_max_files(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que se rechacen lotes con más archivos que BATCH_UPLOAD_MAX_FILES
+        Parámetros de entrada:
+            - files: 3 archivos con BATCH_UPLOAD_MAX_FILES=2
+        Retorno esperado: BatchUploadError
+        """
+        files = [_make_upload(f"{i}.pdf", b"x", "application/pdf") for i in range(3)]
+        with patch('app.services.batch_upload_service.settings.BATCH_UPLOAD_MAX_FILES', 2):
+            with pytest.raises(BatchUploadError):
+                expand_batch_uploads(files)
+
+    @pytest.mark.asyncio
+    async def test_process_batch_uploads_streams_results_and_batches_audit(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que cada archivo genere una línea NDJSON, que el fallo de un archivo no aborte el lote y que la auditoría se registre en una sola llamada
+        Parámetros de entrada:
+            - uploads: [datos.csv (ok), factura.pdf (ok), roto.pdf (falla)]
+        Retorno esperado: 3 líneas NDJSON y una única llamada a log_events con los eventos de los archivos exitosos más el resumen del lote
+        """
+        uploads = [
+            _make_upload("datos.csv", b"id,name,price\n", "text/csv"),
+            _make_upload("factura.pdf", b"%PDF", "application/pdf"),
+            _make_upload("roto.pdf", b"%PDF", "application/pdf"),
+        ]
+
+        async def fake_analyze(upload_file, uploaded_by=None, upload=None):
+            if upload_file.filename == "roto.pdf":
+                raise RuntimeError("fallo de almacenamiento")
+            return {"document_id": 7, "ai_status": "analyzed", "analysis": {"classification": "FACTURA"}}
+
+        csv_result = {"file_id": 1, "s3_path": "file://datos.csv", "rows_saved": 0, "validations": []}
+        stored, claimed = _fake_blob_store()
+        with patch('app.services.batch_upload_service.store_blobs', stored), \
+                patch('app.services.batch_upload_service.store_blob', claimed), \
+                patch('app.services.batch_upload_service.handle_upload', AsyncMock(return_value=csv_result)):
+            with patch('app.services.batch_upload_service.analyze_and_store_document', side_effect=fake_analyze):
+                with patch('app.services.batch_upload_service.log_events') as mock_log_events:
+                    lines = [line async for line in process_batch_uploads(uploads, "a", "b", uploaded_by="1")]
+
+        items = sorted((json.loads(line) for line in lines), key=lambda item: item["index"])
+        assert [item["status"] for item in items] == ["ok", "ok", "error"]
+        assert items[0]["file_type"] == "CSV/Excel"
+        assert items[2]["error"] == "fallo de almacenamiento"
+
+        mock_log_events.assert_called_once()
+        events = mock_log_events.call_args[0][0]
+        # CSV (1 evento) + documento analizado (2 eventos) + resumen del lote
+        assert len(events) == 4
+        assert events[-1]["metadata"]["files_failed"] == 1
+
+    @pytest.mark.asyncio
+    async def test_process_batch_uploads_stores_once_per_content(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que los archivos del lote se guarden juntos antes de procesarlos, una sola vez por contenido distinto, que cada blob se vuelva a reclamar justo antes de procesar su archivo y que los servicios reciban el contenido ya guardado
+        Parámetros de entrada:
+            - uploads: [a.pdf y copia.pdf con el mismo contenido, b.pdf distinto, grande.pdf por encima de MAX_UPLOAD_FILE_BYTES]
+        Retorno esperado: Una llamada a store_blobs con dos contenidos; una reclamación por archivo válido; cada documento recibe su storage_path; grande.pdf falla sin guardarse
+        """
+        uploads = [
+            _make_upload("a.pdf", b"%PDF-igual", "application/pdf"),
+            _make_upload("copia.pdf", b"%PDF-igual", "application/pdf"),
+            _make_upload("b.pdf", b"%PDF-otro", "application/pdf"),
+            _make_upload("grande.pdf", b"%PDF-" + b"x" * 100, "application/pdf"),
+        ]
+        received = {}
+
+        async def fake_analyze(upload_file, uploaded_by=None, upload=None):
+            received[upload_file.filename] = upload.storage_path
+            return {"document_id": 1, "ai_status": "ai_failed", "analysis": None}
+
+        stored, claimed = _fake_blob_store()
+        with patch('app.services.batch_upload_service.store_blobs', stored), \
+                patch('app.services.batch_upload_service.store_blob', claimed), \
+                patch('app.utils.upload_buffer.settings.MAX_UPLOAD_FILE_BYTES', 50), \
+                patch('app.services.batch_upload_service.analyze_and_store_document', side_effect=fake_analyze), \
+                patch('app.services.batch_upload_service.log_events'):
+            lines = [line async for line in process_batch_uploads(uploads, None, None, uploaded_by="1")]
+
+        stored.assert_awaited_once()
+        assert len(stored.call_args[0][0]) == 2
+        assert claimed.await_count == 3
+        assert received["a.pdf"] == received["copia.pdf"] != received["b.pdf"]
+        assert "grande.pdf" not in received
+        items = {item["filename"]: item for item in map(json.loads, lines)}
+        assert items["grande.pdf"]["status"] == "error"
+
+    @pytest.mark.asyncio
+    async def test_process_batch_uploads_closes_pending_uploads_on_disconnect(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que, si el cliente corta la conexión, también se cierren los temporales de los archivos cuyas tareas se cancelaron antes de empezar
+        Parámetros de entrada:
+            - 3 documentos procesados de a uno; el cliente se desconecta tras la primera línea
+        Retorno esperado: Los 3 SpooledUpload y los 3 UploadFile cerrados
+        """
+        uploads = [_make_upload(f"{i}.pdf", f"%PDF-{i}".encode(), "application/pdf") for i in range(3)]
+        closed = []
+        original_close = SpooledUpload.close
+
+        def tracking_close(upload):
+            closed.append(upload.filename)
+            original_close(upload)
+
+        stored, claimed = _fake_blob_store()
+        analyze = AsyncMock(return_value={"document_id": 1, "ai_status": "ai_failed", "analysis": None})
+        with patch('app.services.batch_upload_service.store_blobs', stored), \
+                patch('app.services.batch_upload_service.store_blob', claimed), \
+                patch('app.services.batch_upload_service.settings.BATCH_UPLOAD_CONCURRENCY', 1), \
+                patch('app.services.batch_upload_service.analyze_and_store_document', analyze), \
+                patch.object(SpooledUpload, 'close', tracking_close), \
+                patch('app.services.batch_upload_service.log_events'):
+            stream = process_batch_uploads(uploads, None, None, uploaded_by="1")
+            await stream.__anext__()
+            await stream.aclose()
+
+        assert analyze.await_count < 3
+        assert set(closed) == {"0.pdf", "1.pdf", "2.pdf"}
+        assert all(upload.file.closed for upload in uploads)
@@ -0,0 +1,188 @@
+"""
+Pruebas unitarias para el almacenamiento direccionado por contenido.
+Generado por IA - Fecha: 2024-12-19
+"""
+import asyncio
+import hashlib
+import io
+import os
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from unittest.mock import patch, MagicMock, AsyncMock
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from app.core.storage import get_storage
+from app.db.base import Base
+from app.models.blob import StoredBlob
+from app.services.blob_service import add_blob_reference, blob_key, store_blob, collect_garbage
+
+
+@pytest.fixture
+def blob_db(tmp_path, monkeypatch):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Base SQLite en archivo (con bloqueos reales entre conexiones) y almacenamiento local en un directorio temporal
+    """
+    monkeypatch.chdir(tmp_path)
+    engine = create_engine(f"sqlite:///{tmp_path / 'blobs.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[StoredBlob.__table__])
+    factory = sessionmaker(bind=engine)
+    with patch('app.services.blob_service.SessionLocal', factory):
+        yield factory
+    engine.dispose()
+
+
+async def _store_unreferenced(factory, content: bytes) -> str:
+    # Blob guardado con su registro en ref_count=0 y fuera del periodo de gracia
+    sha = hashlib.sha256(content).hexdigest()
+    await store_blob(io.BytesIO(content), sha)
+    db = factory()
+    db.add(StoredBlob(sha256=sha, size=len(content), storage_path="x", ref_count=0, created_at=datetime(2000, 1, 1)))
+    db.commit()
+    db.close()
+    return sha
+
+
+class TestBlobService:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para el servicio de blobs (almacenamiento local)
+    """
+
+    def test_blob_key_is_sharded(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la clave del blob se reparta en dos niveles a partir del hash
+        Parámetros de entrada:
+            - sha256: "abcdef..."
+        Retorno esperado: "blobs/ab/cd/abcdef..."
+        """
+        sha = "abcdef" + "0" * 58
+        assert blob_key(sha) == f"blobs/ab/cd/{sha}"
+
+    @pytest.mark.asyncio
+    async def test_store_blob_skips_existing(self, blob_db, tmp_path):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la primera escritura cree el blob en el directorio repartido y que una segunda carga idéntica no lo reescriba
+        Parámetros de entrada:
+            - Dos llamadas a store_blob con el mismo contenido
+        Retorno esperado: (ruta, True) la primera vez y (misma ruta, False) la segunda, sin llamar a put del almacenamiento
+        """
+        content = b"id,name,price\n1,A,1\n"
+        sha = hashlib.sha256(content).hexdigest()
+
+        path, created = await store_blob(io.BytesIO(content), sha)
+        assert created is True
+        expected = os.path.join(str(tmp_path), "storage", "blobs", sha[:2], sha[2:4], sha)
+        assert path == f"file://{expected}"
+        with open(expected, "rb") as f:
+            assert f.read() == content
+
+        with patch.object(get_storage(), 'put', new_callable=AsyncMock) as mock_put:
+            path_again, created_again = await store_blob(io.BytesIO(content), sha)
+        assert created_again is False
+        assert path_again == path
+        mock_put.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_collect_garbage_removes_orphans(self, blob_db):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que collect_garbage elimine blobs almacenados sin registro en BD más antiguos que el periodo de gracia y conserve los recientes
+        Parámetros de entrada:
+            - Un blob huérfano antiguo y uno reciente, sin registros en BD
+        Retorno esperado: {"blobs_deleted": 0, "orphans_deleted": 1} y solo el blob reciente sigue en disco
+        """
+        old_sha = hashlib.sha256(b"viejo").hexdigest()
+        new_sha = hashlib.sha256(b"nuevo").hexdigest()
+        old_path = (await store_blob(io.BytesIO(b"viejo"), old_sha))[0][len("file://"):]
+        new_path = (await store_blob(io.BytesIO(b"nuevo"), new_sha))[0][len("file://"):]
+        os.utime(old_path, (0, 0))
+
+        with patch('app.services.blob_service.SessionLocal') as mock_session_class:
+            mock_db = MagicMock()
+            mock_session_class.return_value = mock_db
+            mock_db.query.return_value.filter.return_value.all.return_value = []
+            mock_db.query.return_value.filter.return_value.first.return_value = None
+
+            result = await collect_garbage(grace_seconds=60)
+
+        assert result == {"blobs_deleted": 0, "orphans_deleted": 1}
+        assert not os.path.exists(old_path)
+        assert os.path.exists(new_path)
+
+    @pytest.mark.asyncio
+    async def test_reused_blob_is_not_collected(self, blob_db):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que reutilizar un blob sin referencias reinicie su periodo de gracia, para que la recolección no lo borre antes de que la carga registre su referencia
+        Parámetros de entrada:
+            - Blob con ref_count=0 antiguo, reutilizado por store_blob antes de collect_garbage
+        Retorno esperado: store_blob no lo reescribe y collect_garbage no elimina nada
+        """
+        sha = await _store_unreferenced(blob_db, b"reutilizado")
+
+        _, created = await store_blob(io.BytesIO(b"reutilizado"), sha)
+        result = await collect_garbage(grace_seconds=60)
+
+        assert created is False
+        assert result["blobs_deleted"] == 0
+        assert await get_storage().exists(blob_key(sha))
+
+    @pytest.mark.asyncio
+    async def test_grace_period_uses_utc(self, blob_db):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que created_at se escriba en UTC al registrar y al reclamar un blob, el mismo reloj del corte de collect_garbage, sin depender de la hora local de la base de datos
+        Parámetros de entrada:
+            - Un blob nuevo registrado con add_blob_reference y uno antiguo reclamado por store_blob
+        Retorno esperado: Ambos created_at a segundos de la hora UTC actual
+        """
+        old_sha = await _store_unreferenced(blob_db, b"reclamado")
+        db = blob_db()
+        add_blob_reference(db, "f" * 64, 1, "x")
+        db.commit()
+        db.close()
+
+        await store_blob(io.BytesIO(b"reclamado"), old_sha)
+
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        db = blob_db()
+        created = [blob.created_at for blob in db.query(StoredBlob).all()]
+        db.close()
+        assert len(created) == 2
+        assert all(abs(now - value) < timedelta(seconds=60) for value in created)
+
+    @pytest.mark.asyncio
+    async def test_store_during_collection_rewrites_blob(self, blob_db):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que una carga que coincide con el borrado de su blob por collect_garbage espere a que termine y lo vuelva a escribir, en lugar de omitir la escritura y quedar apuntando a un objeto borrado
+        Parámetros de entrada:
+            - Blob con ref_count=0 antiguo; store_blob lanzado mientras collect_garbage está borrando el objeto
+        Retorno esperado: El blob se elimina en la recolección y la carga lo escribe de nuevo (created=True); el objeto existe al final
+        """
+        sha = await _store_unreferenced(blob_db, b"en carrera")
+        storage = get_storage()
+        original_delete = storage.delete
+        deleting = asyncio.Event()
+        uploads = []
+
+        async def slow_delete(key):
+            deleting.set()
+            # La carga empieza con la fila ya borrada (sin confirmar) y el objeto aún presente
+            await asyncio.sleep(0.2)
+            await original_delete(key)
+
+        async def upload():
+            await deleting.wait()
+            uploads.append(await store_blob(io.BytesIO(b"en carrera"), sha))
+
+        with patch.object(storage, 'delete', side_effect=slow_delete):
+            result, _ = await asyncio.gather(collect_garbage(grace_seconds=60), upload())
+
+        assert result["blobs_deleted"] == 1
+        assert uploads[0][1] is True
+        assert await storage.exists(blob_key(sha))
@@ -0,0 +1,166 @@
+"""
+Pruebas unitarias para la lectura de CSV por lotes y la validación vectorizada.
+Generado por IA - Fecha: 2024-12-19
+"""
+import io
+import pytest
+from app.services.file_service import _validate_batches
+from app.utils import csv_reader
+from app.utils.csv_reader import iter_csv_batches, normalize_header, sniff_csv
+
+# BOM, encabezados con espacios y mayúsculas, columna extra, comillas con salto de línea,
+# línea en blanco, fila corta, fila con un campo de más, precios con espacios / "1_000" / no numéricos, duplicados
+_CSV = (
+    "\ufeff ID ,Product Name,Name,Price,Notas\n"
+    "1,x,Tornillo,10.5,a\n"
+    '2,x,"Tuerca\nlarga", 2 ,b\n'
+    "\n"
+    ",x,Clavo,1_000,c\n"
+    "4,x,,abc,d\n"
+    "5,x,Tornillo,3,e\n"
+    "6,x,Perno\n"
+    "7,x,  ,  ,g\n"
+    "8,x,Arandela,4,h,sobra\n"
+)
+
+_ENGINES = ["python", "pandas", "pyarrow"]
+
+# Exportación típica del ERP: separador ";", Latin-1 (cp1252) y comillas dobles escapadas
+_ERP_CSV = 'Id;Name;Price\n1;Café;10,5\n2;"Niño ""grande""";3\n'.encode("cp1252")
+
+
+def _validate(engine, batch_rows=2):
+    if engine == "pyarrow" and not csv_reader._has_pyarrow:
+        pytest.skip("pyarrow no está instalado")
+    batches = iter_csv_batches(io.BytesIO(_CSV.encode("utf-8")), batch_rows=batch_rows, engine=engine)
+    return _validate_batches(((None, batch) for batch in batches), uploaded_by="1")
+
+
+class TestCsvReader:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para iter_csv_batches con los tres motores
+    """
+
+    def test_normalize_header(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica la normalización de nombres de columna
+        Parámetros de entrada:
+            - " Unit Price ", None
+        Retorno esperado: "unit_price", ""
+        """
+        assert normalize_header(" Unit Price ") == "unit_price"
+        assert normalize_header(None) == ""
+
+    @pytest.mark.parametrize("engine", _ENGINES)
+    def test_engines_validate_the_same(self, engine):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que cada motor, en lotes de 2 filas, produzca las mismas filas y validaciones que la lectura fila a fila (los motores columnares continúan con el módulo csv al llegar a una fila con otra cantidad de campos)
+        Parámetros de entrada:
+            - CSV con BOM, comillas con salto de línea, línea en blanco, fila corta, fila larga, precios inválidos y un duplicado
+        Retorno esperado: 4 filas válidas y las validaciones en orden de fila
+        """
+        rows, validations = _validate(engine)
+
+        assert rows == [
+            {"external_id": "1", "name": "Tornillo", "price": 10.5, "uploaded_by": "1"},
+            {"external_id": "2", "name": "Tuerca\nlarga", "price": 2.0, "uploaded_by": "1"},
+            {"external_id": None, "name": "Clavo", "price": 1000.0, "uploaded_by": "1"},
+            {"external_id": "8", "name": "Arandela", "price": 4.0, "uploaded_by": "1"},
+        ]
+        assert [(v["row"], v["column"], v["error"]) for v in validations] == [
+            (4, "name", "EMPTY"),
+            (4, "price", "TYPE"),
+            (5, "name", "DUPLICATE"),
+            (6, "price", "EMPTY"),
+            (7, "name", "EMPTY"),
+            (7, "price", "EMPTY"),
+        ]
+
+    @pytest.mark.parametrize("engine", ["pandas", "pyarrow"])
+    def test_columnar_batches(self, engine):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que los motores columnares entreguen solo id, name y price como texto y respeten el tamaño de lote
+        Parámetros de entrada:
+            - CSV de prueba sin la fila corta ni la larga, en lotes de 4 filas
+        Retorno esperado: Lotes de 4 y 3 filas con columnas ["id", "name", "price"]
+        """
+        if engine == "pyarrow" and not csv_reader._has_pyarrow:
+            pytest.skip("pyarrow no está instalado")
+        content = _CSV.replace("6,x,Perno\n", "").replace(",sobra", "").encode("utf-8")
+        batches = list(iter_csv_batches(io.BytesIO(content), batch_rows=4, engine=engine))
+
+        assert [len(batch) for batch in batches] == [4, 3]
+        assert list(batches[0].columns) == ["id", "name", "price"]
+        assert batches[1]["price"].tolist() == ["3", "  ", "4"]
+
+    def test_sniff_csv(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica la detección de codificación y separador y que el archivo vuelva al inicio
+        Parámetros de entrada:
+            - CSV del ERP (cp1252 con ";"), UTF-8 con BOM separado por tabulaciones, UTF-8 sin BOM y una sola columna
+        Retorno esperado: cp1252 / ";"; utf-8-sig / tab; utf-8 / "," por defecto
+        """
+        file = io.BytesIO(_ERP_CSV)
+        csv_format = sniff_csv(file)
+        assert (csv_format.encoding, csv_format.delimiter, csv_format.quotechar) == ("cp1252", ";", '"')
+        assert file.tell() == 0
+
+        csv_format = sniff_csv(io.BytesIO("\ufeffid\tname\tprice\n1\tA\t2\n".encode("utf-8")))
+        assert (csv_format.encoding, csv_format.delimiter) == ("utf-8-sig", "\t")
+
+        csv_format = sniff_csv(io.BytesIO("name\nCafé\n".encode("utf-8")))
+        assert (csv_format.encoding, csv_format.delimiter) == ("utf-8", ",")
+
+    @pytest.mark.parametrize("engine", _ENGINES)
+    def test_erp_latin1_semicolon(self, engine):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que el CSV del ERP se lea en el primer intento con cada motor, conservando acentos y comillas escapadas
+        Parámetros de entrada:
+            - CSV cp1252 separado por ";" (el precio "10,5" no es numérico)
+        Retorno esperado: La fila "Niño \"grande\"" válida y un error TYPE en la fila 1
+        """
+        if engine == "pyarrow" and not csv_reader._has_pyarrow:
+            pytest.skip("pyarrow no está instalado")
+        batches = iter_csv_batches(io.BytesIO(_ERP_CSV), engine=engine)
+        rows, validations = _validate_batches((None, batch) for batch in batches)
+
+        assert [row["name"] for row in rows] == ['Niño "grande"']
+        assert [(v["row"], v["error"]) for v in validations] == [(1, "TYPE")]
+
+    @pytest.mark.parametrize("engine", _ENGINES)
+    def test_invalid_utf8_after_sample(self, engine):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que un byte Latin-1 posterior a la muestra (detectada como UTF-8) se decodifique como cp1252 sin fallar ni releer el archivo desde otra fuente
+        Parámetros de entrada:
+            - CSV UTF-8 con una fila final en cp1252 y muestra de 24 bytes
+        Retorno esperado: Nombres ["Café", "Niño"]
+        """
+        if engine == "pyarrow" and not csv_reader._has_pyarrow:
+            pytest.skip("pyarrow no está instalado")
+        content = "id,name,price\n1,Café,10\n".encode("utf-8") + "2,Niño,5\n".encode("cp1252")
+        file = io.BytesIO(content)
+        csv_format = sniff_csv(file, sample_bytes=24)
+        assert csv_format.encoding == "utf-8"
+
+        rows, _ = _validate_batches((None, batch) for batch in iter_csv_batches(file, csv_format, engine=engine))
+
+        assert [row["name"] for row in rows] == ["Café", "Niño"]
+
+    def test_header_only_and_unknown_engine(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que un CSV sin filas no entregue lotes y que un motor desconocido falle
+        Parámetros de entrada:
+            - CSV con solo encabezado; motor "rust"
+        Retorno esperado: Sin lotes; ValueError
+        """
+        assert list(iter_csv_batches(io.BytesIO(b"id,name,price\n"), engine="pandas")) == []
+        with pytest.raises(ValueError):
+            list(iter_csv_batches(io.BytesIO(b"id,name,price\n"), engine="rust"))
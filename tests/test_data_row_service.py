@@ -0,0 +1,86 @@
+"""
+Pruebas unitarias para la consulta de filas de datos.
+Generado por IA - Fecha: 2024-12-19
+"""
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.base import Base
+from app.models.data_row import DataRow
+from app.models.file_model import File
+from app.services.data_row_service import list_file_rows, search_rows
+
+
+@pytest.fixture
+def session_factory():
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Base SQLite en memoria con dos archivos: el 1 con 25 filas (precio = índice) y el 2 con 3 filas
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add_all([File(id=1, filename="a.csv", storage_path="a"), File(id=2, filename="b.csv", storage_path="b")])
+    db.add_all([DataRow(file_id=1, external_id=f"E{i}", name=f"Tornillo {i}", price=float(i), uploaded_by="1") for i in range(25)])
+    db.add_all([DataRow(file_id=2, external_id="E1", name=name, price=5.0, uploaded_by="1") for name in ("Tornillo_x", "Tuerca", "100% algodón")])
+    db.commit()
+    db.close()
+    with patch('app.services.data_row_service.SessionLocal', factory):
+        yield factory
+
+
+class TestDataRowService:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para list_file_rows y search_rows
+    """
+
+    def test_keyset_pages_cover_file_once(self, session_factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que recorrer las páginas con next_after_id retorne todas las filas del archivo una sola vez y en orden
+        Parámetros de entrada:
+            - Archivo 1 con 25 filas y páginas de 10
+        Retorno esperado: Páginas de 10, 10 y 5; la última sin next_after_id
+        """
+        sizes, names, after_id = [], [], None
+        while True:
+            page = list_file_rows(1, after_id=after_id, limit=10)
+            sizes.append(len(page["rows"]))
+            names.extend(row["name"] for row in page["rows"])
+            after_id = page["next_after_id"]
+            if after_id is None:
+                break
+
+        assert sizes == [10, 10, 5]
+        assert names == [f"Tornillo {i}" for i in range(25)]
+
+    def test_price_range_and_missing_file(self, session_factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica el filtro de precio inclusivo y que un archivo inexistente retorne None
+        Parámetros de entrada:
+            - Archivo 1 con precio entre 3 y 6; archivo 99
+        Retorno esperado: Filas con precio 3, 4, 5, 6; None
+        """
+        page = list_file_rows(1, min_price=3, max_price=6)
+        assert [row["price"] for row in page["rows"]] == [3.0, 4.0, 5.0, 6.0]
+        assert list_file_rows(99) is None
+
+    def test_search_across_files(self, session_factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica la búsqueda entre archivos por external_id exacto y por prefijo de nombre, tratando % y _ como literales
+        Parámetros de entrada:
+            - external_id "E1", prefijos "Tornillo_", "100%" y "Tornillo 2" con precio máximo 21
+        Retorno esperado: Filas de ambos archivos para E1 (una del archivo 1 y tres del 2); solo las coincidencias literales para los prefijos
+        """
+        assert sorted(row["file_id"] for row in search_rows(external_id="E1")["rows"]) == [1, 2, 2, 2]
+        assert [row["name"] for row in search_rows(name="Tornillo_")["rows"]] == ["Tornillo_x"]
+        assert [row["name"] for row in search_rows(name="100%")["rows"]] == ["100% algodón"]
+        assert [row["price"] for row in search_rows(name="Tornillo 2", max_price=21)["rows"]] == [2.0, 20.0, 21.0]
+        with pytest.raises(ValueError):
+            search_rows()
@@ -0,0 +1,48 @@
+"""
+Pruebas unitarias para la normalización de fechas de factura.
+Generado por IA - Fecha: 2024-12-19
+"""
+from datetime import date
+
+import pytest
+from app.utils.date_parser import parse_invoice_date
+
+
+class TestDateParser:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para parse_invoice_date
+    """
+
+    @pytest.mark.parametrize("value", [
+        "2024-03-15",
+        "2024/03/15",
+        "2024-03-15T10:30:00Z",
+        "15/03/2024",
+        "15-03-2024",
+        "15.03.24",
+        "15 de marzo de 2024",
+        "15 de Marzo del 2024",
+        "15-mar-2024",
+        "March 15, 2024",
+    ])
+    def test_formats(self, value):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica los formatos que entrega la IA: ISO, día primero con distintos separadores y mes con nombre
+        Parámetros de entrada:
+            - La misma fecha escrita en cada formato
+        Retorno esperado: date(2024, 3, 15)
+        """
+        assert parse_invoice_date(value) == date(2024, 3, 15)
+
+    @pytest.mark.parametrize("value", [None, "", "sin fecha", "31/02/2024", "15 de brumario de 2024", "2024-13-01"])
+    def test_invalid(self, value):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que los textos vacíos, no reconocidos o con fechas imposibles no fallen
+        Parámetros de entrada:
+            - Valores vacíos, texto libre, 31 de febrero, mes inexistente y mes 13
+        Retorno esperado: None
+        """
+        assert parse_invoice_date(value) is None
@@ -0,0 +1,119 @@
+"""
+Pruebas unitarias para la reingesta incremental (delta) de planillas.
+Generado por IA - Fecha: 2024-12-19
+"""
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.base import Base
+from app.models.data_row import DataRow
+from app.models.file_model import File
+from app.services.delta_ingest_service import apply_delta, find_previous_file, insert_rows, row_hash, row_key
+
+
+def _row(external_id, name, price):
+    return {"external_id": external_id, "name": name, "price": price, "uploaded_by": "1"}
+
+
+@pytest.fixture
+def db():
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Sesión SQLite en memoria con el archivo 1 cargado con 5 filas (E0..E4) y una fila sin external_id
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(bind=engine)()
+    session.add(File(id=1, filename="precios.csv", storage_path="a", uploaded_by="1"))
+    session.commit()
+    insert_rows(session, 1, [_row(f"E{i}", f"Producto {i}", float(i)) for i in range(5)] + [_row(None, "Sin id", 9.0)])
+    session.commit()
+    yield session
+    session.close()
+
+
+def _active(db):
+    return {
+        (external_id, name): price
+        for external_id, name, price in db.execute(
+            select(DataRow.external_id, DataRow.name, DataRow.price).where(DataRow.file_id == 1, DataRow.deleted_at.is_(None))
+        )
+    }
+
+
+class TestDeltaIngestService:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para row_key, row_hash, apply_delta y find_previous_file
+    """
+
+    def test_row_key_and_hash(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la clave use external_id o el nombre y que el hash cambie solo con el contenido
+        Parámetros de entrada:
+            - Filas con y sin external_id
+        Retorno esperado: Claves ("id", ...) / ("name", ...); hash igual para el mismo contenido y distinto al cambiar el precio
+        """
+        assert row_key(_row("E1", "A", 1.0)) == ("id", "E1")
+        assert row_key(_row(None, "A", 1.0)) == ("name", "A")
+        assert row_hash(_row("E1", "A", 1.0)) == row_hash({"external_id": "E1", "name": "A", "price": 1.0, "uploaded_by": "2"})
+        assert row_hash(_row("E1", "A", 1.0)) != row_hash(_row("E1", "A", 1.5))
+
+    def test_apply_delta_writes_only_changes(self, db):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que una nueva versión con una fila cambiada, una nueva y una quitada solo escriba esas filas
+        Parámetros de entrada:
+            - Versión nueva: E0..E2 iguales, E3 con otro precio, E4 quitada, E5 nueva, "Sin id" igual
+        Retorno esperado: unchanged 4, changed 1, added 1, removed 1; E3 conserva su id; E4 queda con deleted_at
+        """
+        e3_id = db.execute(select(DataRow.id).where(DataRow.external_id == "E3")).scalar()
+        rows = [_row(f"E{i}", f"Producto {i}", float(i)) for i in range(3)]
+        rows += [_row("E3", "Producto 3", 30.0), _row("E5", "Producto 5", 5.0), _row(None, "Sin id", 9.0)]
+
+        counts = apply_delta(db, 1, rows)
+        db.commit()
+
+        assert counts == {"unchanged": 4, "changed": 1, "added": 1, "removed": 1}
+        active = _active(db)
+        assert ("E4", "Producto 4") not in active
+        assert active[("E3", "Producto 3")] == 30.0
+        assert active[("E5", "Producto 5")] == 5.0
+        assert db.execute(select(DataRow.id).where(DataRow.external_id == "E3")).scalar() == e3_id
+        assert db.execute(select(DataRow.deleted_at).where(DataRow.external_id == "E4")).scalar() is not None
+
+    def test_apply_delta_same_version_is_noop_and_revives_removed_rows(self, db):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que repetir la misma versión no escriba nada y que una fila eliminada que vuelve se reactive sin duplicarse
+        Parámetros de entrada:
+            - Versión sin E4, luego la versión original completa
+        Retorno esperado: La segunda carga reporta E4 como added, reutiliza su fila y deja 6 filas en total
+        """
+        original = [_row(f"E{i}", f"Producto {i}", float(i)) for i in range(5)] + [_row(None, "Sin id", 9.0)]
+        assert apply_delta(db, 1, original) == {"unchanged": 6, "changed": 0, "added": 0, "removed": 0}
+
+        apply_delta(db, 1, original[:4] + original[5:])
+        db.commit()
+        counts = apply_delta(db, 1, original)
+        db.commit()
+
+        assert counts == {"unchanged": 5, "changed": 0, "added": 1, "removed": 0}
+        assert len(_active(db)) == 6
+        assert db.query(DataRow).filter(DataRow.file_id == 1).count() == 6
+
+    def test_find_previous_file(self, db):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la versión anterior se busque por nombre o ID y solo entre los archivos del mismo usuario
+        Parámetros de entrada:
+            - Archivo 1 "precios.csv" del usuario "1"
+        Retorno esperado: El archivo 1 para el mismo usuario; None para otro usuario, otro nombre o un ID inexistente
+        """
+        assert find_previous_file(db, "precios.csv", "1").id == 1
+        assert find_previous_file(db, "otro.csv", "1", previous_file_id=1).id == 1
+        assert find_previous_file(db, "precios.csv", "2") is None
+        assert find_previous_file(db, "otro.csv", "1") is None
+        assert find_previous_file(db, "precios.csv", "1", previous_file_id=99) is None
@@ -0,0 +1,185 @@
+"""
+Pruebas unitarias para la lectura y actualización de análisis en lote.
+Generado por IA - Fecha: 2024-12-19
+"""
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.base import Base
+from app.models.document import Document, DocumentAnalysis
+from app.services.analysis_cache_service import AnalysisCache
+from app.services.document_update_service import (
+    AnalysisVersionConflictError,
+    get_cached_document_analyses,
+    get_document_analyses,
+    update_document_analyses,
+)
+
+
+@pytest.fixture
+def engine():
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Base SQLite en memoria con 5 análisis (IDs 1 a 5) y una caché de análisis vacía
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(Document(id=1, filename="f.pdf", storage_path="a", content_type="application/pdf", uploaded_by="1"))
+    db.add_all([
+        DocumentAnalysis(id=i, document_id=1, classification="FACTURA", client_name=f"Cliente {i}", total_amount=float(i), products_json='[{"name": "A"}]')
+        for i in range(1, 6)
+    ])
+    db.commit()
+    db.close()
+    with patch('app.services.document_update_service.SessionLocal', factory), \
+            patch('app.services.document_update_service.analysis_cache', AnalysisCache(ttl_seconds=60, max_entries=100)):
+        yield engine
+
+
+def _count_statements(engine):
+    statements = []
+    event.listen(engine, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement.split()[0]))
+    return statements
+
+
+class TestDocumentBatchService:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para get_document_analyses, get_cached_document_analyses y update_document_analyses
+    """
+
+    def test_get_many_single_query(self, engine):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que varios análisis y sus productos se lean con una consulta cada uno y que los inexistentes se omitan
+        Parámetros de entrada:
+            - IDs [3, 1, 99, 3]
+        Retorno esperado: Análisis 1 y 3 con products (products_json aún no migrado); dos SELECT
+        """
+        statements = _count_statements(engine)
+
+        result = get_document_analyses([3, 1, 99, 3])
+
+        assert sorted(result) == [1, 3]
+        assert result[3]["client_name"] == "Cliente 3"
+        assert result[1]["products"] == [{"name": "A"}]
+        assert statements == ["SELECT", "SELECT"]
+
+    def test_cached_batch_reads_only_misses(self, engine):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la lectura en lote no vuelva a consultar los análisis cacheados
+        Parámetros de entrada:
+            - Lectura de [1, 2] y luego de [1, 2, 3]
+        Retorno esperado: La segunda lectura consulta solo el 3
+        """
+        get_cached_document_analyses([1, 2])
+        with patch('app.services.document_update_service.get_document_analyses', wraps=get_document_analyses) as loader:
+            result = get_cached_document_analyses([1, 2, 3])
+
+        loader.assert_called_once_with([3])
+        assert sorted(result) == [1, 2, 3]
+
+    def test_update_many(self, engine):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que las actualizaciones parciales se apliquen en una transacción con UPDATE masivos, sin releer análisis uno por uno, e invaliden la caché
+        Parámetros de entrada:
+            - Análisis 1 y 2 con client_name, el 3 con products y el 1 repetido con total_amount
+        Retorno esperado: Campos actualizados, el resto sin cambios; cuatro SELECT (existencia, productos actuales, relectura de análisis y de productos) y la lectura siguiente sin datos viejos
+        """
+        get_cached_document_analyses([1, 3])
+        statements = _count_statements(engine)
+
+        result = update_document_analyses([
+            {"id": 1, "client_name": "Nuevo 1"},
+            {"id": 2, "client_name": "Nuevo 2", "summary": None},
+            {"id": 3, "products": [{"name": "Ñ"}]},
+            {"id": 1, "total_amount": 100.0},
+        ])
+
+        assert [a["id"] for a in result] == [1, 2, 3]
+        assert (result[0]["client_name"], result[0]["total_amount"]) == ("Nuevo 1", 100.0)
+        assert result[1]["client_name"] == "Nuevo 2"
+        assert result[2]["products"] == [{"name": "Ñ", "quantity": None, "unit_price": None, "total": None}]
+        assert result[2]["client_name"] == "Cliente 3"
+        assert statements.count("SELECT") == 4
+        assert statements.count("UPDATE") <= 3
+        assert get_cached_document_analyses([1])[1].body.decode("utf-8").count("Nuevo 1") == 1
+
+    def test_update_missing_applies_nothing(self, engine):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que si un análisis no existe no se aplique ningún cambio
+        Parámetros de entrada:
+            - Análisis 1 y 99 (inexistente)
+        Retorno esperado: ValueError con el ID 99; el análisis 1 sin cambios
+        """
+        with pytest.raises(ValueError, match="99"):
+            update_document_analyses([{"id": 1, "client_name": "Nuevo"}, {"id": 99, "client_name": "X"}])
+
+        assert get_document_analyses([1])[1]["client_name"] == "Cliente 1"
+
+    def test_update_many_version_conflict(self, engine):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica el compare-and-swap del lote: con una versión vieja no se aplica ningún cambio y el error lista los IDs en conflicto
+        Parámetros de entrada:
+            - Análisis 1 en versión 1 y análisis 2 y 3 con versión 5 (la actual es 1)
+        Retorno esperado: AnalysisVersionConflictError con los IDs 2 y 3; el análisis 1 sin cambios; con las versiones correctas se actualizan a la versión 2 con updated_at
+        """
+        with pytest.raises(AnalysisVersionConflictError, match="2, 3"):
+            update_document_analyses([
+                {"id": 1, "version": 1, "client_name": "Nuevo"},
+                {"id": 2, "version": 5, "client_name": "X"},
+                {"id": 3, "version": 5, "client_name": "Y"},
+            ])
+
+        assert get_document_analyses([1])[1]["client_name"] == "Cliente 1"
+        result = update_document_analyses([{"id": 1, "version": 1, "client_name": "Nuevo"}, {"id": 2, "version": 1, "sentiment": "positivo"}])
+        assert [(a["client_name"], a["version"]) for a in result] == [("Nuevo", 2), ("Cliente 2", 2)]
+        assert all(a["updated_at"] is not None for a in result)
+
+    def test_update_many_concurrent_write_rolls_back(self, tmp_path):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que si otro usuario guarda un análisis entre la verificación de versiones y el UPDATE masivo, el lote completo se revierte y se informa ese análisis
+        Parámetros de entrada:
+            - Análisis 1 y 2 en versión 1; otra conexión actualiza el 2 justo antes del primer UPDATE del lote
+        Retorno esperado: AnalysisVersionConflictError con el ID 2; el análisis 1 sin cambios y el 2 con el cambio de la otra conexión
+        """
+        engine = create_engine(f"sqlite:///{tmp_path / 'cas.db'}")
+        other = create_engine(f"sqlite:///{tmp_path / 'cas.db'}")
+        Base.metadata.create_all(bind=engine)
+        factory = sessionmaker(bind=engine)
+        db = factory()
+        db.add(Document(id=1, filename="f.pdf", storage_path="a", content_type="application/pdf", uploaded_by="1"))
+        db.add_all([DocumentAnalysis(id=i, document_id=1, classification="FACTURA", client_name=f"Cliente {i}") for i in (1, 2)])
+        db.commit()
+        db.close()
+
+        def concurrent_write(conn, cursor, statement, *args):
+            if statement.startswith("UPDATE") and not concurrent_write.done:
+                concurrent_write.done = True
+                with other.begin() as other_conn:
+                    other_conn.exec_driver_sql("UPDATE document_analyses SET client_name = 'Otro', version = version + 1 WHERE id = 2")
+        concurrent_write.done = False
+        event.listen(engine, "before_cursor_execute", concurrent_write)
+
+        with patch('app.services.document_update_service.SessionLocal', factory), \
+                patch('app.services.document_update_service.analysis_cache', AnalysisCache(ttl_seconds=60, max_entries=10)):
+            with pytest.raises(AnalysisVersionConflictError, match="ID 2 "):
+                update_document_analyses([
+                    {"id": 1, "version": 1, "client_name": "Nuevo 1"},
+                    {"id": 2, "version": 1, "client_name": "Nuevo 2"},
+                ])
+            result = get_document_analyses([1, 2])
+
+        assert (result[1]["client_name"], result[1]["version"]) == ("Cliente 1", 1)
+        assert (result[2]["client_name"], result[2]["version"]) == ("Otro", 2)
+        engine.dispose()
+        other.dispose()
@@ -0,0 +1,162 @@
+"""
+Pruebas unitarias para las líneas de producto de las facturas analizadas.
+Generado por IA - Fecha: 2024-12-19
+"""
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine, event, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.base import Base
+from app.models.document import Document, DocumentAnalysis
+from app.models.document_product import DocumentProduct
+from app.services.document_product_service import (
+    backfill_document_products,
+    insert_products,
+    load_products,
+    normalize_products,
+    search_products,
+    sync_products,
+)
+
+
+@pytest.fixture
+def factory():
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Base SQLite en memoria con 3 análisis (IDs 1 a 3) sin productos
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(Document(id=1, filename="f.pdf", storage_path="a", content_type="application/pdf", uploaded_by="1"))
+    db.add_all([DocumentAnalysis(id=i, document_id=1, classification="FACTURA") for i in range(1, 4)])
+    db.commit()
+    db.close()
+    with patch('app.services.document_product_service.SessionLocal', factory):
+        yield factory
+
+
+def _product(name, total=None):
+    return {"name": name, "quantity": 1.0, "unit_price": total, "total": total}
+
+
+class TestDocumentProductService:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para normalize_products, insert_products, sync_products, load_products, search_products y backfill_document_products
+    """
+
+    def test_normalize_products(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que los productos se lleven a las columnas de la tabla sin fallar con valores no numéricos
+        Parámetros de entrada:
+            - Producto con quantity como texto, unit_price inválido y una clave extra; un elemento que no es dict
+        Retorno esperado: Un producto con quantity 2.0, unit_price y total None
+        """
+        result = normalize_products([{"name": "A", "quantity": "2", "unit_price": "n/a", "sku": "X"}, "B"])
+
+        assert result == [{"name": "A", "quantity": 2.0, "unit_price": None, "total": None}]
+        assert normalize_products(None) == []
+
+    def test_insert_and_load_in_order(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que los productos de varios análisis se lean en orden con una sola consulta
+        Parámetros de entrada:
+            - Análisis 1 con productos B y A, análisis 2 con C, análisis 3 sin productos
+        Retorno esperado: Productos en el orden original; el 3 no aparece; un SELECT
+        """
+        db = factory()
+        insert_products(db, 1, [_product("B"), _product("A")])
+        insert_products(db, 2, [_product("C")])
+        insert_products(db, 3, [])
+        db.commit()
+        statements = []
+        event.listen(db.get_bind(), "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement.split()[0]))
+
+        result = load_products(db, [1, 2, 3])
+
+        assert [p["name"] for p in result[1]] == ["B", "A"]
+        assert [p["name"] for p in result[2]] == ["C"]
+        assert 3 not in result
+        assert statements == ["SELECT"]
+        db.close()
+
+    def test_sync_writes_only_differences(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la sincronización actualice solo las líneas que cambiaron, inserte las nuevas y elimine las sobrantes, sin tocar las iguales
+        Parámetros de entrada:
+            - Análisis 1 [A, B, C] pasa a [A, B2]; análisis 2 [] pasa a [D, E]
+        Retorno esperado: Un UPDATE, un INSERT y un DELETE; la fila de A conserva su id
+        """
+        db = factory()
+        insert_products(db, 1, [_product("A", 1.0), _product("B", 2.0), _product("C", 3.0)])
+        db.commit()
+        id_a = db.execute(select(DocumentProduct.id).where(DocumentProduct.name == "A")).scalar()
+        statements = []
+        event.listen(db.get_bind(), "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement.split()[0]))
+
+        sync_products(db, {1: [_product("A", 1.0), _product("B2", 2.0)], 2: [_product("D"), _product("E")]})
+        db.commit()
+
+        assert sorted(statements) == ["DELETE", "INSERT", "SELECT", "UPDATE"]
+        result = load_products(db, [1, 2])
+        assert [p["name"] for p in result[1]] == ["A", "B2"]
+        assert [p["name"] for p in result[2]] == ["D", "E"]
+        assert db.execute(select(DocumentProduct.id).where(DocumentProduct.name == "A")).scalar() == id_a
+        db.close()
+
+    def test_search_by_prefix(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica la búsqueda por prefijo (con comodines escapados), el filtro de total y la paginación por keyset
+        Parámetros de entrada:
+            - Productos "Caja 10%", "Caja grande", "Cajón" y "Bolsa"; búsquedas "Caja", "Caja 1%" y min_total
+        Retorno esperado: Dos páginas para "Caja"; "%" se toma literal; el filtro de total deja uno
+        """
+        db = factory()
+        insert_products(db, 1, [_product("Caja 10%", 5.0), _product("Caja grande", 50.0)])
+        insert_products(db, 2, [_product("Cajón", 20.0), _product("Bolsa", 1.0)])
+        db.commit()
+        db.close()
+
+        first = search_products("Caja", limit=1)
+        second = search_products("Caja", after_id=first["next_after_id"], limit=1)
+
+        assert [p["name"] for p in first["products"]] == ["Caja 10%"]
+        assert [p["name"] for p in second["products"]] == ["Caja grande"]
+        assert second["next_after_id"] is None
+        assert search_products("Caja 1%")["products"] == []
+        assert [p["name"] for p in search_products("Caj", min_total=10, max_total=30)["products"]] == ["Cajón"]
+        with pytest.raises(ValueError):
+            search_products("")
+
+    def test_backfill_is_resumable(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la migración lea products_json por lotes, omita análisis ya migrados o con JSON inválido y se pueda volver a ejecutar
+        Parámetros de entrada:
+            - Análisis 1 con dos productos, 2 con JSON inválido, 3 ya migrado; lotes de 2 análisis
+        Retorno esperado: Un análisis migrado; la segunda ejecución no migra nada ni duplica filas
+        """
+        db = factory()
+        db.get(DocumentAnalysis, 1).products_json = '[{"name": "A", "total": 1}, {"name": "B", "total": "2"}]'
+        db.get(DocumentAnalysis, 2).products_json = "{no es json"
+        db.get(DocumentAnalysis, 3).products_json = '[{"name": "Viejo"}]'
+        insert_products(db, 3, [_product("Nuevo")])
+        db.commit()
+        db.close()
+
+        assert backfill_document_products(batch_size=2) == 1
+        assert backfill_document_products(batch_size=2) == 0
+
+        db = factory()
+        result = load_products(db, [1, 2, 3])
+        db.close()
+        assert [(p["name"], p["total"]) for p in result[1]] == [("A", 1.0), ("B", 2.0)]
+        assert 2 not in result
+        assert [p["name"] for p in result[3]] == ["Nuevo"]
@@ -0,0 +1,136 @@
+"""
+Pruebas unitarias para la búsqueda de texto en los análisis de documentos.
+Generado por IA - Fecha: 2024-12-19
+"""
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.base import Base
+from app.models.document import Document, DocumentAnalysis
+from app.services.analysis_cache_service import AnalysisCache
+from app.services.document_search_service import (
+    SearchCursorError,
+    ensure_search_index,
+    rebuild_search_index,
+    search_documents,
+    tokenize,
+)
+from app.services.document_update_service import update_document_analyses, update_document_analysis
+
+_TEXTS = [
+    # id, descripción, resumen
+    (1, "Informe anual de ventas de la región norte", "Las ventas crecieron un 10%"),
+    (2, "Acta de reunión del comité", "Se aprobó el presupuesto de ventas"),
+    (3, "Manual de seguridad", "Normas de acceso al depósito"),
+    (4, "Ventas, ventas y más ventas", "Resumen de ventas trimestrales"),
+    (5, None, None),
+]
+
+
+@pytest.fixture(params=["fts5", "inverted"])
+def factory(request):
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Base SQLite en memoria con cinco análisis indexados, con el backend FTS5 y con el índice invertido
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(Document(id=1, filename="f.pdf", storage_path="a", content_type="application/pdf", uploaded_by="1"))
+    db.add_all([
+        DocumentAnalysis(id=analysis_id, document_id=1, classification="INFORMACION", description=description, summary=summary)
+        for analysis_id, description, summary in _TEXTS
+    ])
+    db.commit()
+    db.close()
+    with patch('app.services.document_search_service.settings.DOCUMENT_SEARCH_BACKEND', request.param), \
+            patch('app.services.document_search_service.SessionLocal', factory), \
+            patch('app.services.document_update_service.SessionLocal', factory), \
+            patch('app.services.document_update_service.analysis_cache', AnalysisCache(ttl_seconds=60, max_entries=10)):
+        ensure_search_index(engine)
+        assert rebuild_search_index(batch_size=2) == 5
+        yield factory
+
+
+def _ids(result):
+    return [document["analysis_id"] for document in result["documents"]]
+
+
+class TestDocumentSearchService:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para search_documents, rebuild_search_index y la actualización del índice al modificar análisis
+    """
+
+    def test_tokenize(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que los términos se separen en minúsculas y sin tildes
+        Parámetros de entrada:
+            - "Reunión del Comité, 2024!"
+        Retorno esperado: ["reunion", "del", "comite", "2024"]
+        """
+        assert tokenize("Reunión del Comité, 2024!") == ["reunion", "del", "comite", "2024"]
+        assert tokenize(None) == []
+
+    def test_ranked_search(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que se encuentren los análisis con todos los términos (por prefijo y sin tildes), ordenados por relevancia
+        Parámetros de entrada:
+            - "venta"; "ventas norte"; "reunion"; "inexistente"
+        Retorno esperado: El 4 (más menciones) primero entre 1, 2 y 4; solo el 1; solo el 2; ninguno
+        """
+        result = search_documents("venta")
+
+        assert _ids(result)[0] == 4
+        assert sorted(_ids(result)) == [1, 2, 4]
+        assert result["documents"][0]["summary"] == "Resumen de ventas trimestrales"
+        assert _ids(search_documents("ventas norte")) == [1]
+        assert _ids(search_documents("reunion")) == [2]
+        assert _ids(search_documents("inexistente")) == []
+
+    def test_cursor_pagination(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la paginación por cursor recorra todos los resultados en orden, sin repetir
+        Parámetros de entrada:
+            - "ventas" en páginas de 1; cursor inválido; q sin palabras
+        Retorno esperado: Las mismas tres coincidencias que en una sola página; SearchCursorError; ValueError
+        """
+        expected = _ids(search_documents("ventas", limit=10))
+        seen = []
+        cursor = None
+        while True:
+            page = search_documents("ventas", cursor=cursor, limit=1)
+            seen.extend(_ids(page))
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        assert seen == expected
+        with pytest.raises(SearchCursorError):
+            search_documents("ventas", cursor="no-es-un-cursor")
+        with pytest.raises(ValueError):
+            search_documents("¿?")
+
+    def test_index_follows_updates(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que el índice se actualice en la misma transacción al modificar description o summary, individualmente y en lote
+        Parámetros de entrada:
+            - Análisis 3 con nuevo summary; análisis 5 y 1 actualizados en lote
+        Retorno esperado: El 3 aparece por su nuevo resumen; el 5 por su nueva descripción; el 1 deja de aparecer por "norte"
+        """
+        update_document_analysis(analysis_id=3, summary="Inventario del depósito de ventas")
+        update_document_analyses([
+            {"id": 5, "description": "Contrato de alquiler"},
+            {"id": 1, "description": "Informe anual", "summary": "Sin novedades"},
+        ])
+
+        assert 3 in _ids(search_documents("inventario ventas"))
+        assert _ids(search_documents("alquiler")) == [5]
+        assert _ids(search_documents("norte")) == []
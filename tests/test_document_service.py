@@ -4,7 +4,7 @@ Generado por IA - Fecha: 2024-12-19
 """
 import pytest
 from unittest.mock import Mock, patch, MagicMock, AsyncMock
-from app.services.document_service import analyze_and_store_document
+from app.services.document_service import analyze_and_store_document, stream_analyze_and_store_document
 from app.services.ai_client import AIServiceError
 
 
@@ -41,7 +41,7 @@ class TestDocumentService:
             "sentiment": None
         }
         
-        with patch('app.services.document_service.upload_bytes_to_s3', return_value="s3://bucket/factura.pdf"):
+        with patch('app.services.document_service.store_blob', new_callable=AsyncMock, return_value=("s3://bucket/factura.pdf", True)):
             with patch('app.services.document_service.analyze_document', return_value=mock_analysis):
                 with patch('app.services.document_service.SessionLocal') as mock_session_class:
                     mock_db = MagicMock()
@@ -116,7 +116,7 @@ class TestDocumentService:
             "products": []
         }
         
-        with patch('app.services.document_service.upload_bytes_to_s3', return_value="s3://bucket/informacion.png"):
+        with patch('app.services.document_service.store_blob', new_callable=AsyncMock, return_value=("s3://bucket/informacion.png", True)):
             with patch('app.services.document_service.analyze_document', return_value=mock_analysis):
                 with patch('app.services.document_service.SessionLocal') as mock_session_class:
                     mock_db = MagicMock()
@@ -179,7 +179,7 @@ class TestDocumentService:
         mock_file.content_type = "application/pdf"
         mock_file.read = AsyncMock(return_value=b"fake content")
         
-        with patch('app.services.document_service.upload_bytes_to_s3', return_value="s3://bucket/documento.pdf"):
+        with patch('app.services.document_service.store_blob', new_callable=AsyncMock, return_value=("s3://bucket/documento.pdf", True)):
             with patch('app.services.document_service.analyze_document', side_effect=AIServiceError("IA no disponible")):
                 with patch('app.services.document_service.SessionLocal') as mock_session_class:
                     mock_db = MagicMock()
@@ -215,3 +215,97 @@ class TestDocumentService:
                     assert result["ai_error"] is not None
                     assert result["analysis"] is None
 
+    @pytest.mark.asyncio
+    async def test_stream_analyze_and_store_document(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la variante en streaming entregue el documento, los campos y productos en orden, y termine con "done" tras guardar el análisis y registrar la auditoría
+        Parámetros de entrada:
+            - upload_file: Mock de UploadFile con contenido PDF
+            - analyze_document_streaming simulado que emite classification y un producto
+        Retorno esperado: Eventos document, field, product, done; DocumentAnalysis agregado a la sesión
+        """
+        mock_file = Mock()
+        mock_file.filename = "factura.pdf"
+        mock_file.content_type = "application/pdf"
+        mock_file.read = AsyncMock(return_value=b"fake pdf content")
+
+        mock_analysis = {"classification": "FACTURA", "total_amount": 2.0, "products": [{"name": "p", "total": 2.0}]}
+
+        def fake_streaming(data, filename, content_type, on_event):
+            on_event("field", {"name": "classification", "value": "FACTURA"})
+            on_event("product", {"name": "p", "total": 2.0})
+            return mock_analysis
+
+        added = []
+
+        def add_side_effect(obj):
+            added.append(obj.__class__.__name__)
+            obj.id = len(added)
+
+        with patch('app.services.document_service.store_blob', new_callable=AsyncMock, return_value=("s3://bucket/factura.pdf", True)), \
+             patch('app.services.document_service.analyze_document_streaming', side_effect=fake_streaming), \
+             patch('app.services.document_service.log_events') as mock_log_events, \
+             patch('app.services.document_service.SessionLocal') as mock_session_class:
+            mock_db = MagicMock()
+            mock_db.add.side_effect = add_side_effect
+            mock_session_class.return_value = mock_db
+
+            events = [event async for event in await stream_analyze_and_store_document(mock_file, "1")]
+
+        assert [name for name, _ in events] == ["document", "field", "product", "done"]
+        assert events[1][1] == {"name": "classification", "value": "FACTURA"}
+        assert events[-1][1]["ai_status"] == "analyzed"
+        assert events[-1][1]["analysis"] == mock_analysis
+        assert "DocumentAnalysis" in added
+        mock_log_events.assert_called_once()
+
+
+    @pytest.mark.asyncio
+    async def test_stream_persists_after_upload_closed(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que el análisis en streaming se guarde aunque el cliente se desconecte y FastAPI cierre el UploadFile apenas se retorna el iterador
+        Parámetros de entrada:
+            - UploadFile real con contenido PDF, cerrado antes de consumir eventos
+            - Base SQLite en memoria; analyze_document_streaming simulado
+        Retorno esperado: store_blob y la IA reciben el contenido completo; fila DocumentAnalysis guardada
+        """
+        import asyncio
+        import io
+        from fastapi import UploadFile
+        from sqlalchemy import create_engine
+        from sqlalchemy.orm import sessionmaker
+        from sqlalchemy.pool import StaticPool
+        from app.db.base import init_db
+        from app.models.document import DocumentAnalysis
+        from app.services import document_service
+
+        engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+        init_db(engine)
+        factory = sessionmaker(bind=engine)
+        upload_file = UploadFile(io.BytesIO(b"%PDF contenido"), filename="informe.pdf", headers={"content-type": "application/pdf"})
+        stored = []
+
+        async def fake_store_blob(handle, sha256):
+            stored.append(handle.read())
+            return "file://informe.pdf", True
+
+        def fake_streaming(data, filename, content_type, on_event):
+            assert bytes(data) == b"%PDF contenido"
+            return {"classification": "INFORMACION", "summary": "Resumen"}
+
+        with patch('app.services.document_service.store_blob', side_effect=fake_store_blob), \
+             patch('app.services.document_service.add_blob_reference'), \
+             patch('app.services.document_service.analyze_document_streaming', side_effect=fake_streaming), \
+             patch('app.services.document_service.log_events'), \
+             patch('app.services.document_service.SessionLocal', factory):
+            await stream_analyze_and_store_document(upload_file, "1")
+            await upload_file.close()
+            await asyncio.gather(*document_service._streaming_tasks)
+
+        db = factory()
+        analyses = db.query(DocumentAnalysis).all()
+        db.close()
+        assert stored == [b"%PDF contenido"]
+        assert [a.summary for a in analyses] == ["Resumen"]
@@ -4,7 +4,37 @@ Generado por IA - Fecha: 2024-12-19
 """
 import pytest
 from unittest.mock import Mock, patch, MagicMock
-from app.services.document_update_service import update_document_analysis, get_document_analysis
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.base import Base
+from app.models.document import Document, DocumentAnalysis
+from app.services.analysis_cache_service import AnalysisCache
+from app.services.document_update_service import (
+    AnalysisVersionConflictError,
+    get_cached_document_analysis,
+    get_document_analysis,
+    update_document_analysis,
+)
+
+
+@pytest.fixture
+def analysis_db():
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Base SQLite en memoria con el análisis 1 (FACTURA, versión 1) y una caché de análisis vacía
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(Document(id=1, filename="f.pdf", storage_path="a", content_type="application/pdf", uploaded_by="1"))
+    db.add(DocumentAnalysis(id=1, document_id=1, classification="FACTURA", client_name="Cliente Original", total_amount=1000.0, products_json="[]"))
+    db.commit()
+    db.close()
+    with patch('app.services.document_update_service.SessionLocal', factory), \
+            patch('app.services.document_update_service.analysis_cache', AnalysisCache(ttl_seconds=60, max_entries=10)):
+        yield engine
 
 
 class TestDocumentUpdateService:
@@ -13,64 +43,31 @@ class TestDocumentUpdateService:
     Descripción: Suite de pruebas para el servicio de actualización de análisis
     """
     
-    def test_update_document_analysis_partial_update(self):
+    def test_update_document_analysis_partial_update(self, analysis_db):
         """
         Generado por IA - Fecha: 2024-12-19
-        Descripción: Verifica que update_document_analysis actualice solo los campos proporcionados
+        Descripción: Verifica que update_document_analysis actualice solo los campos proporcionados e incremente la versión
         Parámetros de entrada:
             - analysis_id: 1
             - client_name: "Nuevo Cliente"
             - total_amount: 2000.0
-        Retorno esperado: Dict con el análisis actualizado, incluyendo los campos modificados
+            - expected_versions: [1]
+        Retorno esperado: Dict con el análisis actualizado, incluyendo los campos modificados, los demás sin cambios y version 2
         """
-        with patch('app.services.document_update_service.SessionLocal') as mock_session_class:
-            mock_db = MagicMock()
-            mock_session_class.return_value = mock_db
-            
-            # Crear un objeto mock con atributos mutables
-            mock_analysis = Mock()
-            mock_analysis.id = 1
-            mock_analysis.document_id = 1
-            mock_analysis.classification = "FACTURA"
-            mock_analysis.client_name = "Cliente Original"
-            mock_analysis.total_amount = 1000.0
-            mock_analysis.products_json = "[]"
-            mock_analysis.client_address = None
-            mock_analysis.provider_name = None
-            mock_analysis.provider_address = None
-            mock_analysis.invoice_number = None
-            mock_analysis.invoice_date = None
-            mock_analysis.description = None
-            mock_analysis.summary = None
-            mock_analysis.sentiment = None
-            
-            # Configurar la cadena de query
-            mock_query = MagicMock()
-            mock_filter = MagicMock()
-            mock_filter.first.return_value = mock_analysis
-            mock_query.filter.return_value = mock_filter
-            mock_db.query.return_value = mock_query
-            
-            mock_db.commit = Mock()
-            
-            def refresh_side_effect(obj):
-                # Simular refresh - no hace nada porque los valores ya están actualizados
-                pass
-            
-            mock_db.refresh = Mock(side_effect=refresh_side_effect)
-            mock_db.close = Mock()
-            
-            result = update_document_analysis(
-                analysis_id=1,
-                client_name="Nuevo Cliente",
-                total_amount=2000.0
-            )
-            
-            assert result["id"] == 1
-            assert result["client_name"] == "Nuevo Cliente"
-            assert result["total_amount"] == 2000.0
+        result = update_document_analysis(
+            analysis_id=1,
+            client_name="Nuevo Cliente",
+            total_amount=2000.0,
+            expected_versions=[1]
+        )
+        
+        assert result["id"] == 1
+        assert result["client_name"] == "Nuevo Cliente"
+        assert result["total_amount"] == 2000.0
+        assert result["classification"] == "FACTURA"
+        assert result["version"] == 2
     
-    def test_update_document_analysis_not_found(self):
+    def test_update_document_analysis_not_found(self, analysis_db):
         """
         Generado por IA - Fecha: 2024-12-19
         Descripción: Verifica que update_document_analysis lance ValueError cuando el análisis no existe
@@ -79,24 +76,12 @@ class TestDocumentUpdateService:
             - client_name: "Test"
         Retorno esperado: ValueError con mensaje indicando que el análisis no fue encontrado
         """
-        with patch('app.services.document_update_service.SessionLocal') as mock_session_class:
-            mock_db = MagicMock()
-            mock_session_class.return_value = mock_db
-            
-            # Configurar la cadena de query para retornar None
-            mock_query = MagicMock()
-            mock_filter = MagicMock()
-            mock_filter.first.return_value = None
-            mock_query.filter.return_value = mock_filter
-            mock_db.query.return_value = mock_query
-            mock_db.close = Mock()
-            
-            with pytest.raises(ValueError) as exc_info:
-                update_document_analysis(analysis_id=999, client_name="Test")
-            
-            assert "no encontrado" in str(exc_info.value).lower()
+        with pytest.raises(ValueError) as exc_info:
+            update_document_analysis(analysis_id=999, client_name="Test")
+        
+        assert "no encontrado" in str(exc_info.value).lower()
     
-    def test_update_document_analysis_products(self):
+    def test_update_document_analysis_products(self, analysis_db):
         """
         Generado por IA - Fecha: 2024-12-19
         Descripción: Verifica que update_document_analysis actualice correctamente la lista de productos
@@ -105,45 +90,58 @@ class TestDocumentUpdateService:
             - products: [{"name": "Producto A", "quantity": 2, "unit_price": 100.0, "total": 200.0}]
         Retorno esperado: Dict con products actualizado como array parseado desde JSON
         """
-        with patch('app.services.document_update_service.SessionLocal') as mock_session_class:
-            mock_db = MagicMock()
-            mock_session_class.return_value = mock_db
-            
-            mock_analysis = Mock()
-            mock_analysis.id = 1
-            mock_analysis.document_id = 1
-            mock_analysis.classification = "FACTURA"
-            mock_analysis.products_json = "[]"
-            mock_analysis.client_name = None
-            mock_analysis.client_address = None
-            mock_analysis.provider_name = None
-            mock_analysis.provider_address = None
-            mock_analysis.invoice_number = None
-            mock_analysis.invoice_date = None
-            mock_analysis.total_amount = None
-            mock_analysis.description = None
-            mock_analysis.summary = None
-            mock_analysis.sentiment = None
-            
-            # Configurar la cadena de query
-            mock_query = MagicMock()
-            mock_filter = MagicMock()
-            mock_filter.first.return_value = mock_analysis
-            mock_query.filter.return_value = mock_filter
-            mock_db.query.return_value = mock_query
-            
-            mock_db.commit = Mock()
-            
-            def refresh_side_effect(obj):
-                pass
-            
-            mock_db.refresh = Mock(side_effect=refresh_side_effect)
-            mock_db.close = Mock()
-            
-            products = [{"name": "Producto A", "quantity": 2, "unit_price": 100.0, "total": 200.0}]
-            result = update_document_analysis(analysis_id=1, products=products)
-            
-            assert result["products"] == products
+        products = [{"name": "Producto A", "quantity": 2, "unit_price": 100.0, "total": 200.0}]
+        result = update_document_analysis(analysis_id=1, products=products)
+        
+        assert result["products"] == products
+    
+    def test_update_document_analysis_version_conflict(self, analysis_db):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica el compare-and-swap: con una versión vieja no se pisa el cambio de otro usuario, y la actualización es un solo UPDATE sin releer el análisis cuando la base soporta RETURNING (solo se leen sus productos)
+        Parámetros de entrada:
+            - Dos actualizaciones del análisis 1 con expected_versions=[1]
+        Retorno esperado: La primera aplica (UPDATE y el SELECT de productos); la segunda lanza AnalysisVersionConflictError y el análisis conserva el primer cambio
+        """
+        statements = []
+        event.listen(analysis_db, "before_cursor_execute", lambda conn, cursor, statement, *args: statements.append(statement.split()[0]))
+        
+        update_document_analysis(analysis_id=1, client_name="Revisor A", expected_versions=[1])
+        assert statements == ["UPDATE", "SELECT"]
+        
+        with pytest.raises(AnalysisVersionConflictError, match="versión actual 2"):
+            update_document_analysis(analysis_id=1, client_name="Revisor B", expected_versions=[1])
+        
+        assert get_document_analysis(analysis_id=1)["client_name"] == "Revisor A"
+    
+    def test_update_document_analysis_without_returning(self, analysis_db):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que en bases sin RETURNING la fila actualizada se lea con un SELECT en la misma transacción
+        Parámetros de entrada:
+            - Dialecto con update_returning desactivado; analysis_id: 1
+        Retorno esperado: Análisis actualizado con version 2
+        """
+        with patch.object(analysis_db.dialect, "update_returning", False):
+            result = update_document_analysis(analysis_id=1, sentiment="positivo", expected_versions=[1])
+        
+        assert (result["sentiment"], result["version"]) == ("positivo", 2)
+    
+    def test_update_document_analysis_invalidates_cache(self, analysis_db):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que update_document_analysis invalide la entrada cacheada del análisis modificado
+        Parámetros de entrada:
+            - Lectura cacheada del análisis 1 y luego actualización de client_name
+        Retorno esperado: La lectura siguiente entrega el nuevo valor y el ETag "2"
+        """
+        assert get_cached_document_analysis(1).etag == '"1"'
+        
+        update_document_analysis(analysis_id=1, client_name="Otro")
+        cached = get_cached_document_analysis(1)
+        
+        assert cached.etag == '"2"'
+        assert "Otro" in cached.body.decode("utf-8")
     
     def test_get_document_analysis_success(self):
         """
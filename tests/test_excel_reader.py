@@ -0,0 +1,80 @@
+"""
+Pruebas unitarias para la lectura de Excel por lotes.
+Generado por IA - Fecha: 2024-12-19
+"""
+import io
+import pytest
+from openpyxl import Workbook
+from app.utils.excel_reader import ExcelReadError, iter_excel_batches, select_sheets
+
+
+def _workbook_bytes():
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Libro con dos hojas: "Precios" (3 filas, una fila vacía intermedia y una columna sin encabezado) y "Extra" (1 fila)
+    """
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = "Precios"
+    sheet.append(["ID", " Name ", "Price", None])
+    sheet.append([1, "A", 10.5, "x"])
+    sheet.append([None, None, None, None])
+    sheet.append([2, "B", 20, None])
+    sheet.append([3, "C", None, None])
+    extra = workbook.create_sheet("Extra")
+    extra.append(["id", "name", "price"])
+    extra.append([4, "D", 1])
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+class TestExcelReader:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para select_sheets e iter_excel_batches
+    """
+
+    def test_select_sheets(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica la selección por defecto, "*", lista de nombres y hoja inexistente
+        Parámetros de entrada:
+            - Hojas ["A", "B", "C"]
+        Retorno esperado: ["A"]; todas; ["C", "A"]; ExcelReadError
+        """
+        assert select_sheets(["A", "B", "C"], None) == ["A"]
+        assert select_sheets(["A", "B", "C"], "*") == ["A", "B", "C"]
+        assert select_sheets(["A", "B", "C"], "C, A") == ["C", "A"]
+        with pytest.raises(ExcelReadError):
+            select_sheets(["A", "B", "C"], "A,Z")
+
+    @pytest.mark.parametrize("engine", ["openpyxl", "calamine"])
+    def test_batches_first_sheet(self, engine):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que se lea la primera hoja por lotes con encabezados normalizados, sin filas vacías ni columnas sin encabezado
+        Parámetros de entrada:
+            - Libro de prueba, lotes de 2 filas, motor openpyxl o calamine
+        Retorno esperado: Lotes de 2 y 1 filas de "Precios"
+        """
+        if engine == "calamine":
+            pytest.importorskip("python_calamine")
+        batches = list(iter_excel_batches(_workbook_bytes(), batch_rows=2, engine=engine))
+
+        assert [(sheet, len(rows)) for sheet, rows in batches] == [("Precios", 2), ("Precios", 1)]
+        assert batches[0][1][0] == {"id": 1, "name": "A", "price": 10.5}
+        assert batches[1][1][0] == {"id": 3, "name": "C", "price": None}
+
+    def test_batches_all_sheets(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que "*" recorra todas las hojas en orden y que cada lote pertenezca a una sola hoja
+        Parámetros de entrada:
+            - Libro de prueba con sheets="*"
+        Retorno esperado: Lotes de "Precios" (3 filas) y "Extra" (1 fila)
+        """
+        batches = list(iter_excel_batches(_workbook_bytes(), sheets="*", engine="openpyxl"))
+
+        assert [(sheet, [row["name"] for row in rows]) for sheet, rows in batches] == [("Precios", ["A", "B", "C"]), ("Extra", ["D"])]
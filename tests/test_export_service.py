@@ -0,0 +1,108 @@
+"""
+Pruebas unitarias para la exportación columnar de filas.
+Generado por IA - Fecha: 2024-12-19
+"""
+import csv
+import io
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.base import Base
+from app.models.data_row import DataRow
+from app.models.file_model import File
+from app.services.export_service import ExportError, check_export_format, iter_export
+
+
+@pytest.fixture
+def session_factory():
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Base SQLite en memoria con un archivo de 10 filas (una sin external_id) y otro archivo con una fila
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add_all([File(id=1, filename="a.csv", storage_path="a"), File(id=2, filename="b.csv", storage_path="b")])
+    db.add_all([DataRow(file_id=1, external_id=None if i == 3 else f"E{i}", name=f"Producto {i}", price=i * 1.5, uploaded_by="1") for i in range(10)])
+    db.add(DataRow(file_id=2, external_id="X", name="Otro", price=1.0, uploaded_by="1"))
+    db.commit()
+    db.close()
+    with patch('app.services.export_service.SessionLocal', factory):
+        yield factory
+
+
+class TestExportService:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para iter_export
+    """
+
+    def test_csv_export_streams_batches(self, session_factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que el CSV tenga encabezado y solo las filas del archivo, emitido en un fragmento por lote
+        Parámetros de entrada:
+            - Archivo 1 con 10 filas y lotes de 4
+        Retorno esperado: 3 fragmentos y 10 filas en orden
+        """
+        chunks = list(iter_export(1, "csv", batch_rows=4))
+        rows = list(csv.reader(io.StringIO(b"".join(chunks).decode("utf-8"))))
+
+        assert len(chunks) == 3
+        assert rows[0] == ["id", "external_id", "name", "price", "uploaded_by"]
+        assert [row[2] for row in rows[1:]] == [f"Producto {i}" for i in range(10)]
+        assert rows[4][1] == ""
+
+    def test_parquet_export_has_row_groups_and_statistics(self, session_factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que el Parquet se escriba con un row group por lote, compresión y estadísticas por columna, y conserve nulos y tipos
+        Parámetros de entrada:
+            - Archivo 1 con 10 filas y lotes de 4
+        Retorno esperado: 3 row groups, estadísticas de price y la tabla completa al leerlo
+        """
+        pq = pytest.importorskip("pyarrow.parquet")
+        data = b"".join(iter_export(1, "parquet", batch_rows=4))
+
+        parquet_file = pq.ParquetFile(io.BytesIO(data))
+        assert parquet_file.metadata.num_row_groups == 3
+        price = parquet_file.metadata.row_group(0).column(3)
+        assert price.statistics.min == 0.0 and price.statistics.max == 4.5
+        assert price.compression != "UNCOMPRESSED"
+        table = parquet_file.read()
+        assert table.num_rows == 10
+        assert table.column("external_id").null_count == 1
+
+    def test_arrow_stream_export(self, session_factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que el stream Arrow IPC se pueda leer completo
+        Parámetros de entrada:
+            - Archivo 1 con 10 filas y lotes de 4
+        Retorno esperado: 3 record batches con 10 filas
+        """
+        ipc = pytest.importorskip("pyarrow.ipc")
+        reader = ipc.open_stream(b"".join(iter_export(1, "arrow", batch_rows=4)))
+        batches = list(reader)
+
+        assert len(batches) == 3
+        assert sum(batch.num_rows for batch in batches) == 10
+        assert reader.schema.names == ["id", "external_id", "name", "price", "uploaded_by"]
+
+    def test_rejects_unknown_or_unavailable_format(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que un formato desconocido, o Parquet sin pyarrow instalado, se rechace antes de consultar
+        Parámetros de entrada:
+            - Formato "xlsx" y "parquet" con pyarrow no disponible
+        Retorno esperado: ExportError en ambos casos; CSV siempre disponible
+        """
+        with pytest.raises(ExportError):
+            check_export_format("xlsx")
+        with patch('app.services.export_service._has_pyarrow', False):
+            with pytest.raises(ExportError, match="pyarrow"):
+                check_export_format("parquet")
+            check_export_format("csv")
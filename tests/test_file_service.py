@@ -4,10 +4,46 @@ Generado por IA - Fecha: 2024-12-19
 """
 import pytest
 from io import BytesIO
-from unittest.mock import Mock, patch, MagicMock
+from unittest.mock import Mock, patch, MagicMock, AsyncMock
+from fastapi import UploadFile
+from sqlalchemy import create_engine, func, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.base import Base
+from app.models.data_row import DataRow
+from app.models.file_model import File
+from app.models.file_validation import FileValidation
+from app.services import file_service
 from app.services.file_service import handle_upload, _validate_row_basic, _is_empty_value
 
 
+@pytest.fixture
+def factory():
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Base SQLite en memoria con todas las tablas, usada por handle_upload, y lotes CSV de 2 filas
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    with patch('app.services.file_service.SessionLocal', factory), \
+            patch('app.services.file_service.store_blob', new_callable=AsyncMock, return_value=("file://precios.csv", True)), \
+            patch('app.utils.csv_reader.settings.CSV_BATCH_ROWS', 2):
+        yield factory
+
+
+def _csv_upload(content: str) -> UploadFile:
+    return UploadFile(file=BytesIO(content.encode("utf-8")), filename="precios.csv")
+
+
+def _count(factory, model) -> int:
+    db = factory()
+    try:
+        return db.execute(select(func.count()).select_from(model)).scalar()
+    finally:
+        db.close()
+
+
 class TestFileService:
     """
     Generado por IA - Fecha: 2024-12-19
@@ -144,7 +180,7 @@ class TestFileService:
         mock_file.filename = "test.csv"
         mock_file.read = AsyncMock(return_value=csv_content.encode('utf-8-sig'))
         
-        with patch('app.services.file_service.upload_bytes_to_s3', return_value="file://test.csv"):
+        with patch('app.services.file_service.store_blob', new_callable=AsyncMock, return_value=("file://test.csv", True)):
             with patch('app.services.file_service.SessionLocal') as mock_session_class:
                 # Mock de la sesión de base de datos
                 mock_db = MagicMock()
@@ -177,3 +213,54 @@ class TestFileService:
                 assert "validations" in result
                 assert result["rows_saved"] >= 0
 
+
+    @pytest.mark.asyncio
+    async def test_handle_upload_persists_batch_by_batch(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que las filas y validaciones se guarden a medida que llegan los lotes, sin juntar todo el archivo, y que el resumen se acumule entre lotes
+        Parámetros de entrada:
+            - CSV de 6 filas (una sin precio) leído en lotes de 2
+        Retorno esperado: 3 INSERT de filas (2, 1 y 2), 5 filas y 1 validación guardadas, resumen con total 1
+        """
+        inserted = []
+        original_insert = file_service.insert_rows
+
+        def tracking_insert(db, file_id, rows):
+            inserted.append(len(rows))
+            original_insert(db, file_id, rows)
+
+        content = "id,name,price\n1,A,1\n2,B,2\n3,C,\n4,D,4\n5,E,5\n6,F,6\n"
+        with patch('app.services.file_service.insert_rows', tracking_insert):
+            result = await handle_upload(_csv_upload(content), "a", "b", uploaded_by="1")
+
+        assert inserted == [2, 1, 2]
+        assert result["rows_saved"] == 5
+        assert result["validation_summary"]["total"] == 1
+        assert result["validations"][0]["row"] == 3
+        assert _count(factory, DataRow) == 5
+        assert _count(factory, FileValidation) == 1
+
+    @pytest.mark.asyncio
+    async def test_handle_upload_failure_saves_nothing(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que los lotes se escriban en una sola transacción: si falla un lote posterior no queda ni el archivo ni sus filas
+        Parámetros de entrada:
+            - CSV de 4 filas en lotes de 2; el guardado de validaciones falla en el segundo lote
+        Retorno esperado: La excepción se propaga y no quedan registros en files ni data_rows
+        """
+        calls = []
+
+        def failing_save(db, file_id, validations):
+            calls.append(file_id)
+            if len(calls) == 2:
+                raise RuntimeError("fallo de base de datos")
+
+        content = "id,name,price\n1,A,1\n2,B,2\n3,C,3\n4,D,4\n"
+        with patch('app.services.file_service.save_validations', failing_save):
+            with pytest.raises(RuntimeError):
+                await handle_upload(_csv_upload(content), "a", "b", uploaded_by="1")
+
+        assert _count(factory, File) == 0
+        assert _count(factory, DataRow) == 0
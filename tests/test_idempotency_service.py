@@ -0,0 +1,178 @@
+"""
+Pruebas unitarias para la idempotencia de cargas.
+Generado por IA - Fecha: 2024-12-19
+"""
+import asyncio
+import pytest
+from app.services.idempotency_service import (
+    IdempotencyStore,
+    IdempotencyError,
+    IdempotencyKeyMismatchError,
+    InvalidIdempotencyKeyError,
+)
+
+
+class TestIdempotencyStore:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para IdempotencyStore
+    """
+
+    @pytest.mark.asyncio
+    async def test_concurrent_duplicates_wait_for_first_result(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que peticiones simultáneas con la misma clave ejecuten el procesamiento una sola vez y que una repetición posterior reciba el resultado guardado
+        Parámetros de entrada:
+            - Tres peticiones concurrentes y una posterior con la misma clave
+        Retorno esperado: Una ejecución; un resultado original y tres repetidos
+        """
+        store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+        calls = []
+
+        async def process():
+            calls.append(1)
+            await asyncio.sleep(0.05)
+            return {"file_id": 7}
+
+        results = await asyncio.gather(*[store.run("u1", "k", "fp", process) for _ in range(3)])
+        later = await store.run("u1", "k", "fp", process)
+
+        assert len(calls) == 1
+        assert [replayed for _, replayed in results].count(False) == 1
+        assert all(value == {"file_id": 7} for value, _ in results)
+        assert later == ({"file_id": 7}, True)
+
+    @pytest.mark.asyncio
+    async def test_keys_are_scoped_by_user_and_expire(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la misma clave de otro usuario se procese aparte y que al vencer el TTL se procese de nuevo
+        Parámetros de entrada:
+            - TTL de 0 segundos y dos usuarios
+        Retorno esperado: Tres ejecuciones
+        """
+        store = IdempotencyStore(ttl_seconds=0, max_entries=10)
+        calls = []
+
+        async def process():
+            calls.append(1)
+            return len(calls)
+
+        assert await store.run("u1", "k", "fp", process) == (1, False)
+        assert await store.run("u2", "k", "fp", process) == (2, False)
+        assert await store.run("u1", "k", "fp", process) == (3, False)
+
+    @pytest.mark.asyncio
+    async def test_failure_releases_key(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que si la primera petición falla el error no se guarde y la clave pueda reintentarse
+        Parámetros de entrada:
+            - Procesamiento que falla la primera vez
+        Retorno esperado: ValueError y luego el resultado del reintento
+        """
+        store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+        attempts = []
+
+        async def process():
+            attempts.append(1)
+            if len(attempts) == 1:
+                raise ValueError("falla temporal")
+            return "ok"
+
+        with pytest.raises(ValueError):
+            await store.run("u1", "k", "fp", process)
+        assert await store.run("u1", "k", "fp", process) == ("ok", False)
+
+    @pytest.mark.asyncio
+    async def test_rejects_mismatch_and_invalid_keys(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que una clave reutilizada con otra petición y una clave vacía o demasiado larga se rechacen
+        Parámetros de entrada:
+            - Misma clave con otra huella, clave vacía y clave de 256 caracteres
+        Retorno esperado: IdempotencyKeyMismatchError e InvalidIdempotencyKeyError
+        """
+        store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+
+        async def process():
+            return 1
+
+        await store.run("u1", "k", "fp-a", process)
+        with pytest.raises(IdempotencyKeyMismatchError):
+            await store.run("u1", "k", "fp-b", process)
+        for key in ("", "x" * 256):
+            with pytest.raises(InvalidIdempotencyKeyError):
+                await store.run("u1", key, "fp-a", process)
+
+    @pytest.mark.asyncio
+    async def test_stream_is_replayed(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que una respuesta en streaming se transmita en vivo la primera vez y se repita igual después; si el cliente corta el stream el procesamiento sigue hasta el final y el reintento repite ese resultado
+        Parámetros de entrada:
+            - Stream de dos líneas consumido completo y otro abandonado a la mitad
+        Retorno esperado: Mismas líneas en la repetición; el stream abandonado no vuelve a ejecutarse
+        """
+        store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+        calls = []
+        release = asyncio.Event()
+
+        async def prepare():
+            calls.append(1)
+
+            async def lines():
+                yield "a\n"
+                await release.wait()
+                yield "b\n"
+            return lines()
+
+        release.set()
+        stream, replayed = await store.run_stream("u1", "k", "fp", prepare)
+        assert not replayed
+        assert [line async for line in stream] == ["a\n", "b\n"]
+        stream, replayed = await store.run_stream("u1", "k", "fp", prepare)
+        assert replayed
+        assert [line async for line in stream] == ["a\n", "b\n"]
+        assert len(calls) == 1
+
+        release.clear()
+        stream, _ = await store.run_stream("u1", "k2", "fp", prepare)
+        assert await stream.__anext__() == "a\n"
+        await stream.aclose()
+        retry = asyncio.create_task(store.run_stream("u1", "k2", "fp", prepare))
+        await asyncio.sleep(0)
+        assert not retry.done()
+        release.set()
+        stream, replayed = await retry
+        assert replayed
+        assert [line async for line in stream] == ["a\n", "b\n"]
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_stream_failure_releases_key(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que si el propio procesamiento en streaming falla el cliente recibe el error y la clave se libera para reintentar
+        Parámetros de entrada:
+            - Stream que emite una línea y luego lanza RuntimeError
+        Retorno esperado: RuntimeError al consumir; el reintento se ejecuta de nuevo
+        """
+        store = IdempotencyStore(ttl_seconds=60, max_entries=10)
+        calls = []
+
+        async def prepare():
+            calls.append(1)
+
+            async def lines():
+                yield "a\n"
+                raise RuntimeError("boom")
+            return lines()
+
+        stream, _ = await store.run_stream("u1", "k", "fp", prepare)
+        with pytest.raises(RuntimeError):
+            [line async for line in stream]
+        _, replayed = await store.run_stream("u1", "k", "fp", prepare)
+        assert not replayed
+        assert len(calls) == 2
@@ -0,0 +1,141 @@
+"""
+Pruebas unitarias para la búsqueda y los totales de facturas.
+Generado por IA - Fecha: 2024-12-19
+"""
+from datetime import date
+
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.base import Base
+from app.db.indexes import DOCUMENT_ANALYSIS_INDEXES
+from app.models.document import Document, DocumentAnalysis
+from app.services.analysis_cache_service import AnalysisCache
+from app.services.document_update_service import update_document_analysis
+from app.services.invoice_search_service import backfill_invoice_dates, search_invoices, sum_invoices_by_provider_month
+
+_INVOICES = [
+    # id, proveedor, cliente, número, fecha, monto
+    (1, "Acme S.A.", "Cliente Uno", "F-001", "15/01/2024", 100.0),
+    (2, "Acme S.A.", "Cliente Dos", "F-002", "2024-01-20", 50.0),
+    (3, "Acme S.A.", "Cliente Uno", "F-003", "3 de febrero de 2024", 25.0),
+    (4, "Beta Ltda", "Cliente Uno", "B-100", "2024-01-05", 300.0),
+    (5, "Beta Ltda", "Cliente Dos", "B-101", "sin fecha", 10.0),
+]
+
+
+@pytest.fixture
+def factory():
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Base SQLite en memoria con cinco facturas (fecha en texto, sin normalizar) y un documento informativo
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(Document(id=1, filename="f.pdf", storage_path="a", content_type="application/pdf", uploaded_by="1"))
+    db.add_all([
+        DocumentAnalysis(
+            id=analysis_id, document_id=1, classification="FACTURA", provider_name=provider, client_name=client,
+            invoice_number=number, invoice_date=invoice_date, total_amount=amount,
+        )
+        for analysis_id, provider, client, number, invoice_date, amount in _INVOICES
+    ])
+    db.add(DocumentAnalysis(id=6, document_id=1, classification="INFORMACION", provider_name="Acme S.A.", invoice_date="2024-01-10"))
+    db.commit()
+    db.close()
+    with patch('app.services.invoice_search_service.SessionLocal', factory):
+        assert backfill_invoice_dates(batch_size=2) == 5
+        yield factory
+
+
+class TestInvoiceSearchService:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para search_invoices, sum_invoices_by_provider_month y backfill_invoice_dates
+    """
+
+    def test_backfill_normalizes_dates(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la migración normalice las fechas reconocidas, deje en NULL las demás y se pueda volver a ejecutar
+        Parámetros de entrada:
+            - Fechas en formatos distintos y una factura con "sin fecha"
+        Retorno esperado: Fechas reales; NULL para "sin fecha"; la segunda ejecución no cambia nada
+        """
+        assert backfill_invoice_dates() == 0
+        db = factory()
+        values = dict(db.query(DocumentAnalysis.id, DocumentAnalysis.invoice_date_value).all())
+        db.close()
+        assert values[1] == date(2024, 1, 15)
+        assert values[3] == date(2024, 2, 3)
+        assert values[5] is None
+
+    def test_search_filters_and_pagination(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica los filtros por proveedor, cliente, número, fechas y montos, y la paginación por keyset
+        Parámetros de entrada:
+            - Proveedor "Acme" en enero en páginas de 1; cliente "Cliente Uno" con monto >= 100; número "B-101"; solo montos entre 25 y 100; sin filtros
+        Retorno esperado: Facturas 1 y 2 (sin el documento informativo); facturas 1 y 4; factura 5; facturas 1, 2 y 3; ValueError
+        """
+        first = search_invoices(provider_name="Acme", date_from=date(2024, 1, 1), date_to=date(2024, 1, 31), limit=1)
+        second = search_invoices(provider_name="Acme", date_from=date(2024, 1, 1), date_to=date(2024, 1, 31), after_id=first["next_after_id"], limit=1)
+
+        assert [i["id"] for i in first["invoices"]] == [1]
+        assert first["invoices"][0]["invoice_date_value"] == "2024-01-15"
+        assert [i["id"] for i in second["invoices"]] == [2]
+        assert second["next_after_id"] is None
+        assert [i["id"] for i in search_invoices(client_name="Cliente Uno", min_amount=100)["invoices"]] == [1, 4]
+        assert [i["id"] for i in search_invoices(invoice_number="B-101")["invoices"]] == [5]
+        assert [i["id"] for i in search_invoices(min_amount=25, max_amount=100)["invoices"]] == [1, 2, 3]
+        with pytest.raises(ValueError):
+            search_invoices()
+
+    def test_totals_by_provider_month(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica la suma por proveedor y mes en la base de datos, sin facturas sin fecha ni documentos informativos
+        Parámetros de entrada:
+            - Todas las facturas; luego solo "Acme" desde febrero
+        Retorno esperado: Acme 2024-01 (2, 150), Acme 2024-02 (1, 25), Beta 2024-01 (1, 300); luego solo Acme 2024-02
+        """
+        totals = sum_invoices_by_provider_month()
+
+        assert [(t["provider_name"], t["month"], t["invoice_count"], t["total_amount"]) for t in totals] == [
+            ("Acme S.A.", "2024-01", 2, 150.0),
+            ("Acme S.A.", "2024-02", 1, 25.0),
+            ("Beta Ltda", "2024-01", 1, 300.0),
+        ]
+        assert [t["month"] for t in sum_invoices_by_provider_month(provider_name="Acme", date_from=date(2024, 2, 1))] == ["2024-02"]
+
+    def test_update_normalizes_invoice_date(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que al corregir invoice_date se actualice también la fecha normalizada usada en la búsqueda
+        Parámetros de entrada:
+            - Factura 5 ("sin fecha") corregida a "10/03/2024"
+        Retorno esperado: La factura aparece al buscar marzo de 2024
+        """
+        with patch('app.services.document_update_service.SessionLocal', factory), \
+                patch('app.services.document_update_service.analysis_cache', AnalysisCache(ttl_seconds=60, max_entries=10)):
+            update_document_analysis(analysis_id=5, invoice_date="10/03/2024")
+
+        result = search_invoices(date_from=date(2024, 3, 1), date_to=date(2024, 3, 31))
+        assert [i["id"] for i in result["invoices"]] == [5]
+
+    def test_indexes_cover_search_columns(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que los índices de búsqueda empiecen por las columnas filtradas y terminen en id para la paginación
+        Parámetros de entrada:
+            - DOCUMENT_ANALYSIS_INDEXES
+        Retorno esperado: Índices por proveedor, cliente, número, fecha y clasificación con monto, todos terminados en id
+        """
+        leading = {index.columns.values()[0].name for index in DOCUMENT_ANALYSIS_INDEXES}
+
+        assert leading == {"provider_name", "client_name", "invoice_number", "invoice_date_value", "classification"}
+        assert all(index.columns.values()[-1].name == "id" for index in DOCUMENT_ANALYSIS_INDEXES)
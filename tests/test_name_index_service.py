@@ -0,0 +1,150 @@
+"""
+Pruebas unitarias para el índice persistente de nombres (duplicados entre cargas).
+Generado por IA - Fecha: 2024-12-19
+"""
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, select
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.base import Base
+from app.models.file_model import File
+from app.models.name_index import NameIndexEntry
+from app.services import name_index_service
+from app.services.delta_ingest_service import insert_rows
+from app.services.file_service import _validate_batches
+from app.services.name_index_service import (
+    find_known_names, name_hash, probe_names, rebuild_name_index, register_names, sync_file_names,
+)
+
+
+@pytest.fixture
+def factory():
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Fábrica de sesiones SQLite en memoria con los nombres "A" y "B" del usuario "1" registrados para el archivo 1
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    session = factory()
+    register_names(session, "1", 1, [name_hash("A"), name_hash("B")])
+    session.commit()
+    session.close()
+    return factory
+
+
+def _index(db, uploaded_by="1"):
+    return dict(db.execute(
+        select(NameIndexEntry.name_hash, NameIndexEntry.file_id).where(NameIndexEntry.uploaded_by == uploaded_by)
+    ).all())
+
+
+class TestNameIndexService:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para name_hash, probe_names, register_names, sync_file_names y rebuild_name_index
+    """
+
+    def test_probe_by_uploader(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la consulta devuelva solo los nombres del mismo usuario y respete exclude_file_id
+        Parámetros de entrada:
+            - Hashes de "A", "C" y "A" repetido; usuario "1" y "2"; exclude_file_id=1
+        Retorno esperado: {hash(A): 1}; {} para el usuario "2" y al excluir el archivo 1
+        """
+        db = factory()
+        hashes = [name_hash("A"), name_hash("C"), name_hash("A")]
+
+        assert probe_names(db, "1", hashes) == {name_hash("A"): 1}
+        assert probe_names(db, "2", hashes) == {}
+        assert probe_names(db, "1", hashes, exclude_file_id=1) == {}
+        assert name_hash("A") != name_hash("a")
+
+    def test_probe_chunks(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que un lote mayor que el bloque se consulte en varias sentencias IN
+        Parámetros de entrada:
+            - 5 hashes con bloques de 2
+        Retorno esperado: Los dos nombres registrados
+        """
+        with patch.object(name_index_service, "_PROBE_CHUNK", 2):
+            known = probe_names(factory(), "1", [name_hash(n) for n in ("X", "A", "Y", "Z", "B")])
+
+        assert known == {name_hash("A"): 1, name_hash("B"): 1}
+
+    def test_register_keeps_first_file(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que registrar nombres ya existentes no falle y conserve el archivo que los cargó primero
+        Parámetros de entrada:
+            - Archivo 2 con "B" (ya registrado por el archivo 1) y "C"
+        Retorno esperado: B en el archivo 1 y C en el archivo 2
+        """
+        db = factory()
+        register_names(db, "1", 2, [name_hash("B"), name_hash("C")])
+        db.commit()
+
+        assert _index(db) == {name_hash("A"): 1, name_hash("B"): 1, name_hash("C"): 2}
+
+    def test_sync_file_names(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que una carga delta deje en el índice solo los nombres de la versión actual del archivo
+        Parámetros de entrada:
+            - Archivo 1 con "B" y "D"
+        Retorno esperado: Índice {B: 1, D: 1}
+        """
+        db = factory()
+        sync_file_names(db, "1", 1, [name_hash("B"), name_hash("D")])
+        db.commit()
+
+        assert _index(db) == {name_hash("B"): 1, name_hash("D"): 1}
+
+    def test_rebuild_from_rows(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica la reconstrucción del índice a partir de las filas guardadas
+        Parámetros de entrada:
+            - Archivos 1 y 2 del usuario "1" con "A" repetido, y archivo 3 del usuario "2" con "A"
+        Retorno esperado: 3 nombres; "A" asociado al archivo 1 para el usuario "1"
+        """
+        db = factory()
+        for file_id, uploaded_by, names in ((1, "1", ["A", "E"]), (2, "1", ["A"]), (3, "2", ["A"])):
+            db.add(File(id=file_id, filename=f"f{file_id}.csv", storage_path="a", uploaded_by=uploaded_by))
+            db.flush()
+            insert_rows(db, file_id, [{"external_id": None, "name": n, "price": 1.0, "uploaded_by": uploaded_by} for n in names])
+        db.commit()
+
+        assert rebuild_name_index(db) == 3
+        assert _index(db) == {name_hash("A"): 1, name_hash("E"): 1}
+        assert _index(db, "2") == {name_hash("A"): 3}
+
+    def test_validate_batches_rejects_known_names(self, factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que la validación por lotes rechace como DUPLICATE los nombres ya cargados, con una consulta por lote
+        Parámetros de entrada:
+            - Lotes [A, C] y [D, B sin precio, B] contra el índice del usuario "1"
+        Retorno esperado: Filas C y D; validaciones DUPLICATE en las filas 1 y 5 y EMPTY en la fila 4
+        """
+        batches = [
+            (None, [{"name": "A", "price": "1"}, {"name": "C", "price": "2"}]),
+            (None, [{"name": "D", "price": "3"}, {"name": "B", "price": ""}, {"name": "B", "price": "4"}]),
+        ]
+        calls = []
+
+        def known_names(hashes):
+            calls.append(len(hashes))
+            return find_known_names("1", hashes)
+
+        with patch("app.services.name_index_service.SessionLocal", factory):
+            rows, validations = _validate_batches(batches, uploaded_by="1", known_names=known_names)
+
+        assert [row["name"] for row in rows] == ["C", "D"]
+        assert [(v["row"], v["error"]) for v in validations] == [(1, "DUPLICATE"), (4, "EMPTY"), (5, "DUPLICATE")]
+        assert validations[0]["message"] == "duplicate name: A (already uploaded in file 1)"
+        assert calls == [2, 2]
@@ -0,0 +1,187 @@
+"""
+Pruebas unitarias para el pipeline de PDFs de varias páginas.
+Generado por IA - Fecha: 2024-12-19
+"""
+import io
+import json
+import threading
+import time
+from unittest.mock import patch
+from PIL import Image
+from pypdf import PdfReader
+from app.services.ai_client import analyze_document
+from app.services.pdf_pipeline import analyze_pdf, merge_invoice_results, _is_line_item_page
+from app.utils.metrics import metrics
+from tests.fake_gemini_server import FakeGeminiServer
+
+
+def _pdf(pages: int) -> bytes:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Genera un PDF de imágenes donde el ancho de cada página identifica su índice (100 + índice)
+    Parámetros de entrada:
+        - pages: int - Número de páginas
+    Retorno esperado: bytes - Contenido del PDF
+    """
+    images = [Image.new("L", (100 + index, 100), 255) for index in range(pages)]
+    output = io.BytesIO()
+    images[0].save(output, format="PDF", save_all=True, append_images=images[1:], resolution=72)
+    return output.getvalue()
+
+
+def _page_indexes(pdf_bytes: bytes) -> list:
+    return [int(float(page.mediabox.width)) - 100 for page in PdfReader(io.BytesIO(pdf_bytes)).pages]
+
+
+class TestPdfPipeline:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para analyze_pdf y la combinación de resultados
+    """
+
+    def test_short_pdf_is_not_split(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que un PDF con menos páginas que AI_PDF_SPLIT_MIN_PAGES se analice en una sola llamada
+        Parámetros de entrada:
+            - PDF de 3 páginas
+        Retorno esperado: None y el modelo no es invocado por el pipeline
+        """
+        calls = []
+        assert analyze_pdf(_pdf(3), calls.append, lambda pdf, prompt: calls.append(pdf)) is None
+        assert calls == []
+
+    def test_informacion_falls_back_to_whole_document(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que un documento INFORMACION no se resuelva con las primeras páginas, sino que se delegue el análisis del documento completo
+        Parámetros de entrada:
+            - PDF de 8 páginas y un modelo que responde INFORMACION
+        Retorno esperado: None tras una sola llamada de clasificación con las páginas 0 y 1
+        """
+        calls = []
+
+        def call_model(pdf_bytes, prompt):
+            calls.append(_page_indexes(pdf_bytes))
+            return {"classification": "INFORMACION", "summary": "Estado de cuenta"}
+
+        assert analyze_pdf(_pdf(8), lambda pdf: call_model(pdf, "prompt"), call_model) is None
+        assert calls == [[0, 1]]
+
+    def test_invoice_chunks_run_concurrently_and_merge(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que una factura larga envíe solo las páginas con productos en fragmentos concurrentes (acotados por el semáforo), registre el tiempo por página y combine productos y total en orden de página
+        Parámetros de entrada:
+            - PDF de 10 páginas donde las páginas 4 y 5 no tienen importes; fragmentos de 2 páginas; semáforo de 2
+        Retorno esperado: Productos de las páginas 0, 2, 3, 6, 7, 8, 9 en orden, total del último fragmento y a lo sumo 2 llamadas simultáneas
+        """
+        texts = ["Cantidad 2 x 10,00", "Producto 5,00 7,00", "Términos y condiciones", "Notas", "A 1.00 B 2.00", "C 3.00 D 4.00", "E 5.00 F 6.00", "Total 99.50 IVA 1.00"]
+        state = {"active": 0, "max": 0}
+        lock = threading.Lock()
+
+        def call_model(pdf_bytes, prompt):
+            pages = _page_indexes(pdf_bytes)
+            if pages == [0, 1]:
+                return {"classification": "FACTURA", "invoice_number": "F-1", "products": [{"name": "p0", "total": 1}]}
+            with lock:
+                state["active"] += 1
+                state["max"] = max(state["max"], state["active"])
+            time.sleep(0.05)
+            with lock:
+                state["active"] -= 1
+            return {"products": [{"name": f"p{page}", "total": 1} for page in pages], "total_amount": 99.5 if 9 in pages else None}
+
+        metrics.reset()
+        with patch('app.services.pdf_pipeline.settings.AI_PDF_PAGES_PER_CHUNK', 2), \
+             patch('app.services.pdf_pipeline._chunk_semaphore', threading.BoundedSemaphore(2)), \
+             patch('app.services.pdf_pipeline._page_text', side_effect=texts):
+            result = analyze_pdf(_pdf(10), lambda pdf: call_model(pdf, "prompt"), call_model)
+
+        assert result["invoice_number"] == "F-1"
+        assert [product["name"] for product in result["products"]] == ["p0", "p2", "p3", "p6", "p7", "p8", "p9"]
+        assert result["total_amount"] == 99.5
+        assert state["max"] == 2
+        timings = metrics.snapshot()["timings"]
+        assert timings["ai.pdf.page_seconds"]["count"] == 8
+        assert timings["ai.pdf.chunk_seconds"]["count"] == 4
+
+    def test_merge_sums_line_totals_without_grand_total(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que sin total general en ningún fragmento se use la suma de los totales de línea
+        Parámetros de entrada:
+            - Encabezado sin total y dos fragmentos sin total_amount
+        Retorno esperado: total_amount = 6.5
+        """
+        merged = merge_invoice_results(
+            {"classification": "FACTURA", "products": [{"name": "a", "total": 1.5}], "total_amount": None},
+            [{"products": [{"name": "b", "total": 2}]}, {"products": [{"name": "c", "total": 3}], "total_amount": None}],
+        )
+        assert merged["total_amount"] == 6.5
+        assert len(merged["products"]) == 3
+
+    def test_is_line_item_page(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica la heurística de selección de páginas con productos
+        Parámetros de entrada:
+            - Textos con varios importes, con palabra clave e importe, sin importes y vacío (escaneado)
+        Retorno esperado: True, True, False, True
+        """
+        assert _is_line_item_page("Tornillo 1.234,50  Tuerca 10,00")
+        assert _is_line_item_page("Cantidad: 3  Precio 4.50")
+        assert not _is_line_item_page("Condiciones generales de venta")
+        assert _is_line_item_page("   ")
+
+
+class TestAnalyzeDocumentPdfWithFakeServer:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Pruebas de analyze_document con PDFs largos contra el servidor falso de Gemini
+    """
+
+    def test_long_invoice_pdf_is_split(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que analyze_document divida un PDF largo en una llamada de clasificación y llamadas de productos, y normalice el resultado combinado
+        Parámetros de entrada:
+            - PDF escaneado de 7 páginas (sin texto extraíble) y fragmentos de 4 páginas
+        Retorno esperado: 3 peticiones al servidor y los productos de ambos fragmentos en el resultado
+        """
+        def responder(model, body):
+            prompt = body["contents"][0]["parts"][0]["text"]
+            if "parte de una FACTURA" in prompt:
+                return json.dumps({"products": [{"name": "item", "quantity": 1, "unit_price": 2, "total": 2}], "total_amount": None})
+            return json.dumps({"classification": "FACTURA", "invoice_number": "F-9", "total_amount": 10, "products": []})
+
+        with FakeGeminiServer(responder) as server:
+            with patch('app.services.ai_client.settings.GEMINI_API_KEY', "test-key"), \
+                 patch('app.services.ai_client.settings.GEMINI_BASE_URL', server.base_url):
+                result = analyze_document(_pdf(7), filename="estado.pdf", content_type="application/pdf")
+
+        assert len(server.requests) == 3
+        assert result["invoice_number"] == "F-9"
+        assert result["total_amount"] == 10
+        assert len(result["products"]) == 2
+
+    def test_long_informacion_pdf_is_analyzed_whole(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que analyze_document analice completo un PDF largo que no es FACTURA, para que descripción y resumen cubran todas las páginas
+        Parámetros de entrada:
+            - PDF de 60 páginas y un servidor que responde INFORMACION
+        Retorno esperado: Clasificación con 2 páginas y luego una petición con las 60 páginas, cuyo resumen es el que se retorna
+        """
+        summaries = iter(["Primeras páginas", "Informe completo"])
+
+        def responder(model, body):
+            return json.dumps({"classification": "INFORMACION", "summary": next(summaries), "sentiment": "neutral"})
+
+        with FakeGeminiServer(responder) as server:
+            with patch('app.services.ai_client.settings.GEMINI_API_KEY', "test-key"), \
+                 patch('app.services.ai_client.settings.GEMINI_BASE_URL', server.base_url):
+                result = analyze_document(_pdf(60), filename="informe.pdf", content_type="application/pdf")
+
+        assert [len(PdfReader(io.BytesIO(server.inline_parts(i)[0][1])).pages) for i in range(len(server.requests))] == [2, 60]
+        assert result["summary"] == "Informe completo"
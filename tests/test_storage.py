@@ -0,0 +1,126 @@
+"""
+Pruebas unitarias para el almacenamiento local asíncrono.
+Generado por IA - Fecha: 2024-12-19
+"""
+import asyncio
+import io
+import os
+import pytest
+from unittest.mock import patch
+from app.core.storage import LocalAsyncStorage, FsyncPolicy, flush_periodically
+
+
+class TestLocalAsyncStorage:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para LocalAsyncStorage
+    """
+
+    @pytest.mark.asyncio
+    async def test_put_is_atomic_and_hierarchical(self, tmp_path):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que put escriba bajo la jerarquía de la clave sin dejar archivos temporales, y que exists/list/delete funcionen
+        Parámetros de entrada:
+            - key: "blobs/ab/cd/abcd" con contenido desde un handle de archivo
+        Retorno esperado: URI file:// al archivo final, sin archivos .tmp y eliminado tras delete
+        """
+        storage = LocalAsyncStorage(root=str(tmp_path))
+        key = "blobs/ab/cd/abcd"
+
+        uri = await storage.put(io.BytesIO(b"contenido"), key)
+
+        path = os.path.join(str(tmp_path), "blobs", "ab", "cd", "abcd")
+        assert uri == f"file://{path}"
+        assert await storage.exists(key)
+        assert os.listdir(os.path.dirname(path)) == ["abcd"]
+        assert [k for k, _ in await storage.list("blobs/")] == [key]
+
+        await storage.delete(key)
+        assert not await storage.exists(key)
+
+    @pytest.mark.asyncio
+    async def test_failed_write_leaves_no_partial_file(self, tmp_path):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que si la escritura falla a mitad no quede ni el archivo final ni el temporal
+        Parámetros de entrada:
+            - data: handle cuyo read() lanza IOError
+        Retorno esperado: IOError y directorio sin archivos
+        """
+        class BrokenReader:
+            def read(self, size=-1):
+                raise IOError("disco lleno")
+
+        storage = LocalAsyncStorage(root=str(tmp_path))
+        with pytest.raises(IOError):
+            await storage.put(BrokenReader(), "uploads/a")
+        assert os.listdir(os.path.join(str(tmp_path), "uploads")) == []
+
+    @pytest.mark.asyncio
+    async def test_fsync_policies(self, tmp_path):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica el número de fsync según la política: ninguno con "none", archivo + directorio con "file" y agrupados al completar el lote con "batch"
+        Parámetros de entrada:
+            - 2 escrituras por política, con fsync_batch_size=2
+        Retorno esperado: 0 fsync (none), 4 fsync (file), 0 tras la primera y 3 tras la segunda escritura (batch: 2 archivos + 1 directorio)
+        """
+        with patch('app.core.storage.os.fsync') as mock_fsync:
+            storage = LocalAsyncStorage(root=str(tmp_path / "none"), fsync_policy=FsyncPolicy.NONE)
+            await storage.put(b"a", "x/1")
+            await storage.put(b"b", "x/2")
+            assert mock_fsync.call_count == 0
+
+        with patch('app.core.storage.os.fsync') as mock_fsync:
+            storage = LocalAsyncStorage(root=str(tmp_path / "file"), fsync_policy=FsyncPolicy.PER_FILE)
+            await storage.put(b"a", "x/1")
+            await storage.put(b"b", "x/2")
+            assert mock_fsync.call_count == 4
+
+        with patch('app.core.storage.os.fsync') as mock_fsync:
+            storage = LocalAsyncStorage(
+                root=str(tmp_path / "batch"),
+                fsync_policy=FsyncPolicy.BATCH,
+                fsync_batch_size=2,
+                fsync_batch_interval=3600,
+            )
+            await storage.put(b"a", "x/1")
+            assert mock_fsync.call_count == 0
+            await storage.put(b"b", "x/2")
+            assert mock_fsync.call_count == 3
+
+    @pytest.mark.asyncio
+    async def test_periodic_flush_syncs_idle_batch(self, tmp_path):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que con la política "batch" una escritura aislada (sin otra que complete el lote) reciba su fsync desde flush_periodically
+        Parámetros de entrada:
+            - Una escritura con fsync_batch_size=32 e intervalo de 1 hora; flush_periodically cada 10 ms
+        Retorno esperado: Ningún fsync tras la escritura; archivo + directorio tras el flush periódico
+        """
+        with patch('app.core.storage.os.fsync') as mock_fsync:
+            storage = LocalAsyncStorage(
+                root=str(tmp_path),
+                fsync_policy=FsyncPolicy.BATCH,
+                fsync_batch_size=32,
+                fsync_batch_interval=3600,
+            )
+            await storage.put(b"a", "x/1")
+            assert mock_fsync.call_count == 0
+
+            task = asyncio.create_task(flush_periodically(storage, 0.01))
+            await asyncio.sleep(0.1)
+            task.cancel()
+            assert mock_fsync.call_count == 2
+
+    def test_invalid_fsync_policy(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que una política de fsync desconocida se rechace al crear el backend
+        Parámetros de entrada:
+            - fsync_policy: "siempre"
+        Retorno esperado: ValueError
+        """
+        with pytest.raises(ValueError):
+            LocalAsyncStorage(fsync_policy="siempre")
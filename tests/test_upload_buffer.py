@@ -0,0 +1,138 @@
+"""
+Pruebas unitarias para el manejo de archivos subidos en archivos temporales.
+Generado por IA - Fecha: 2024-12-19
+"""
+import hashlib
+import io
+import pytest
+from tempfile import SpooledTemporaryFile
+from unittest.mock import Mock, AsyncMock
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+from app.utils.upload_buffer import SpooledUpload, UploadTooLargeError
+
+
+class TestSpooledUpload:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para SpooledUpload
+    """
+
+    @pytest.mark.asyncio
+    async def test_reuses_underlying_file_and_hashes(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que se reutilice el archivo temporal del UploadFile (sin copia) y que tamaño y SHA-256 sean correctos
+        Parámetros de entrada:
+            - upload_file: UploadFile respaldado por un SpooledTemporaryFile con 3 MB
+        Retorno esperado: open() retorna el mismo handle, size y sha256 coinciden con el contenido
+        """
+        content = b"x" * (3 * 1024 * 1024)
+        spool = SpooledTemporaryFile(max_size=1024)
+        spool.write(content)
+        upload_file = UploadFile(file=spool, filename="grande.pdf", headers=Headers({"content-type": "application/pdf"}))
+
+        upload = await SpooledUpload.from_upload_file(upload_file, max_bytes=0)
+
+        assert upload.open() is spool
+        assert upload.size == len(content)
+        assert upload.sha256 == hashlib.sha256(content).hexdigest()
+        assert upload.content_type == "application/pdf"
+
+    @pytest.mark.asyncio
+    async def test_getbuffer_zero_copy_in_memory_and_on_disk(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que getbuffer entregue el contenido tanto en memoria (BytesIO) como en disco (mmap) y que close libere las vistas
+        Parámetros de entrada:
+            - Un archivo pequeño en memoria y uno grande que ya pasó a disco
+        Retorno esperado: memoryview de solo lectura con el contenido; tras close() la vista queda liberada
+        """
+        small = UploadFile(file=io.BytesIO(b"hola"), filename="a.png")
+        on_disk = SpooledTemporaryFile(max_size=10)
+        on_disk.write(b"contenido en disco")
+        large = UploadFile(file=on_disk, filename="b.png")
+
+        for upload_file, expected in ((small, b"hola"), (large, b"contenido en disco")):
+            upload = await SpooledUpload.from_upload_file(upload_file)
+            view = upload.getbuffer()
+            assert view.readonly
+            assert bytes(view) == expected
+            upload.close()
+            with pytest.raises(ValueError):
+                bytes(view)
+            # El archivo original puede cerrarse sin BufferError
+            upload_file.file.close()
+
+    @pytest.mark.asyncio
+    async def test_rejects_declared_size_before_reading(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que un archivo con tamaño declarado mayor al límite se rechace sin leerlo
+        Parámetros de entrada:
+            - upload_file: Mock con size=100 y max_bytes=10
+        Retorno esperado: UploadTooLargeError y read() nunca invocado
+        """
+        mock_file = Mock()
+        mock_file.filename = "enorme.csv"
+        mock_file.size = 100
+        mock_file.read = AsyncMock(return_value=b"x" * 100)
+
+        with pytest.raises(UploadTooLargeError):
+            await SpooledUpload.from_upload_file(mock_file, max_bytes=10)
+        mock_file.read.assert_not_called()
+
+    @pytest.mark.asyncio
+    async def test_rejects_content_over_limit_without_declared_size(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que el límite se aplique al recorrer el contenido cuando no hay tamaño declarado
+        Parámetros de entrada:
+            - upload_file: UploadFile de 20 bytes sin size y max_bytes=10
+        Retorno esperado: UploadTooLargeError
+        """
+        upload_file = UploadFile(file=io.BytesIO(b"y" * 20), filename="a.csv")
+
+        with pytest.raises(UploadTooLargeError):
+            await SpooledUpload.from_upload_file(upload_file, max_bytes=10)
+
+    @pytest.mark.asyncio
+    async def test_fallback_for_objects_without_file(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que objetos sin archivo subyacente (solo read()) se vuelquen a un temporal propio
+        Parámetros de entrada:
+            - upload_file: Mock con read() asíncrono
+        Retorno esperado: SpooledUpload con el contenido leído
+        """
+        mock_file = Mock()
+        mock_file.filename = "test.csv"
+        mock_file.content_type = "text/csv"
+        mock_file.size = None
+        mock_file.read = AsyncMock(return_value=b"id,name,price\n")
+
+        upload = await SpooledUpload.from_upload_file(mock_file)
+
+        assert upload.open().read() == b"id,name,price\n"
+        assert upload.size == 14
+        upload.close()
+
+    @pytest.mark.asyncio
+    async def test_copy_survives_upload_close(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que con copy=True el contenido quede en un temporal propio que sigue legible después de cerrar el UploadFile
+        Parámetros de entrada:
+            - upload_file: UploadFile en memoria, cerrado después de crear el SpooledUpload
+        Retorno esperado: Otro handle con el mismo contenido, tamaño y SHA-256
+        """
+        source = io.BytesIO(b"contenido")
+        upload_file = UploadFile(file=source, filename="a.pdf")
+
+        upload = await SpooledUpload.from_upload_file(upload_file, copy=True)
+        await upload_file.close()
+
+        assert upload.open() is not source
+        assert bytes(upload.getbuffer()) == b"contenido"
+        assert (upload.size, upload.sha256) == (9, hashlib.sha256(b"contenido").hexdigest())
+        upload.close()
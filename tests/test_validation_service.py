@@ -0,0 +1,113 @@
+"""
+Pruebas unitarias para el resumen y la consulta de validaciones.
+Generado por IA - Fecha: 2024-12-19
+"""
+import csv
+import io
+import pytest
+from unittest.mock import patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+from app.db.base import Base
+from app.models.file_model import File
+from app.services.validation_service import (
+    ValidationSummary,
+    iter_file_validations_csv,
+    list_file_validations,
+    save_validations,
+    summarize_validations,
+)
+
+_VALIDATIONS = [
+    {"row": i + 2, "column": "price" if i % 3 else "name", "error": "TYPE" if i % 3 else "EMPTY", "message": f"error {i}"}
+    for i in range(12)
+]
+
+
+@pytest.fixture
+def session_factory():
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Base SQLite en memoria con un archivo y sus 12 validaciones guardadas con save_validations
+    """
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    db = factory()
+    db.add(File(id=1, filename="a.csv", storage_path="a"))
+    db.flush()
+    save_validations(db, 1, _VALIDATIONS)
+    db.commit()
+    db.close()
+    with patch('app.services.validation_service.SessionLocal', factory):
+        yield factory
+
+
+class TestValidationService:
+    """
+    Generado por IA - Fecha: 2024-12-19
+    Descripción: Suite de pruebas para el resumen, la paginación y la exportación de validaciones
+    """
+
+    def test_summary_counts_and_samples(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica los conteos por error y columna y el recorte de muestras
+        Parámetros de entrada:
+            - 12 validaciones (4 EMPTY de name, 8 TYPE de price) y 5 muestras
+        Retorno esperado: Conteos correctos, 5 muestras y truncated=True
+        """
+        summary = summarize_validations(_VALIDATIONS, 5)
+
+        assert summary["total"] == 12
+        assert summary["by_error"] == {"EMPTY": 4, "TYPE": 8}
+        assert summary["by_column"] == {"name": 4, "price": 8}
+        assert summary["samples"] == _VALIDATIONS[:5]
+        assert summary["truncated"] is True
+
+    def test_summary_accumulates_batches(self):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que acumular el resumen por lotes dé lo mismo que resumir la lista completa
+        Parámetros de entrada:
+            - Las 12 validaciones en lotes de 2, 3 y 7 con 4 muestras
+        Retorno esperado: El mismo resultado que summarize_validations
+        """
+        summary = ValidationSummary(4)
+        for batch in (_VALIDATIONS[:2], _VALIDATIONS[2:5], _VALIDATIONS[5:]):
+            summary.add(batch)
+
+        assert summary.result() == summarize_validations(_VALIDATIONS, 4)
+
+    def test_keyset_pages_with_error_filter(self, session_factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica que al paginar por keyset filtrando por código de error se obtengan todas las validaciones del código una sola vez
+        Parámetros de entrada:
+            - Filtro TYPE y páginas de 3
+        Retorno esperado: 8 validaciones TYPE en orden de fila; None para un archivo inexistente
+        """
+        rows, after_id = [], None
+        while True:
+            page = list_file_validations(1, error_code="TYPE", after_id=after_id, limit=3)
+            rows.extend(v["row"] for v in page["validations"])
+            after_id = page["next_after_id"]
+            if after_id is None:
+                break
+
+        assert rows == [v["row"] for v in _VALIDATIONS if v["error"] == "TYPE"]
+        assert list_file_validations(99) is None
+
+    def test_csv_export(self, session_factory):
+        """
+        Generado por IA - Fecha: 2024-12-19
+        Descripción: Verifica la exportación CSV filtrada por columna
+        Parámetros de entrada:
+            - Columna name
+        Retorno esperado: Encabezado y 4 validaciones EMPTY
+        """
+        rows = list(csv.reader(io.StringIO(b"".join(iter_file_validations_csv(1, column="name")).decode("utf-8"))))
+
+        assert rows[0] == ["id", "row", "column", "error", "message"]
+        assert [row[3] for row in rows[1:]] == ["EMPTY"] * 4